@@ -0,0 +1,44 @@
+-- 迁移 001: 热点表索引
+-- 适用于在 schema.sql 加入 "热点查询索引" 之前建立的数据库。
+-- 新建数据库直接执行 schema.sql 即可，无需本文件。
+--
+-- CREATE INDEX CONCURRENTLY 不会阻塞爬虫和分析的写入，但不能放在事务块里执行：
+--   psql "$DATABASE_URL" -f db_schema/migrations/001_hot_table_indexes.sql
+-- (Supabase SQL Editor 会把整段脚本包进事务，请逐条执行)
+-- 如果某条语句中途失败，会留下 INVALID 状态的索引，先 DROP INDEX 再重跑即可。
+--
+-- 关于按月分区：
+--   raw_articles / l1_analysis_sentiment 暂不做声明式分区。
+--   PostgreSQL 要求分区表上的主键和唯一约束必须包含分区键，按 crawl_date / analyzed_at 分区会
+--     * 破坏 raw_articles.url 的全局唯一 (爬虫靠 ON CONFLICT (url) 去重)；
+--     * 破坏 article_id 的单列唯一，l1_analysis_sentiment、article_entity_map 的外键无法再引用它，
+--       save_l1_batch 的 ON CONFLICT (article_id) 也会失效。
+--   两张表都是按时间顺序追加写入，crawl_date 上的 BRIN 索引就能让时间窗口查询按块范围跳过旧数据，
+--   效果接近分区裁剪，又不改变任何约束。
+--
+-- 基准: python -m scripts.benchmarks.bench_db_queries (对比本迁移前后每条查询的 EXPLAIN ANALYZE)
+
+-- 按主题筛选文章 / 报告查询里 raw_articles -> tracked_topics 的连接
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_articles_topic_id
+  ON public.raw_articles (topic_id);
+
+-- 爬虫加载最近 N 天的去重签名
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_raw_articles_crawl_date
+  ON public.raw_articles USING BRIN (crawl_date);
+
+-- L2 报告的 24 小时窗口
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_l1_sentiment_analyzed_at
+  ON public.l1_analysis_sentiment (analyzed_at);
+
+-- 实体 -> 文章 的下钻
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_article_entity_map_entity
+  ON public.article_entity_map (entity_id, article_id);
+
+-- 前端按日期读取报告
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_reports_report_date
+  ON public.daily_reports (report_date);
+
+ANALYZE public.raw_articles;
+ANALYZE public.l1_analysis_sentiment;
+ANALYZE public.article_entity_map;
+ANALYZE public.daily_reports;
@@ -105,4 +105,82 @@ CREATE POLICY "Allow analyzer to write L1 map" ON public.article_entity_map
   FOR ALL TO analyzer_role USING (true) WITH CHECK (true);
 
 CREATE POLICY "Allow analyzer to write L2 reports" ON public.daily_reports
-  FOR ALL TO analyzer_role USING (true) WITH CHECK (true);
\ No newline at end of file
+  FOR ALL TO analyzer_role USING (true) WITH CHECK (true);
+
+-- -------------------------------
+-- 7. 函数 (RPC) 的执行权限
+-- Postgres 默认允许 PUBLIC 执行函数，Supabase 会把它们暴露为 /rpc 接口，
+-- 所以我们先收回，再只授予需要的角色。
+-- -------------------------------
+REVOKE EXECUTE ON FUNCTION public.save_l1_batch(JSONB) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.save_l1_batch(JSONB) TO analyzer_role;
+-- save_l1_batch 使用 ON CONFLICT DO UPDATE，因此需要 UPDATE 权限
+GRANT UPDATE ON public.l1_analysis_sentiment TO analyzer_role;
+GRANT UPDATE ON public.l1_analysis_entities TO analyzer_role;
+
+REVOKE EXECUTE ON FUNCTION public.copy_l1_to_duplicates(INT[]) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.copy_l1_to_duplicates(INT[]) TO analyzer_role;
+
+-- 爬虫更新主题的增量爬取状态 (水位线和轮询计划)
+REVOKE EXECUTE ON FUNCTION public.save_crawl_state(JSONB) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.save_crawl_state(JSONB) TO crawler_role;
+CREATE POLICY "Allow crawler to update crawl state" ON public.tracked_topics
+  FOR UPDATE TO crawler_role USING (is_active = true) WITH CHECK (is_active = true);
+
+-- 爬虫只允许更新 'canonical_article_id' 这一列 (记录近似重复关系)
+REVOKE EXECUTE ON FUNCTION public.set_canonical_articles(JSONB) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.set_canonical_articles(JSONB) TO crawler_role;
+GRANT SELECT, UPDATE (canonical_article_id) ON public.raw_articles TO crawler_role;
+CREATE POLICY "Allow crawler to read articles" ON public.raw_articles
+  FOR SELECT TO crawler_role USING (true);
+CREATE POLICY "Allow crawler to link near-duplicates" ON public.raw_articles
+  FOR UPDATE TO crawler_role USING (true) WITH CHECK (true);
+
+-- 待分析文章视图 (只给 AI 分析脚本使用，前端不需要)
+REVOKE ALL ON public.unanalyzed_articles FROM anon;
+GRANT SELECT ON public.unanalyzed_articles TO analyzer_role;
+GRANT SELECT ON public.tracked_topics TO analyzer_role;
+CREATE POLICY "Allow analyzer to read topics" ON public.tracked_topics
+  FOR SELECT TO analyzer_role USING (true);
+
+-- L1 工作租约 (多个分析进程领取互不重叠的批次)
+-- 领取 / 归还通过 SECURITY DEFINER 函数完成；save_l1_batch 以调用者身份删除已完成文章的租约
+ALTER TABLE public.l1_work_claims ENABLE ROW LEVEL SECURITY;
+GRANT SELECT, DELETE ON public.l1_work_claims TO analyzer_role;
+CREATE POLICY "Allow analyzer to clear finished claims" ON public.l1_work_claims
+  FOR ALL TO analyzer_role USING (true) WITH CHECK (true);
+REVOKE EXECUTE ON FUNCTION public.claim_l1_batch(TEXT, INT, INT, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.claim_l1_batch(TEXT, INT, INT, INT) TO analyzer_role;
+REVOKE EXECUTE ON FUNCTION public.release_l1_claims(TEXT, INT[], TEXT, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.release_l1_claims(TEXT, INT[], TEXT, INT) TO analyzer_role;
+
+-- 实体每日统计 (由触发器维护，分析脚本只读)
+ALTER TABLE public.entity_daily_stats ENABLE ROW LEVEL SECURITY;
+GRANT SELECT ON public.entity_daily_stats TO analyzer_role;
+CREATE POLICY "Allow analyzer to read entity stats" ON public.entity_daily_stats
+  FOR SELECT TO analyzer_role USING (true);
+REVOKE EXECUTE ON FUNCTION public.get_trending_entities(DATE, DATE, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_trending_entities(DATE, DATE, INT) TO analyzer_role;
+REVOKE EXECUTE ON FUNCTION public.rebuild_entity_daily_stats(DATE, DATE) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.rebuild_entity_daily_stats(DATE, DATE) TO analyzer_role;
+-- 前端静态数据包 (scripts/bundles.py)
+REVOKE EXECUTE ON FUNCTION public.get_entity_articles(TEXT[], TIMESTAMPTZ, TIMESTAMPTZ, INT) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.get_entity_articles(TEXT[], TIMESTAMPTZ, TIMESTAMPTZ, INT) TO analyzer_role;
+-- 前端下钻 (js/app.js): 只读，且以调用者身份执行，anon 只能读到上面 RLS 策略允许的行
+GRANT EXECUTE ON FUNCTION public.get_entity_drilldown(TEXT, INT, INT) TO anon;
+
+-- 实体别名与合并 (scripts/entity_resolver.py)
+ALTER TABLE public.entity_aliases ENABLE ROW LEVEL SECURITY;
+GRANT SELECT, INSERT, UPDATE ON public.entity_aliases TO analyzer_role;
+CREATE POLICY "Allow analyzer to write entity aliases" ON public.entity_aliases
+  FOR ALL TO analyzer_role USING (true) WITH CHECK (true);
+REVOKE EXECUTE ON FUNCTION public.merge_entities(INT, INT[], TEXT[]) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.merge_entities(INT, INT[], TEXT[]) TO analyzer_role;
+-- 合并会删除被并入的实体 (连接行和统计行级联删除)
+GRANT DELETE ON public.l1_analysis_entities TO analyzer_role;
+
+-- 冷数据归档 (scripts/archive.py): 维护操作，只允许 service_role 执行
+REVOKE EXECUTE ON FUNCTION public.get_archive_page(TIMESTAMPTZ, INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_archive_page(TIMESTAMPTZ, INT, INT) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.prune_archived_articles(TIMESTAMPTZ, TIMESTAMPTZ, INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.prune_archived_articles(TIMESTAMPTZ, TIMESTAMPTZ, INT, INT) TO service_role;
@@ -12,6 +12,18 @@ CREATE TABLE public.tracked_topics (
   is_active BOOLEAN DEFAULT true  -- 是否启用此关键词
 );
 
+-- 增量爬取 (scripts/crawler.py)：
+-- last_published_at: 水位线，该主题已入库文章中最新的发布时间，下次只请求更新的文章
+-- idle_runs: 连续没有新文章的爬取次数；next_crawl_at: 下次轮询时间 (安静的主题按指数退避，NULL 表示每次都爬)
+-- backfill_since / backfill_until: 翻页达到上限后还没取到的发布时间区间，下次运行以它为 'from' / 'to' 补爬 (NULL 表示没有)
+-- (使用 ADD COLUMN IF NOT EXISTS，已有数据库直接执行这几行即可升级)
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS last_published_at TIMESTAMPTZ;
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS last_crawled_at TIMESTAMPTZ;
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS next_crawl_at TIMESTAMPTZ;
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS idle_runs INT NOT NULL DEFAULT 0;
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS backfill_since TIMESTAMPTZ;
+ALTER TABLE public.tracked_topics ADD COLUMN IF NOT EXISTS backfill_until TIMESTAMPTZ;
+
 -- -------------------------------
 -- 表 2: 原始文章表 (L0 - Raw Data)
 -- 爬虫抓取的数据存放区
@@ -29,6 +41,15 @@ CREATE TABLE public.raw_articles (
   crawl_date TIMESTAMPTZ DEFAULT now()
 );
 
+-- 近似重复检测 (scripts/dedupe.py)：
+-- minhash_signature: 规范化 "标题 + 摘要" 的 MinHash 签名，爬取时计算
+-- canonical_article_id: 近似重复簇的代表文章；NULL 表示本文就是代表
+-- (使用 ADD COLUMN IF NOT EXISTS，已有数据库直接执行这几行即可升级)
+ALTER TABLE public.raw_articles ADD COLUMN IF NOT EXISTS minhash_signature BIGINT[];
+ALTER TABLE public.raw_articles ADD COLUMN IF NOT EXISTS canonical_article_id INT REFERENCES public.raw_articles(article_id) ON DELETE SET NULL;
+CREATE INDEX IF NOT EXISTS idx_raw_articles_canonical ON public.raw_articles (canonical_article_id)
+  WHERE canonical_article_id IS NOT NULL;
+
 -- -------------------------------
 -- 表 3: L1 分析 - 情感摘要表 (L1 - Analysis)
 -- 存储对“每篇”文章的 AI 分析结果 (一对一关系)
@@ -84,28 +105,758 @@ CREATE TABLE public.daily_reports (
   UNIQUE(report_date, category)
 );
 
-CREATE OR REPLACE VIEW public.daily_trending_entities
+-- -------------------------------
+-- 热点查询索引
+-- (已有数据库请执行 migrations/001_hot_table_indexes.sql，它用 CONCURRENTLY 创建，不阻塞写入)
+-- -------------------------------
+-- 按主题筛选文章 / 报告查询里 raw_articles -> tracked_topics 的连接
+CREATE INDEX IF NOT EXISTS idx_raw_articles_topic_id ON public.raw_articles (topic_id);
+-- 爬虫加载最近 N 天的去重签名；crawl_date 随插入顺序递增，BRIN 只有几十 KB 就能按块范围跳过旧数据
+CREATE INDEX IF NOT EXISTS idx_raw_articles_crawl_date ON public.raw_articles USING BRIN (crawl_date);
+-- L2 报告的 24 小时窗口
+CREATE INDEX IF NOT EXISTS idx_l1_sentiment_analyzed_at ON public.l1_analysis_sentiment (analyzed_at);
+-- 实体 -> 文章 的下钻 (主键以 article_id 开头，按 entity_id 查找只能全表扫描)
+CREATE INDEX IF NOT EXISTS idx_article_entity_map_entity ON public.article_entity_map (entity_id, article_id);
+-- 前端按日期读取报告 (唯一键虽以 report_date 开头，单列索引更小，也便于按日期范围清理)
+CREATE INDEX IF NOT EXISTS idx_daily_reports_report_date ON public.daily_reports (report_date);
+
+
+-- -------------------------------
+-- 函数: 把簇代表的 L1 结果复制给其近似重复文章
+-- canonical_ids 为 NULL 时处理所有 "代表已分析、自己还没有结果" 的成员
+-- (例如代表分析完之后才爬到的转载)。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.copy_l1_to_duplicates(canonical_ids INT[] DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  copied_count INT;
+BEGIN
+  WITH copied AS (
+    INSERT INTO public.l1_analysis_sentiment (article_id, ai_summary, sentiment_score, sentiment_label)
+    SELECT a.article_id, s.ai_summary, s.sentiment_score, s.sentiment_label
+    FROM public.raw_articles a
+      JOIN public.l1_analysis_sentiment s ON s.article_id = a.canonical_article_id
+    WHERE a.canonical_article_id IS NOT NULL
+      AND (canonical_ids IS NULL OR a.canonical_article_id = ANY(canonical_ids))
+      AND NOT EXISTS (SELECT 1 FROM public.l1_analysis_sentiment x WHERE x.article_id = a.article_id)
+    ON CONFLICT (article_id) DO NOTHING
+    RETURNING article_id
+  ), copied_maps AS (
+    INSERT INTO public.article_entity_map (article_id, entity_id)
+    SELECT c.article_id, m.entity_id
+    FROM copied c
+      JOIN public.raw_articles a ON a.article_id = c.article_id
+      JOIN public.article_entity_map m ON m.article_id = a.canonical_article_id
+    ON CONFLICT (article_id, entity_id) DO NOTHING
+  )
+  SELECT count(*) INTO copied_count FROM copied;
+
+  RETURN copied_count;
+END;
+$$;
+
+-- -------------------------------
+-- 函数: 保存增量爬取状态 (crawler.py 每次运行结束时调用一次)
+-- states 格式: [{"topic_id": 1, "last_published_at": "...", "last_crawled_at": "...",
+--               "next_crawl_at": null, "idle_runs": 0, "backfill_since": null, "backfill_until": null}]
+-- 水位线只前进不后退 (GREATEST 忽略 NULL)；未爬区间按本次的结果整体覆盖 (补完后清空)。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.save_crawl_state(states JSONB)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count INT;
+BEGIN
+  UPDATE public.tracked_topics t
+  SET
+    last_published_at = GREATEST(t.last_published_at, (s->>'last_published_at')::TIMESTAMPTZ),
+    last_crawled_at = (s->>'last_crawled_at')::TIMESTAMPTZ,
+    next_crawl_at = (s->>'next_crawl_at')::TIMESTAMPTZ,
+    idle_runs = (s->>'idle_runs')::INT,
+    backfill_since = (s->>'backfill_since')::TIMESTAMPTZ,
+    backfill_until = (s->>'backfill_until')::TIMESTAMPTZ
+  FROM jsonb_array_elements(states) AS s
+  WHERE t.topic_id = (s->>'topic_id')::INT;
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$;
+
+-- -------------------------------
+-- 函数: 记录近似重复关系 (crawler.py 每批新文章调用一次)
+-- links 格式: [{"article_id": 12, "canonical_article_id": 7}]
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.set_canonical_articles(links JSONB)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count INT;
+BEGIN
+  UPDATE public.raw_articles a
+  SET canonical_article_id = (l->>'canonical_article_id')::INT
+  FROM jsonb_array_elements(links) AS l
+  WHERE a.article_id = (l->>'article_id')::INT;
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$;
+
+-- -------------------------------
+-- 表 4b: 实体别名表 (Entity Aliases)
+-- 规范化别名键 -> 实体。analysis.py 每次运行开始时把实体表和别名表一次性读入内存
+-- (scripts/entity_resolver.py)，在本地把 AI 写出的实体名解析为 entity_id：
+-- "NVIDIA" / "Nvidia Corp" 的规范化键相同；"英伟达" 这类跨语言别名通过合并命令写入本表。
+-- 实体名自身的规范化键不必写入，只记录与之不同的别名。
+-- -------------------------------
+CREATE TABLE IF NOT EXISTS public.entity_aliases (
+  alias_key TEXT PRIMARY KEY,          -- 规范化后的别名 (normalize_entity_key)
+  entity_id INT NOT NULL REFERENCES public.l1_analysis_entities(entity_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_entity_aliases_entity ON public.entity_aliases (entity_id);
+
+-- -------------------------------
+-- 函数: 批量写入 L1 分析结果 (L1 Bulk Writer)
+-- analysis.py 每个分块 (chunk) 只调用一次此函数 (一次 HTTP 往返)。
+-- 函数体在同一个事务中执行，所以整个分块要么全部写入、要么全部回滚，
+-- 不再需要 "写入失败后删除 l1_analysis_sentiment" 的补偿操作。
+--
+-- 实体已在客户端解析: 已知实体直接给出 entity_id；"entities" 中只有本分块里真正新出现的实体，
+-- 它们的连接行和别名用 entity_name 引用，在这里插入后按名称查回 ID。
+--
+-- payload 格式:
+-- {
+--   "sentiments": [{"article_id": 1, "ai_summary": "...", "sentiment_score": 0.5, "sentiment_label": "Positive"}],
+--   "entities":   [{"entity_name": "Blackwell GPU", "entity_type": "PRODUCT"}],      -- 新实体
+--   "aliases":    [{"alias_key": "blackwellgpus", "entity_name": "Blackwell GPU"},   -- 新别名 (按名称或 ID 引用)
+--                  {"alias_key": "nvidiacorporation", "entity_id": 7}],
+--   "maps":       [{"article_id": 1, "entity_id": 7}, {"article_id": 1, "entity_name": "Blackwell GPU"}]
+-- }
+-- 返回 {"saved": 写入的文章数, "entities": [{"entity_id": 8, "entity_name": "Blackwell GPU"}]} (新实体的 ID)
+-- (返回类型由 INT 改为 JSONB，需要先删除旧函数)
+-- -------------------------------
+DROP FUNCTION IF EXISTS public.save_l1_batch(JSONB);
+CREATE OR REPLACE FUNCTION public.save_l1_batch(payload JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  saved_count INT;
+  created JSONB;
+BEGIN
+  -- 1. 情感摘要 (表 3)
+  INSERT INTO public.l1_analysis_sentiment (article_id, ai_summary, sentiment_score, sentiment_label)
+  SELECT
+    (s->>'article_id')::INT,
+    s->>'ai_summary',
+    (s->>'sentiment_score')::FLOAT,
+    s->>'sentiment_label'
+  FROM jsonb_array_elements(COALESCE(payload->'sentiments', '[]'::jsonb)) AS s
+  ON CONFLICT (article_id) DO UPDATE SET
+    ai_summary = EXCLUDED.ai_summary,
+    sentiment_score = EXCLUDED.sentiment_score,
+    sentiment_label = EXCLUDED.sentiment_label;
+  GET DIAGNOSTICS saved_count = ROW_COUNT;
+
+  -- 2. 新实体 (表 4)，同名实体只保留一行；已存在时 (例如另一次运行刚刚创建) 返回已有的 ID
+  WITH inserted AS (
+    INSERT INTO public.l1_analysis_entities (entity_name, entity_type)
+    SELECT DISTINCT ON (e->>'entity_name')
+      e->>'entity_name',
+      e->>'entity_type'
+    FROM jsonb_array_elements(COALESCE(payload->'entities', '[]'::jsonb)) AS e
+    ON CONFLICT (entity_name) DO UPDATE SET
+      entity_type = EXCLUDED.entity_type
+    RETURNING entity_id, entity_name
+  )
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('entity_id', entity_id, 'entity_name', entity_name)), '[]'::jsonb)
+  INTO created
+  FROM inserted;
+
+  -- 3. 别名 (表 4b)，按 ID 或 (新实体的) 名称引用
+  INSERT INTO public.entity_aliases (alias_key, entity_id)
+  SELECT DISTINCT ON (a->>'alias_key')
+    a->>'alias_key',
+    COALESCE((a->>'entity_id')::INT, ent.entity_id)
+  FROM jsonb_array_elements(COALESCE(payload->'aliases', '[]'::jsonb)) AS a
+    LEFT JOIN public.l1_analysis_entities ent ON ent.entity_name = a->>'entity_name'
+  WHERE COALESCE((a->>'entity_id')::INT, ent.entity_id) IS NOT NULL
+  ON CONFLICT (alias_key) DO NOTHING;
+
+  -- 4. 文章-实体连接表 (表 5)，已知实体直接用 ID，新实体按名称查回 ID
+  INSERT INTO public.article_entity_map (article_id, entity_id)
+  SELECT DISTINCT
+    (m->>'article_id')::INT,
+    COALESCE((m->>'entity_id')::INT, ent.entity_id)
+  FROM jsonb_array_elements(COALESCE(payload->'maps', '[]'::jsonb)) AS m
+    LEFT JOIN public.l1_analysis_entities ent ON ent.entity_name = m->>'entity_name'
+  WHERE COALESCE((m->>'entity_id')::INT, ent.entity_id) IS NOT NULL
+  ON CONFLICT (article_id, entity_id) DO NOTHING;
+
+  -- 5. 把结果复制给这些文章的近似重复 (它们不会再单独调用 AI)
+  PERFORM public.copy_l1_to_duplicates(
+    ARRAY(SELECT (s->>'article_id')::INT FROM jsonb_array_elements(COALESCE(payload->'sentiments', '[]'::jsonb)) AS s)
+  );
+
+  -- 6. 已写入结果的文章不再需要租约 (见下方 l1_work_claims)
+  DELETE FROM public.l1_work_claims c
+  WHERE c.article_id IN (
+    SELECT (s->>'article_id')::INT FROM jsonb_array_elements(COALESCE(payload->'sentiments', '[]'::jsonb)) AS s
+  );
+
+  RETURN jsonb_build_object('saved', saved_count, 'entities', created);
+END;
+$$;
+
+-- -------------------------------
+-- 函数: 合并重复实体 (python -m scripts.entity_resolver merge)
+-- 把 source_ids 的文章关系并入 target_id，别名改指向 target_id，并记录 alias_keys
+-- (被合并实体名的规范化键，之后 AI 再写出这些名字时直接解析为 target_id)，最后删除 source 实体。
+-- entity_daily_stats 随之保持一致: source 的每日统计 (包括明细已归档的日期) 先累加到 target，
+-- 再减去同时关联了多个被合并实体的在库文章多算的部分；文章关系用 UPDATE 改指向 target，
+-- 不经过插入触发器，不会重复计数。source 剩下的统计行随实体级联删除。
+-- 返回并入 target 的文章关系数。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.merge_entities(target_id INT, source_ids INT[], alias_keys TEXT[] DEFAULT '{}')
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  moved_count INT;
+BEGIN
+  source_ids := array_remove(source_ids, target_id);
+
+  -- 1. source 的每日统计累加到 target
+  INSERT INTO public.entity_daily_stats AS st
+    (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+  SELECT d.stat_date, d.category, target_id, sum(d.article_count), sum(d.sentiment_sum), sum(d.sentiment_sq_sum)
+  FROM public.entity_daily_stats d
+  WHERE d.entity_id = ANY(source_ids)
+  GROUP BY d.stat_date, d.category
+  ON CONFLICT (stat_date, category, entity_id) DO UPDATE SET
+    article_count = st.article_count + EXCLUDED.article_count,
+    sentiment_sum = st.sentiment_sum + EXCLUDED.sentiment_sum,
+    sentiment_sq_sum = st.sentiment_sq_sum + EXCLUDED.sentiment_sq_sum;
+
+  -- 2. 同一篇文章关联了 k 个被合并的实体 (target 或 source)，合并后只算一次: 减去多算的 k - 1 次
+  UPDATE public.entity_daily_stats st
+  SET
+    article_count = st.article_count - d.extra_count,
+    sentiment_sum = st.sentiment_sum - d.extra_sum,
+    sentiment_sq_sum = st.sentiment_sq_sum - d.extra_sq_sum
+  FROM (
+    SELECT
+      (s.analyzed_at AT TIME ZONE 'UTC')::DATE AS stat_date,
+      t.category,
+      sum(l.extra) AS extra_count,
+      sum(l.extra * s.sentiment_score) AS extra_sum,
+      sum(l.extra * s.sentiment_score * s.sentiment_score) AS extra_sq_sum
+    FROM (
+      SELECT m.article_id, count(*) - 1 AS extra
+      FROM public.article_entity_map m
+      WHERE m.entity_id = target_id OR m.entity_id = ANY(source_ids)
+      GROUP BY m.article_id
+      HAVING count(*) > 1
+    ) l
+      JOIN public.l1_analysis_sentiment s ON s.article_id = l.article_id
+      JOIN public.raw_articles a ON a.article_id = l.article_id
+      JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+    WHERE a.canonical_article_id IS NULL
+      AND s.sentiment_score IS NOT NULL
+    GROUP BY 1, 2
+  ) d
+  WHERE st.stat_date = d.stat_date
+    AND st.category = d.category
+    AND st.entity_id = target_id;
+
+  -- 3. 文章关系改指向 target: 每篇文章只改一行 (entity_id 最小的 source)，且 target 还没有这篇文章；
+  --    其余的 source 关系随 source 实体级联删除
+  UPDATE public.article_entity_map m
+  SET entity_id = target_id
+  WHERE m.entity_id = ANY(source_ids)
+    AND m.entity_id = (
+      SELECT min(x.entity_id) FROM public.article_entity_map x
+      WHERE x.article_id = m.article_id AND x.entity_id = ANY(source_ids)
+    )
+    AND NOT EXISTS (
+      SELECT 1 FROM public.article_entity_map x
+      WHERE x.article_id = m.article_id AND x.entity_id = target_id
+    );
+  GET DIAGNOSTICS moved_count = ROW_COUNT;
+
+  -- 先改指向再删除 source (否则别名会被级联删除)
+  UPDATE public.entity_aliases SET entity_id = target_id WHERE entity_id = ANY(source_ids);
+  INSERT INTO public.entity_aliases (alias_key, entity_id)
+  SELECT DISTINCT k, target_id FROM unnest(alias_keys) AS k
+  ON CONFLICT (alias_key) DO UPDATE SET entity_id = EXCLUDED.entity_id;
+
+  DELETE FROM public.l1_analysis_entities WHERE entity_id = ANY(source_ids);
+  RETURN moved_count;
+END;
+$$;
+
+
+-- -------------------------------
+-- 视图: 待分析的文章 (L1 积压)
+-- 在数据库端做真正的反连接 (NOT EXISTS)，analysis.py 按 article_id 做 keyset 分页读取。
+-- 近似重复 (canonical_article_id 非空) 不在其中，它们复用簇代表的结果。
+-- security_invoker: 按调用者的权限和 RLS 执行，而不是视图所有者
+-- -------------------------------
+CREATE OR REPLACE VIEW public.unanalyzed_articles
+WITH (security_invoker = true)
 AS
 SELECT
-  t.category,
-  e.entity_name AS topic,
-  count(a.article_id) AS count,
-  avg(s.sentiment_score) AS average_sentiment
-FROM public.l1_analysis_entities e
-  -- 找到所有提到该实体的文章
-  JOIN public.article_entity_map m ON e.entity_id = m.entity_id
-  -- 获取文章的L1情感分数
-  JOIN public.l1_analysis_sentiment s ON m.article_id = s.article_id
-  -- 获取文章的元数据（用于过滤时间和分类）
-  JOIN public.raw_articles a ON m.article_id = a.article_id
-  -- 获取分类
-  JOIN public.tracked_topics t ON a.topic_id = t.topic_id
+  a.article_id,
+  a.title,
+  a.snippet,
+  t.keyword
+FROM public.raw_articles a
+  LEFT JOIN public.tracked_topics t ON a.topic_id = t.topic_id
 WHERE
-  -- 仅限过去 24 小时的分析
-  s.analyzed_at >= (now() - '1 day'::interval)
-GROUP BY
-  t.category,
-  e.entity_name
-ORDER BY
-  t.category,
-  count DESC;
\ No newline at end of file
+  a.canonical_article_id IS NULL
+  AND NOT EXISTS (
+    SELECT 1 FROM public.l1_analysis_sentiment s WHERE s.article_id = a.article_id
+  );
+
+
+-- -------------------------------
+-- 表 3b: L1 分析的工作租约 (Work Claims)
+-- 多个 analysis.py 进程 (手动触发与定时任务重叠、或为清积压多开的 runner) 通过
+-- claim_l1_batch 领取互不重叠的文章批次，不会把同一篇文章分析两遍。
+-- 每行是一篇已被领取、尚未写入结果的文章:
+--   * lease_expires_at 之前只属于 worker_id；进程崩溃后租约过期，别的进程可以重新领取；
+--   * attempts 为领取次数，达到上限后仍未成功的文章进入死信 (dead_lettered_at)，不再被领取；
+--   * 结果写入后 (save_l1_batch) 行被删除，所以表的大小只与在途和死信的文章数有关。
+-- 重新排队死信文章: DELETE FROM public.l1_work_claims WHERE dead_lettered_at IS NOT NULL;
+-- -------------------------------
+CREATE TABLE IF NOT EXISTS public.l1_work_claims (
+  article_id INT PRIMARY KEY REFERENCES public.raw_articles(article_id) ON DELETE CASCADE,
+  worker_id TEXT NOT NULL,
+  lease_expires_at TIMESTAMPTZ NOT NULL,
+  attempts INT NOT NULL DEFAULT 1,
+  last_error TEXT,
+  dead_lettered_at TIMESTAMPTZ
+);
+
+-- -------------------------------
+-- 函数: 领取一批待分析文章 (L1 Work Claim)
+-- 候选行用 FOR UPDATE SKIP LOCKED 锁定: 并发领取的进程会跳过彼此正在领取的文章，而不是排队等待。
+-- 锁只持续到本次调用结束，之后由 l1_work_claims 中的租约保证互斥；
+-- 写租约时 ON CONFLICT ... WHERE 会重新检查最新提交的租约，
+-- 所以即使两个进程的快照都认为某篇文章可以领取，也只有一个能拿到。
+-- 租约过期且已用完 max_attempts 次的文章先被移入死信。
+-- 返回 'unanalyzed_articles' 视图的各列以及本次是第几次领取 (attempts)。
+-- SECURITY DEFINER: 分析脚本不需要 raw_articles 的 UPDATE 权限 (FOR UPDATE 需要) 和租约表的写权限。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.claim_l1_batch(
+  worker TEXT,
+  batch_size INT,
+  lease_seconds INT DEFAULT 900,
+  max_attempts INT DEFAULT 3
+)
+RETURNS TABLE (article_id INT, title TEXT, snippet TEXT, keyword TEXT, attempts INT)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+#variable_conflict use_column
+BEGIN
+  UPDATE public.l1_work_claims c
+  SET dead_lettered_at = now(),
+      last_error = COALESCE(c.last_error, 'lease expired')
+  WHERE c.dead_lettered_at IS NULL
+    AND c.lease_expires_at <= now()
+    AND c.attempts >= max_attempts;
+
+  RETURN QUERY
+  WITH candidates AS (
+    SELECT a.article_id
+    FROM public.raw_articles a
+    WHERE a.canonical_article_id IS NULL
+      AND NOT EXISTS (SELECT 1 FROM public.l1_analysis_sentiment s WHERE s.article_id = a.article_id)
+      AND NOT EXISTS (
+        SELECT 1 FROM public.l1_work_claims c
+        WHERE c.article_id = a.article_id
+          AND (c.lease_expires_at > now() OR c.dead_lettered_at IS NOT NULL)
+      )
+    ORDER BY a.article_id
+    LIMIT batch_size
+    FOR UPDATE OF a SKIP LOCKED
+  ),
+  claimed AS (
+    INSERT INTO public.l1_work_claims AS c (article_id, worker_id, lease_expires_at, attempts)
+    SELECT candidates.article_id, worker, now() + make_interval(secs => lease_seconds), 1
+    FROM candidates
+    ON CONFLICT (article_id) DO UPDATE SET
+      worker_id = EXCLUDED.worker_id,
+      lease_expires_at = EXCLUDED.lease_expires_at,
+      attempts = c.attempts + 1,
+      last_error = NULL
+    WHERE c.lease_expires_at <= now() AND c.dead_lettered_at IS NULL
+    RETURNING c.article_id, c.attempts
+  )
+  SELECT a.article_id, a.title, a.snippet, t.keyword, claimed.attempts
+  FROM claimed
+    JOIN public.raw_articles a ON a.article_id = claimed.article_id
+    LEFT JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+  ORDER BY a.article_id;
+END;
+$$;
+
+-- -------------------------------
+-- 函数: 归还本进程分析失败的文章
+-- 租约立即过期 (下一次领取就能重试)；已用完 max_attempts 次的直接进入死信。
+-- 只处理仍属于 worker 的租约 (已过期并被别的进程领走的不受影响)。
+-- 返回 {"released": 归还的文章数, "dead_lettered": 其中进入死信的文章数}
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.release_l1_claims(
+  worker TEXT,
+  article_ids INT[],
+  error TEXT DEFAULT NULL,
+  max_attempts INT DEFAULT 3
+)
+RETURNS JSONB
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH released AS (
+    UPDATE public.l1_work_claims c
+    SET lease_expires_at = now(),
+        last_error = error,
+        dead_lettered_at = CASE WHEN c.attempts >= max_attempts THEN now() END
+    WHERE c.article_id = ANY(article_ids)
+      AND c.worker_id = worker
+      AND c.dead_lettered_at IS NULL
+    RETURNING c.dead_lettered_at
+  )
+  SELECT jsonb_build_object(
+    'released', count(*),
+    'dead_lettered', count(dead_lettered_at)
+  )
+  FROM released;
+$$;
+
+-- -------------------------------
+-- 表 7: 实体每日统计 (Rollup)
+-- 按 (日期, 分类, 实体) 预聚合的文章数、情感分数之和与平方和，
+-- 由下面的触发器在 L1 结果写入时增量维护。
+-- 热门实体查询 (任意一天或日期范围) 只需按主键做索引范围扫描，不再做五表连接。
+-- 注意：
+--   * 只统计簇代表 (canonical_article_id 为 NULL)，转载不重复计数；
+--   * 删除 / 归档原始数据时不会回减统计 (历史热度保留)；
+--   * 如需与明细表完全对齐，执行 rebuild_entity_daily_stats() (python -m scripts.entity_stats)，
+--     它不会重算库中最早的文章之前的日期 (这些日期的明细已被删除或归档)。
+-- -------------------------------
+CREATE TABLE IF NOT EXISTS public.entity_daily_stats (
+  stat_date DATE NOT NULL,                -- 分析日期 (UTC, 取自 analyzed_at)
+  category TEXT NOT NULL,
+  entity_id INT NOT NULL REFERENCES public.l1_analysis_entities(entity_id) ON DELETE CASCADE,
+  article_count INT NOT NULL DEFAULT 0,
+  sentiment_sum FLOAT NOT NULL DEFAULT 0,
+  sentiment_sq_sum FLOAT NOT NULL DEFAULT 0,  -- 用于计算方差 / 标准差
+  PRIMARY KEY (stat_date, category, entity_id)
+);
+
+-- 新增 "文章-实体" 关系时，累加到对应的 (日期, 分类, 实体)
+-- (语句级触发器 + 过渡表：每个 save_l1_batch 分块只执行一次聚合)
+CREATE OR REPLACE FUNCTION public.entity_daily_stats_on_map_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO public.entity_daily_stats AS st
+    (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+  SELECT
+    (s.analyzed_at AT TIME ZONE 'UTC')::DATE,
+    t.category,
+    n.entity_id,
+    count(*),
+    sum(s.sentiment_score),
+    sum(s.sentiment_score * s.sentiment_score)
+  FROM new_rows n
+    JOIN public.l1_analysis_sentiment s ON s.article_id = n.article_id
+    JOIN public.raw_articles a ON a.article_id = n.article_id
+    JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+  WHERE a.canonical_article_id IS NULL
+    AND s.sentiment_score IS NOT NULL
+  GROUP BY 1, 2, 3
+  ON CONFLICT (stat_date, category, entity_id) DO UPDATE SET
+    article_count = st.article_count + EXCLUDED.article_count,
+    sentiment_sum = st.sentiment_sum + EXCLUDED.sentiment_sum,
+    sentiment_sq_sum = st.sentiment_sq_sum + EXCLUDED.sentiment_sq_sum;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_entity_daily_stats_map_insert ON public.article_entity_map;
+CREATE TRIGGER trg_entity_daily_stats_map_insert
+  AFTER INSERT ON public.article_entity_map
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.entity_daily_stats_on_map_insert();
+
+-- 文章被重新分析 (情感分数变化) 时，按差值修正它所关联实体的统计
+CREATE OR REPLACE FUNCTION public.entity_daily_stats_on_sentiment_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  UPDATE public.entity_daily_stats st
+  SET
+    sentiment_sum = st.sentiment_sum + d.delta_sum,
+    sentiment_sq_sum = st.sentiment_sq_sum + d.delta_sq_sum
+  FROM (
+    SELECT
+      (o.analyzed_at AT TIME ZONE 'UTC')::DATE AS stat_date,
+      t.category,
+      m.entity_id,
+      sum(n.sentiment_score - o.sentiment_score) AS delta_sum,
+      sum(n.sentiment_score * n.sentiment_score - o.sentiment_score * o.sentiment_score) AS delta_sq_sum
+    FROM old_rows o
+      JOIN new_rows n ON n.article_id = o.article_id
+      JOIN public.article_entity_map m ON m.article_id = o.article_id
+      JOIN public.raw_articles a ON a.article_id = o.article_id
+      JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+    WHERE a.canonical_article_id IS NULL
+      AND n.sentiment_score IS DISTINCT FROM o.sentiment_score
+      AND n.sentiment_score IS NOT NULL
+      AND o.sentiment_score IS NOT NULL
+    GROUP BY 1, 2, 3
+  ) d
+  WHERE st.stat_date = d.stat_date
+    AND st.category = d.category
+    AND st.entity_id = d.entity_id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_entity_daily_stats_sentiment_update ON public.l1_analysis_sentiment;
+CREATE TRIGGER trg_entity_daily_stats_sentiment_update
+  AFTER UPDATE ON public.l1_analysis_sentiment
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.entity_daily_stats_on_sentiment_update();
+
+-- 从明细表完全重算统计 (可选日期范围，默认全部)，返回写入的行数
+-- 起点不早于库中最早的文章的日期: 更早的明细已被删除或归档 (scripts/archive.py)，保留它们的统计
+CREATE OR REPLACE FUNCTION public.rebuild_entity_daily_stats(start_date DATE DEFAULT NULL, end_date DATE DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  rebuilt_count INT;
+  live_since DATE;
+BEGIN
+  SELECT (min(crawl_date) AT TIME ZONE 'UTC')::DATE INTO live_since FROM public.raw_articles;
+  IF live_since IS NULL THEN
+    RETURN 0;
+  END IF;
+  start_date := GREATEST(start_date, live_since);
+
+  DELETE FROM public.entity_daily_stats
+  WHERE (start_date IS NULL OR stat_date >= start_date)
+    AND (end_date IS NULL OR stat_date <= end_date);
+
+  INSERT INTO public.entity_daily_stats
+    (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+  SELECT
+    (s.analyzed_at AT TIME ZONE 'UTC')::DATE,
+    t.category,
+    m.entity_id,
+    count(*),
+    sum(s.sentiment_score),
+    sum(s.sentiment_score * s.sentiment_score)
+  FROM public.article_entity_map m
+    JOIN public.l1_analysis_sentiment s ON s.article_id = m.article_id
+    JOIN public.raw_articles a ON a.article_id = m.article_id
+    JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+  WHERE a.canonical_article_id IS NULL
+    AND s.sentiment_score IS NOT NULL
+    AND (start_date IS NULL OR (s.analyzed_at AT TIME ZONE 'UTC')::DATE >= start_date)
+    AND (end_date IS NULL OR (s.analyzed_at AT TIME ZONE 'UTC')::DATE <= end_date)
+  GROUP BY 1, 2, 3;
+  GET DIAGNOSTICS rebuilt_count = ROW_COUNT;
+  RETURN rebuilt_count;
+END;
+$$;
+
+-- 某天或某个日期范围内的热门实体 (report.py 使用)
+-- per_category_limit: 每个分类只返回前 N 个 (NULL 表示全部)
+CREATE OR REPLACE FUNCTION public.get_trending_entities(
+  start_date DATE,
+  end_date DATE,
+  per_category_limit INT DEFAULT NULL
+)
+RETURNS TABLE (category TEXT, topic TEXT, count BIGINT, average_sentiment FLOAT)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT ranked.category, ranked.topic, ranked.count, ranked.average_sentiment
+  FROM (
+    SELECT
+      st.category,
+      e.entity_name AS topic,
+      sum(st.article_count) AS count,
+      sum(st.sentiment_sum) / NULLIF(sum(st.article_count), 0) AS average_sentiment,
+      row_number() OVER (PARTITION BY st.category ORDER BY sum(st.article_count) DESC, e.entity_name) AS rank
+    FROM public.entity_daily_stats st
+      JOIN public.l1_analysis_entities e ON e.entity_id = st.entity_id
+    WHERE st.stat_date BETWEEN start_date AND end_date
+    GROUP BY st.category, e.entity_name
+  ) ranked
+  WHERE per_category_limit IS NULL OR ranked.rank <= per_category_limit
+  ORDER BY ranked.category, ranked.count DESC;
+$$;
+
+-- 报告窗口内提到这些实体的文章及其 L1 结果 (scripts/bundles.py 生成前端静态数据包时使用)
+-- 每个实体按 article_id 倒序 (与 get_entity_drilldown 的翻页顺序一致) 最多 per_entity_limit 篇 (NULL 表示全部)
+CREATE OR REPLACE FUNCTION public.get_entity_articles(
+  entity_names TEXT[],
+  since TIMESTAMPTZ,
+  until TIMESTAMPTZ DEFAULT NULL,
+  per_entity_limit INT DEFAULT NULL
+)
+RETURNS TABLE (
+  entity_name TEXT, article_id INT, title TEXT, url TEXT, source_name TEXT, publication_date TIMESTAMPTZ,
+  ai_summary TEXT, sentiment_label TEXT, sentiment_score FLOAT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT ranked.entity_name, ranked.article_id, ranked.title, ranked.url, ranked.source_name, ranked.publication_date,
+         ranked.ai_summary, ranked.sentiment_label, ranked.sentiment_score
+  FROM (
+    SELECT e.entity_name, a.article_id, a.title, a.url, a.source_name, a.publication_date,
+           s.ai_summary, s.sentiment_label, s.sentiment_score,
+           row_number() OVER (PARTITION BY e.entity_id ORDER BY a.article_id DESC) AS rank
+    FROM public.l1_analysis_entities e
+      JOIN public.article_entity_map m ON m.entity_id = e.entity_id
+      JOIN public.raw_articles a ON a.article_id = m.article_id
+      JOIN public.l1_analysis_sentiment s ON s.article_id = a.article_id
+    WHERE e.entity_name = ANY(entity_names)
+      AND s.analyzed_at >= since
+      AND (until IS NULL OR s.analyzed_at < until)
+  ) ranked
+  WHERE per_entity_limit IS NULL OR ranked.rank <= per_entity_limit
+  ORDER BY ranked.entity_name, ranked.rank;
+$$;
+
+-- -------------------------------
+-- RPC: 前端下钻 (js/app.js，没有静态数据包的日期)
+-- 一次调用返回某个实体的一页文章及其 L1 摘要 / 情感 (原先是 实体 -> 文章列表 -> 每篇文章一次 L1 查询)。
+-- 按 article_id 从新到旧做键集分页: 下一页传入上一页最后一篇的 article_id，
+-- 走 idx_article_entity_map_entity (entity_id, article_id)，翻到多深都不需要 OFFSET 扫描。
+-- 以调用者身份执行 (SECURITY INVOKER)，仍受各表的 RLS 约束；还没有 L1 分析的文章返回 NULL 分析字段。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.get_entity_drilldown(
+  entity TEXT,
+  page_size INT DEFAULT 20,
+  before_article_id INT DEFAULT NULL
+)
+RETURNS TABLE (
+  article_id INT, title TEXT, url TEXT, source_name TEXT, publication_date TIMESTAMPTZ,
+  ai_summary TEXT, sentiment_label TEXT, sentiment_score FLOAT
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT a.article_id, a.title, a.url, a.source_name, a.publication_date,
+         s.ai_summary, s.sentiment_label, s.sentiment_score
+  FROM public.l1_analysis_entities e
+    JOIN public.article_entity_map m ON m.entity_id = e.entity_id
+    JOIN public.raw_articles a ON a.article_id = m.article_id
+    LEFT JOIN public.l1_analysis_sentiment s ON s.article_id = a.article_id
+  WHERE e.entity_name = entity
+    AND (before_article_id IS NULL OR m.article_id < before_article_id)
+  ORDER BY m.article_id DESC
+  LIMIT LEAST(GREATEST(page_size, 1), 100);
+$$;
+
+-- -------------------------------
+-- RPC: 冷数据归档 (scripts/archive.py)
+-- get_archive_page: 按 article_id 做 keyset 分页，一次往返返回一页旧文章 (crawl_date < until)
+--   以及它们的 L1 情感和实体关系 (附实体名)，由客户端按月写入压缩文件。
+-- prune_archived_articles: 归档文件写好并校验后，分批删除该月的原始文章；
+--   L1 情感、实体关系、工作租约随外键级联删除；entity_daily_stats 只在插入 / 更新时维护，
+--   不会回减，所以历史热度和报告保留。每次最多删除 batch_size 篇，避免长事务和长时间持锁。
+-- 归档是维护操作，只授予 service_role (见 rls_policies.sql)。
+-- -------------------------------
+CREATE OR REPLACE FUNCTION public.get_archive_page(
+  until TIMESTAMPTZ,
+  after_id INT DEFAULT 0,
+  page_size INT DEFAULT 1000
+)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+  WITH page AS (
+    SELECT a.*, t.keyword, t.category
+    FROM public.raw_articles a
+      LEFT JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+    WHERE a.crawl_date < until
+      AND a.article_id > after_id
+    ORDER BY a.article_id
+    LIMIT page_size
+  )
+  SELECT jsonb_build_object(
+    'articles', COALESCE((SELECT jsonb_agg(to_jsonb(p) ORDER BY p.article_id) FROM page p), '[]'::jsonb),
+    'sentiments', COALESCE((
+      SELECT jsonb_agg(to_jsonb(s) ORDER BY s.article_id)
+      FROM public.l1_analysis_sentiment s JOIN page p ON p.article_id = s.article_id
+    ), '[]'::jsonb),
+    'maps', COALESCE((
+      SELECT jsonb_agg(jsonb_build_object(
+        'article_id', m.article_id, 'entity_id', m.entity_id,
+        'entity_name', e.entity_name, 'entity_type', e.entity_type
+      ) ORDER BY m.article_id, m.entity_id)
+      FROM public.article_entity_map m
+        JOIN page p ON p.article_id = m.article_id
+        JOIN public.l1_analysis_entities e ON e.entity_id = m.entity_id
+    ), '[]'::jsonb)
+  );
+$$;
+
+CREATE OR REPLACE FUNCTION public.prune_archived_articles(
+  since TIMESTAMPTZ,
+  until TIMESTAMPTZ,
+  max_article_id INT,
+  batch_size INT DEFAULT 5000
+)
+RETURNS INT
+LANGUAGE sql
+AS $$
+  WITH doomed AS (
+    SELECT a.article_id
+    FROM public.raw_articles a
+    WHERE a.crawl_date >= since
+      AND a.crawl_date < until
+      AND a.article_id <= max_article_id
+    ORDER BY a.article_id
+    LIMIT batch_size
+  ),
+  deleted AS (
+    DELETE FROM public.raw_articles a
+    USING doomed d
+    WHERE a.article_id = d.article_id
+    RETURNING 1
+  )
+  SELECT count(*)::INT FROM deleted;
+$$;
+
+-- -------------------------------
+-- 视图: 今日热门实体 (兼容旧的查询方式)
+-- 原先是五表连接 + 过去 24 小时过滤；现在直接读取 entity_daily_stats 中今天 (UTC) 的统计。
+-- -------------------------------
+CREATE OR REPLACE VIEW public.daily_trending_entities
+AS
+SELECT category, topic, count, average_sentiment
+FROM public.get_trending_entities((now() AT TIME ZONE 'UTC')::DATE, (now() AT TIME ZONE 'UTC')::DATE);
@@ -8,6 +8,69 @@ let reportMap = new Map(); // 存储当前加载日期的报告
 let currentVisibleCategory = null; 
 let datePicker; // 日期选择器的 DOM 元素
 
+// 【新】静态数据包 (由 scripts/bundles.py 在报告生成后写入 data/，与网站一起部署)
+// 有数据包的日期，报告和所有下钻都在本地完成；没有数据包的日期才实时查询 Supabase
+const BUNDLE_VERSION = 1;
+let bundleManifestPromise = null; // data/manifest.json (只加载一次)
+const bundleCache = new Map(); // 日期 -> 数据包 (或 null)
+let currentBundle = null; // 当前显示日期的数据包
+
+// 【新】实时查询的客户端缓存 (没有数据包的日期): 报告、实体文章分页、文章 L1 分析
+// 重复打开同一个话题 / 文章不再发请求；空闲时预取当前分类最大的几个 treemap 方块
+const QUERY_CACHE_MAX_ENTRIES = 300;
+const QUERY_CACHE_TTL_MS = 10 * 60 * 1000; // 数据每天才更新一次，10 分钟足够新鲜
+const DRILLDOWN_PAGE_SIZE = 20; // 每次从 get_entity_drilldown 取的文章数
+const PREFETCH_TOP_TILES = 3; // 空闲时预取的 treemap 方块数
+
+// 带 TTL 的 LRU 缓存 (Map 按插入顺序迭代，最久未使用的在最前面)
+class LruCache {
+  constructor(maxEntries, ttlMs) {
+    this.maxEntries = maxEntries;
+    this.ttlMs = ttlMs;
+    this.entries = new Map();
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return undefined;
+    this.entries.delete(key);
+    if (Date.now() > entry.expiresAt) return undefined;
+    this.entries.set(key, entry); // 移到最近使用的位置
+    return entry.value;
+  }
+
+  has(key) {
+    return this.get(key) !== undefined;
+  }
+
+  set(key, value) {
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + this.ttlMs });
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  }
+}
+
+const queryCache = new LruCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_MS);
+const inFlightQueries = new Map(); // 正在进行的查询 (预取和点击同时发生时只发一次请求)
+
+// 先查缓存；未命中时调用 loader 并缓存结果 (失败不缓存)
+function cachedQuery(key, loader) {
+  const cached = queryCache.get(key);
+  if (cached !== undefined) return Promise.resolve(cached);
+  if (inFlightQueries.has(key)) return inFlightQueries.get(key);
+
+  const promise = loader()
+    .then(value => {
+      queryCache.set(key, value);
+      return value;
+    })
+    .finally(() => inFlightQueries.delete(key));
+  inFlightQueries.set(key, promise);
+  return promise;
+}
+
 // --- 辅助函数：获取 'YYYY-MM-DD' 格式的日期字符串 ---
 function getLocalDateString(date) {
     const yyyy = date.getFullYear();
@@ -50,6 +113,39 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 
+// --- 1.5 【新增】加载静态数据包 ---
+function loadBundleManifest() {
+  if (!bundleManifestPromise) {
+    // 清单每天都会变，需要重新验证；数据包文件名带内容哈希，可以直接使用浏览器缓存
+    bundleManifestPromise = fetch('data/manifest.json', { cache: 'no-cache' })
+      .then(resp => (resp.ok ? resp.json() : null))
+      .then(manifest => (manifest && manifest.version === BUNDLE_VERSION ? manifest : null))
+      .catch(() => null);
+  }
+  return bundleManifestPromise;
+}
+
+// 返回某天的数据包；没有数据包、浏览器不支持解压或加载失败时返回 null (调用方改为实时查询)
+async function loadBundle(dateStr) {
+  if (bundleCache.has(dateStr)) return bundleCache.get(dateStr);
+
+  let bundle = null;
+  const manifest = await loadBundleManifest();
+  const entry = manifest && manifest.dates[dateStr];
+  if (entry && typeof DecompressionStream !== 'undefined') {
+    try {
+      const resp = await fetch(`data/${entry.path}`);
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const data = await new Response(resp.body.pipeThrough(new DecompressionStream('gzip'))).json();
+      if (data.version === BUNDLE_VERSION && data.report_date === dateStr) bundle = data;
+    } catch (error) {
+      console.warn(`加载 ${dateStr} 的数据包失败，改为实时查询:`, error.message);
+    }
+  }
+  bundleCache.set(dateStr, bundle);
+  return bundle;
+}
+
 // --- 2. 【重构】主函数：获取并渲染“指定日期”的数据 ---
 async function loadReportsForDate(dateStr) {
   const loadingSpinner = document.getElementById('loading-spinner');
@@ -67,14 +163,26 @@ async function loadReportsForDate(dateStr) {
   clearReportDetails(); // 清空报告详情
 
   try {
-    // B. 【核心查询修改】使用 .eq() 来精确匹配所选日期
-    const { data, error } = await supabase
-      .from('daily_reports')
-      .select('*')
-      .eq('report_date', dateStr) // ⬅️ 核心修改！
-      .order('category', { ascending: true });
-
-    if (error) throw error;
+    // B. 优先使用静态数据包；没有数据包时用 .eq() 精确匹配所选日期实时查询
+    const bundle = await loadBundle(dateStr);
+    if (datePicker.value !== dateStr) return; // 加载期间又切换了日期
+    currentBundle = bundle;
+
+    let data;
+    if (bundle) {
+      data = bundle.reports;
+    } else {
+      data = await cachedQuery(`reports:${dateStr}`, async () => {
+        const { data: liveData, error } = await supabase
+          .from('daily_reports')
+          .select('*')
+          .eq('report_date', dateStr) // ⬅️ 核心修改！
+          .order('category', { ascending: true });
+
+        if (error) throw error;
+        return liveData;
+      });
+    }
 
     if (!data || data.length === 0) {
       // 该日期没有报告
@@ -156,6 +264,7 @@ function renderReportDetails(category) {
     if (report.trending_topics && report.trending_topics.length > 0) {
       treemapEl.style.display = 'block';
       renderTreemap(report.trending_topics, report.category);
+      schedulePrefetch(report.trending_topics);
     } else {
       treemapEl.innerHTML = "<p>当日无热点话题数据。</p>";
       treemapEl.style.display = 'block';
@@ -296,51 +405,26 @@ async function showTopicModal(topicData, category, l2Summary) {
   showModal(); 
 
   try {
-    const { data, error } = await supabase
-      .from('l1_analysis_entities') 
-      .select(`
-        article_entity_map (
-          raw_articles (
-            article_id,
-            title,
-            url
-          )
-        )
-      `) 
-      .eq('entity_name', topicData.name) 
-      .single();
-
-    if (error) throw error;
-
-    const articles = data.article_entity_map.map(entry => entry.raw_articles);
     const listContainer = document.getElementById('article-list-container');
-    
-    if (articles.length === 0) {
-      listContainer.innerHTML = "<p>未找到关联的详细新闻。</p>";
+    const bundleIds = currentBundle && currentBundle.entities[topicData.name];
+    if (bundleIds) {
+      // 数据包中已有该实体的文章，无需查询；被截断的实体从最后一篇起实时翻页
+      const articles = bundleIds.map(id => ({ article_id: id, ...currentBundle.articles[id] }));
+      const truncated = (currentBundle.truncated || []).includes(topicData.name);
+      renderArticleList(listContainer, articles, truncated, topicData, category, l2Summary);
       return;
     }
 
-    const listHtml = articles.map(article => 
-      `<li class="article-list-item" 
-           data-article-id="${article.article_id}" 
-           data-article-title="${escape(article.title)}"
-           data-article-url="${article.url}">
-        ${article.title}
-      </li>`
-    ).join('');
-    
-    listContainer.innerHTML = `<ul class="article-list">${listHtml}</ul>`;
-    
-    document.querySelectorAll('.article-list-item').forEach(item => {
-      item.addEventListener('click', () => {
-        const article = {
-          id: item.dataset.articleId,
-          title: unescape(item.dataset.articleTitle),
-          url: item.dataset.articleUrl
-        };
-        showArticleDetail(article, topicData, category, l2Summary); 
-      });
-    });
+    // 实时查询: 一次 RPC 返回一页文章及其 L1 分析；之前加载过的后续页直接从缓存补上
+    let articles = await fetchEntityArticlesPage(topicData.name);
+    let page = articles;
+    while (page.length === DRILLDOWN_PAGE_SIZE) {
+      const nextKey = entityPageKey(topicData.name, page[page.length - 1].article_id);
+      if (!queryCache.has(nextKey)) break;
+      page = queryCache.get(nextKey);
+      articles = articles.concat(page);
+    }
+    renderArticleList(listContainer, articles, page.length === DRILLDOWN_PAGE_SIZE, topicData, category, l2Summary);
 
   } catch (err) {
     document.getElementById('article-list-container').innerHTML = 
@@ -348,6 +432,84 @@ async function showTopicModal(topicData, category, l2Summary) {
   }
 }
 
+// 渲染文章列表；hasMore 为 true 时在末尾显示 "加载更多" (按 article_id 翻页)
+function renderArticleList(listContainer, articles, hasMore, topicData, category, l2Summary) {
+  if (articles.length === 0) {
+    listContainer.innerHTML = "<p>未找到关联的详细新闻。</p>";
+    return;
+  }
+
+  const listHtml = articles.map(article => 
+    `<li class="article-list-item" 
+         data-article-id="${article.article_id}" 
+         data-article-title="${escape(article.title)}"
+         data-article-url="${article.url}">
+      ${article.title}
+    </li>`
+  ).join('');
+  
+  listContainer.innerHTML = `<ul class="article-list">${listHtml}</ul>` +
+    (hasMore ? `<button id="article-list-more" class="modal-back-btn">加载更多</button>` : '');
+  
+  listContainer.querySelectorAll('.article-list-item').forEach(item => {
+    item.addEventListener('click', () => {
+      const article = {
+        id: item.dataset.articleId,
+        title: unescape(item.dataset.articleTitle),
+        url: item.dataset.articleUrl
+      };
+      showArticleDetail(article, topicData, category, l2Summary); 
+    });
+  });
+
+  if (hasMore) {
+    const moreBtn = document.getElementById('article-list-more');
+    moreBtn.addEventListener('click', async () => {
+      moreBtn.disabled = true;
+      try {
+        const page = await fetchEntityArticlesPage(topicData.name, articles[articles.length - 1].article_id);
+        renderArticleList(listContainer, articles.concat(page), page.length === DRILLDOWN_PAGE_SIZE,
+                          topicData, category, l2Summary);
+      } catch (err) {
+        moreBtn.disabled = false;
+        console.error(`加载更多文章失败:`, err.message);
+      }
+    });
+  }
+}
+
+// --- 8.5 【新增】实体文章分页查询 (get_entity_drilldown RPC) 与空闲预取 ---
+function entityPageKey(entityName, beforeArticleId) {
+  return `entity:${entityName}:${beforeArticleId ?? ''}`;
+}
+
+// 一页文章 (按 article_id 从新到旧)；每篇文章的 L1 分析同时写入缓存，点开文章时不再查询
+function fetchEntityArticlesPage(entityName, beforeArticleId = null) {
+  return cachedQuery(entityPageKey(entityName, beforeArticleId), async () => {
+    const { data, error } = await supabase.rpc('get_entity_drilldown', {
+      entity: entityName,
+      page_size: DRILLDOWN_PAGE_SIZE,
+      before_article_id: beforeArticleId,
+    });
+    if (error) throw error;
+    data.forEach(row => queryCache.set(`article:${row.article_id}`, row));
+    return data;
+  });
+}
+
+// 浏览器空闲时预取当前分类最大的几个方块的第一页 (有数据包或省流量模式时跳过)
+function schedulePrefetch(topics) {
+  if (currentBundle || (navigator.connection && navigator.connection.saveData)) return;
+  const names = [...topics]
+    .sort((a, b) => b.count - a.count)
+    .slice(0, PREFETCH_TOP_TILES)
+    .map(topic => topic.topic);
+  const idle = window.requestIdleCallback || (callback => setTimeout(callback, 200));
+  idle(() => {
+    names.forEach(name => fetchEntityArticlesPage(name).catch(() => {})); // 预取失败不影响点击时的正常查询
+  });
+}
+
 // --- 9. L1 模态框 (showArticleDetail) (逻辑不变) ---
 async function showArticleDetail(article, topicData, category, l2Summary) {
   modalBody.innerHTML = `
@@ -369,13 +531,23 @@ async function showArticleDetail(article, topicData, category, l2Summary) {
   });
 
   try {
-    const { data: l1Data, error: l1Error } = await supabase
-      .from('l1_analysis_sentiment') 
-      .select('ai_summary, sentiment_label, sentiment_score')
-      .eq('article_id', article.id) 
-      .single();
-
-    if (l1Error) throw l1Error;
+    let l1Data = currentBundle && currentBundle.articles[article.id];
+    if (!l1Data || !l1Data.sentiment_label) {
+      // 通常已由 get_entity_drilldown 写入缓存；没有 L1 分析的文章才单独查询
+      l1Data = await cachedQuery(`article:${article.id}`, async () => {
+        const { data, error: l1Error } = await supabase
+          .from('l1_analysis_sentiment') 
+          .select('ai_summary, sentiment_label, sentiment_score')
+          .eq('article_id', article.id) 
+          .single();
+
+        if (l1Error) throw l1Error;
+        return data;
+      });
+      if (!l1Data.sentiment_label) {
+        throw new Error('该文章还没有 L1 分析结果');
+      }
+    }
 
     const container = document.getElementById('l1-analysis-container');
     const sentimentClass = l1Data.sentiment_label.toLowerCase(); 
@@ -1,15 +1,29 @@
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Any
+import json
+import uuid
+import queue
+import socket
+import itertools
+import functools
+import threading
+from time import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterable, Iterator, Callable
 from tqdm import tqdm
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
 from pydantic import ValidationError
 
 # 导入我们自己的模块
-from .db import get_db_client
-from .l1_structure import L1AnalysisStructure
+from .storage import get_storage
+from .l1_structure import L1AnalysisStructure, L1BatchAnalysisStructure
+from .llm_cache import with_llm_cache
+from .llm_output import build_structured_chain, output_signature, LLM_OUTPUT_MODE
+from .entity_resolver import EntityResolver, get_entity_resolver
+from .metrics import span, inc, llm_instrumentation, write_run_report
+from .llm_concurrency import with_adaptive_concurrency, get_llm_limiter, LLM_MAX_CONCURRENCY
 
 # -----------------------------------------------------------------
 # 常量定义 (Constants)
@@ -17,45 +31,240 @@ from .l1_structure import L1AnalysisStructure
 # 从环境变量中获取 AI 配置，使用原仓库的变量名
 MODEL_NAME = os.environ.get("MODEL_NAME", "deepseek-chat")
 LANGUAGE = os.environ.get("LANGUAGE", "Chinese")
-# 并行处理的工作线程数，就像原仓库的 'max_workers'
-MAX_WORKERS = 2 
 
-def load_prompt() -> str:
+# --- 批量 L1 模式 (一次 AI 调用分析多篇文章) ---
+# 开启后，提示词和格式化指令每批只发送一次，而不是每篇文章一次
+L1_BATCH_MODE = os.environ.get("L1_BATCH_MODE", "true").lower() == "true"
+# 每批文章内容 (标题 + 摘要) 的估算 token 预算，批大小据此自适应
+L1_BATCH_TOKEN_BUDGET = int(os.environ.get("L1_BATCH_TOKEN_BUDGET", "1500"))
+# 每批最多的文章数 (避免输出过长导致截断)
+L1_BATCH_MAX_ARTICLES = int(os.environ.get("L1_BATCH_MAX_ARTICLES", "15"))
+# 每篇文章摘要 (snippet) 的估算 token 上限，超出部分截断 (0 表示不截断)
+L1_SNIPPET_MAX_TOKENS = int(os.environ.get("L1_SNIPPET_MAX_TOKENS", "300"))
+
+# --- 批量入库 (L1 Bulk Writer) ---
+# 开启后，每个分块只调用一次 'save_l1_batch' RPC (见 schema.sql)，分块内原子提交
+L1_BULK_WRITE = os.environ.get("L1_BULK_WRITE", "true").lower() == "true"
+# 每个 RPC 分块包含的文章数
+L1_WRITE_CHUNK_SIZE = int(os.environ.get("L1_WRITE_CHUNK_SIZE", "200"))
+
+# --- 流式处理 (Streaming) ---
+# AI 线程把结果推入有界队列，写入线程按 "数量或时间" 微批次落库，
+# 因此进度是持续持久化的，内存占用也与待分析文章总数无关。
+# 结果队列容量 (满了之后 AI 线程会等待写入线程，形成背压)
+L1_RESULT_QUEUE_SIZE = int(os.environ.get("L1_RESULT_QUEUE_SIZE", "200"))
+# 缓冲区达到多少篇就落库一次
+L1_FLUSH_SIZE = int(os.environ.get("L1_FLUSH_SIZE", "50"))
+# 距离上次落库超过多少秒就落库一次 (即使没攒够 L1_FLUSH_SIZE)
+L1_FLUSH_INTERVAL = float(os.environ.get("L1_FLUSH_INTERVAL", "10"))
+
+# 分页读取待分析文章时每页的行数 (不超过 PostgREST 的默认行数上限 1000)
+BACKLOG_PAGE_SIZE = int(os.environ.get("BACKLOG_PAGE_SIZE", "1000"))
+
+# --- 多进程领取 (L1 Work Claims) ---
+# 开启后，文章不再直接分页读取，而是通过 'claim_l1_batch' RPC 领取带租约的批次 (见 schema.sql)，
+# 任意多个分析进程 (不同机器上也可以) 同时运行时拿到的文章互不重叠
+L1_WORK_CLAIMS = os.environ.get("L1_WORK_CLAIMS", "true").lower() == "true"
+# 每次领取的文章数 (领取的文章在租约期内只属于本进程，不宜过大)
+L1_CLAIM_SIZE = int(os.environ.get("L1_CLAIM_SIZE", "200"))
+# 租约时长 (秒)：进程崩溃后，这些文章最晚在租约到期后被别的进程重新领取
+L1_LEASE_SECONDS = int(os.environ.get("L1_LEASE_SECONDS", "900"))
+# 一篇文章最多被领取几次，仍失败则进入死信，不再自动重试
+L1_MAX_ATTEMPTS = int(os.environ.get("L1_MAX_ATTEMPTS", "3"))
+# 本进程的标识 (写入租约，便于排查是哪个 runner 领走了文章)
+L1_WORKER_ID = os.environ.get("L1_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def load_prompt(filename: str = 'l1_analysis.txt') -> str:
     """从文件加载 L1 提示词"""
-    prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'l1_analysis.txt')
+    prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', filename)
     with open(prompt_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def get_unanalyzed_articles() -> List[Dict[str, Any]]:
+def build_chain(prompt_filename: str, pydantic_object):
+    """
+    构建 'prompt | llm | parser' chain，返回 (chain, prompt)。
+    """
+    # 1. 加载原始提示词字符串 (静态指令在前，每次调用的数据在 PROMPT_INPUT_MARKER 之后)
+    prompt_template_str = load_prompt(prompt_filename)
+    
+    # 2. 初始化 LLM
+    #    (附带指标埋点: 每次调用的耗时、token 用量、429/5xx 和重试，见 metrics.py)
+    #    (关闭 SDK 自带的重试: 429/5xx 由共享的并发控制器退避重试，并据此调整并发)
+    prompt_name = prompt_filename.rsplit('.', 1)[0]
+    llm = ChatOpenAI(model=MODEL_NAME, max_retries=0, **llm_instrumentation(prompt_name))
+    
+    # 3. 按输出模式 (LLM_OUTPUT_MODE，见 llm_output.py) 创建 'prompt | llm | parser' chain：
+    #    'parser' 附加完整格式化指令并解析文本；其他模式使用模型原生的 JSON / 工具调用和紧凑 schema
+    chain, prompt = build_structured_chain(prompt_template_str, pydantic_object, llm)
+    
+    # 4. 每次调用都经过 L1/L2 共享的自适应并发控制器 (见 llm_concurrency.py)
+    chain = with_adaptive_concurrency(chain, prompt_name)
+    
+    # 5. 套上本地 LLM 响应缓存 (相同输入不再重复调用 AI)
+    return with_llm_cache(chain, prompt, MODEL_NAME, pydantic_object, output_signature(pydantic_object)), prompt
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：CJK 字符约 1 token/字，其余约 4 字符/token。
+    只用于批大小规划和成本对比，不需要精确。
+    """
+    if not text:
+        return 0
+    cjk_chars = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af')
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int = L1_SNIPPET_MAX_TOKENS) -> str:
+    """
+    按 estimate_tokens 的口径把文本截断到 max_tokens 以内 (尽量在空白处断开)，被截断时末尾加 '…'。
+    """
+    if not text or max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens * 4  # 以 1/4 token 为单位计数: CJK 字符 4，其余字符 1
+    cut = 0
+    for cut, ch in enumerate(text):
+        budget -= 4 if ('\u3000' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af') else 1
+        if budget < 4:  # 给 '…' 留位置
+            break
+    truncated = text[:cut]
+    space = truncated.rfind(' ')
+    if space > cut * 0.8:
+        truncated = truncated[:space]
+    return truncated.rstrip() + "…"
+
+def get_snippet(article: Dict[str, Any]) -> str:
+    """文章摘要 (超长时截断到 L1_SNIPPET_MAX_TOKENS)"""
+    return truncate_to_tokens(article.get('snippet') or '')
+
+def estimate_prompt_tokens(prompt: ChatPromptTemplate, ai_input: Dict[str, Any]) -> int:
+    """估算一次调用的完整提示词 (模板 + 格式化指令 + 输入) 的 token 数"""
+    return estimate_tokens(prompt.format(**ai_input))
+
+def get_topic_keyword(article: Dict[str, Any]) -> str:
+    """提取文章所属主题的关键词 (来自 'unanalyzed_articles' 视图的 keyword 列)"""
+    return article.get('keyword') or "general"
+
+def iter_batches(
+    articles: Iterable[Dict[str, Any]],
+    token_budget: int = L1_BATCH_TOKEN_BUDGET,
+    max_articles: int = L1_BATCH_MAX_ARTICLES
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按估算的 token 预算 (标题 + 摘要) 把文章打包成批 (生成器，边读边打包)。
+    短摘要的文章会被打包得更多，长文章则更少；单篇超预算的文章自成一批。
+    """
+    current_batch = []
+    current_tokens = 0
+    for article in articles:
+        article_tokens = estimate_tokens(article.get('title') or '') + estimate_tokens(get_snippet(article))
+        if current_batch and (current_tokens + article_tokens > token_budget or len(current_batch) >= max_articles):
+            yield current_batch
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(article)
+        current_tokens += article_tokens
+    if current_batch:
+        yield current_batch
+
+def build_batch_input(batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """准备批量 AI 调用的输入 (紧凑 JSON，不缩进以节省 token)"""
+    articles_payload = [
+        {
+            "article_id": article['article_id'],
+            "topic": get_topic_keyword(article),
+            "title": article['title'],
+            "snippet": get_snippet(article)
+        }
+        for article in batch
+    ]
+    return {
+        "language": LANGUAGE,
+        "articles_json": json.dumps(articles_payload, ensure_ascii=False, separators=(',', ':'))
+    }
+
+def fetch_unanalyzed_page(after_id: int, page_size: int = BACKLOG_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """
+    读取一页 article_id > after_id 的待分析文章 (keyset 分页)。
+    'unanalyzed_articles' 视图在数据库端完成反连接 (NOT EXISTS)，见 schema.sql。
+    """
+    return get_storage().fetch_unanalyzed_page(after_id, page_size)
+
+def iter_unanalyzed_articles(page_size: int = BACKLOG_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    逐篇产出所有“未被分析过”的文章 (L0)，按 article_id 做 keyset 分页。
+    下一页在后台线程中预取，所以第一页到手就可以开始分析；
+    不受 PostgREST 单次返回行数上限的影响，任意大小的积压都能完整处理。
+    """
+    print("  (Analysis Step 1/3) 正在从数据库分页获取“未分析”的文章...")
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_page = prefetcher.submit(fetch_unanalyzed_page, 0, page_size)
+        while True:
+            try:
+                page = next_page.result()
+            except Exception as e:
+                tqdm.write(f"🔴 错误: 无法获取未分析的文章 (已获取 {fetched} 篇): {e}")
+                return
+            if len(page) == page_size:
+                next_page = prefetcher.submit(fetch_unanalyzed_page, page[-1]['article_id'], page_size)
+            fetched += len(page)
+            yield from page
+            if len(page) < page_size:
+                tqdm.write(f"  > 共获取 {fetched} 篇新文章待分析。")
+                return
+
+def iter_claimed_articles(claim_size: int = L1_CLAIM_SIZE) -> Iterator[Dict[str, Any]]:
     """
-    从数据库获取所有“未被分析过”的文章 (L0)。
-    这是通过 'LEFT JOIN' 实现的：我们查找所有在 'raw_articles' 中
-    但“不在” 'l1_analysis_sentiment' 表中的文章。
+    逐篇产出本进程领取到的待分析文章，直到没有可领取的文章为止。
+    与 iter_unanalyzed_articles 一样在后台线程中预先领取下一批。
     """
-    print("  (Analysis Step 1/3) 正在从数据库获取“未分析”的文章...")
-    db = get_db_client()
+    print(f"  (Analysis Step 1/3) 正在以 '{L1_WORKER_ID}' 的身份领取待分析文章 (每次 {claim_size} 篇，租约 {L1_LEASE_SECONDS} 秒)...")
+    storage = get_storage()
+    claim = functools.partial(storage.claim_l1_batch, L1_WORKER_ID, claim_size, L1_LEASE_SECONDS, L1_MAX_ATTEMPTS)
+    claimed = retried = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_claim = prefetcher.submit(claim)
+        while True:
+            try:
+                page = next_claim.result()
+            except Exception as e:
+                tqdm.write(f"🔴 错误: 无法领取待分析的文章 (已领取 {claimed} 篇): {e}")
+                return
+            if len(page) == claim_size:
+                next_claim = prefetcher.submit(claim)
+            claimed += len(page)
+            retried += sum(1 for article in page if article.get('attempts', 1) > 1)
+            inc("l1_claimed_total", len(page))
+            yield from page
+            if len(page) < claim_size:
+                tqdm.write(f"  > 共领取 {claimed} 篇文章 (其中 {retried} 篇是重试)。")
+                return
+
+_release_stats_lock = threading.Lock()
+
+def release_failed_articles(unit: List[Dict[str, Any]], results: List[Dict[str, Any]], release_stats: Dict[str, int]):
+    """把本批中 AI 分析失败的文章归还 (下次领取时重试，或进入死信)"""
+    failed = sorted({a['article_id'] for a in unit} - {r['article_id'] for r in results})
+    if not failed:
+        return
     try:
-        # 使用 PostgREST 的 RPC (远程过程调用) 或视图 (View) 是最高效的
-        # 但为简单起见，我们使用一个等效的 'left_join' 查询
-        # (注意: Supabase-py v2+ 可能需要调整此查询语法)
-        #
-        # SQL 等价于:
-        # SELECT a.article_id, a.title, a.snippet, t.keyword 
-        # FROM raw_articles a
-        # JOIN tracked_topics t ON a.topic_id = t.topic_id
-        # LEFT JOIN l1_analysis_sentiment s ON a.article_id = s.article_id
-        # WHERE s.analysis_id IS NULL;
-
-        response = db.table("raw_articles").select(
-            "article_id, title, snippet, tracked_topics(keyword), l1_analysis_sentiment(analysis_id)"
-        ).is_("l1_analysis_sentiment.analysis_id", None).execute()
-        
-        articles = response.data
-        tqdm.write(f"  > 成功获取 {len(articles)} 篇新文章待分析。")
-        return articles
+        released = get_storage().release_l1_claims(L1_WORKER_ID, failed, "AI 分析失败", L1_MAX_ATTEMPTS)
     except Exception as e:
-        tqdm.write(f"🔴 错误: 无法获取未分析的文章: {e}")
-        return []
+        # 归还失败也无妨，租约到期后同样会被重新领取
+        tqdm.write(f"🟡 警告: 归还 {len(failed)} 篇失败文章的租约失败: {e}")
+        return
+    inc("l1_dead_lettered_total", released.get("dead_lettered", 0))
+    with _release_stats_lock:  # 由多个 AI 线程调用
+        for key, value in released.items():
+            release_stats[key] = release_stats.get(key, 0) + value
+
+def build_single_input(article: Dict[str, Any]) -> Dict[str, Any]:
+    """准备单篇文章 AI 调用的输入"""
+    return {
+        "language": LANGUAGE,
+        "topic_keyword": get_topic_keyword(article),
+        "article_title": article['title'],
+        "article_snippet": get_snippet(article)
+    }
 
 def process_single_article(article: Dict[str, Any], chain) -> Dict[str, Any] | None:
     """
@@ -63,17 +272,7 @@ def process_single_article(article: Dict[str, Any], chain) -> Dict[str, Any] | N
     """
     try:
         # 准备 AI 模型的输入
-        # (注意：'tracked_topics' 是一个字典列表，我们需要提取第一个)
-        topic_keyword = "general"
-        if article.get('tracked_topics'):
-            topic_keyword = article['tracked_topics']['keyword']
-            
-        ai_input = {
-            "language": LANGUAGE,
-            "topic_keyword": topic_keyword,
-            "article_title": article['title'],
-            "article_snippet": article['snippet']
-        }
+        ai_input = build_single_input(article)
         
         # 调用 AI (这步最耗时)
         response: L1AnalysisStructure = chain.invoke(ai_input)
@@ -88,139 +287,362 @@ def process_single_article(article: Dict[str, Any], chain) -> Dict[str, Any] | N
     
     return None
 
+def process_article_batch(batch: List[Dict[str, Any]], batch_chain, single_chain) -> List[Dict[str, Any]]:
+    """
+    用一次 AI 调用分析一批文章，并按 'article_id' 拆分结果。
+    - 整批解析失败时，只有这一批回退到逐篇调用；
+    - AI 漏掉的文章也会单独补调用一次。
+    """
+    if len(batch) == 1:
+        with span("l1_unit", mode="single"):
+            result = process_single_article(batch[0], single_chain)
+        inc("l1_articles_total", status="ok" if result else "failed")
+        return [result] if result else []
+
+    try:
+        with span("l1_unit", mode="batch"):
+            response: L1BatchAnalysisStructure = batch_chain.invoke(build_batch_input(batch))
+    except (ValidationError, OutputParserException) as e:
+        tqdm.write(f"🟡 批量输出解析失败 ({len(batch)} 篇)，回退到逐篇分析: {e}")
+        inc("l1_fallbacks_total", len(batch), reason="parse_error")
+        results = [r for r in (process_single_article(a, single_chain) for a in batch) if r]
+        inc("l1_articles_total", len(results), status="ok")
+        inc("l1_articles_total", len(batch) - len(results), status="failed")
+        return results
+    except Exception as e:
+        tqdm.write(f"🔴 批量 AI 调用失败 ({len(batch)} 篇): {e}")
+        inc("l1_articles_total", len(batch), status="failed")
+        return []
+
+    # 只接受本批中存在的 article_id (防止 AI 编造 ID)
+    batch_ids = {article['article_id'] for article in batch}
+    results_by_id = {}
+    for item in response.results:
+        if item.article_id in batch_ids and item.article_id not in results_by_id:
+            analysis = L1AnalysisStructure(**item.model_dump(exclude={'article_id'}))
+            results_by_id[item.article_id] = {"article_id": item.article_id, "analysis": analysis}
+
+    missing = [article for article in batch if article['article_id'] not in results_by_id]
+    if missing:
+        tqdm.write(f"🟡 批量输出缺少 {len(missing)} 篇文章的结果，逐篇补充分析...")
+        inc("l1_fallbacks_total", len(missing), reason="missing_result")
+        for article in missing:
+            result = process_single_article(article, single_chain)
+            if result:
+                results_by_id[article['article_id']] = result
+
+    inc("l1_articles_total", len(results_by_id), status="ok")
+    inc("l1_articles_total", len(batch) - len(results_by_id), status="failed")
+    return list(results_by_id.values())
+
 def save_analysis_to_db(result: Dict[str, Any]):
     """
-    将单篇 AI 分析结果（L1）存入数据库的三个表中。
+    将单篇 AI 分析结果（L1）存入数据库的三个表中 (一次 'save_l1_batch'，原子写入)。
     [对应 schema.sql 表 3, 4, 5]
     """
-    db = get_db_client()
     article_id = result['article_id']
-    analysis = result['analysis']
 
     try:
-        # 1. 写入 'l1_analysis_sentiment' 表 (表 3)
-        db.table("l1_analysis_sentiment").upsert({
-            "article_id": article_id,
-            "ai_summary": analysis.ai_summary,
-            "sentiment_score": analysis.sentiment_score,
-            "sentiment_label": analysis.sentiment_label
-        }, on_conflict="article_id").execute()
-        
-        # 2. & 3. 写入 'l1_analysis_entities' (表 4) 和 'article_entity_map' (表 5)
-        if analysis.entities:
-            entity_ids_to_map = []
-            
-            # 准备实体数据
-            entities_to_upsert = [
-                {"entity_name": e.name, "entity_type": e.type} 
-                for e in analysis.entities
-            ]
-            
-            # 'upsert' 会插入新实体，或在 'entity_name' 冲突时更新现有实体
-            # 这能确保 'NVIDIA' 在 'l1_analysis_entities' 中只存在一次 (规范化)
-            entity_response = db.table("l1_analysis_entities").upsert(
-                entities_to_upsert, 
-                on_conflict="entity_name"
-            ).execute()
-            
-            entity_ids = [e['entity_id'] for e in entity_response.data]
-            
-            # 准备连接表数据 (多对多关系)
-            map_data_to_insert = [
-                {"article_id": article_id, "entity_id": eid}
-                for eid in entity_ids
-            ]
-
-# 插入连接表，'ignore_duplicates=True' 防止重复
-            db.table("article_entity_map").upsert(
-                map_data_to_insert,
-                on_conflict="article_id, entity_id",
-                ignore_duplicates=True
-            ).execute()
-
+        save_l1_chunk([result])
         return True # 表示成功
         
     except Exception as e:
+        # 写入在同一个事务中，失败时已整体回滚，无需补偿删除
         tqdm.write(f"🔴 数据库写入失败 (ID: {article_id}): {e}")
-        # (可选) 在这里添加逻辑，删除已插入的 l1_analysis_sentiment，以实现事务回滚
-        db.table("l1_analysis_sentiment").delete().eq("article_id", article_id).execute()
         return False # 表示失败
 
-def main():
+def build_l1_payload(results: List[Dict[str, Any]], resolver: EntityResolver) -> Dict[str, List[Dict[str, Any]]]:
     """
-    L1 分析脚本主函数
+    把一个分块的 AI 结果转换为 'save_l1_batch' RPC 的 payload。
+    实体名先在本地解析 (见 entity_resolver.py)：已知实体直接给出 entity_id，
+    只有真正的新实体 (在分块内去重) 放进 "entities"，由 RPC 一次性创建。
+    """
+    sentiments = []
+    maps = []
+    pending_keys = set()
+    for result in results:
+        analysis = result['analysis']
+        sentiments.append({
+            "article_id": result['article_id'],
+            "ai_summary": analysis.ai_summary,
+            "sentiment_score": analysis.sentiment_score,
+            "sentiment_label": analysis.sentiment_label
+        })
+        # 同一篇文章里解析到同一实体的多个写法只连接一次
+        entity_ids, new_keys = set(), set()
+        for entity in analysis.entities:
+            entity_id, key = resolver.resolve(entity.name, entity.type)
+            if entity_id is None:
+                new_keys.add(key)
+            else:
+                entity_ids.add(entity_id)
+        maps += [{"article_id": result['article_id'], "entity_id": i} for i in sorted(entity_ids)]
+        maps += [{"article_id": result['article_id'], "entity_name": resolver.pending_name(k)} for k in sorted(new_keys)]
+        pending_keys |= new_keys
+
+    entities, aliases = resolver.build_entity_payload(pending_keys)
+    return {"sentiments": sentiments, "entities": entities, "aliases": aliases, "maps": maps}
+
+def save_l1_chunk(results: List[Dict[str, Any]], storage=None) -> Dict[str, List[Dict[str, Any]]]:
+    """解析实体并写入一个分块 (一次 'save_l1_batch')，成功后把新实体的 ID 登记到解析器，返回 payload"""
+    resolver = get_entity_resolver()
+    payload = build_l1_payload(results, resolver)
+    response = (storage or get_storage()).save_l1_batch(payload)
+    resolver.confirm(payload, (response or {}).get("entities") or [])
+    return payload
+
+def save_analyses_bulk(results: List[Dict[str, Any]], chunk_size: int = L1_WRITE_CHUNK_SIZE, pbar=None) -> Dict[str, int]:
+    """
+    批量写入 L1 结果：
+    1. 在本地把实体名解析为 entity_id (同一实体的不同写法归为一个实体，新实体在分块内去重)；
+    2. 按分块调用 'save_l1_batch' RPC，每块一次往返，并在数据库中原子提交。
+    返回 {'saved': 成功文章数, 'rows': 写入行数, 'round_trips': 往返次数}。
+    """
+    storage = get_storage()
+    stats = {"saved": 0, "rows": 0, "round_trips": 0}
+
+    for start in range(0, len(results), chunk_size):
+        chunk = results[start:start + chunk_size]
+        try:
+            stats["round_trips"] += 1
+            payload = save_l1_chunk(chunk, storage)
+            stats["saved"] += len(chunk)
+            stats["rows"] += len(payload["sentiments"]) + len(payload["entities"]) + len(payload["maps"])
+        except Exception as e:
+            # 分块在数据库端是一个事务，失败时整块回滚，无需补偿删除
+            tqdm.write(f"🔴 数据库批量写入失败 ({len(chunk)} 篇，整块已回滚): {e}")
+        if pbar is not None:
+            pbar.update(len(chunk))
+
+    return stats
+
+def save_analyses_per_article(results: List[Dict[str, Any]], pbar=None) -> Dict[str, int]:
+    """
+    逐篇写入模式 (每篇一次往返)，保留用于对比和回退。
+    """
+    stats = {"saved": 0, "rows": 0, "round_trips": 0}
+    for result in results:
+        entity_count = len(result['analysis'].entities)
+        stats["round_trips"] += 1
+        if save_analysis_to_db(result):
+            stats["saved"] += 1
+            stats["rows"] += 1 + 2 * entity_count
+        if pbar is not None:
+            pbar.update(1)
+    return stats
+
+# 结果队列的结束标记
+_END_OF_RESULTS = object()
+
+def result_writer(
+    result_queue: queue.Queue,
+    write_fn: Callable[[List[Dict[str, Any]]], Dict[str, int]],
+    write_stats: Dict[str, float]
+):
+    """
+    写入线程：从队列中取出 AI 结果，攒够 L1_FLUSH_SIZE 篇或等待超过
+    L1_FLUSH_INTERVAL 秒就落库一次，直到收到结束标记。
+    write_fn 抛出的异常只让这一块记为写入失败，写入线程继续运行，
+    否则生产者会在有界队列的 put() 上永远阻塞。
+    """
+    buffer = []
+    last_flush = time()
+
+    def flush():
+        nonlocal buffer, last_flush
+        if buffer:
+            flush_start = time()
+            try:
+                with span("l1_flush"):
+                    stats = write_fn(buffer)
+            except Exception as e:
+                # 这些文章仍未分析 (或租约到期)，下次运行会重新处理
+                tqdm.write(f"🔴 写入线程落库失败 ({len(buffer)} 篇，本块跳过): {e}")
+                stats = {"write_failed": len(buffer)}
+            write_stats["seconds"] += time() - flush_start
+            write_stats["flushes"] += 1
+            write_stats["per_article_round_trips"] += len(buffer)
+            for key, value in stats.items():
+                write_stats[key] = write_stats.get(key, 0) + value
+            buffer = []
+        last_flush = time()
+
+    while True:
+        timeout = max(0.0, L1_FLUSH_INTERVAL - (time() - last_flush))
+        try:
+            item = result_queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        if item is _END_OF_RESULTS:
+            flush()
+            return
+        if item is not None:
+            buffer.append(item)
+        if len(buffer) >= L1_FLUSH_SIZE or time() - last_flush >= L1_FLUSH_INTERVAL:
+            flush()
+
+def run_streaming_analysis(
+    work_units: Iterable[List[Dict[str, Any]]],
+    process_unit: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+    write_fn: Callable[[List[Dict[str, Any]]], Dict[str, int]],
+    total: int | None = None
+) -> Dict[str, float]:
+    """
+    流式 L1 流水线 (生产者/消费者)：
+    - 最多 LLM_MAX_CONCURRENCY * 2 个工作单元同时在途，工作单元按需从迭代器中读取；
+      实际同时进行的 AI 调用数由共享的自适应并发控制器决定 (见 llm_concurrency.py)；
+    - AI 结果推入有界队列，由写入线程按微批次落库，与 AI 调用同时进行。
+    返回写入统计 (saved/rows/round_trips/flushes/seconds/write_failed) 以及 AI 成功数 'analyzed'。
+    """
+    result_queue: queue.Queue = queue.Queue(maxsize=L1_RESULT_QUEUE_SIZE)
+    write_stats = {
+        "saved": 0, "rows": 0, "round_trips": 0, "flushes": 0, "seconds": 0.0, "per_article_round_trips": 0, "write_failed": 0
+    }
+    writer = threading.Thread(target=result_writer, args=(result_queue, write_fn, write_stats), daemon=True)
+    writer.start()
+
+    analyzed = 0
+    unit_sizes = {}
+    max_in_flight = LLM_MAX_CONCURRENCY * 2
+
+    try:
+        with ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY) as executor, \
+                tqdm(total=total, desc="AI 分析 (L1)") as pbar:
+
+            def drain(done):
+                nonlocal analyzed
+                for future in done:
+                    for result in future.result():
+                        result_queue.put(result)  # 队列满时阻塞，等待写入线程
+                        analyzed += 1
+                    pbar.update(unit_sizes.pop(future))
+
+            in_flight = set()
+            for unit in work_units:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    drain(done)
+                future = executor.submit(process_unit, unit)
+                unit_sizes[future] = len(unit)
+                in_flight.add(future)
+            drain(in_flight)
+    finally:
+        # 即使 AI 阶段异常退出，也要把已经拿到的结果落库
+        result_queue.put(_END_OF_RESULTS)
+        writer.join()
+    write_stats["analyzed"] = analyzed
+    return write_stats
+
+def describe_analysis_plan():
+    """预演模式: 统计积压的文章数、AI 调用次数和文章数据的估算 token，不调用 AI、不写库"""
+    backlog = iter_unanalyzed_articles()
+    work_units = iter_batches(backlog) if L1_BATCH_MODE else ([article] for article in backlog)
+    units = articles = tokens = 0
+    for unit in work_units:
+        units += 1
+        articles += len(unit)
+        tokens += sum(estimate_tokens(a.get('title') or '') + estimate_tokens(get_snippet(a)) for a in unit)
+    print(f"  > [预演] 待分析 {articles} 篇文章，约 {units} 次 AI 调用 ({'批量' if L1_BATCH_MODE else '逐篇'}模式)，"
+          f"文章数据约 {tokens} token (不含提示词指令)。")
+
+def main(dry_run: bool = False):
+    """
+    L1 分析脚本主函数。
+    dry_run: 只统计积压的文章，不调用 AI、不写库。
     """
     print("--- L1 分析脚本 (analysis.py) 启动 ---")
+
+    if dry_run:
+        describe_analysis_plan()
+        print("--- L1 分析脚本 (analysis.py) 结束 (预演，未调用 AI、未写入数据库) ---")
+        return
     
     # 1. 初始化 AI
     try:
-        # 【新】导入 Pydantic 解析器
-        from langchain_core.output_parsers import PydanticOutputParser
-        
-        # 1. 加载原始提示词字符串
-        l1_prompt_template_str = load_prompt()
-        
-        # 2. 设置我们的解析器，告诉它我们想要 L1AnalysisStructure
-        parser = PydanticOutputParser(pydantic_object=L1AnalysisStructure)
-        
-        # 3. 从解析器获取 JSON 格式化指令
-        format_instructions = parser.get_format_instructions()
-        
-        # 4. 【关键】将格式化指令附加到原始提示词的末尾
-        l1_prompt_template_str += "\n\n{format_instructions}\n"
-        
-        # 5. 创建新的、包含格式化指令的 PromptTemplate
-        prompt = ChatPromptTemplate.from_template(
-            l1_prompt_template_str,
-            partial_variables={"format_instructions": format_instructions}
-        )
-        
-        # 6. 【修复】初始化 LLM，但*不*使用 .with_structured_output()
-        llm = ChatOpenAI(model=MODEL_NAME)
-        
-        # 7. 创建新的 chain，它会在 LLM 输出后调用我们的解析器
-        chain = prompt | llm | parser
-        
-        print(f"  > AI 模型 ({MODEL_NAME}) 和提示词已加载 (使用 PydanticParser)。")
+        chain, single_prompt = build_chain('l1_analysis.txt', L1AnalysisStructure)
+        batch_chain, batch_prompt = build_chain('l1_batch_analysis.txt', L1BatchAnalysisStructure)
+        print(f"  > AI 模型 ({MODEL_NAME}) 和提示词已加载 (输出模式: {LLM_OUTPUT_MODE})。")
     except Exception as e:
         print(f"🔴 致命错误: 无法初始化 AI: {e}")
-        return
-    articles_to_process = get_unanalyzed_articles()
-    if not articles_to_process:
+        raise
+    # 一次性加载实体表和别名表，之后实体名在本地解析为 ID
+    try:
+        resolver = get_entity_resolver()
+        print(f"  > 已加载实体索引 ({len(resolver)} 个实体)。")
+    except Exception as e:
+        print(f"🔴 致命错误: 无法加载实体表: {e}")
+        raise
+    # 先把已分析的簇代表的结果复制给后来爬到的近似重复
+    try:
+        copied = get_storage().copy_l1_to_duplicates()
+        if copied:
+            print(f"  > 已为 {copied} 篇近似重复文章复用簇代表的 L1 分析 (无需调用 AI)。")
+    except Exception as e:
+        tqdm.write(f"🟡 警告: 复用近似重复的 L1 分析失败: {e}")
+
+    backlog = iter_claimed_articles() if L1_WORK_CLAIMS else iter_unanalyzed_articles()
+    first_article = next(backlog, None)
+    if first_article is None:
         print("⏹️ 没有新文章需要分析。脚本退出。")
         return
-    print(f"  (Analysis Step 2/3) 开始使用 {MAX_WORKERS} 个并行线程处理 {len(articles_to_process)} 篇文章...")
-    
-    successful_analyses = 0
-    
-    # 3. 并行调用 AI (复用原仓库的多线程逻辑)
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 提交所有 AI 分析任务
-        future_to_article = {
-            executor.submit(process_single_article, article, chain): article
-            for article in articles_to_process
-        }
-        
-        # 收集 AI 分析结果 (带进度条)
-        ai_results = []
-        for future in tqdm(as_completed(future_to_article), total=len(articles_to_process), desc="AI 分析 (L1)"):
-            result = future.result()
-            if result:
-                ai_results.append(result)
+    articles_to_process = itertools.chain([first_article], backlog)
+
+    # 2. 按 token 预算分批 (非批量模式下每批一篇)
+    if L1_BATCH_MODE:
+        work_units = iter_batches(articles_to_process)
+        print(f"  (Analysis Step 2/3) 批量模式: 边读取边按 token 预算分批，自适应并发 (上限 {LLM_MAX_CONCURRENCY})...")
+    else:
+        work_units = ([article] for article in articles_to_process)
+        print(f"  (Analysis Step 2/3) 开始逐篇处理，自适应并发 (上限 {LLM_MAX_CONCURRENCY})...")
+
+    # 边提交边估算提示词 token：逐篇模式 vs 本次实际使用的模式
+    token_stats = {"units": 0, "articles": 0, "actual": 0, "per_article": 0}
+    def tracked_units():
+        for unit in work_units:
+            token_stats["units"] += 1
+            token_stats["articles"] += len(unit)
+            token_stats["per_article"] += sum(estimate_prompt_tokens(single_prompt, build_single_input(a)) for a in unit)
+            if len(unit) > 1:
+                token_stats["actual"] += estimate_prompt_tokens(batch_prompt, build_batch_input(unit))
+            else:
+                token_stats["actual"] += estimate_prompt_tokens(single_prompt, build_single_input(unit[0]))
+            yield unit
+
+    # 3. 流式处理：并行调用 AI，同时由写入线程按微批次存入数据库
+    print(f"  (Analysis Step 3/3) AI 结果将每 {L1_FLUSH_SIZE} 篇或每 {L1_FLUSH_INTERVAL:.0f} 秒落库一次...")
+    write_fn = save_analyses_bulk if L1_BULK_WRITE else save_analyses_per_article
+    release_stats = {"released": 0, "dead_lettered": 0}
+    def process_unit(unit):
+        results = process_article_batch(unit, batch_chain, chain)
+        if L1_WORK_CLAIMS:
+            release_failed_articles(unit, results, release_stats)
+        return results
 
-    print(f"  > AI 分析完成。成功 {len(ai_results)} 篇，失败 {len(articles_to_process) - len(ai_results)} 篇。")
+    ai_start = time()
+    stats = run_streaming_analysis(tracked_units(), process_unit, write_fn)
+    ai_elapsed = time() - ai_start
+    successful_analyses = stats["saved"]
+    article_count = max(token_stats["articles"], 1)
 
-    # 4. 将 AI 结果存入数据库
-    if ai_results:
-        print(f"  (Analysis Step 3/3) 正在将 {len(ai_results)} 篇分析结果存入数据库...")
-        with tqdm(total=len(ai_results), desc="数据库写入 (L1)") as pbar:
-            for result in ai_results:
-                if save_analysis_to_db(result):
-                    successful_analyses += 1
-                pbar.update(1)
+    print(f"  > AI 分析完成。成功 {stats['analyzed']} 篇，失败 {token_stats['articles'] - stats['analyzed']} 篇。")
+    print(f"  > AI 吞吐: {token_stats['articles'] / max(ai_elapsed, 1e-9):.2f} 篇/秒 ({token_stats['units']} 次调用，不含回退)。")
+    print(f"  > 提示词 token (估算): {token_stats['actual'] / article_count:.0f} token/篇，"
+          f"逐篇模式为 {token_stats['per_article'] / article_count:.0f} token/篇。")
+    print(f"  > 入库吞吐: {stats['rows'] / max(stats['seconds'], 1e-9):.1f} 行/秒，共落库 {stats['flushes']} 次，"
+          f"往返 {stats['round_trips']} 次 (逐篇模式约需 {stats['per_article_round_trips']} 次)。")
+    if stats["write_failed"]:
+        print(f"🟡 有 {stats['write_failed']} 篇文章的 AI 结果因落库失败被跳过，下次运行会重新分析。")
+    print(f"  > {get_llm_limiter().format_stats()}")
+    print(f"  > {resolver.format_stats()}")
+    if release_stats["released"]:
+        print(f"  > 已归还 {release_stats['released']} 篇失败文章的租约，"
+              f"其中 {release_stats['dead_lettered']} 篇已失败 {L1_MAX_ATTEMPTS} 次，进入死信。")
 
     print("--- L1 分析脚本 (analysis.py) 结束 ---")
     print(f"🟢 总结：总共 {successful_analyses} 篇新文章的 L1 分析已成功存入数据库。")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("stage", trace=True, stage="analysis"):
+        main()
+    write_run_report()
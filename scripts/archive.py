@@ -0,0 +1,481 @@
+import os
+import io
+import sys
+import gzip
+import json
+import sqlite3
+import hashlib
+import argparse
+from time import perf_counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+try:
+    from .storage import get_storage
+    from .metrics import span, inc
+except ImportError:
+    from storage import get_storage
+    from metrics import span, inc
+
+# -----------------------------------------------------------------
+# 冷数据归档 (Cold-Data Archival)
+# -----------------------------------------------------------------
+#
+# raw_articles / l1_analysis_sentiment / article_entity_map 只增不减，而 24 小时窗口查询、
+# 热门实体和搜索几乎只读最近的数据。本脚本把 crawl_date 早于 ARCHIVE_AFTER_DAYS 天的整月数据
+# 按月写入压缩文件，校验后从数据库中删除 (情感和实体关系随外键级联删除)：
+#   archive/<YYYY-MM>/raw_articles.<part>.<ext>
+#   archive/<YYYY-MM>/l1_analysis_sentiment.<part>.<ext>
+#   archive/<YYYY-MM>/article_entity_map.<part>.<ext>     (附实体名，实体表本身不归档)
+#   archive/<YYYY-MM>/manifest.json                       (每个 part 的行数、字节数、sha256)
+# 热门实体统计 (entity_daily_stats) 和 L2 报告保留在数据库中，历史趋势不受影响；
+# 清单记录了归档的最晚分析日期，python -m scripts.entity_stats 重算时会跳过这些日期 (见 first_live_stat_date)。
+#
+# 文件格式 (ARCHIVE_FORMAT=auto 时按可用的库依次选择):
+#   parquet   (需要 pyarrow，列式存储 + zstd 压缩)
+#   jsonl.zst (需要 zstandard)
+#   jsonl.gz  (只用标准库)
+# 同一个月可以有不同格式的 part (例如换了机器重跑)，读取时按文件扩展名区分。
+#
+# 用法:
+#   python -m scripts.archive                      # 归档并删除 90 天前的整月数据
+#   python -m scripts.archive --older-than-days 180 --dry-run
+#   python -m scripts.archive --no-prune           # 只写归档文件，不删除数据库中的行
+#   python -m scripts.archive query "SELECT category, count(*) FROM raw_articles GROUP BY 1" --months 2025-01,2025-02
+#
+# 常量定义 (Constants)
+ARCHIVE_DIR = os.environ.get(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'archive')
+)
+# crawl_date 早于多少天的数据归档 (只归档完整的月份)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_FORMAT = os.environ.get("ARCHIVE_FORMAT", "auto").lower()
+# 每次从数据库读取的文章数 (一次 get_archive_page 往返)
+ARCHIVE_PAGE_SIZE = int(os.environ.get("ARCHIVE_PAGE_SIZE", "1000"))
+# 每次删除的文章数 (一次 prune_archived_articles 调用，一个短事务)
+ARCHIVE_PRUNE_BATCH = int(os.environ.get("ARCHIVE_PRUNE_BATCH", "5000"))
+# Parquet 每个 row group 的行数
+PARQUET_ROW_GROUP_SIZE = 50000
+# JSONL 的压缩级别: 更高的级别压缩比只多 2% 左右，速度却慢 3~5 倍
+ZSTD_LEVEL = 6
+GZIP_LEVEL = 6
+
+# 归档的表和列 (写 Parquet 时的列类型；时间统一存为数据库返回的文本)
+ARCHIVE_TABLES = {
+    "raw_articles": {
+        "article_id": "int64", "topic_id": "int64", "url": "string", "title": "string", "snippet": "string",
+        "source_name": "string", "publication_date": "string", "crawl_date": "string",
+        "minhash_signature": "list<int64>", "canonical_article_id": "int64",
+        "keyword": "string", "category": "string",
+    },
+    "l1_analysis_sentiment": {
+        "analysis_id": "int64", "article_id": "int64", "ai_summary": "string",
+        "sentiment_score": "float64", "sentiment_label": "string", "analyzed_at": "string",
+    },
+    "article_entity_map": {
+        "article_id": "int64", "entity_id": "int64", "entity_name": "string", "entity_type": "string",
+    },
+}
+# get_archive_page 返回的键 -> 表名
+_PAGE_KEYS = {"articles": "raw_articles", "sentiments": "l1_analysis_sentiment", "maps": "article_entity_map"}
+_EXTENSIONS = {"parquet": ".parquet", "jsonl.zst": ".jsonl.zst", "jsonl.gz": ".jsonl.gz"}
+
+
+def resolve_format(requested: str = ARCHIVE_FORMAT) -> str:
+    """auto: pyarrow > zstandard > gzip；显式指定但缺少依赖时报错"""
+    available = ["jsonl.gz"]
+    try:
+        import zstandard  # noqa: F401
+        available.insert(0, "jsonl.zst")
+    except ImportError:
+        pass
+    try:
+        import pyarrow  # noqa: F401
+        available.insert(0, "parquet")
+    except ImportError:
+        pass
+    if requested == "auto":
+        return available[0]
+    if requested not in _EXTENSIONS:
+        raise ValueError(f"未知的 ARCHIVE_FORMAT: '{requested}' (可选: auto, {', '.join(_EXTENSIONS)})")
+    if requested not in available:
+        raise RuntimeError(f"ARCHIVE_FORMAT={requested} 需要额外的依赖 (pip install {'pyarrow' if requested == 'parquet' else 'zstandard'})")
+    return requested
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def next_month(month: str) -> str:
+    """'2025-01' -> '2025-02-01'"""
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12}-{mon % 12 + 1:02d}-01"
+
+# --- 写入 ---
+
+class JsonlArchiveWriter:
+    """逐行写入压缩的 JSON Lines (gzip 或 zstd 流)"""
+    def __init__(self, path: str, fmt: str):
+        self.path = path
+        self._file = open(path, 'wb')
+        if fmt == "jsonl.zst":
+            import zstandard
+            self._stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self._file)
+        else:
+            self._stream = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+        self.rows = 0
+        self.raw_bytes = 0
+
+    def write(self, rows: List[Dict[str, Any]]):
+        data = "".join(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + "\n" for row in rows).encode('utf-8')
+        self._stream.write(data)
+        self.rows += len(rows)
+        self.raw_bytes += len(data)
+
+    def close(self):
+        self._stream.close()
+        if not self._file.closed:
+            self._file.close()
+
+class ParquetArchiveWriter:
+    """按 row group 缓冲后写入 Parquet (zstd 压缩)"""
+    def __init__(self, path: str, table: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "list<int64>": pa.list_(pa.int64())}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in ARCHIVE_TABLES[table].items()])
+        self.path = path
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self._buffer: List[Dict[str, Any]] = []
+        self.rows = 0
+        self.raw_bytes = 0
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self._buffer.extend(rows)
+        self.rows += len(rows)
+        self.raw_bytes += sum(len(json.dumps(row, ensure_ascii=False, separators=(',', ':'))) + 1 for row in rows)
+        if len(self._buffer) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            columns = list(self.schema.names)
+            batch = self._pa.Table.from_pylist(
+                [{column: row.get(column) for column in columns} for row in self._buffer], schema=self.schema
+            )
+            self._writer.write_table(batch)
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+def open_writer(path: str, table: str, fmt: str):
+    return ParquetArchiveWriter(path, table) if fmt == "parquet" else JsonlArchiveWriter(path, fmt)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# --- 读取 ---
+
+def iter_archive_file(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行读取一个归档文件 (按扩展名判断格式)"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+    if path.endswith(".jsonl.zst"):
+        import zstandard
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    else:
+        raw = gzip.open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def load_month_manifest(month: str, archive_dir: str | None = None) -> Dict[str, Any] | None:
+    path = os.path.join(archive_dir or ARCHIVE_DIR, month, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_month_manifest(manifest: Dict[str, Any], archive_dir: str | None = None):
+    path = os.path.join(archive_dir or ARCHIVE_DIR, manifest["month"], "manifest.json")
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+def list_archived_months(archive_dir: str | None = None) -> List[str]:
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(m for m in os.listdir(archive_dir) if os.path.exists(os.path.join(archive_dir, m, "manifest.json")))
+
+def first_live_stat_date(archive_dir: str | None = None) -> date | None:
+    """
+    明细完全在库中的第一个统计日期: 已归档文章中最晚的分析日期 (UTC) 的下一天，
+    没有归档时返回 None。重算 entity_daily_stats 不能早于这一天，否则归档部分的统计会丢失。
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    latest = None
+    for month in list_archived_months(archive_dir):
+        for part in load_month_manifest(month, archive_dir)["parts"]:
+            # 旧清单没有 max_stat_date: 退回到该月的最后一天
+            stat_date = (date.fromisoformat(part["max_stat_date"]) if part.get("max_stat_date")
+                         else date.fromisoformat(next_month(month)) - timedelta(days=1))
+            latest = max(latest or stat_date, stat_date)
+    return latest + timedelta(days=1) if latest else None
+
+def read_archive(table: str, months: List[str] | None = None, archive_dir: str | None = None) -> Iterator[Dict[str, Any]]:
+    """
+    读取已归档的行 (供历史分析使用):
+        for row in read_archive("l1_analysis_sentiment", ["2025-01"]): ...
+    months 为 None 时读取全部月份。
+    """
+    if table not in ARCHIVE_TABLES:
+        raise ValueError(f"未知的归档表: '{table}' (可选: {', '.join(ARCHIVE_TABLES)})")
+    archive_dir = archive_dir or ARCHIVE_DIR
+    for month in months or list_archived_months(archive_dir):
+        manifest = load_month_manifest(month, archive_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"没有 {month} 的归档 ({os.path.abspath(archive_dir)})")
+        for part in manifest["parts"]:
+            yield from iter_archive_file(os.path.join(archive_dir, month, part["tables"][table]["file"]))
+
+def load_into_sqlite(months: List[str] | None = None, archive_dir: str | None = None,
+                     conn: sqlite3.Connection | None = None) -> sqlite3.Connection:
+    """把归档的三张表载入 SQLite (默认在内存中)，之后可以直接用 SQL 做历史分析"""
+    conn = conn or sqlite3.connect(":memory:")
+    for table, columns in ARCHIVE_TABLES.items():
+        names = list(columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(names)})")
+        insert = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in names)})"
+        batch = []
+        for row in read_archive(table, months, archive_dir):
+            batch.append(tuple(
+                json.dumps(row.get(name)) if isinstance(row.get(name), list) else row.get(name) for name in names
+            ))
+            if len(batch) >= 10000:
+                conn.executemany(insert, batch)
+                batch = []
+        conn.executemany(insert, batch)
+    return conn
+
+# --- 归档 ---
+
+def archive_cold_data(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    archive_dir: str | None = None,
+    fmt: str | None = None,
+    prune: bool = True,
+    dry_run: bool = False,
+    today: date | None = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    把 crawl_date 在 (today - older_than_days) 所在月份之前的数据按月归档，校验后删除。
+    已经归档过的文章 (article_id 不超过该月清单中的最大值) 不会重复写入，只会被删除，
+    所以中途失败后直接重跑即可。返回每个月的统计。
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    fmt = resolve_format(fmt or ARCHIVE_FORMAT)
+    until = month_start((today or date.today()) - timedelta(days=older_than_days))
+    storage = get_storage()
+    print(f"  (Archive Step 1/3) 正在读取 {until} 之前的数据 (格式: {fmt}，目录: {os.path.abspath(archive_dir)})...")
+
+    manifests = {month: load_month_manifest(month, archive_dir) for month in list_archived_months(archive_dir)}
+    archived_max = {month: max((p["max_article_id"] for p in m["parts"]), default=0) for month, m in manifests.items()}
+    months: Dict[str, Dict[str, Any]] = {}
+    writers: Dict[str, Dict[str, Any]] = {}
+    article_month: Dict[int, str] = {}
+
+    def month_stats(month: str) -> Dict[str, Any]:
+        return months.setdefault(month, {"new_rows": dict.fromkeys(ARCHIVE_TABLES, 0), "live_articles": 0,
+                                         "max_article_id": archived_max.get(month, 0), "max_stat_date": None,
+                                         "pruned": 0})
+
+    def writer_for(month: str, table: str):
+        if month not in writers:
+            os.makedirs(os.path.join(archive_dir, month), exist_ok=True)
+            part = len((manifests.get(month) or {}).get("parts", []))
+            writers[month] = {
+                "part": part,
+                "tables": {
+                    t: open_writer(os.path.join(archive_dir, month, f"{t}.{part:04d}{_EXTENSIONS[fmt]}"), t, fmt)
+                    for t in ARCHIVE_TABLES
+                },
+            }
+        return writers[month]["tables"][table]
+
+    export_start = perf_counter()
+    exported_rows = 0
+    after_id = 0
+    try:
+        with span("archive_export"):
+            while True:
+                page = storage.fetch_archive_page(str(until), after_id, ARCHIVE_PAGE_SIZE)
+                articles = page["articles"]
+                if not articles:
+                    break
+                after_id = articles[-1]['article_id']
+                article_month.clear()
+                for article in articles:
+                    month = (article.get('crawl_date') or '')[:7]
+                    if not month:
+                        continue
+                    stats = month_stats(month)
+                    stats["live_articles"] += 1
+                    if article['article_id'] > archived_max.get(month, 0):
+                        article_month[article['article_id']] = month
+                        stats["max_article_id"] = max(stats["max_article_id"], article['article_id'])
+                for key, table in _PAGE_KEYS.items():
+                    by_month: Dict[str, List[Dict[str, Any]]] = {}
+                    for row in page[key]:
+                        month = article_month.get(row['article_id'])
+                        if month:
+                            by_month.setdefault(month, []).append(row)
+                    for month, rows in by_month.items():
+                        if table == "l1_analysis_sentiment":
+                            # 统计按分析日期 (UTC) 计入，可能晚于文章所在的月份
+                            latest = max(str(row['analyzed_at'])[:10] for row in rows if row.get('analyzed_at'))
+                            months[month]["max_stat_date"] = max(months[month]["max_stat_date"] or latest, latest)
+                        if not dry_run:
+                            writer_for(month, table).write(rows)
+                        months[month]["new_rows"][table] += len(rows)
+                        exported_rows += len(rows)
+                        inc("archive_rows_total", len(rows), table=table)
+                if len(articles) < ARCHIVE_PAGE_SIZE:
+                    break
+    finally:
+        for entry in writers.values():
+            for writer in entry["tables"].values():
+                writer.close()
+    export_seconds = perf_counter() - export_start
+
+    if dry_run:
+        for month, stats in sorted(months.items()):
+            print(f"  > [预演] {month}: 库中 {stats['live_articles']} 篇文章，其中 {stats['new_rows']['raw_articles']} 篇待归档 "
+                  f"(情感 {stats['new_rows']['l1_analysis_sentiment']} 行，实体关系 {stats['new_rows']['article_entity_map']} 行)")
+        if not months:
+            print(f"  > [预演] {until} 之前没有需要归档的数据。")
+        return months
+
+    # 2. 回读校验行数，写入清单 (清单写好之后才允许删除)
+    print("  (Archive Step 2/3) 校验归档文件并写入清单...")
+    for month, entry in sorted(writers.items()):
+        stats = months[month]
+        tables = {}
+        for table, writer in entry["tables"].items():
+            read_back = sum(1 for _ in iter_archive_file(writer.path))
+            if read_back != writer.rows:
+                raise RuntimeError(f"{writer.path} 校验失败: 写入 {writer.rows} 行，读回 {read_back} 行")
+            size = os.path.getsize(writer.path)
+            tables[table] = {"file": os.path.basename(writer.path), "rows": writer.rows, "bytes": size,
+                             "raw_bytes": writer.raw_bytes, "sha256": file_sha256(writer.path)}
+            stats.setdefault("bytes", 0)
+            stats.setdefault("raw_bytes", 0)
+            stats["bytes"] += size
+            stats["raw_bytes"] += writer.raw_bytes
+        manifest = manifests.get(month) or {"month": month, "parts": []}
+        manifest["parts"].append({
+            "part": entry["part"],
+            "format": fmt,
+            "archived_at": datetime.now().isoformat(timespec='seconds'),
+            "max_article_id": stats["max_article_id"],
+            "max_stat_date": stats["max_stat_date"],
+            "tables": tables,
+        })
+        write_month_manifest(manifest, archive_dir)
+
+    # 3. 删除已归档的行 (分批短事务)
+    prune_start = perf_counter()
+    pruned_total = 0
+    if prune:
+        print(f"  (Archive Step 3/3) 正在从数据库删除已归档的文章 (每批 {ARCHIVE_PRUNE_BATCH} 篇)...")
+        with span("archive_prune"):
+            for month, stats in sorted(months.items()):
+                if not stats["max_article_id"]:
+                    continue
+                while True:
+                    deleted = storage.prune_archived_articles(f"{month}-01", next_month(month), stats["max_article_id"],
+                                                              ARCHIVE_PRUNE_BATCH)
+                    stats["pruned"] += deleted
+                    if deleted < ARCHIVE_PRUNE_BATCH:
+                        break
+                pruned_total += stats["pruned"]
+                inc("archive_pruned_articles_total", stats["pruned"])
+    else:
+        print("  (Archive Step 3/3) --no-prune: 保留数据库中的行。")
+    prune_seconds = perf_counter() - prune_start
+
+    for month, stats in sorted(months.items()):
+        rows = stats["new_rows"]
+        ratio = stats.get("raw_bytes", 0) / max(stats.get("bytes", 0), 1)
+        print(f"  > {month}: 新归档 文章 {rows['raw_articles']} / 情感 {rows['l1_analysis_sentiment']} / "
+              f"实体关系 {rows['article_entity_map']} 行，{stats.get('bytes', 0) / 1024:.0f} KB (压缩比 {ratio:.1f}x)，"
+              f"删除 {stats['pruned']} 篇")
+    print(f"  > 导出吞吐: {exported_rows / max(export_seconds, 1e-9):.0f} 行/秒 ({exported_rows} 行，{export_seconds:.1f} 秒)")
+    if prune:
+        print(f"  > 删除吞吐: {pruned_total / max(prune_seconds, 1e-9):.0f} 篇/秒 ({pruned_total} 篇，{prune_seconds:.1f} 秒，"
+              f"情感与实体关系级联删除)")
+    return months
+
+def run_query(sql: str, months: List[str] | None, archive_dir: str | None, limit: int):
+    """把归档载入内存中的 SQLite 并执行一条 SQL，打印结果"""
+    start = perf_counter()
+    conn = load_into_sqlite(months, archive_dir)
+    loaded = perf_counter() - start
+    cursor = conn.execute(sql)
+    columns = [d[0] for d in cursor.description or []]
+    rows = cursor.fetchmany(limit)
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+    print(f"  ({len(rows)} 行；载入归档 {loaded:.2f} 秒)", file=sys.stderr)
+
+def main(argv: List[str] | None = None):
+    """
+    冷数据归档脚本的主函数
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["query"]:
+        parser = argparse.ArgumentParser(prog="python -m scripts.archive query", description="在已归档的月份上执行 SQL")
+        parser.add_argument("sql", help="SQL 语句 (表: raw_articles, l1_analysis_sentiment, article_entity_map)")
+        parser.add_argument("--months", help="逗号分隔的月份 YYYY-MM (默认全部)")
+        parser.add_argument("--dir", default=None, help="归档目录")
+        parser.add_argument("--limit", type=int, default=100, help="最多打印的行数")
+        args = parser.parse_args(argv[1:])
+        months = [m.strip() for m in args.months.split(',')] if args.months else None
+        run_query(args.sql, months, args.dir, args.limit)
+        return
+
+    parser = argparse.ArgumentParser(description="把旧的原始文章和 L1 结果按月归档到压缩文件，并从数据库中删除")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"归档 crawl_date 早于多少天的整月数据 (默认 {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--dir", default=None, help="归档目录")
+    parser.add_argument("--format", default=None, help="parquet, jsonl.zst, jsonl.gz 或 auto")
+    parser.add_argument("--no-prune", action="store_true", help="只写归档文件，不删除数据库中的行")
+    parser.add_argument("--dry-run", action="store_true", help="只统计每个月待归档的行数")
+    args = parser.parse_args(argv)
+
+    print("--- 冷数据归档脚本 (archive.py) 启动 ---")
+    try:
+        with span("stage", trace=True, stage="archive"):
+            months = archive_cold_data(args.older_than_days, args.dir, args.format,
+                                       prune=not args.no_prune, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"🔴 错误: 归档失败: {e}")
+        sys.exit(1)
+    print("--- 冷数据归档脚本 (archive.py) 结束 ---")
+    if not args.dry_run:
+        print(f"🟢 总结：归档了 {sum(m['new_rows']['raw_articles'] for m in months.values())} 篇文章，"
+              f"删除了 {sum(m['pruned'] for m in months.values())} 篇。")
+
+if __name__ == "__main__":
+    main()
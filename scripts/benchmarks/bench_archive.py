@@ -0,0 +1,134 @@
+import os
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from time import perf_counter
+from datetime import date, timedelta
+
+from .. import archive
+from ..storage import create_storage, set_storage
+
+# -----------------------------------------------------------------
+# 冷数据归档基准测试 (scripts/archive.py)
+# 在本地 SQLite 中生成跨越若干个月的文章 + L1 结果，归档早于 N 天的整月数据，记录:
+#   导出 / 删除吞吐 (行/秒)、归档文件大小与压缩比、热表行数和数据库文件大小的变化、
+#   回读校验 (归档载入 SQLite 后的行数) 以及重跑时不会重复归档。
+# 用法: python -m scripts.benchmarks.bench_archive --articles 50000 --months 12
+# -----------------------------------------------------------------
+
+CATEGORIES = ["财经", "科技", "游戏", "体育"]
+ENTITIES = [f"Entity {i}" for i in range(500)]
+HOT_TABLES = ["raw_articles", "l1_analysis_sentiment", "article_entity_map", "entity_daily_stats"]
+
+def seed_database(db_path: str, articles: int, months: int, today: date):
+    """文章的 crawl_date 均匀分布在最近 months 个月内，每篇带 L1 情感和 3 个实体"""
+    storage = create_storage("sqlite", db_path)
+    storage.upsert_topics([
+        {"keyword": f"topic {i}", "category": CATEGORIES[i % len(CATEGORIES)], "is_active": True} for i in range(20)
+    ])
+    topic_ids = [t['topic_id'] for t in storage.fetch_active_topics()]
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(3000)]
+    start = today - timedelta(days=months * 30)
+    for offset in range(0, articles, 2000):
+        chunk = range(offset, min(offset + 2000, articles))
+        inserted = storage.insert_articles([
+            {"topic_id": rng.choice(topic_ids), "url": f"https://news.example.com/{i}",
+             "title": " ".join(rng.choices(words, k=10)), "snippet": " ".join(rng.choices(words, k=40)),
+             "source_name": "Example News", "publication_date": None,
+             "minhash_signature": [rng.getrandbits(32) for _ in range(16)]}
+            for i in chunk
+        ])
+        # 按插入顺序推进 crawl_date / analyzed_at (与真实数据一样随 article_id 递增)
+        with storage._transaction() as conn:
+            conn.executemany(
+                "UPDATE raw_articles SET crawl_date = ? WHERE article_id = ?",
+                [(f"{start + timedelta(days=(i * months * 30) // articles)} 12:00:00.000", row['article_id'])
+                 for i, row in zip(chunk, inserted)]
+            )
+        storage.save_l1_batch({
+            "sentiments": [
+                {"article_id": row['article_id'], "ai_summary": " ".join(rng.choices(words, k=30)),
+                 "sentiment_score": round(rng.uniform(-1, 1), 2), "sentiment_label": "Neutral"}
+                for row in inserted
+            ],
+            "entities": [{"entity_name": name, "entity_type": "COMPANY"} for name in ENTITIES] if offset == 0 else [],
+            "maps": [
+                {"article_id": row['article_id'], "entity_name": name}
+                for row in inserted for name in rng.sample(ENTITIES, 3)
+            ],
+        })
+    with storage._transaction() as conn:
+        conn.execute("UPDATE l1_analysis_sentiment SET analyzed_at = (SELECT crawl_date FROM raw_articles a "
+                     "WHERE a.article_id = l1_analysis_sentiment.article_id)")
+    return storage
+
+def table_counts(storage) -> dict:
+    return {table: storage._query(f"SELECT count(*) AS n FROM {table}")[0]['n'] for table in HOT_TABLES}
+
+def db_size(storage) -> int:
+    storage._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    storage._conn.execute("VACUUM")
+    return os.path.getsize(storage.path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-data archival benchmark on a local SQLite database")
+    parser.add_argument("--articles", type=int, default=50000, help="生成的文章数")
+    parser.add_argument("--months", type=int, default=12, help="文章分布的月数")
+    parser.add_argument("--older-than-days", type=int, default=90, help="归档早于多少天的整月数据")
+    parser.add_argument("--format", default="auto", help="parquet, jsonl.zst, jsonl.gz 或 auto")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_archive_")
+    archive_dir = os.path.join(work_dir, "archive")
+    today = date.today()
+    try:
+        start = perf_counter()
+        storage = seed_database(os.path.join(work_dir, "dailynews.sqlite3"), args.articles, args.months, today)
+        set_storage(storage)
+        print(f"生成 {args.articles} 篇文章 (跨 {args.months} 个月)，用时 {perf_counter() - start:.1f} 秒")
+        before, size_before = table_counts(storage), db_size(storage)
+
+        start = perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            months = archive.archive_cold_data(args.older_than_days, archive_dir, args.format, today=today)
+        elapsed = perf_counter() - start
+        after, size_after = table_counts(storage), db_size(storage)
+
+        fmt = archive.resolve_format(args.format)
+        rows = sum(sum(m["new_rows"].values()) for m in months.values())
+        archived_bytes = sum(m.get("bytes", 0) for m in months.values())
+        raw_bytes = sum(m.get("raw_bytes", 0) for m in months.values())
+        print(f"\n--- 归档 ({fmt}，早于 {args.older_than_days} 天的整月，共 {len(months)} 个月) ---")
+        print(f"{'表':<24}{'归档前':>10}{'归档后':>10}")
+        for table in HOT_TABLES:
+            print(f"{table:<24}{before[table]:>10}{after[table]:>10}")
+        print(f"{'数据库文件 (MB)':<20}{size_before / 2**20:>14.1f}{size_after / 2**20:>10.1f}")
+        print(f"  > 归档 {rows} 行，用时 {elapsed:.2f} 秒 ({rows / max(elapsed, 1e-9):.0f} 行/秒，含校验和删除)")
+        print(f"  > 归档文件 {archived_bytes / 2**20:.1f} MB (JSON 原始大小 {raw_bytes / 2**20:.1f} MB，压缩比 {raw_bytes / max(archived_bytes, 1):.1f}x)")
+
+        # 回读: 载入内存 SQLite，行数应与归档一致
+        start = perf_counter()
+        conn = archive.load_into_sqlite(archive_dir=archive_dir)
+        loaded = perf_counter() - start
+        archived = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in archive.ARCHIVE_TABLES}
+        for table, count in archived.items():
+            assert count == before[table] - after[table], f"{table}: 归档 {count} 行，数据库减少 {before[table] - after[table]} 行"
+        top = conn.execute(
+            "SELECT m.entity_name, count(*) FROM article_entity_map m JOIN raw_articles a USING (article_id) "
+            "GROUP BY 1 ORDER BY 2 DESC LIMIT 1"
+        ).fetchone()
+        print(f"  > 回读: {sum(archived.values())} 行载入内存 SQLite 用时 {loaded:.2f} 秒 "
+              f"({sum(archived.values()) / max(loaded, 1e-9):.0f} 行/秒)，行数与删除的行一致；示例查询 top 实体: {top}")
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            again = archive.archive_cold_data(args.older_than_days, archive_dir, args.format, today=today)
+        print(f"  > 重跑: 新归档 {sum(sum(m['new_rows'].values()) for m in again.values())} 行")
+    finally:
+        set_storage(None)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
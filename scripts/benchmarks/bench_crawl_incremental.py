@@ -0,0 +1,100 @@
+import os
+import argparse
+import tempfile
+import contextlib
+from time import perf_counter
+from datetime import timedelta
+
+from .. import crawler, url_filter
+from ..storage import set_storage
+from ..storage.sqlite_backend import SQLiteStorage
+from .fake_gnews import FakeGNewsServer
+
+# -----------------------------------------------------------------
+# 增量爬取基准测试: 全量 (每次取最新一页) vs 增量 (水位线 + 翻页 + 安静主题降频)
+# 在本地 SQLite 上模拟连续 N 次定时运行 (每次之间推进假 GNews 的时钟)，
+# 统计 API 请求数、发送到 upsert 的文章数、真正新增的文章数、留到下次补爬的文章数和漏掉的文章数。
+# 用法: python -m scripts.benchmarks.bench_crawl_incremental --topics 200 --runs 7
+# -----------------------------------------------------------------
+
+def run_mode(incremental: bool, args) -> dict:
+    """用全新的数据库和假服务器跑 args.runs 次爬虫，返回累计统计"""
+    work_dir = tempfile.mkdtemp(prefix="bench_crawl_incremental_")
+    storage = SQLiteStorage(os.path.join(work_dir, "dailynews.sqlite3"))
+    set_storage(storage)
+    url_filter.URL_FILTER_PATH = os.path.join(work_dir, "url_filter.bin")
+    storage.upsert_topics([
+        {"keyword": f"topic {i}", "category": "bench", "is_active": True} for i in range(args.topics)
+    ])
+
+    stats = {"requests": 0, "upserted": 0, "inserted": 0, "seconds": 0.0, "published": 0, "pending": 0}
+    save_articles = crawler.save_articles_to_db
+
+    def counting_save(articles, topic_id, **kwargs):
+        stats["upserted"] += len(articles)
+        new_count = save_articles(articles, topic_id, **kwargs)
+        stats["inserted"] += new_count
+        return new_count
+
+    with FakeGNewsServer(latency=args.latency, publish_interval=args.publish_interval,
+                         quiet_ratio=args.quiet_ratio) as server:
+        crawler.NEWS_API_BASE_URL = server.url
+        crawler.INCREMENTAL_CRAWL = incremental
+        crawler.utc_now = server.now
+        crawler.save_articles_to_db = counting_save
+        first_run_at = server.now()
+        try:
+            for run in range(args.runs):
+                if run:
+                    server.advance(args.hours_between)
+                start = perf_counter()
+                with open(os.devnull, 'w') as devnull, \
+                        contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                    crawler.main()
+                stats["seconds"] += perf_counter() - start
+        finally:
+            crawler.save_articles_to_db = save_articles
+        stats["requests"] = server.request_count
+        # 应当爬到的文章: 第一次运行前回看窗口内发布的，加上之后每次运行之前发布的
+        since = first_run_at - timedelta(hours=crawler.CRAWL_INITIAL_LOOKBACK_HOURS)
+        stats["published"] = sum(
+            server.search(f"topic {i}", 1, since=since, until=server.now())["totalArticles"]
+            for i in range(args.topics)
+        )
+        # 因页数上限记为未爬区间、下次运行才补爬的文章 (不算漏掉)
+        stats["pending"] = sum(
+            server.search(t['keyword'], 1, since=crawler.parse_timestamp(t['backfill_since']),
+                          until=crawler.parse_timestamp(t['backfill_until']))["totalArticles"]
+            for t in storage.fetch_active_topics() if t['backfill_until']
+        )
+    set_storage(None)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental vs full crawl against a local fake GNews server")
+    parser.add_argument("--topics", type=int, default=200, help="主题数量")
+    parser.add_argument("--runs", type=int, default=7, help="模拟的连续运行次数")
+    parser.add_argument("--hours-between", type=float, default=24, help="两次运行之间的间隔 (小时)")
+    parser.add_argument("--publish-interval", type=float, default=3600, help="活跃主题每隔多少秒发布一篇文章")
+    parser.add_argument("--quiet-ratio", type=float, default=0.5, help="已经停止发布的安静主题的比例")
+    parser.add_argument("--latency", type=float, default=0.005, help="假 GNews 每个请求的延迟 (秒)")
+    args = parser.parse_args()
+
+    crawler.DEDUPE_ENABLED = False
+    crawler.GNEWS_REQUESTS_PER_SECOND = 1000
+    crawler.GNEWS_BURST = 100
+    os.environ.setdefault("NEWS_API_KEY", "bench-key")
+
+    results = {mode: run_mode(mode == "incremental", args) for mode in ("full", "incremental")}
+
+    print("\n--- 增量爬取基准测试结果 ---")
+    print(f"主题数: {args.topics} (安静 {args.quiet_ratio:.0%})，运行 {args.runs} 次，间隔 {args.hours_between:g} 小时，"
+          f"每页 {crawler.ARTICLES_PER_TOPIC} 篇")
+    print(f"{'mode':<12}{'API 请求':>10}{'upsert 行':>12}{'新增':>10}{'浪费':>10}{'待补爬':>10}{'漏掉':>10}{'耗时(s)':>10}")
+    for mode, s in results.items():
+        missed = max(0, s['published'] - s['inserted'] - s['pending'])
+        print(f"{mode:<12}{s['requests']:>10}{s['upserted']:>12}{s['inserted']:>10}"
+              f"{s['upserted'] - s['inserted']:>10}{s['pending']:>10}{missed:>10}{s['seconds']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
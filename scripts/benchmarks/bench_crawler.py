@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+from time import sleep, perf_counter
+
+from .. import crawler
+from .fake_gnews import FakeGNewsServer
+
+# -----------------------------------------------------------------
+# 爬虫基准测试: sequential vs async (topics/sec)
+# 用法: python -m scripts.benchmarks.bench_crawler --topics 200
+# -----------------------------------------------------------------
+
+def make_fake_save(db_latency: float):
+    """模拟 save_articles_to_db 的一次 HTTP 往返，不连接真实数据库"""
+    def fake_save(articles, topic_id):
+        sleep(db_latency)
+        return len(articles)
+    return fake_save
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawler benchmark against a local fake GNews server")
+    parser.add_argument("--topics", type=int, default=200, help="要抓取的主题数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="假 GNews 每个请求的延迟 (秒)")
+    parser.add_argument("--db-latency", type=float, default=0.03, help="模拟每次入库的延迟 (秒)")
+    parser.add_argument("--concurrency", type=int, default=crawler.CRAWLER_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=1000.0, help="令牌桶速率 (请求/秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="假服务器返回 429 的概率")
+    args = parser.parse_args()
+
+    topics = [{"topic_id": i, "keyword": f"topic {i}", "category": "bench"} for i in range(args.topics)]
+    fake_save = make_fake_save(args.db_latency)
+
+    with FakeGNewsServer(latency=args.latency, error_rate=args.error_rate) as server:
+        crawler.NEWS_API_BASE_URL = server.url
+        # 只比较两种模式的请求吞吐: 每个主题一次请求，不按水位线翻页
+        crawler.INCREMENTAL_CRAWL = False
+
+        start = perf_counter()
+        crawler.crawl_topics_sequential(topics, "bench-key", save_fn=fake_save)
+        sequential_elapsed = perf_counter() - start
+
+        start = perf_counter()
+        limiter = crawler.TokenBucket(args.rate, max(1, args.concurrency))
+        asyncio.run(crawler.crawl_topics_async(
+            topics, "bench-key", save_fn=fake_save, concurrency=args.concurrency, limiter=limiter
+        ))
+        async_elapsed = perf_counter() - start
+
+    print("\n--- 爬虫基准测试结果 ---")
+    print(f"主题数: {args.topics}, GNews 延迟: {args.latency}s, 入库延迟: {args.db_latency}s, 并发: {args.concurrency}")
+    print(f"sequential: {sequential_elapsed:.2f} 秒, {args.topics / sequential_elapsed:.1f} topics/sec")
+    print(f"async:      {async_elapsed:.2f} 秒, {args.topics / async_elapsed:.1f} topics/sec")
+    print(f"加速比: {sequential_elapsed / async_elapsed:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import argparse
+import statistics
+from time import perf_counter
+from datetime import date, timedelta
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+# -----------------------------------------------------------------
+# 数据库查询基准测试: 在本地 PostgreSQL 里灌入百万级合成数据，
+# 对流水线和前端发出的每条查询做 EXPLAIN ANALYZE，
+# 比较 migrations/001_hot_table_indexes.sql 执行前后的耗时和执行计划。
+#
+# 用法 (需要 psycopg2: pip install psycopg2-binary):
+#   python -m scripts.benchmarks.bench_db_queries \
+#       --dsn postgresql://postgres@localhost:5432/postgres --articles 1000000
+# 会新建 (并覆盖) 名为 --database 的数据库，不会动 dsn 指向的库本身。
+# -----------------------------------------------------------------
+
+SCHEMA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'db_schema')
+SCHEMA_PATH = os.path.join(SCHEMA_DIR, 'schema.sql')
+MIGRATION_PATH = os.path.join(SCHEMA_DIR, 'migrations', '001_hot_table_indexes.sql')
+
+CATEGORIES = ["财经", "科技", "游戏", "体育", "娱乐", "汽车", "健康", "国际"]
+
+# 合成数据: 全部在数据库端用 generate_series 生成，避免百万行经过 Python
+# 文章按 article_id 顺序均匀分布在最近 %(days)s 天内 (与真实的追加写入一致)
+# 每 10 篇中有 1 篇是上一篇的近似重复；最近 30 天的文章带 MinHash 签名；
+# 最新的 %(backlog)s 篇尚未分析 (L1 积压)；实体出现频率呈长尾分布。
+LOAD_SQL = """
+INSERT INTO public.tracked_topics (keyword, category)
+SELECT 'topic ' || i, (%(categories)s::text[])[1 + i %% array_length(%(categories)s::text[], 1)]
+FROM generate_series(1, %(topics)s) AS i;
+
+INSERT INTO public.raw_articles (
+  topic_id, url, title, snippet, source_name, publication_date, crawl_date, minhash_signature
+)
+SELECT
+  1 + (i::bigint * 7919) %% %(topics)s,
+  'https://news.example.com/' || i,
+  'Synthetic headline ' || i,
+  'Synthetic snippet for article ' || i,
+  'Source ' || (i %% 50),
+  ts - interval '2 hours',
+  ts,
+  CASE WHEN ts > now() - interval '30 days'
+    THEN ARRAY(SELECT (hashint8(i * 64 + k))::bigint FROM generate_series(1, 64) AS k)
+  END
+FROM generate_series(1, %(articles)s) AS i,
+  LATERAL (SELECT now() - (%(articles)s - i) * (interval '1 day' * %(days)s / %(articles)s) AS ts) AS t;
+
+UPDATE public.raw_articles SET canonical_article_id = article_id - 1
+WHERE article_id %% 10 = 0;
+
+INSERT INTO public.l1_analysis_entities (entity_name, entity_type)
+SELECT 'entity ' || i, (ARRAY['COMPANY', 'PRODUCT', 'PERSON', 'TECHNOLOGY'])[1 + i %% 4]
+FROM generate_series(1, %(entities)s) AS i;
+
+INSERT INTO public.l1_analysis_sentiment (article_id, ai_summary, sentiment_score, sentiment_label, analyzed_at)
+SELECT
+  a.article_id,
+  'summary of article ' || a.article_id || ' tag' || (a.article_id %% 10000),
+  ((a.article_id %% 21) - 10) / 10.0,
+  (ARRAY['Negative', 'Neutral', 'Positive'])[1 + a.article_id %% 3],
+  a.crawl_date + interval '1 hour'
+FROM public.raw_articles a
+WHERE a.article_id <= %(articles)s - %(backlog)s;
+
+INSERT INTO public.article_entity_map (article_id, entity_id)
+SELECT DISTINCT s.article_id, 1 + floor(%(entities)s * power(random(), 3))::int
+FROM public.l1_analysis_sentiment s, generate_series(1, %(entities_per_article)s);
+
+INSERT INTO public.daily_reports (report_date, category, report_summary, overall_sentiment_score, trending_topics)
+SELECT d::date, c, 'Synthetic report', 0.1, '[]'::jsonb
+FROM generate_series(current_date - %(days)s, current_date, interval '1 day') AS d,
+  unnest(%(categories)s::text[]) AS c;
+"""
+
+# 被基准测试的查询 (名称, SQL)
+# 与 scripts/ 和 js/ 中 PostgREST / RPC 调用等价的 SQL，参数取有代表性的值
+def build_queries(args):
+    today = date.today()
+    recent_article = args.articles - args.backlog - 100
+    return [
+        ("crawler: 活跃主题", "SELECT * FROM public.tracked_topics WHERE is_active = true"),
+        ("crawler: 加载 7 天去重签名 (首页)", """
+            SELECT article_id, minhash_signature, canonical_article_id FROM public.raw_articles
+            WHERE crawl_date >= now() - interval '7 days' AND article_id > 0 AND minhash_signature IS NOT NULL
+            ORDER BY article_id LIMIT 1000"""),
+        ("analysis: L1 积压 (首页)", """
+            SELECT article_id, title, snippet, keyword FROM public.unanalyzed_articles
+            WHERE article_id > 0 ORDER BY article_id LIMIT 1000"""),
+        ("analysis: 复制 L1 结果给近似重复", "SELECT public.copy_l1_to_duplicates()"),
+        ("report: 24 小时 L1 结果", """
+            SELECT s.analyzed_at, a.title, t.category, s.ai_summary, s.sentiment_score
+            FROM public.l1_analysis_sentiment s
+              JOIN public.raw_articles a ON a.article_id = s.article_id
+              LEFT JOIN public.tracked_topics t ON t.topic_id = a.topic_id
+            WHERE s.analyzed_at >= now() - interval '1 day'"""),
+        ("report: 热门实体 (近 7 日)",
+         f"SELECT * FROM public.get_trending_entities('{today - timedelta(days=6)}', '{today}', 5)"),
+        ("frontend: 按日期读取报告",
+         f"SELECT * FROM public.daily_reports WHERE report_date = '{today - timedelta(days=1)}' ORDER BY category"),
+        ("frontend: 实体下钻到文章", """
+            SELECT a.article_id, a.title, a.url
+            FROM public.l1_analysis_entities e
+              JOIN public.article_entity_map m ON m.entity_id = e.entity_id
+              JOIN public.raw_articles a ON a.article_id = m.article_id
+            WHERE e.entity_name = 'entity 500'"""),
+        ("frontend: 文章详情",
+         f"SELECT ai_summary, sentiment_label, sentiment_score FROM public.l1_analysis_sentiment WHERE article_id = {recent_article}"),
+        ("frontend: 全文搜索摘要", """
+            SELECT s.ai_summary, s.sentiment_label, s.sentiment_score, a.title, a.url, a.publication_date
+            FROM public.l1_analysis_sentiment s JOIN public.raw_articles a ON a.article_id = s.article_id
+            WHERE to_tsvector(s.ai_summary) @@ to_tsquery('tag4242') LIMIT 20"""),
+        ("sync_topics: 删除主题 (外键 SET NULL)",
+         f"DELETE FROM public.tracked_topics WHERE topic_id = {args.topics // 2}"),
+    ]
+
+def read_sql_statements(path: str):
+    """按分号切分不含函数体的 SQL 文件 (用于逐条执行 CONCURRENTLY 迁移)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = re.sub(r"--[^\n]*", "", f.read())
+    return [s.strip() for s in text.split(";") if s.strip()]
+
+def migration_index_names():
+    return re.findall(r"IF NOT EXISTS (\w+)", open(MIGRATION_PATH, encoding='utf-8').read())
+
+def plan_nodes(plan: dict):
+    """列出执行计划中的扫描节点 (例如 'Index Scan on raw_articles')"""
+    nodes = []
+    if "Relation Name" in plan:
+        nodes.append(f"{plan['Node Type']} on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+def explain(conn, sql: str, repeat: int):
+    """
+    执行 EXPLAIN (ANALYZE, BUFFERS) repeat 次，取执行时间的中位数。
+    每次都在事务中执行并回滚，写查询 (DELETE / RPC) 不会改动数据。
+    """
+    times, plan = [], None
+    with conn.cursor() as cur:
+        for _ in range(repeat):
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            result = cur.fetchone()[0][0]
+            conn.rollback()
+            times.append(result["Execution Time"])
+            plan = result["Plan"]
+    return {
+        "execution_ms": round(statistics.median(times), 3),
+        "rows": plan.get("Actual Rows"),
+        "shared_buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "scans": plan_nodes(plan),
+    }
+
+def run_queries(conn, queries, repeat: int, label: str):
+    print(f"\n🔵 [{label}] 正在执行 {len(queries)} 条查询的 EXPLAIN ANALYZE...")
+    results = {}
+    for name, sql in queries:
+        results[name] = explain(conn, sql, repeat)
+        print(f"  {name}: {results[name]['execution_ms']:.2f} ms")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE benchmark for pipeline and frontend queries")
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_PG_DSN", "postgresql://postgres@localhost:5432/postgres"),
+                        help="本地 PostgreSQL 连接串 (用于创建基准数据库)")
+    parser.add_argument("--database", default="dailynews_bench", help="要创建的基准数据库名 (会被覆盖)")
+    parser.add_argument("--articles", type=int, default=1_000_000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--entities", type=int, default=50_000)
+    parser.add_argument("--entities-per-article", type=int, default=3)
+    parser.add_argument("--days", type=int, default=365, help="文章分布的天数")
+    parser.add_argument("--backlog", type=int, default=2000, help="尚未分析的最新文章数")
+    parser.add_argument("--repeat", type=int, default=3, help="每条查询执行次数 (取中位数)")
+    parser.add_argument("--output", default="bench_db_queries.json", help="JSON 结果文件")
+    args = parser.parse_args()
+
+    if psycopg2 is None:
+        print("🔴 错误: 需要 psycopg2 (pip install psycopg2-binary)")
+        return
+
+    admin = psycopg2.connect(args.dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{args.database}"')
+        cur.execute(f'CREATE DATABASE "{args.database}" ENCODING \'UTF8\' TEMPLATE template0')
+    admin.close()
+
+    conn = psycopg2.connect(args.dsn, dbname=args.database)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(open(SCHEMA_PATH, encoding='utf-8').read())
+        # 基线 = 迁移之前的表结构
+        for index_name in migration_index_names():
+            cur.execute(f"DROP INDEX IF EXISTS public.{index_name}")
+
+        print(f"🔵 正在生成合成数据: {args.articles} 篇文章, {args.entities} 个实体...")
+        start = perf_counter()
+        cur.execute(LOAD_SQL, {
+            "categories": CATEGORIES, "topics": args.topics, "articles": args.articles,
+            "entities": args.entities, "entities_per_article": args.entities_per_article,
+            "days": args.days, "backlog": args.backlog,
+        })
+        cur.execute("VACUUM ANALYZE")
+        load_elapsed = perf_counter() - start
+        print(f"  ✅ 数据生成完成，用时 {load_elapsed:.1f} 秒")
+
+    queries = build_queries(args)
+    conn.autocommit = False
+    before = run_queries(conn, queries, args.repeat, "迁移前")
+
+    conn.autocommit = True
+    start = perf_counter()
+    with conn.cursor() as cur:
+        for statement in read_sql_statements(MIGRATION_PATH):
+            cur.execute(statement)
+    migration_elapsed = perf_counter() - start
+    print(f"\n🔵 迁移 001 执行完成，用时 {migration_elapsed:.1f} 秒")
+
+    conn.autocommit = False
+    after = run_queries(conn, queries, args.repeat, "迁移后")
+    conn.close()
+
+    print("\n--- 数据库查询基准测试结果 (执行时间中位数, ms) ---")
+    print(f"{'查询':<36}{'迁移前':>12}{'迁移后':>12}{'加速比':>10}")
+    for name, _ in queries:
+        b, a = before[name]["execution_ms"], after[name]["execution_ms"]
+        print(f"{name:<36}{b:>12.2f}{a:>12.2f}{b / max(a, 0.001):>9.1f}x")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "articles": args.articles,
+            "load_seconds": round(load_elapsed, 1),
+            "migration_seconds": round(migration_elapsed, 1),
+            "queries": {name: {"before": before[name], "after": after[name]} for name, _ in queries},
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 详细结果 (含扫描节点) 已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
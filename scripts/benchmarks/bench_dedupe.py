@@ -0,0 +1,73 @@
+import argparse
+import random
+from time import perf_counter
+
+from ..dedupe import NearDuplicateIndex, article_signature
+
+# -----------------------------------------------------------------
+# 近似重复检测基准测试: 指纹 + LSH 索引的 CPU 开销，以及节省的 LLM 调用比例
+# 用法: python -m scripts.benchmarks.bench_dedupe --articles 100000
+# -----------------------------------------------------------------
+
+SOURCES = ["Reuters", "AP News", "Yahoo Finance", "MarketWatch", "CNBC"]
+
+def make_synthetic_articles(count: int, duplicate_ratio: float, seed: int = 7):
+    """
+    生成合成文章：(1 - duplicate_ratio) 是原创报道，其余是对某篇原创的 "转载"
+    (加来源后缀、截断摘要、改动个别词)。返回 (文章列表, 每篇文章真实所属的原创下标)。
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    articles, truth = [], []
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < duplicate_ratio:
+            origin = rng.choice(originals)
+            title, snippet = articles[origin]["title"], articles[origin]["snippet"]
+            words = snippet.split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            cut = rng.randint(0, 3)
+            snippet = " ".join(words[:len(words) - cut]) + "..."
+            title = f"{title} - {rng.choice(SOURCES)}"
+            truth.append(origin)
+        else:
+            title = " ".join(rng.choices(vocabulary, k=rng.randint(8, 14)))
+            snippet = " ".join(rng.choices(vocabulary, k=rng.randint(30, 45)))
+            originals.append(i)
+            truth.append(i)
+        articles.append({"article_id": i + 1, "title": title, "snippet": snippet})
+    return articles, truth
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate detection benchmark")
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="合成数据中转载的比例")
+    args = parser.parse_args()
+
+    articles, truth = make_synthetic_articles(args.articles, args.duplicate_ratio)
+
+    start = perf_counter()
+    signatures = [article_signature(a["title"], a["snippet"]) for a in articles]
+    signature_elapsed = perf_counter() - start
+
+    index = NearDuplicateIndex()
+    start = perf_counter()
+    assigned = [index.assign(a["article_id"], sig) for a, sig in zip(articles, signatures)]
+    index_elapsed = perf_counter() - start
+
+    # 与真实标签对比：被标成重复的文章，其簇代表应当与它源自同一篇原创
+    true_duplicates = sum(1 for i, origin in enumerate(truth) if origin != i)
+    found = sum(1 for c in assigned if c is not None)
+    correct = sum(1 for i, c in enumerate(assigned) if c is not None and truth[c - 1] == truth[i])
+
+    total = args.articles
+    print("\n--- 近似重复检测基准测试结果 ---")
+    print(f"文章数: {total}, 合成转载比例: {args.duplicate_ratio:.0%}")
+    print(f"MinHash 签名: {signature_elapsed:.2f} 秒 ({signature_elapsed / total * 1e6:.0f} µs/篇)")
+    print(f"LSH 索引+查询: {index_elapsed:.2f} 秒 ({index_elapsed / total * 1e6:.0f} µs/篇)")
+    print(f"识别为近似重复: {found} 篇 (真实 {true_duplicates} 篇)，"
+          f"召回率 {correct / max(true_duplicates, 1):.1%}，精确率 {correct / max(found, 1):.1%}")
+    print(f"节省的 L1 LLM 调用比例: {found / total:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import math
+import queue
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import functools
+import subprocess
+import multiprocessing
+from time import perf_counter
+from datetime import datetime, timezone
+
+from .fake_gnews import FakeGNewsServer
+from .fake_openai import FakeOpenAIServer
+
+# -----------------------------------------------------------------
+# 端到端流水线基准测试: sync_topics -> crawler -> analysis -> report
+# 全部跑在本地: 假 GNews + 假 OpenAI 兼容服务器 + SQLite 存储后端 (STORAGE_BACKEND=sqlite)。
+# 每个规模在独立的子进程中运行 (全新数据库、独立的峰值内存)，
+# 记录每个阶段的耗时、吞吐、单次调用 p50/p95 延迟和峰值 RSS，结果写入 JSON 便于跨提交对比。
+#
+# 用法: python -m scripts.benchmarks.bench_pipeline --sizes 100,1000,10000
+# -----------------------------------------------------------------
+
+CATEGORIES = ["财经", "科技", "游戏", "体育", "娱乐", "汽车", "健康", "国际"]
+STAGES = ["sync", "crawl", "analysis", "report"]
+
+def percentile(samples, q: float) -> float | None:
+    """最近秩百分位数 (样本为空时返回 None)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def timed(samples: list, fn):
+    """包装一个函数，把每次调用的耗时 (秒) 追加到 samples (list.append 线程安全)"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(perf_counter() - start)
+    return wrapper
+
+def timed_async(samples: list, fn):
+    """timed 的协程版本"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            samples.append(perf_counter() - start)
+    return wrapper
+
+def read_rss_bytes() -> int:
+    """当前进程的常驻内存 (Linux 读 /proc/self/statm，其他系统退回到进程历史峰值 ru_maxrss)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+class PeakRSSSampler(threading.Thread):
+    """后台线程定期采样 RSS，reset() 之后重新记录峰值 (每个阶段一次)"""
+    def __init__(self, interval: float = 0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = read_rss_bytes()
+        self._stop_event = threading.Event()
+
+    def reset(self):
+        self.peak = read_rss_bytes()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, read_rss_bytes())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.peak = max(self.peak, read_rss_bytes())
+        return self.peak
+
+def summarize_latencies(samples: list) -> dict:
+    p50, p95 = percentile(samples, 0.50), percentile(samples, 0.95)
+    return {
+        "calls": len(samples),
+        "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+        "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+    }
+
+def count_rows(db_path: str, table: str) -> int:
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+def run_pipeline(size: int, config: dict, results: multiprocessing.Queue):
+    """
+    子进程入口: 设置环境变量后再导入流水线模块 (它们在导入时读取配置)，
+    依次运行四个阶段并把统计结果放入 results 队列。
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"bench_pipeline_{size}_")
+    db_path = os.path.join(work_dir, "dailynews.sqlite3")
+    topic_count = max(1, math.ceil(size / config["articles_per_topic"]))
+    os.environ.update({
+        "STORAGE_BACKEND": "sqlite",
+        "LOCAL_DB_PATH": db_path,
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_OUTPUT_MODE": config["llm_output_mode"],
+        "NEWS_API_KEY": "bench-key",
+        "NEWS_API_BASE_URL": config["gnews_url"],
+        "OPENAI_BASE_URL": config["llm_url"],
+        "OPENAI_API_KEY": "bench-key",
+        # 基准测试衡量的是流水线本身，不是 GNews 的配额限速
+        "GNEWS_REQUESTS_PER_SECOND": "1000",
+        "GNEWS_BURST": "100",
+        # 每个主题只取一页，文章数 = 主题数 * articles_per_topic
+        "CRAWL_MAX_PAGES": "1",
+        "URL_FILTER_PATH": os.path.join(work_dir, "url_filter.bin"),
+        "BUNDLE_DIR": os.path.join(work_dir, "data"),
+        "TRACKED_TOPICS": ",".join(
+            f"{CATEGORIES[i % len(CATEGORIES)]}:topic {i}" for i in range(topic_count)
+        ),
+    })
+
+    # 流水线的进度输出写入日志文件 (未指定 --log-dir 时丢弃)
+    log_path = os.path.join(config["log_dir"], f"bench_pipeline_{size}.log") if config["log_dir"] else os.devnull
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+
+    from .. import sync_topics, crawler, analysis, report
+    from ..llm_concurrency import get_llm_limiter
+
+    crawler.ARTICLES_PER_TOPIC = config["articles_per_topic"]
+
+    # 每个阶段的 "单元" 延迟: 一次 GNews 请求 / 一次 L1 调用 (一批) / 一份 L2 报告；以及每次入库的延迟
+    samples = {stage: {"unit": [], "db_write": []} for stage in STAGES}
+    crawler.fetch_articles_async = timed_async(samples["crawl"]["unit"], crawler.fetch_articles_async)
+    crawler.fetch_articles_from_api = timed(samples["crawl"]["unit"], crawler.fetch_articles_from_api)
+    crawler.save_articles_to_db = timed(samples["crawl"]["db_write"], crawler.save_articles_to_db)
+    analysis.process_article_batch = timed(samples["analysis"]["unit"], analysis.process_article_batch)
+    analysis.save_analyses_bulk = timed(samples["analysis"]["db_write"], analysis.save_analyses_bulk)
+    analysis.save_analyses_per_article = timed(samples["analysis"]["db_write"], analysis.save_analyses_per_article)
+    report.generate_l2_report = timed(samples["report"]["unit"], report.generate_l2_report)
+    report.save_l2_report_to_db = timed(samples["report"]["db_write"], report.save_l2_report_to_db)
+    # generate_reports_concurrently 的默认参数在定义时已绑定了原函数
+    report.generate_reports_concurrently = functools.partial(
+        report.generate_reports_concurrently, save_fn=report.save_l2_report_to_db
+    )
+
+    # 每个阶段完成后用 "处理了多少行" 作为吞吐的分子
+    stage_runs = [
+        ("sync", sync_topics.main, "tracked_topics"),
+        ("crawl", crawler.main, "raw_articles"),
+        ("analysis", analysis.main, "l1_analysis_sentiment"),
+        ("report", report.main, "daily_reports"),
+    ]
+
+    sampler = PeakRSSSampler()
+    sampler.start()
+    stage_results = {}
+    try:
+        for stage, stage_main, table in stage_runs:
+            sampler.reset()
+            start = perf_counter()
+            stage_main()
+            elapsed = perf_counter() - start
+            peak = max(sampler.peak, read_rss_bytes())
+            items = count_rows(db_path, table)
+            stage_results[stage] = {
+                "seconds": round(elapsed, 3),
+                "items": items,
+                "items_per_second": round(items / max(elapsed, 1e-9), 2),
+                "unit_latency": summarize_latencies(samples[stage]["unit"]),
+                "db_write_latency": summarize_latencies(samples[stage]["db_write"]),
+                "peak_rss_mb": round(peak / 2**20, 1),
+            }
+        results.put({
+            "size": size,
+            "topics": topic_count,
+            "near_duplicates": count_rows(db_path, "raw_articles WHERE canonical_article_id IS NOT NULL"),
+            "entities": count_rows(db_path, "l1_analysis_entities"),
+            "stages": stage_results,
+            "llm_concurrency": get_llm_limiter().get_stats(),
+            "total_seconds": round(sum(s["seconds"] for s in stage_results.values()), 3),
+            "peak_rss_mb": round(sampler.stop() / 2**20, 1),
+        })
+    except BaseException as e:
+        results.put({"size": size, "error": repr(e), "stages": stage_results})
+        raise
+    finally:
+        # 工作目录里还有 URL 过滤器和前端数据包
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_size(ctx, size: int, config: dict) -> dict:
+    """在新的子进程中跑一个规模，等待结果 (子进程异常退出时返回错误信息)"""
+    results = ctx.Queue()
+    process = ctx.Process(target=run_pipeline, args=(size, config, results))
+    process.start()
+    result = None
+    while result is None and (process.is_alive() or not results.empty()):
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            pass
+    process.join()
+    if result is None:
+        result = {"size": size, "error": f"子进程退出 (exit code {process.exitcode})", "stages": {}}
+    return result
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(runs: list):
+    print("\n--- 端到端流水线基准测试结果 ---")
+    print(f"{'规模':>7} {'阶段':<9}{'耗时(s)':>9}{'行数':>8}{'行/秒':>10}{'调用':>7}{'p50(ms)':>10}{'p95(ms)':>10}{'峰值RSS(MB)':>13}")
+    for run in runs:
+        if "error" in run:
+            print(f"{run['size']:>7} 🔴 失败: {run['error']}")
+        for stage, s in run["stages"].items():
+            unit = s["unit_latency"]
+            p50 = f"{unit['p50_ms']:.1f}" if unit["p50_ms"] is not None else "-"
+            p95 = f"{unit['p95_ms']:.1f}" if unit["p95_ms"] is not None else "-"
+            print(f"{run['size']:>7} {stage:<9}{s['seconds']:>9.2f}{s['items']:>8}{s['items_per_second']:>10.1f}"
+                  f"{unit['calls']:>7}{p50:>10}{p95:>10}{s['peak_rss_mb']:>13.1f}")
+
+    # 假 LLM 服务器统计的提示词 token (含 tools / response_format 中的 schema) 和前缀缓存命中
+    print(f"\n{'规模':>7} {'调用类型':<10}{'请求数':>8}{'提示词token':>13}{'token/篇':>10}{'缓存命中':>10}{'输出token':>11}")
+    for run in runs:
+        articles = run.get("stages", {}).get("analysis", {}).get("items") or 0
+        for kind, s in sorted(run.get("servers", {}).get("llm", {}).items()):
+            prompt_tokens = s.get("prompt_tokens", 0)
+            per_article = f"{prompt_tokens / articles:.1f}" if articles and kind.startswith("l1") else "-"
+            cached = f"{s.get('cached_tokens', 0) / prompt_tokens:.0%}" if prompt_tokens else "-"
+            print(f"{run['size']:>7} {kind:<10}{s.get('requests', 0):>8}{prompt_tokens:>13}{per_article:>10}"
+                  f"{cached:>10}{s.get('completion_tokens', 0):>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against local fake GNews and LLM servers")
+    parser.add_argument("--sizes", default="100,1000,10000", help="要测试的文章规模 (逗号分隔)")
+    parser.add_argument("--articles-per-topic", type=int, default=25, help="每个主题抓取的文章数 (决定主题数)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="假 GNews 文章中转载的比例")
+    parser.add_argument("--snippet-words", type=int, default=30, help="假 GNews 每篇文章摘要的单词数")
+    parser.add_argument("--gnews-latency", type=float, default=0.05, help="假 GNews 每个请求的延迟 (秒)")
+    parser.add_argument("--gnews-error-rate", type=float, default=0.0, help="假 GNews 返回 429 的概率")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="假 LLM 每次调用的延迟 (秒)")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="假 LLM 额外的随机延迟上限 (秒)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="假 LLM 返回 500 的概率")
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="假 LLM 返回 429 的概率")
+    parser.add_argument("--llm-retry-after", type=float, default=0.5, help="429 响应的 Retry-After (秒)")
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=0.0,
+                        help="假 LLM 每 1000 个未缓存提示词 + 输出 token 额外的延迟 (毫秒)")
+    parser.add_argument("--llm-output-mode", default="parser", help="LLM_OUTPUT_MODE (parser / json_mode / json_schema / function_calling)")
+    parser.add_argument("--llm-max-concurrency", type=int, default=0,
+                        help="假 LLM 同时处理的请求上限，超出返回 429 (0 表示不限)")
+    parser.add_argument("--log-dir", default=None, help="保存每个规模的流水线日志 (默认丢弃)")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON 结果文件")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+
+    with FakeGNewsServer(latency=args.gnews_latency, error_rate=args.gnews_error_rate,
+                         duplicate_ratio=args.duplicate_ratio, snippet_words=args.snippet_words) as gnews, \
+            FakeOpenAIServer(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                             rate_limit_rate=args.llm_rate_limit_rate, retry_after=args.llm_retry_after,
+                             max_concurrency=args.llm_max_concurrency,
+                             ms_per_1k_tokens=args.llm_ms_per_1k_tokens) as llm:
+        config = {
+            "gnews_url": gnews.url,
+            "llm_url": llm.url,
+            "articles_per_topic": args.articles_per_topic,
+            "llm_output_mode": args.llm_output_mode,
+            "log_dir": os.path.abspath(args.log_dir) if args.log_dir else None,
+        }
+        for size in sizes:
+            print(f"🔵 正在运行规模 {size} 篇文章...")
+            gnews.request_count = 0
+            llm.reset_stats()
+            start = perf_counter()
+            run = run_size(ctx, size, config)
+            run["servers"] = {"gnews": {"requests": gnews.request_count}, "llm": llm.stats()}
+            runs.append(run)
+            status = "🔴 失败" if "error" in run else "✅ 完成"
+            print(f"  {status}，用时 {perf_counter() - start:.1f} 秒")
+
+    print_summary(runs)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "log_dir")},
+            "runs": runs,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 详细结果已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
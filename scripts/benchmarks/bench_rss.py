@@ -0,0 +1,109 @@
+import os
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import xml.etree.ElementTree as ET
+from time import perf_counter
+
+from ..rss_source import FeedParser, RssSource, parse_feed
+from .fake_feeds import FakeFeedServer
+
+# -----------------------------------------------------------------
+# RSS / Atom 来源基准测试
+#   1. 解析: 流式解析的条目/秒，以及解析一个订阅源的内存峰值 (对比一次性构建整个文档的 ElementTree)；
+#   2. 条件请求: 对本地假订阅源连续运行 N 次，比较带 / 不带 ETag 时的 304 数、传输字节数和耗时。
+# 用法: python -m scripts.benchmarks.bench_rss --feeds 200 --runs 5
+# -----------------------------------------------------------------
+
+CHUNK_SIZE = 64 * 1024
+
+def chunks(data: bytes, size: int = CHUNK_SIZE):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def count_items(data: bytes) -> int:
+    """流式解析但不保留条目 (与爬取时只保留匹配条目的情形接近)"""
+    parser, count = FeedParser(), 0
+    for chunk in chunks(data):
+        count += len(parser.feed(chunk))
+    return count + len(parser.close())
+
+def measure_peak(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_parse(args):
+    server = FakeFeedServer(feeds=2, items_per_feed=args.items, keywords=["topic 1"], body_words=args.body_words)
+    print("\n--- 解析 ---")
+    print(f"{'格式':<8}{'条目数':>8}{'文档 KB':>10}{'条目/秒':>12}{'流式峰值 KB':>14}{'DOM 峰值 KB':>14}")
+    for feed, label in ((0, "RSS 2.0"), (1, "Atom")):
+        data = server.render(feed)
+        start = perf_counter()
+        items = parse_feed(chunks(data))
+        elapsed = perf_counter() - start
+        assert len(items) == args.items, f"{label}: 解析出 {len(items)} 条，应为 {args.items} 条"
+        streaming_peak = measure_peak(lambda: count_items(data))
+        # 对比: 一次性构建整个文档 (不含 bytes 本身)
+        dom_peak = measure_peak(lambda: ET.fromstring(data))
+        print(f"{label:<8}{len(items):>8}{len(data) / 1024:>10.0f}{len(items) / elapsed:>12.0f}"
+              f"{streaming_peak / 1024:>14.0f}{dom_peak / 1024:>14.0f}")
+    print(f"  (流式: 每次送入 {CHUNK_SIZE // 1024} KB，条目解析完即丢弃；DOM: ElementTree.fromstring 整个文档)")
+
+def run_feeds(conditional: bool, args) -> dict:
+    """对同一组假订阅源连续运行 args.runs 次 RssSource.crawl (不写库，只统计)"""
+    keywords = [f"topic {i}" for i in range(args.topics)]
+    topics = [{"topic_id": i + 1, "keyword": keyword} for i, keyword in enumerate(keywords)]
+    state_path = os.path.join(tempfile.mkdtemp(prefix="bench_rss_"), "rss_feeds.json")
+    stats = {"saved": 0, "seconds": 0.0}
+
+    def fake_save(articles, topic_id):
+        stats["saved"] += len(articles)
+        return len(articles)
+
+    with FakeFeedServer(feeds=args.feeds, items_per_feed=args.feed_items, keywords=keywords,
+                        update_ratio=args.update_ratio, latency=args.latency) as server:
+        source = RssSource(server.feed_urls, state_path=state_path)
+        for run in range(args.runs):
+            if run:
+                server.advance(seed=run)
+            if not conditional and os.path.exists(state_path):
+                os.remove(state_path)
+            start = perf_counter()
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                source.crawl(topics, fake_save)
+            stats["seconds"] += perf_counter() - start
+        stats.update(requests=server.request_count, not_modified=server.not_modified_count,
+                     bytes=server.bytes_sent)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS / Atom source benchmark against local fake feeds")
+    parser.add_argument("--items", type=int, default=5000, help="解析测试中每个订阅源的条目数")
+    parser.add_argument("--body-words", type=int, default=200, help="解析测试中每个条目正文 (<content:encoded>) 的单词数")
+    parser.add_argument("--feeds", type=int, default=200, help="条件请求测试的订阅源数量")
+    parser.add_argument("--feed-items", type=int, default=50, help="条件请求测试中每个订阅源的条目数")
+    parser.add_argument("--topics", type=int, default=100, help="主题数量")
+    parser.add_argument("--runs", type=int, default=5, help="连续运行的次数")
+    parser.add_argument("--update-ratio", type=float, default=0.2, help="两次运行之间有新条目的订阅源比例")
+    parser.add_argument("--latency", type=float, default=0.002, help="假订阅源每个请求的延迟 (秒)")
+    args = parser.parse_args()
+
+    bench_parse(args)
+
+    results = {mode: run_feeds(mode == "conditional", args) for mode in ("full", "conditional")}
+
+    print("\n--- 条件请求 ---")
+    print(f"订阅源: {args.feeds} (每个 {args.feed_items} 条)，运行 {args.runs} 次，每次 {args.update_ratio:.0%} 的订阅源有更新")
+    print(f"{'mode':<14}{'请求':>8}{'304':>8}{'传输 KB':>12}{'入库条目':>10}{'耗时(s)':>10}")
+    for mode, s in results.items():
+        print(f"{mode:<14}{s['requests']:>8}{s['not_modified']:>8}{s['bytes'] / 1024:>12.0f}"
+              f"{s['saved']:>10}{s['seconds']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import json
+import argparse
+import tempfile
+import contextlib
+from time import perf_counter
+
+from .. import crawler, url_filter
+from ..storage import set_storage
+from ..storage.sqlite_backend import SQLiteStorage
+from ..url_filter import BloomFilter, KnownUrlFilter, canonical_url_key
+from .fake_gnews import FakeGNewsServer, url_variant
+
+# -----------------------------------------------------------------
+# 已知 URL 过滤器基准测试
+#   1. Bloom 过滤器本身: 实测误报率 vs 目标误报率、大小、加入 / 查询耗时、持久化文件的读写耗时；
+#   2. 规范化: 已知文章的各种 URL 变体 (跟踪参数、http、AMP) 有多少能被认出；
+#   3. 连续 N 次全量爬取 (每次都会重新拿到上次的文章，部分换成 URL 变体)，
+#      比较开 / 关过滤器时发送到 upsert 的行数和字节数、重复入库的文章数和被误判跳过的文章数。
+# 用法: python -m scripts.benchmarks.bench_url_filter --urls 200000 --topics 100 --runs 5
+# -----------------------------------------------------------------
+
+def bench_bloom(count: int, fp_rate: float):
+    known = [f"https://news.example.com/topic-{i % 500}/{i}" for i in range(count)]
+    unseen = [f"https://news.example.com/topic-{i % 500}/{i}" for i in range(count, 2 * count)]
+    bloom = BloomFilter(count, fp_rate)
+
+    start = perf_counter()
+    for url in known:
+        bloom.add(url)
+    add_elapsed = perf_counter() - start
+    start = perf_counter()
+    false_positives = sum(1 for url in unseen if url in bloom)
+    lookup_elapsed = perf_counter() - start
+    missed = sum(1 for url in known[:10000] if url not in bloom)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_url_filter_"), "url_filter.bin")
+    start = perf_counter()
+    KnownUrlFilter(bloom, count).save(path)
+    save_elapsed = perf_counter() - start
+    start = perf_counter()
+    KnownUrlFilter.read(path)
+    read_elapsed = perf_counter() - start
+
+    print("\n--- Bloom 过滤器 ---")
+    print(f"URL 数: {count}，目标误报率 {fp_rate:.4%}，{bloom.num_bits / count:.1f} 位/URL，k = {bloom.num_hashes}，"
+          f"大小 {bloom.size_bytes / 1024:.0f} KB (文件 {os.path.getsize(path) / 1024:.0f} KB)")
+    print(f"实测误报率: {false_positives / count:.4%} ({false_positives}/{count})，"
+          f"估算 {bloom.estimated_fp_rate():.4%}，漏报 {missed}")
+    print(f"加入: {add_elapsed / count * 1e6:.2f} µs/URL，查询: {lookup_elapsed / count * 1e6:.2f} µs/URL，"
+          f"保存 {save_elapsed * 1000:.1f} ms，读取 {read_elapsed * 1000:.1f} ms")
+
+def bench_canonicalization(count: int):
+    known = [f"https://news.example.com/topic-{i % 50}/{i}" for i in range(count)]
+    url_filter_ = KnownUrlFilter(BloomFilter(count))
+    for url in known:
+        url_filter_.add_url(url)
+    variants = [url_variant(url) for url in known]
+    recognized = sum(1 for url in variants if canonical_url_key(url) in url_filter_.bloom)
+    print("\n--- URL 规范化 ---")
+    print(f"已知文章的 URL 变体被认出: {recognized}/{count} ({recognized / count:.2%})，例如:")
+    for url in variants[:5]:
+        print(f"  {url}  ->  {canonical_url_key(url)}")
+
+def run_crawls(enabled: bool, args) -> dict:
+    """用全新的数据库和假服务器连续跑 args.runs 次全量爬取，返回累计统计"""
+    work_dir = tempfile.mkdtemp(prefix="bench_url_filter_")
+    storage = SQLiteStorage(os.path.join(work_dir, "dailynews.sqlite3"))
+    set_storage(storage)
+    storage.upsert_topics([
+        {"keyword": f"topic {i}", "category": "bench", "is_active": True} for i in range(args.topics)
+    ])
+
+    stats = {"rows": 0, "bytes": 0, "inserted": 0, "seconds": 0.0}
+    fetched_keys = set()
+    insert_articles, save_articles = storage.insert_articles, crawler.save_articles_to_db
+
+    def counting_insert(articles):
+        stats["rows"] += len(articles)
+        stats["bytes"] += len(json.dumps(articles, ensure_ascii=False).encode('utf-8'))
+        inserted = insert_articles(articles)
+        stats["inserted"] += len(inserted)
+        return inserted
+
+    def recording_save(articles, topic_id, **kwargs):
+        fetched_keys.update(canonical_url_key(a["url"]) for a in articles)
+        return save_articles(articles, topic_id, **kwargs)
+
+    storage.insert_articles = counting_insert
+    crawler.save_articles_to_db = recording_save
+    crawler.URL_FILTER_ENABLED = enabled
+    url_filter.URL_FILTER_PATH = os.path.join(work_dir, "url_filter.bin")
+    with FakeGNewsServer(latency=args.latency, publish_interval=args.publish_interval,
+                         url_variant_ratio=args.variant_ratio) as server:
+        crawler.NEWS_API_BASE_URL = server.url
+        crawler.utc_now = server.now
+        try:
+            for run in range(args.runs):
+                if run:
+                    server.advance(args.hours_between)
+                start = perf_counter()
+                with open(os.devnull, 'w') as devnull, \
+                        contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                    crawler.main()
+                stats["seconds"] += perf_counter() - start
+        finally:
+            crawler.save_articles_to_db = save_articles
+
+    stored_keys = [canonical_url_key(row["url"]) for row in storage.fetch_url_page(0, 10 ** 9)]
+    # 重复入库: 同一篇文章以不同 URL 存了多行；误判跳过: 爬到了但一行都没有入库
+    stats["duplicates"] = len(stored_keys) - len(set(stored_keys))
+    stats["missed"] = len(fetched_keys - set(stored_keys))
+    set_storage(None)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Known-URL Bloom filter benchmark")
+    parser.add_argument("--urls", type=int, default=200_000, help="Bloom 过滤器测试的 URL 数")
+    parser.add_argument("--fp-rate", type=float, default=url_filter.URL_FILTER_FP_RATE, help="目标误报率")
+    parser.add_argument("--topics", type=int, default=100, help="爬取测试的主题数量")
+    parser.add_argument("--runs", type=int, default=5, help="连续爬取的次数")
+    parser.add_argument("--hours-between", type=float, default=6, help="两次爬取之间的间隔 (小时)")
+    parser.add_argument("--publish-interval", type=float, default=3600, help="每个主题每隔多少秒发布一篇文章")
+    parser.add_argument("--variant-ratio", type=float, default=0.2, help="返回的文章换成 URL 变体的概率")
+    parser.add_argument("--latency", type=float, default=0.002, help="假 GNews 每个请求的延迟 (秒)")
+    args = parser.parse_args()
+
+    bench_bloom(args.urls, args.fp_rate)
+    bench_canonicalization(10000)
+
+    # 全量模式: 每次都取最新一页，和上次的结果大量重叠 (增量模式见 bench_crawl_incremental)
+    crawler.INCREMENTAL_CRAWL = False
+    crawler.DEDUPE_ENABLED = False
+    crawler.GNEWS_REQUESTS_PER_SECOND = 1000
+    crawler.GNEWS_BURST = 100
+    os.environ.setdefault("NEWS_API_KEY", "bench-key")
+    results = {mode: run_crawls(mode == "filter", args) for mode in ("no filter", "filter")}
+
+    print("\n--- 连续全量爬取 ---")
+    print(f"主题数: {args.topics}，运行 {args.runs} 次，间隔 {args.hours_between:g} 小时，"
+          f"每页 {crawler.ARTICLES_PER_TOPIC} 篇，URL 变体概率 {args.variant_ratio:.0%}")
+    print(f"{'mode':<12}{'upsert 行':>12}{'upsert KB':>12}{'新增':>10}{'重复入库':>10}{'误判跳过':>10}{'耗时(s)':>10}")
+    for mode, s in results.items():
+        print(f"{mode:<12}{s['rows']:>12}{s['bytes'] / 1024:>12.0f}{s['inserted']:>10}"
+              f"{s['duplicates']:>10}{s['missed']:>10}{s['seconds']:>10.2f}")
+    off, on = results["no filter"], results["filter"]
+    print(f"过滤器减少了 {1 - on['rows'] / max(1, off['rows']):.1%} 的 upsert 行、"
+          f"{(off['bytes'] - on['bytes']) / 1024:.0f} KB ({1 - on['bytes'] / max(1, off['bytes']):.1%}) 的 upsert 数据。")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from time import perf_counter, sleep
+from collections import Counter
+
+from ..storage import create_storage
+
+# -----------------------------------------------------------------
+# L1 工作租约基准测试 (claim_l1_batch / release_l1_claims)
+# 在本地 SQLite 上用多个进程模拟多个分析 runner (AI 调用用 sleep 代替):
+#   1. "scan" (旧方式): 每个进程各自分页读取 unanalyzed_articles，统计同一篇文章被重复分析的次数；
+#   2. "claim": 每个进程领取带租约的批次，统计重复次数和随进程数增加的吞吐；
+#   3. 崩溃恢复: 一个进程领取后直接退出，租约到期后由其他进程接手；
+#      另有一部分文章总是分析失败，用完重试次数后进入死信。
+# 用法: python -m scripts.benchmarks.bench_work_queue --articles 2000 --workers 1,2,4
+# -----------------------------------------------------------------
+
+def seed_database(db_path: str, articles: int):
+    storage = create_storage("sqlite", db_path)
+    storage.upsert_topics([{"keyword": "topic 0", "category": "科技", "is_active": True}])
+    topic_id = storage.fetch_active_topics()[0]['topic_id']
+    storage.insert_articles([
+        {"topic_id": topic_id, "url": f"https://news.example.com/{i}", "title": f"Article {i}",
+         "snippet": "snippet", "source_name": "Example News"}
+        for i in range(articles)
+    ])
+
+def fake_results(batch: list) -> dict:
+    return {"sentiments": [
+        {"article_id": a['article_id'], "ai_summary": "summary", "sentiment_score": 0.1, "sentiment_label": "Neutral"}
+        for a in batch
+    ]}
+
+def always_fails(article_id: int, fail_ratio: float) -> bool:
+    """固定的一部分文章每次都分析失败 (用于观察死信)"""
+    return random.Random(article_id).random() < fail_ratio
+
+def worker(db_path: str, mode: str, worker_id: str, config: dict, results: multiprocessing.Queue):
+    storage = create_storage("sqlite", db_path)
+    analyzed, batches = [], 0
+    if mode == "scan":
+        after_id = 0
+        while page := storage.fetch_unanalyzed_page(after_id, config["batch"]):
+            sleep(config["latency"])
+            storage.save_l1_batch(fake_results(page))
+            analyzed += [a['article_id'] for a in page]
+            after_id = page[-1]['article_id']
+            batches += 1
+    else:
+        while batch := storage.claim_l1_batch(worker_id, config["batch"], config["lease"], config["max_attempts"]):
+            batches += 1
+            if mode == "crash":
+                break  # 领取后直接退出，不写结果也不归还
+            sleep(config["latency"])
+            failed = [a['article_id'] for a in batch if always_fails(a['article_id'], config["fail_ratio"])]
+            ok = [a for a in batch if a['article_id'] not in failed]
+            storage.save_l1_batch(fake_results(ok))
+            if failed:
+                storage.release_l1_claims(worker_id, failed, "simulated failure", config["max_attempts"])
+            analyzed += [a['article_id'] for a in ok]
+    results.put({"worker": worker_id, "analyzed": analyzed, "batches": batches})
+
+def run_workers(db_path: str, modes: list, config: dict) -> tuple:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(db_path, mode, f"{mode}-{i}", config, results))
+        for i, mode in enumerate(modes)
+    ]
+    start = perf_counter()
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return outputs, perf_counter() - start
+
+def queue_state(db_path: str) -> dict:
+    storage = create_storage("sqlite", db_path)
+    row = storage._query(
+        """
+        SELECT
+          (SELECT count(*) FROM unanalyzed_articles) AS unanalyzed,
+          (SELECT count(*) FROM l1_work_claims WHERE dead_lettered_at IS NULL) AS leased,
+          (SELECT count(*) FROM l1_work_claims WHERE dead_lettered_at IS NOT NULL) AS dead_lettered
+        """
+    )[0]
+    return row
+
+def bench_mode(mode: str, workers: int, config: dict) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bench_work_queue_")
+    db_path = os.path.join(work_dir, "dailynews.sqlite3")
+    try:
+        seed_database(db_path, config["articles"])
+        outputs, elapsed = run_workers(db_path, [mode] * workers, config)
+        counts = Counter(article_id for output in outputs for article_id in output["analyzed"])
+        return {
+            "analyzed": sum(counts.values()),
+            "unique": len(counts),
+            "duplicates": sum(n - 1 for n in counts.values()),
+            "seconds": elapsed,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def bench_recovery(config: dict):
+    """一个进程领取后崩溃，其余进程处理剩余文章；租约到期后再跑一轮，直到队列清空"""
+    work_dir = tempfile.mkdtemp(prefix="bench_work_queue_")
+    db_path = os.path.join(work_dir, "dailynews.sqlite3")
+    try:
+        seed_database(db_path, config["articles"])
+        print(f"\n--- 崩溃恢复与死信 (租约 {config['lease']} 秒，最多领取 {config['max_attempts']} 次，"
+              f"{config['fail_ratio']:.0%} 的文章总是失败) ---")
+        print(f"{'轮次':<6}{'进程':<22}{'入库':>8}{'未分析':>8}{'租约中':>8}{'死信':>8}")
+        total = Counter()
+        for round_no in range(1, config["max_attempts"] + 3):
+            modes = (["crash"] if round_no == 1 else []) + ["claim"] * 2
+            outputs, _ = run_workers(db_path, modes, config)
+            total.update(article_id for output in outputs for article_id in output["analyzed"])
+            state = queue_state(db_path)
+            print(f"{round_no:<6}{'+'.join(modes):<22}{sum(len(o['analyzed']) for o in outputs):>8}"
+                  f"{state['unanalyzed']:>8}{state['leased']:>8}{state['dead_lettered']:>8}")
+            if state['unanalyzed'] == state['dead_lettered']:
+                break
+            sleep(config["lease"])  # 等待崩溃进程 / 失败文章的租约到期
+        expected_dead = sum(1 for i in range(1, config["articles"] + 1) if always_fails(i, config["fail_ratio"]))
+        print(f"  > 共入库 {len(total)} 篇，重复分析 {sum(total.values()) - len(total)} 次；"
+              f"死信 {state['dead_lettered']} 篇 (总是失败的文章 {expected_dead} 篇)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="L1 work-claim benchmark with multiple local worker processes")
+    parser.add_argument("--articles", type=int, default=2000, help="积压的文章数")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的进程数")
+    parser.add_argument("--batch", type=int, default=50, help="每次读取 / 领取的文章数")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟的每批 AI 耗时 (秒)")
+    parser.add_argument("--lease", type=int, default=2, help="崩溃恢复测试的租约时长 (秒)")
+    parser.add_argument("--max-attempts", type=int, default=3, help="一篇文章最多被领取的次数")
+    parser.add_argument("--fail-ratio", type=float, default=0.01, help="崩溃恢复测试中总是失败的文章比例")
+    args = parser.parse_args()
+    config = {
+        "articles": args.articles, "batch": args.batch, "latency": args.latency,
+        "lease": args.lease, "max_attempts": args.max_attempts, "fail_ratio": 0.0,
+    }
+
+    print(f"积压 {args.articles} 篇，每批 {args.batch} 篇，每批模拟 AI 耗时 {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<8}{'进程':>6}{'分析次数':>10}{'入库文章':>10}{'重复分析':>10}{'耗时(s)':>10}{'篇/秒':>10}")
+    for workers in [int(n) for n in args.workers.split(',')]:
+        for mode in ("scan", "claim"):
+            r = bench_mode(mode, workers, config)
+            print(f"{mode:<8}{workers:>6}{r['analyzed']:>10}{r['unique']:>10}{r['duplicates']:>10}"
+                  f"{r['seconds']:>10.2f}{r['unique'] / r['seconds']:>10.0f}")
+
+    bench_recovery({**config, "fail_ratio": args.fail_ratio})
+
+if __name__ == "__main__":
+    main()
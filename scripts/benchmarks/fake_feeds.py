@@ -0,0 +1,188 @@
+import random
+import threading
+from time import sleep
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+# -----------------------------------------------------------------
+# 本地假 RSS / Atom 订阅源服务器 (Fake Feed Server)
+# -----------------------------------------------------------------
+# 生成 RSS 2.0 和 Atom 格式的订阅源 (带命名空间、CDATA、HTML 摘要、<content:encoded>)，
+# 支持 ETag / Last-Modified 条件请求，用于 rss_source.py 的基准测试。
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+def make_feed_item(feed: int, index: int, published_at: datetime, keywords: list, match_ratio: float,
+                   body_words: int = 0) -> dict:
+    """生成订阅源 feed 的第 index 个条目；以 match_ratio 的概率在标题中提到某个主题关键词"""
+    rng = random.Random(f"feed/{feed}/{index}")
+    title = " ".join(rng.choices(VOCABULARY, k=8))
+    if keywords and rng.random() < match_ratio:
+        title = f"{rng.choice(keywords)} {title}"
+    return {
+        "title": title,
+        "summary": " ".join(rng.choices(VOCABULARY, k=30)),
+        "body": " ".join(rng.choices(VOCABULARY, k=body_words)),
+        "url": f"https://feeds.example.com/{feed}/articles/{index}?utm_source=rss",
+        "published_at": published_at,
+    }
+
+def render_rss(feed: int, items: list) -> bytes:
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f'<title>Example Feed {feed}</title><link>https://feeds.example.com/{feed}</link>'
+        '<description>Fake feed for benchmarks</description>'
+    ]
+    for item in items:
+        parts.append(
+            f'<item><title>{escape(item["title"])}</title><link>{escape(item["url"])}</link>'
+            f'<guid isPermaLink="false">{feed}-{escape(item["url"])}</guid>'
+            f'<description><![CDATA[<p>{item["summary"]}</p>]]></description>'
+            + (f'<content:encoded><![CDATA[<div>{item["body"]}</div>]]></content:encoded>' if item["body"] else "")
+            + f'<pubDate>{format_datetime(item["published_at"], usegmt=True)}</pubDate>'
+            f'<dc:creator>Reporter</dc:creator></item>'
+        )
+    parts.append('</channel></rss>')
+    return "".join(parts).encode("utf-8")
+
+def render_atom(feed: int, items: list) -> bytes:
+    updated = items[0]["published_at"] if items else datetime.now(timezone.utc)
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title type="text">Example Atom Feed {feed}</title>'
+        f'<link rel="alternate" href="https://feeds.example.com/{feed}"/>'
+        f'<link rel="self" href="https://feeds.example.com/{feed}/atom.xml"/>'
+        f'<id>urn:feed:{feed}</id><updated>{updated.isoformat()}</updated>'
+    ]
+    for item in items:
+        parts.append(
+            f'<entry><title type="html">{escape(item["title"])}</title>'
+            f'<link rel="self" href="https://feeds.example.com/api/{feed}"/>'
+            f'<link rel="alternate" type="text/html" href="{escape(item["url"])}"/>'
+            f'<id>urn:entry:{feed}:{escape(item["url"])}</id>'
+            f'<published>{item["published_at"].isoformat()}</published>'
+            f'<updated>{item["published_at"].isoformat()}</updated>'
+            f'<summary type="html">{escape("<p>" + item["summary"] + "</p>")}</summary>'
+            + (f'<content type="html">{escape(item["body"])}</content>' if item["body"] else "")
+            + '</entry>'
+        )
+    parts.append('</feed>')
+    return "".join(parts).encode("utf-8")
+
+class FakeFeedServer:
+    """
+    在后台线程中运行的假订阅源服务器: /feeds/<n>.xml (偶数为 RSS 2.0，奇数为 Atom)。
+    - items_per_feed: 每个订阅源包含的最新条目数
+    - keywords / match_ratio: 条目标题提到主题关键词的概率
+    - update_ratio: 每次 advance() 时有新条目的订阅源比例 (其余订阅源内容不变，条件请求返回 304)
+    - new_items: 有更新的订阅源每次新增的条目数
+    - body_words: <content:encoded> 中正文的单词数 (0 表示没有正文)
+    """
+    def __init__(self, feeds: int = 100, items_per_feed: int = 50, keywords: list | None = None,
+                 match_ratio: float = 0.3, update_ratio: float = 0.2, new_items: int = 5,
+                 body_words: int = 0, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.feeds = feeds
+        self.items_per_feed = items_per_feed
+        self.keywords = keywords or []
+        self.match_ratio = match_ratio
+        self.update_ratio = update_ratio
+        self.new_items = new_items
+        self.body_words = body_words
+        self.latency = latency
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=1)
+        # 每个订阅源的版本号 (每个版本新增 new_items 个条目) 和最后修改时间
+        self.versions = [0] * feeds
+        self.modified_at = [self.started_at] * feeds
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def advance(self, seed: int = 0):
+        """模拟一段时间过去: update_ratio 比例的订阅源发布了 new_items 个新条目"""
+        rng = random.Random(f"advance/{seed}")
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        for feed in range(self.feeds):
+            if rng.random() < self.update_ratio:
+                self.versions[feed] += 1
+                self.modified_at[feed] = now
+
+    def render(self, feed: int) -> bytes:
+        newest = self.items_per_feed + self.versions[feed] * self.new_items
+        items = [
+            make_feed_item(feed, i, self.started_at + timedelta(minutes=i), self.keywords,
+                           self.match_ratio, self.body_words)
+            for i in range(newest - 1, max(-1, newest - self.items_per_feed - 1), -1)
+        ]
+        return (render_rss if feed % 2 == 0 else render_atom)(feed, items)
+
+    @property
+    def feed_urls(self) -> list:
+        host, port = self._server.server_address[:2]
+        return [f"http://{host}:{port}/feeds/{feed}.xml" for feed in range(self.feeds)]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                sleep(server.latency)
+                try:
+                    feed = int(self.path.rsplit('/', 1)[-1].split('.')[0])
+                    assert 0 <= feed < server.feeds
+                except (ValueError, AssertionError):
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = f'"{feed}-{server.versions[feed]}"'
+                last_modified = format_datetime(server.modified_at[feed], usegmt=True)
+                if self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified_count += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                body = server.render(feed)
+                with server._lock:
+                    server.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml" if feed % 2 == 0 else "application/atom+xml")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self) -> "FakeFeedServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,188 @@
+import json
+import math
+import random
+import threading
+from time import sleep
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# -----------------------------------------------------------------
+# 本地假 GNews 服务器 (Fake GNews Server)
+# -----------------------------------------------------------------
+# 模拟 'https://gnews.io/api/v4/search' 的响应格式，用于基准测试，
+# 不消耗真实 API 配额。通过 crawler.NEWS_API_BASE_URL 指向它即可。
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+SOURCES = ["Reuters", "AP News", "Yahoo Finance", "MarketWatch", "CNBC"]
+
+def make_fake_article(keyword: str, index: int, published_at: datetime, duplicate_ratio: float = 0.0,
+                      snippet_words: int = 30) -> dict:
+    """
+    生成一篇与 GNews 响应格式一致的假文章。
+    标题和摘要由 (keyword, index) 确定性地生成，不同文章内容互不相同；
+    以 duplicate_ratio 的概率生成同一主题前一篇文章的 "转载" (标题加来源后缀，url 不同)。
+    """
+    rng = random.Random(f"{keyword}/{index}")
+    source_index = index
+    if index > 0 and rng.random() < duplicate_ratio:
+        source_index = index - 1
+        rng = random.Random(f"{keyword}/{source_index}")
+    title = f"{keyword} " + " ".join(rng.choices(VOCABULARY, k=8))
+    description = " ".join(rng.choices(VOCABULARY, k=snippet_words))
+    if source_index != index:
+        title = f"{title} - {SOURCES[index % len(SOURCES)]}"
+    return {
+        "title": title,
+        "description": description,
+        "content": description,
+        "url": f"https://news.example.com/{keyword.replace(' ', '-').lower()}/{index}",
+        "publishedAt": published_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "source": {"name": "Example News", "url": "https://news.example.com"},
+    }
+
+URL_VARIANTS = [
+    lambda url: f"{url}?utm_source=gnews&utm_medium=rss",
+    lambda url: f"{url}?fbclid=IwAR{random.getrandbits(32):08x}",
+    lambda url: url.replace("https://", "http://", 1),
+    lambda url: url.replace("https://news.", "https://amp.news.", 1) + "/amp",
+    lambda url: url.replace("https://news.example.com/", "https://www.news.example.com/amp/", 1),
+    lambda url: url.replace("https://", "https://news-example-com.cdn.ampproject.org/c/s/", 1),
+]
+
+def url_variant(url: str) -> str:
+    """同一篇文章的另一种 URL 写法 (跟踪参数、http、AMP 版本……)"""
+    return random.choice(URL_VARIANTS)(url)
+
+class FakeGNewsServer:
+    """
+    在后台线程中运行的假 GNews 服务器。
+    - latency: 每个请求的固定延迟 (秒)
+    - jitter: 额外的随机延迟上限 (秒)
+    - error_rate: 以该概率返回 429 (带 Retry-After 头)
+    - duplicate_ratio: 文章是 "转载" 的概率 (用于近似重复检测)
+    - snippet_words: 每篇文章摘要的单词数 (模拟长摘要)
+    - publish_interval: 每个主题每隔多少秒发布一篇文章 (文章序号和发布时间固定，重复请求会看到同样的文章)
+    - quiet_ratio / quiet_days: 这个比例的主题在 quiet_days 天前就停止了发布 (模拟安静的主题)
+    - url_variant_ratio: 每次返回文章时以该概率换成另一种 URL 写法 (模拟跟踪参数和 AMP 链接)
+    响应支持 'from' / 'to' / 'page' / 'max' 参数，按发布时间倒序，totalArticles 为窗口内的总数。
+    advance() 推进模拟时钟 (基准测试用它模拟两次运行之间过去的时间)。
+    """
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 0.1, duplicate_ratio: float = 0.0, snippet_words: int = 30,
+                 publish_interval: float = 60.0, quiet_ratio: float = 0.0, quiet_days: float = 3.0,
+                 history_days: float = 30.0, url_variant_ratio: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.duplicate_ratio = duplicate_ratio
+        self.snippet_words = snippet_words
+        self.publish_interval = publish_interval
+        self.quiet_ratio = quiet_ratio
+        self.url_variant_ratio = url_variant_ratio
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.epoch = self.started_at - timedelta(days=history_days)
+        self.quiet_since = self.started_at - timedelta(days=quiet_days)
+        self.clock_offset = timedelta(0)
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def now(self) -> datetime:
+        """模拟时钟的当前时间"""
+        return datetime.now(timezone.utc) + self.clock_offset
+
+    def advance(self, hours: float):
+        self.clock_offset += timedelta(hours=hours)
+
+    def is_quiet(self, keyword: str) -> bool:
+        return random.Random(f"quiet/{keyword}").random() < self.quiet_ratio
+
+    def _index_at(self, moment: datetime) -> float:
+        """moment 时刻对应的文章序号 (序号 i 的发布时间为 epoch + i * publish_interval)"""
+        return (moment - self.epoch).total_seconds() / self.publish_interval
+
+    def search(self, keyword: str, count: int, page: int = 1,
+               since: datetime | None = None, until: datetime | None = None) -> dict:
+        """生成一页搜索结果 (按发布时间倒序)"""
+        newest_at = min(self.now(), self.quiet_since) if self.is_quiet(keyword) else self.now()
+        if until is not None:
+            newest_at = min(newest_at, until)
+        newest = math.floor(self._index_at(newest_at))
+        oldest = max(0, math.ceil(self._index_at(since))) if since is not None else 0
+        start = newest - (page - 1) * count
+        indices = range(start, max(oldest, start - count + 1) - 1, -1)
+        articles = [
+            make_fake_article(keyword, i, self.epoch + timedelta(seconds=i * self.publish_interval),
+                              self.duplicate_ratio, self.snippet_words)
+            for i in indices
+        ]
+        for article in articles:
+            if self.url_variant_ratio and random.random() < self.url_variant_ratio:
+                article["url"] = url_variant(article["url"])
+        return {"totalArticles": max(0, newest - oldest + 1), "articles": articles}
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v4/search"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                sleep(server.latency + random.random() * server.jitter)
+
+                if server.error_rate and random.random() < server.error_rate:
+                    self._send_json(429, {"errors": ["Too many requests"]},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+
+                query = parse_qs(urlparse(self.path).query)
+                bounds = {
+                    key: datetime.fromisoformat(query[key][0].replace("Z", "+00:00"))
+                    for key in ("from", "to") if key in query
+                }
+                self._send_json(200, server.search(
+                    query.get("q", ["topic"])[0],
+                    int(query.get("max", ["10"])[0]),
+                    int(query.get("page", ["1"])[0]),
+                    bounds.get("from"), bounds.get("to")
+                ))
+
+        return Handler
+
+    def start(self) -> "FakeGNewsServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,247 @@
+import re
+import json
+import random
+import threading
+from time import sleep, time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# -----------------------------------------------------------------
+# 本地假 OpenAI 兼容服务器 (Fake OpenAI-compatible Server)
+# -----------------------------------------------------------------
+# 模拟 'POST /v1/chat/completions'，按提示词中的格式化指令 (或 tools / response_format 中的 schema)
+# 判断调用类型 (L1 单篇 / L1 批量 / L2 map / L2 报告)，返回能通过 Pydantic 校验的 JSON；
+# 请求带 tools 时以工具调用的形式返回。
+# 同一调用类型的提示词与上一次请求的公共前缀计为 "命中前缀缓存" (usage.prompt_tokens_details.cached_tokens)，
+# 用来比较不同提示词布局对供应商前缀缓存的友好程度。
+# 通过 OPENAI_BASE_URL 指向它即可，不消耗真实 API 配额。
+
+ENTITY_TYPES = ['COMPANY', 'PRODUCT', 'PERSON', 'TECHNOLOGY', 'EVENT', 'OTHER']
+SENTIMENT_LABELS = [(-1.0, 'Negative'), (-0.2, 'Neutral'), (0.2, 'Positive')]
+
+def estimate_tokens(text: str) -> int:
+    """与 analysis.estimate_tokens 相同的粗略估算 (这里不导入流水线模块)"""
+    cjk_chars = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af')
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
+
+def common_prefix_length(a: str, b: str) -> int:
+    """两个字符串公共前缀的长度"""
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+def classify_prompt(prompt: str) -> str:
+    """根据格式化指令 (或 schema) 中的 JSON 字段判断调用类型"""
+    if '"partial_summary"' in prompt:
+        return "l2_map"
+    if '"report_summary"' in prompt:
+        return "l2_report"
+    if '"results"' in prompt:
+        return "l1_batch"
+    return "l1"
+
+def make_l1_analysis(rng: random.Random, entity_pool: int) -> dict:
+    """一篇文章的假 L1 分析 (实体从固定大小的实体池中抽取，让热门实体统计有意义)"""
+    score = round(rng.uniform(-1.0, 1.0), 2)
+    label = [name for threshold, name in SENTIMENT_LABELS if score >= threshold][-1]
+    entities = [
+        {"name": f"Entity {n}", "type": ENTITY_TYPES[n % len(ENTITY_TYPES)]}
+        for n in sorted({int(rng.paretovariate(1.2)) % entity_pool for _ in range(rng.randint(1, 4))})
+    ]
+    return {
+        "ai_summary": "这是一段由本地假 LLM 服务器生成的摘要，用于基准测试。",
+        "sentiment_label": label,
+        "sentiment_score": score,
+        "entities": entities,
+    }
+
+def make_completion(kind: str, prompt: str, rng: random.Random, entity_pool: int) -> dict:
+    """按调用类型生成结构化输出"""
+    if kind == "l1_batch":
+        article_ids = [int(i) for i in re.findall(r'"article_id":(\d+)', prompt)]
+        return {"results": [{"article_id": i, **make_l1_analysis(rng, entity_pool)} for i in article_ids]}
+    if kind == "l2_map":
+        return {
+            "partial_summary": "本部分文章的要点摘要 (假 LLM)。",
+            "key_developments": [f"进展 {i}" for i in range(1, 4)],
+        }
+    if kind == "l2_report":
+        return {
+            "report_summary": "这是由本地假 LLM 服务器生成的每日简报，用于基准测试。",
+            "overall_sentiment_score": round(rng.uniform(-1.0, 1.0), 2),
+            "trending_topics": [],
+        }
+    return make_l1_analysis(rng, entity_pool)
+
+class FakeOpenAIServer:
+    """
+    在后台线程中运行的假 OpenAI 兼容服务器。
+    - latency: 每个请求的固定延迟 (秒)
+    - jitter: 额外的随机延迟上限 (秒)
+    - error_rate: 以该概率返回 500
+    - rate_limit_rate: 以该概率返回 429 (带 Retry-After 头)
+    - max_concurrency: 同时处理的请求数上限，超出的请求立即返回 429 (0 表示不限，模拟供应商的并发配额)
+    - ms_per_1k_tokens: 每 1000 个 (未命中缓存的提示词 + 输出) token 额外增加的延迟 (毫秒)
+    - entity_pool: 假实体的总数
+    按调用类型统计请求数、错误数和 token 数 (见 stats / reset_stats)。
+    """
+    def __init__(self, latency: float = 0.3, jitter: float = 0.2, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 0.5, entity_pool: int = 200,
+                 max_concurrency: int = 0, ms_per_1k_tokens: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.entity_pool = entity_pool
+        self.max_concurrency = max_concurrency
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.in_flight = 0
+        self._last_prompt = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """OPENAI_BASE_URL (含 /v1)"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, kind: str, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                self._stats[kind][key] += value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+            self._last_prompt.clear()
+
+    def _cached_tokens(self, kind: str, prompt: str) -> int:
+        """与同类型上一次请求的公共前缀 token 数 (模拟供应商的前缀缓存)"""
+        with self._lock:
+            previous = self._last_prompt.get(kind, "")
+            self._last_prompt[kind] = prompt
+        return estimate_tokens(prompt[:common_prefix_length(previous, prompt)])
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+                    return
+
+                # 工具和 response_format 中的 schema 同样计入提示词 (供应商按 token 计费，且位于消息之前)
+                parts = [json.dumps(request[key], ensure_ascii=False, separators=(',', ':'))
+                         for key in ("tools", "response_format") if key in request]
+                parts += [str(m.get("content", "")) for m in request.get("messages", [])]
+                prompt = "\n".join(parts)
+                kind = classify_prompt(prompt)
+                server._count(kind, requests=1)
+                with server._lock:
+                    over_capacity = bool(server.max_concurrency) and server.in_flight >= server.max_concurrency
+                    if not over_capacity:
+                        server.in_flight += 1
+                if over_capacity:
+                    server._count(kind, rate_limited=1)
+                    self._send_json(429, {"error": {"message": "Too many concurrent requests", "type": "rate_limit_error"}},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+                try:
+                    self._respond(kind, prompt, request)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _respond(self, kind: str, prompt: str, request: dict):
+                content = json.dumps(
+                    make_completion(kind, prompt, random.Random(), server.entity_pool), ensure_ascii=False
+                )
+                prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+                cached_tokens = server._cached_tokens(kind, prompt)
+                token_latency = server.ms_per_1k_tokens * (prompt_tokens - cached_tokens + completion_tokens) / 1e6
+                sleep(server.latency + random.random() * server.jitter + token_latency)
+
+                roll = random.random()
+                if roll < server.rate_limit_rate:
+                    server._count(kind, rate_limited=1)
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+                if roll < server.rate_limit_rate + server.error_rate:
+                    server._count(kind, errors=1)
+                    self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                    return
+
+                server._count(kind, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens,
+                              completion_tokens=completion_tokens)
+                message = {"role": "assistant", "content": content}
+                if request.get("tools"):
+                    tool_name = request["tools"][0]["function"]["name"]
+                    message = {"role": "assistant", "content": None, "tool_calls": [{
+                        "id": f"call_fake_{time():.6f}",
+                        "type": "function",
+                        "function": {"name": tool_name, "arguments": content},
+                    }]}
+                self._send_json(200, {
+                    "id": f"chatcmpl-fake-{time():.6f}",
+                    "object": "chat.completion",
+                    "created": int(time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if "tool_calls" in message else "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                    },
+                })
+
+        return Handler
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
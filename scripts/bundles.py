@@ -0,0 +1,189 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import argparse
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+try:
+    from .storage import get_storage
+    from .metrics import inc
+except ImportError:
+    from storage import get_storage
+    from metrics import inc
+
+# -----------------------------------------------------------------
+# 前端静态数据包 (Static Data Bundles)
+# -----------------------------------------------------------------
+#
+# 前端每切换一次日期、每点一次 treemap / 文章，都要实时查询 Supabase
+# (daily_reports -> l1_analysis_entities -> article_entity_map -> raw_articles -> l1_analysis_sentiment)。
+# L2 报告生成后，这里把某天的全部数据预先打成一个 gzip 压缩的 JSON 包，和静态网站一起部署:
+#   data/bundles/<日期>.<内容哈希>.json.gz   (文件名带内容哈希，内容不变时文件名不变，可以长期缓存)
+#   data/manifest.json                       (日期 -> 数据包路径，前端每次加载时读取)
+# 数据包内容: 当天各分类的报告 (含 treemap 数据)、热门实体 -> 文章的索引、文章的 L1 摘要和情感。
+# js/app.js 先查清单，有数据包的日期所有下钻都在本地完成，没有的日期才实时查询。
+#
+# 常量定义 (Constants)
+BUNDLES_ENABLED = os.environ.get("BUNDLES_ENABLED", "true").lower() == "true"
+BUNDLE_DIR = os.environ.get(
+    "BUNDLE_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'data')
+)
+# 数据包格式版本 (前端只加载自己认识的版本，其余按没有数据包处理)
+BUNDLE_VERSION = 1
+# 每个热门实体最多收录的文章数 (更多的文章由前端 "加载更多" 实时查询)
+BUNDLE_MAX_ARTICLES_PER_ENTITY = int(os.environ.get("BUNDLE_MAX_ARTICLES_PER_ENTITY", "50"))
+# 只保留最近 N 天的数据包 (更早的日期由前端实时查询)
+BUNDLE_RETENTION_DAYS = int(os.environ.get("BUNDLE_RETENTION_DAYS", "90"))
+
+_BUNDLE_FILE = re.compile(r"^(?P<date>\d{4}-\d{2}-\d{2})\.(?P<hash>[0-9a-f]{12})\.json\.gz$")
+
+
+def build_bundle(report_date: str, start_date: str | None = None) -> Dict[str, Any] | None:
+    """
+    读取某天的报告和热门实体的文章，组装成数据包；这一天没有报告时返回 None。
+    实体文章的时间范围与热门实体统计一致: [start_date 00:00, report_date 次日 00:00)。
+    """
+    storage = get_storage()
+    reports = storage.fetch_reports(report_date)
+    if not reports:
+        return None
+
+    entity_names = sorted({
+        topic['topic'] for report in reports for topic in (report.get('trending_topics') or []) if topic.get('topic')
+    })
+    since = start_date or report_date
+    until = str(date.fromisoformat(report_date) + timedelta(days=1))
+    # 多取一篇，用来判断实体的文章是否被截断
+    rows = storage.fetch_entity_articles(entity_names, since, until, BUNDLE_MAX_ARTICLES_PER_ENTITY + 1)
+
+    # 文章只存一份，实体里只放 article_id (与 get_entity_drilldown 一样按 article_id 倒序)
+    entities: Dict[str, List[int]] = {name: [] for name in entity_names}
+    truncated = set()
+    articles: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        if len(entities[row['entity_name']]) >= BUNDLE_MAX_ARTICLES_PER_ENTITY:
+            truncated.add(row['entity_name'])
+            continue
+        entities[row['entity_name']].append(row['article_id'])
+        articles.setdefault(str(row['article_id']), {
+            "title": row['title'],
+            "url": row['url'],
+            "source_name": row.get('source_name'),
+            "publication_date": str(row['publication_date']) if row.get('publication_date') else None,
+            "ai_summary": row.get('ai_summary'),
+            "sentiment_label": row.get('sentiment_label'),
+            "sentiment_score": row.get('sentiment_score'),
+        })
+
+    return {
+        "version": BUNDLE_VERSION,
+        "report_date": report_date,
+        "reports": [
+            {
+                "report_date": str(report['report_date']),
+                "category": report['category'],
+                "report_summary": report.get('report_summary'),
+                "overall_sentiment_score": report.get('overall_sentiment_score'),
+                "trending_topics": report.get('trending_topics') or [],
+            }
+            for report in reports
+        ],
+        "entities": entities,
+        # 文章数超过上限的实体: 前端显示 "加载更多"，从最后一篇起用 get_entity_drilldown 继续翻页
+        "truncated": sorted(truncated),
+        "articles": articles,
+    }
+
+def write_bundle(bundle: Dict[str, Any], bundle_dir: str = BUNDLE_DIR) -> Dict[str, Any]:
+    """
+    写入 gzip 压缩的数据包 (文件名带内容哈希；mtime 固定为 0，相同内容得到相同的文件)，
+    并删除同一天的旧版本。返回清单条目。
+    """
+    raw = json.dumps(bundle, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    compressed = gzip.compress(raw, compresslevel=9, mtime=0)
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    bundles_dir = os.path.join(bundle_dir, "bundles")
+    os.makedirs(bundles_dir, exist_ok=True)
+
+    filename = f"{bundle['report_date']}.{digest}.json.gz"
+    path = os.path.join(bundles_dir, filename)
+    with open(path + ".tmp", 'wb') as f:
+        f.write(compressed)
+    os.replace(path + ".tmp", path)
+    for other in os.listdir(bundles_dir):
+        match = _BUNDLE_FILE.match(other)
+        if match and match.group("date") == bundle['report_date'] and other != filename:
+            os.remove(os.path.join(bundles_dir, other))
+
+    inc("bundle_bytes_total", len(compressed))
+    return {"path": f"bundles/{filename}", "bytes": len(compressed), "raw_bytes": len(raw)}
+
+def write_bundle_manifest(bundle_dir: str = BUNDLE_DIR, retention_days: int = BUNDLE_RETENTION_DAYS) -> Dict[str, Any]:
+    """
+    扫描 bundles 目录重建 data/manifest.json (同一天只应有一个数据包)，
+    并删除超过保留天数的数据包。
+    """
+    bundles_dir = os.path.join(bundle_dir, "bundles")
+    cutoff = str(datetime.now(timezone.utc).date() - timedelta(days=retention_days))
+    dates = {}
+    for filename in sorted(os.listdir(bundles_dir)) if os.path.isdir(bundles_dir) else []:
+        match = _BUNDLE_FILE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(bundles_dir, filename)
+        if match.group("date") < cutoff:
+            os.remove(path)
+            continue
+        dates[match.group("date")] = {"path": f"bundles/{filename}", "bytes": os.path.getsize(path)}
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "dates": dict(sorted(dates.items(), reverse=True)),
+    }
+    os.makedirs(bundle_dir, exist_ok=True)
+    path = os.path.join(bundle_dir, "manifest.json")
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+def publish_bundle(report_date: str, start_date: str | None = None, bundle_dir: str = BUNDLE_DIR) -> Dict[str, Any] | None:
+    """生成并写入某天的数据包，再更新清单；这一天没有报告时只更新清单"""
+    bundle = build_bundle(report_date, start_date)
+    entry = write_bundle(bundle, bundle_dir) if bundle else None
+    write_bundle_manifest(bundle_dir)
+    return entry
+
+def main(argv: List[str] | None = None):
+    """
+    命令行: 为指定日期 (默认今天) 重新生成数据包，或只重建清单。
+    python -m scripts.bundles --date 2025-06-01 --date 2025-06-02
+    python -m scripts.bundles --manifest-only
+    """
+    parser = argparse.ArgumentParser(description="生成前端静态数据包 (data/bundles/*.json.gz 和 data/manifest.json)")
+    parser.add_argument("--date", action="append", dest="dates", help="报告日期 YYYY-MM-DD，可重复 (默认今天，UTC)")
+    parser.add_argument("--manifest-only", action="store_true", help="只根据已有的数据包重建清单")
+    parser.add_argument("--dir", default=BUNDLE_DIR, help="输出目录")
+    args = parser.parse_args(argv)
+
+    if args.manifest_only:
+        manifest = write_bundle_manifest(args.dir)
+        print(f"🟢 清单已更新: {len(manifest['dates'])} 个日期。")
+        return
+    for report_date in args.dates or [str(datetime.now(timezone.utc).date())]:
+        bundle = build_bundle(report_date)
+        if bundle is None:
+            print(f"⏹️ {report_date} 没有报告，跳过。")
+            continue
+        entry = write_bundle(bundle, args.dir)
+        print(f"  > {report_date}: {entry['path']} ({entry['bytes'] / 1024:.1f} KB，压缩前 {entry['raw_bytes'] / 1024:.1f} KB)")
+    manifest = write_bundle_manifest(args.dir)
+    print(f"🟢 清单已更新: {len(manifest['dates'])} 个日期。")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,67 @@
 import os
+import random
+import asyncio
+import functools
 import httpx
-from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from time import monotonic
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from tqdm import tqdm
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Tuple
 
 # 导入我们自己的数据库客户端
 # .db 会自动找到同目录下的 db.py
-from .db import get_db_client
+from .storage import get_storage
+from .dedupe import NearDuplicateIndex, article_signature
+from .url_filter import KnownUrlFilter, URL_FILTER_ENABLED, clean_url, load_known_url_filter
+from .metrics import span, inc, httpx_event_hooks, write_run_report
 
 # -----------------------------------------------------------------
 # 常量定义 (Constants)
 # -----------------------------------------------------------------
-NEWS_API_BASE_URL = "https://gnews.io/api/v4/search"
+NEWS_API_BASE_URL = os.environ.get("NEWS_API_BASE_URL", "https://gnews.io/api/v4/search")
 # 为避免 API 滥用和控制 AI 成本，我们只取每个主题最新的 20 篇文章
 ARTICLES_PER_TOPIC = 30
 
+# --- 异步爬取模式 (async) 的配置 ---
+# 'async': 共享一个 keep-alive 的 httpx.AsyncClient 并发抓取; 'sequential': 旧的逐个主题模式
+CRAWLER_MODE = os.environ.get("CRAWLER_MODE", "async")
+# 同时在途的 GNews 请求上限
+CRAWLER_CONCURRENCY = int(os.environ.get("CRAWLER_CONCURRENCY", "4"))
+# 令牌桶: 每秒补充的请求数 和 桶容量 (允许的突发请求数)，按你的 GNews 套餐配额调整
+GNEWS_REQUESTS_PER_SECOND = float(os.environ.get("GNEWS_REQUESTS_PER_SECOND", "1"))
+GNEWS_BURST = int(os.environ.get("GNEWS_BURST", "1"))
+# 429 / 5xx / 网络错误的最大重试次数，以及指数退避的基准秒数
+CRAWLER_MAX_RETRIES = int(os.environ.get("CRAWLER_MAX_RETRIES", "3"))
+CRAWLER_BACKOFF_BASE = float(os.environ.get("CRAWLER_BACKOFF_BASE", "1.0"))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# --- 近似重复检测 (见 dedupe.py) ---
+DEDUPE_ENABLED = os.environ.get("DEDUPE_ENABLED", "true").lower() == "true"
+# 新文章只与最近 N 天内爬取的文章比较 (转载通常在几天内出现)
+DEDUPE_WINDOW_DAYS = int(os.environ.get("DEDUPE_WINDOW_DAYS", "7"))
+# 加载指纹时每页的行数 (不超过 PostgREST 的默认行数上限)
+DB_PAGE_SIZE = 1000
+
+# --- 文章来源 (见 ArticleSource) ---
+# 按顺序运行的来源: 'gnews' (需要 NEWS_API_KEY)、'rss' (需要 RSS_FEEDS，见 rss_source.py)；未配置的来源自动跳过
+CRAWLER_SOURCES = [s.strip() for s in os.environ.get("CRAWLER_SOURCES", "gnews,rss").split(',') if s.strip()]
+
+# --- 增量爬取 (水位线) ---
+# 每个主题记录已入库的最新发布时间 (tracked_topics.last_published_at)，下次只请求更新的文章 (GNews 'from')，
+# 一次运行中新文章超过一页时继续翻页；连续没有新文章的 "安静" 主题按指数退避降低轮询频率 (next_crawl_at)。
+# 翻页达到 CRAWL_MAX_PAGES 时，没取到的较早区间记为 backfill_since / backfill_until，下次运行以它为 'to' 补爬。
+INCREMENTAL_CRAWL = os.environ.get("INCREMENTAL_CRAWL", "true").lower() == "true"
+# 还没有水位线的主题 (首次爬取) 回看多少小时
+CRAWL_INITIAL_LOOKBACK_HOURS = float(os.environ.get("CRAWL_INITIAL_LOOKBACK_HOURS", "24"))
+# 每个主题每次运行最多请求的页数 (每页 ARTICLES_PER_TOPIC 篇)
+CRAWL_MAX_PAGES = max(1, int(os.environ.get("CRAWL_MAX_PAGES", "5")))
+# 连续 k 次没有新文章后，下次轮询间隔为 基数 * 2^(k-1) 小时，不超过上限。
+# 基数略小于每天一次的定时任务间隔: 安静一次的主题下次照常爬取，之后隔天、隔三天……
+CRAWL_IDLE_BASE_HOURS = float(os.environ.get("CRAWL_IDLE_BASE_HOURS", "20"))
+CRAWL_IDLE_MAX_HOURS = float(os.environ.get("CRAWL_IDLE_MAX_HOURS", "168"))
+
 
 def fetch_topics_from_db() -> List[Dict[str, Any]]:
     """
@@ -22,19 +69,78 @@ def fetch_topics_from_db() -> List[Dict[str, Any]]:
     [对应 schema.sql 表 1]
     """
     print("  (Crawler Step 1/3) 正在从数据库获取追踪主题...")
-    db = get_db_client()
     try:
-        response = db.table("tracked_topics").select("*").eq("is_active", True).execute()
-        topics = response.data
+        topics = get_storage().fetch_active_topics()
         tqdm.write(f"  > 成功获取 {len(topics)} 个激活的主题。")
         return topics
     except Exception as e:
         tqdm.write(f"🔴 错误: 无法从 'tracked_topics' 表获取数据: {e}")
         return []
 
-def fetch_articles_from_api(topic: Dict[str, Any], api_key: str) -> List[Dict[str, Any]]:
+# 爬取的发布时间窗口 (since, until)，任一端为 None 表示不限
+SearchWindow = Tuple[datetime | None, datetime | None]
+
+def utc_now() -> datetime:
+    """当前 UTC 时间 (基准测试会替换为假服务器的模拟时钟)"""
+    return datetime.now(timezone.utc)
+
+def parse_timestamp(value: Any) -> datetime | None:
+    """解析 GNews / 数据库返回的时间 ('...Z'、'+00:00' 或无时区的 UTC 时间)，无法解析时返回 None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def topic_watermark(topic: Dict[str, Any]) -> datetime | None:
+    """主题的水位线: 已入库文章中最新的发布时间"""
+    return parse_timestamp(topic.get('last_published_at'))
+
+def is_topic_due(topic: Dict[str, Any], now: datetime) -> bool:
+    """主题是否到了轮询时间 (从未爬取过或 next_crawl_at 已过)"""
+    next_crawl_at = parse_timestamp(topic.get('next_crawl_at'))
+    return next_crawl_at is None or next_crawl_at <= now
+
+def idle_interval(idle_runs: int) -> timedelta | None:
+    """连续 idle_runs 次没有新文章后的轮询间隔；有新文章 (idle_runs 为 0) 时返回 None，即每次运行都爬取"""
+    if idle_runs <= 0:
+        return None
+    return timedelta(hours=min(CRAWL_IDLE_MAX_HOURS, CRAWL_IDLE_BASE_HOURS * 2 ** min(idle_runs - 1, 16)))
+
+def topic_backfill(topic: Dict[str, Any]) -> SearchWindow | None:
+    """增量模式下主题上次没爬完的区间 (backfill_since, backfill_until)，没有时返回 None"""
+    since, until = parse_timestamp(topic.get('backfill_since')), parse_timestamp(topic.get('backfill_until'))
+    return (since, until) if INCREMENTAL_CRAWL and since and until else None
+
+def merge_windows(*windows: SearchWindow | None) -> SearchWindow | None:
+    """
+    合并几个没爬完的区间 (取覆盖它们的最小区间)。
+    两个区间之间已入库的部分下次会被重复请求，由 URL 去重，不会漏掉文章。
+    """
+    windows = [w for w in windows if w]
+    if not windows:
+        return None
+    return min(w[0] for w in windows), max(w[1] for w in windows)
+
+def incremental_since(topic: Dict[str, Any]) -> datetime | None:
+    """增量模式下请求的起点: 主题的水位线；首次爬取时回看 CRAWL_INITIAL_LOOKBACK_HOURS"""
+    if not INCREMENTAL_CRAWL:
+        return None
+    return topic_watermark(topic) or utc_now() - timedelta(hours=CRAWL_INITIAL_LOOKBACK_HOURS)
+
+def format_gnews_time(value: datetime) -> str:
+    """GNews 'from' / 'to' 参数的格式: UTC 的 ISO 8601 (naive 时间按本地时区处理)"""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def build_search_params(topic: Dict[str, Any], api_key: str, window: SearchWindow | None = None) -> Dict[str, Any]:
     """
-    根据单个主题，调用 NewsAPI 获取文章。
+    为单个主题构造 GNews 搜索参数 (同步与异步模式共用)。
+    指定 window 时只搜索该时间窗口内发布的文章 (用于补爬历史日期)，否则增量模式下从主题的水位线开始。
     """
     db_keyword = topic.get('keyword', '')
     db_category = topic.get('category', '')
@@ -43,9 +149,6 @@ def fetch_articles_from_api(topic: Dict[str, Any], api_key: str) -> List[Dict[st
     # 我们将它们组合使用，并用 'NOT 政治' 来规避风险
     query = db_keyword
     
-    # 计算一天前的时间，只看最新的
-    yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-    
     params = {
         "q": query,
         "lang": "en",
@@ -53,16 +156,92 @@ def fetch_articles_from_api(topic: Dict[str, Any], api_key: str) -> List[Dict[st
         "sortby": "publishedAt",
         "apikey": api_key,   # ✅ 官方推荐命名
     }
+    since, until = window or (incremental_since(topic), None)
+    if since:
+        params["from"] = format_gnews_time(since)
+    if until:
+        params["to"] = format_gnews_time(until)
+    return params
+
+def page_params(params: Dict[str, Any], page: int) -> Dict[str, Any]:
+    """第 page 页的请求参数 (第一页与不翻页时的请求相同)"""
+    return params if page == 1 else {**params, "page": page}
+
+def has_next_page(
+    params: Dict[str, Any],
+    api_data: Dict[str, Any],
+    page_articles: List[Dict[str, Any]],
+    page: int,
+    watermark: datetime | None
+) -> bool:
+    """
+    是否还有下一页: 只在有起点 ('from') 的请求中翻页，
+    且本页是满的、总数表明还有更多、还没有翻到水位线之前的文章 (结果按发布时间倒序)。
+    页数上限 CRAWL_MAX_PAGES 由调用方判断 (见 unfetched_window)。
+    """
+    if "from" not in params or len(page_articles) < int(params["max"]):
+        return False
+    if page * int(params["max"]) >= (api_data.get("totalArticles") or 0):
+        return False
+    oldest = parse_timestamp(page_articles[-1].get("publishedAt"))
+    return watermark is None or oldest is None or oldest > watermark
+
+def unfetched_window(params: Dict[str, Any], articles: List[Dict[str, Any]]) -> SearchWindow:
+    """
+    翻页达到 CRAWL_MAX_PAGES 但还有下一页时，没取到的较早区间: 从请求的 'from' 到已取到的最早发布时间
+    (无法解析发布时间时取整个请求窗口，宁可重复请求也不漏掉文章)。
+    """
+    since = parse_timestamp(params["from"])
+    published = [p for p in (parse_timestamp(a.get("publishedAt")) for a in articles) if p]
+    until = min(published, default=None) or parse_timestamp(params.get("to")) or utc_now()
+    tqdm.write(f"🟡 警告: 主题 '{params['q']}' 的文章超过 {CRAWL_MAX_PAGES} 页，"
+               f"{format_gnews_time(since)} ~ {format_gnews_time(until)} 之间的文章本次没有取到。")
+    inc("gnews_page_limit_reached_total")
+    return since, until
+
+def drop_seen_articles(articles: List[Dict[str, Any]], watermark: datetime | None) -> List[Dict[str, Any]]:
+    """
+    去掉发布时间早于水位线的文章：它们已经入库，不必再放进 upsert 请求。
+    与水位线同一秒发布的文章要保留 (GNews 的 'from' 包含边界，上次运行可能只拿到了其中一部分)，
+    已入库的那些由 URL 过滤器和 upsert 去重。
+    """
+    if watermark is None:
+        return articles
+    fresh = [a for a in articles if (parse_timestamp(a.get("publishedAt")) or utc_now()) >= watermark]
+    inc("gnews_articles_seen_total", len(articles) - len(fresh))
+    return fresh
+
+def fetch_articles_from_api(
+    topic: Dict[str, Any],
+    api_key: str,
+    window: SearchWindow | None = None
+) -> Tuple[List[Dict[str, Any]], SearchWindow | None] | None:
+    """
+    根据单个主题，调用 NewsAPI 获取文章 (增量模式下翻页取完水位线之后的新文章)。
+    返回 (文章, 因页数上限没取到的区间 或 None)；
+    请求失败时返回 None (区别于 "没有新文章"，失败的主题不更新水位线)。
+    """
+    db_keyword = topic.get('keyword', '')
+    params = build_search_params(topic, api_key, window)
+    watermark = topic_watermark(topic) if window is None and INCREMENTAL_CRAWL else None
 
     try:
-        with httpx.Client(timeout=10.0) as client:
-            response = client.get(NEWS_API_BASE_URL, params=params)
-            response.raise_for_status() # 如果 API 返回 4xx 或 5xx，将引发异常
-            
-            api_data = response.json()
-            articles = api_data.get("articles", [])
-            tqdm.write(f"  > API 返回: 主题 '{db_keyword}' 找到 {len(articles)} 篇文章。")
-            return articles
+        articles, unfetched = [], None
+        with httpx.Client(timeout=10.0, event_hooks=httpx_event_hooks("gnews")) as client:
+            for page in range(1, CRAWL_MAX_PAGES + 1):
+                response = client.get(NEWS_API_BASE_URL, params=page_params(params, page))
+                response.raise_for_status() # 如果 API 返回 4xx 或 5xx，将引发异常
+                
+                api_data = response.json()
+                page_articles = api_data.get("articles", [])
+                inc("gnews_articles_total", len(page_articles))
+                articles.extend(page_articles)
+                if not has_next_page(params, api_data, page_articles, page, watermark):
+                    break
+            else:
+                unfetched = unfetched_window(params, articles)
+        tqdm.write(f"  > API 返回: 主题 '{db_keyword}' 找到 {len(articles)} 篇文章" + (f" ({page} 页)。" if page > 1 else "。"))
+        return drop_seen_articles(articles, watermark), unfetched
             
     except httpx.HTTPStatusError as e:
         tqdm.write(f"🔴 错误: NewsAPI 请求失败 (HTTP {e.response.status_code})，主题: {db_keyword}")
@@ -71,90 +250,593 @@ def fetch_articles_from_api(topic: Dict[str, Any], api_key: str) -> List[Dict[st
     except Exception as e:
         tqdm.write(f"🔴 错误: API 数据解析失败: {e}")
     
-    return []
+    return None
+
+def fetch_topic_articles(
+    topic: Dict[str, Any],
+    api_key: str,
+    window: SearchWindow | None = None
+) -> Tuple[List[Dict[str, Any]], SearchWindow | None] | None:
+    """
+    一个主题本次的全部请求: 先取水位线之后的新文章，主题还有上次没爬完的区间时再补爬该区间。
+    返回 (文章, 之后仍没爬完的区间 或 None)；任何一次请求失败时返回 None。
+    """
+    fresh = fetch_articles_from_api(topic, api_key, window)
+    backfill = topic_backfill(topic) if window is None else None
+    if fresh is None or backfill is None:
+        return fresh
+    older = fetch_articles_from_api(topic, api_key, backfill)
+    if older is None:
+        return None
+    return fresh[0] + older[0], merge_windows(fresh[1], older[1])
+
+def load_near_duplicate_index(days: int = DEDUPE_WINDOW_DAYS) -> NearDuplicateIndex:
+    """
+    把最近 N 天文章的 MinHash 签名加载到内存中的 LSH 索引 (按 article_id 分页读取)。
+    """
+    storage = get_storage()
+    index = NearDuplicateIndex()
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    last_id = 0
+    while True:
+        rows = storage.fetch_signature_page(since, last_id, DB_PAGE_SIZE)
+        for row in rows:
+            index.add(row['article_id'], row['minhash_signature'], row['canonical_article_id'])
+        if len(rows) < DB_PAGE_SIZE:
+            return index
+        last_id = rows[-1]['article_id']
+
+def link_near_duplicates(inserted_rows: List[Dict[str, Any]], dedupe_index: NearDuplicateIndex) -> int:
+    """
+    为新插入的文章在 LSH 索引中查找近似重复，并通过一次 RPC 记录它们所属的簇。
+    返回被识别为近似重复的文章数。
+    """
+    links = []
+    for row in sorted(inserted_rows, key=lambda r: r['article_id']):
+        if not row.get('minhash_signature'):
+            continue
+        canonical_id = dedupe_index.assign(row['article_id'], row['minhash_signature'])
+        if canonical_id is not None:
+            links.append({"article_id": row['article_id'], "canonical_article_id": canonical_id})
+
+    if links:
+        get_storage().set_canonical_articles(links)
+        inc("near_duplicates_total", len(links))
+    return len(links)
 
-def save_articles_to_db(articles: List[Dict[str, Any]], topic_id: int):
+def save_articles_to_db(
+    articles: List[Dict[str, Any]],
+    topic_id: int,
+    dedupe_index: NearDuplicateIndex | None = None,
+    url_filter: KnownUrlFilter | None = None
+):
     """
-    将从 API 获取的文章列表存入数据库。
+    将从 API 获取的文章列表存入数据库 (URL 先去掉跟踪参数，见 url_filter.py)。
+    传入 dedupe_index 时，还会把新文章中的近似重复 (转载) 关联到它们的簇代表；
+    传入 url_filter 时，已入库的文章 (包括只是 URL 变体的) 在写库之前就被丢掉。
     [对应 schema.sql 表 2]
     """
     if not articles:
         return 0
         
-    db = get_db_client()
     new_articles_to_insert = []
     
     for article in articles:
+        url = clean_url(article.get("url"))
+        if url_filter is not None and url != article.get("url"):
+            url_filter.stats["cleaned"] += 1
         # 格式化数据以匹配我们的 'raw_articles' 表
         new_articles_to_insert.append({
             "topic_id": topic_id,
-            "url": article.get("url"),
+            "url": url,
             "title": article.get("title"),
             "snippet": article.get("description") or article.get("content"),
             "source_name": article.get("source", {}).get("name"),
             "publication_date": article.get("publishedAt"),
+            # 近似重复检测用的 MinHash 签名
+            "minhash_signature": article_signature(
+                article.get("title"), article.get("description") or article.get("content")
+            ),
             # crawl_date 会自动由数据库的 'DEFAULT now()' 填充
         })
 
+    if url_filter is not None:
+        new_articles_to_insert = url_filter.drop_known(new_articles_to_insert)
+        if not new_articles_to_insert:
+            return 0
+
     try:
         # **【核心成本控制】**
-        # on_conflict="url" 告诉数据库：如果 'url' 字段已存在，就忽略这行数据。
-        # 'ignore_duplicates=True' 是 Supabase-Python 库的写法。
+        # 'url' 字段已存在的文章会被忽略 (raw_articles.url 是唯一键)，
         # 这确保我们永远不会重复插入同一篇文章。
-        response = db.table("raw_articles").upsert(
-            new_articles_to_insert, 
-            on_conflict="url", 
-            ignore_duplicates=True
-        ).execute()
-        
-        # response.data 包含了 "新" 插入的数据条目
-        inserted_count = len(response.data)
-        return inserted_count
-        
+        # 返回值只包含 "新" 插入的数据条目
+        inserted_rows = get_storage().insert_articles(new_articles_to_insert)
+        inserted_count = len(inserted_rows)
+        inc("articles_inserted_total", inserted_count)
+        inc("articles_known_total", len(new_articles_to_insert) - inserted_count)
     except Exception as e:
+        # 抛给爬取循环: 该主题记为失败，水位线不前进，下次运行重新爬取这些文章
         tqdm.write(f"🔴 错误: 插入文章到 'raw_articles' 表失败: {e}")
-        return 0
+        raise
 
-def main():
+    if url_filter is not None:
+        url_filter.record_written(new_articles_to_insert, inserted_rows)
+    if dedupe_index is not None and inserted_rows:
+        try:
+            link_near_duplicates(inserted_rows, dedupe_index)
+        except Exception as e:
+            # 关联失败不影响文章本身，只是这些转载会被单独分析
+            tqdm.write(f"🟡 警告: 记录近似重复关系失败: {e}")
+    return inserted_count
+
+class CrawlStateTracker:
     """
-    爬虫主函数
+    收集本次运行中每个主题的爬取结果，结束时一次性写回水位线、没爬完的区间和下次轮询时间 (tracked_topics)。
+    请求或入库失败的主题不会被记录，下次运行照常从旧水位线 (和旧的未爬区间) 重新爬取。
     """
-    print("--- 爬虫脚本 (crawler.py) 启动 ---")
-    
-    news_api_key = os.environ.get("NEWS_API_KEY")
-    if not news_api_key:
-        print("🔴 错误: NEWS_API_KEY 环境变量未设置！爬虫无法运行。")
-        return
+    def __init__(self, now: datetime):
+        self.now = now
+        self.states: Dict[int, Dict[str, Any]] = {}
 
-    # 1. 获取要追踪的主题
-    topics = fetch_topics_from_db()
-    if not topics:
-        print("⏹️ 数据库中没有激活的主题。爬虫退出。")
-        return
-        
+    def record(
+        self,
+        topic: Dict[str, Any],
+        articles: List[Dict[str, Any]],
+        new_count: int,
+        unfetched: SearchWindow | None = None
+    ):
+        """
+        记录一个主题: 水位线前进到已入库文章的最新发布时间 (不超过当前时间)，没有新文章时累计空闲次数；
+        unfetched 是因页数上限没取到的区间，下次运行补爬 (补爬完之前主题不会被降频)。
+        """
+        published = [parse_timestamp(a.get("publishedAt")) for a in articles]
+        candidates = [p for p in published if p and p <= self.now]
+        watermark = max(candidates + ([topic_watermark(topic)] if topic_watermark(topic) else []), default=None)
+        idle_runs = 0 if new_count > 0 or unfetched else (topic.get('idle_runs') or 0) + 1
+        interval = idle_interval(idle_runs)
+        if unfetched:
+            tqdm.write(f"  > 主题 '{topic['keyword']}' 在 {format_gnews_time(unfetched[0])} ~ "
+                       f"{format_gnews_time(unfetched[1])} 之间还有文章没取到，下次运行补爬。")
+        self.states[topic['topic_id']] = {
+            "topic_id": topic['topic_id'],
+            "last_published_at": watermark.isoformat() if watermark else None,
+            "last_crawled_at": self.now.isoformat(),
+            "next_crawl_at": (self.now + interval).isoformat() if interval else None,
+            "idle_runs": idle_runs,
+            "backfill_since": unfetched[0].isoformat() if unfetched else None,
+            "backfill_until": unfetched[1].isoformat() if unfetched else None,
+        }
+
+    @property
+    def backfill_topics(self) -> int:
+        return sum(1 for state in self.states.values() if state["backfill_until"])
+
+    @property
+    def idle_topics(self) -> int:
+        return sum(1 for state in self.states.values() if state["idle_runs"] > 0)
+
+    def save(self) -> int:
+        """一次写回所有主题的状态，返回更新的主题数"""
+        if not self.states:
+            return 0
+        return get_storage().save_crawl_state(list(self.states.values()))
+
+# -----------------------------------------------------------------
+# 异步爬取模式 (Async Crawl Mode)
+# -----------------------------------------------------------------
+
+class TokenBucket:
+    """
+    简单的异步令牌桶限速器：每秒补充 `rate` 个令牌，最多积攒 `capacity` 个。
+    每个 GNews 请求 (包括重试) 都要先拿到一个令牌，确保不超过 API 配额。
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # 持有锁等待，保证令牌按请求到达的顺序发放
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    解析 'Retry-After' 响应头 (秒数 或 HTTP 日期)，返回需要等待的秒数。
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+async def fetch_page_async(
+    client: httpx.AsyncClient,
+    params: Dict[str, Any],
+    limiter: TokenBucket
+) -> Dict[str, Any] | None:
+    """
+    异步请求一页搜索结果：复用共享的 AsyncClient，
+    对 429/5xx/网络错误按指数退避 (加抖动) 重试，并优先遵循 'Retry-After'。失败时返回 None。
+    """
+    db_keyword = params.get('q', '')
+
+    for attempt in range(CRAWLER_MAX_RETRIES + 1):
+        await limiter.acquire()
+        delay = CRAWLER_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+        try:
+            response = await client.get(NEWS_API_BASE_URL, params=params)
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < CRAWLER_MAX_RETRIES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = retry_after
+                inc("gnews_retries_total", reason=str(response.status_code))
+                tqdm.write(f"🟡 警告: NewsAPI 返回 HTTP {response.status_code}，主题: {db_keyword}，{delay:.1f} 秒后重试...")
+                await asyncio.sleep(delay)
+                continue
+            response.raise_for_status()
+
+            api_data = response.json()
+            inc("gnews_articles_total", len(api_data.get("articles", [])))
+            return api_data
+
+        except httpx.HTTPStatusError as e:
+            tqdm.write(f"🔴 错误: NewsAPI 请求失败 (HTTP {e.response.status_code})，主题: {db_keyword}")
+            return None
+        except httpx.RequestError as e:
+            if attempt < CRAWLER_MAX_RETRIES:
+                inc("gnews_retries_total", reason="network")
+                tqdm.write(f"🟡 警告: 网络请求失败 ({e})，主题: {db_keyword}，{delay:.1f} 秒后重试...")
+                await asyncio.sleep(delay)
+                continue
+            tqdm.write(f"🔴 错误: 网络请求失败: {e}")
+            return None
+        except Exception as e:
+            tqdm.write(f"🔴 错误: API 数据解析失败: {e}")
+            return None
+
+    return None
+
+async def fetch_articles_async(
+    client: httpx.AsyncClient,
+    topic: Dict[str, Any],
+    api_key: str,
+    limiter: TokenBucket,
+    window: SearchWindow | None = None
+) -> Tuple[List[Dict[str, Any]], SearchWindow | None] | None:
+    """
+    异步版 fetch_articles_from_api：增量模式下逐页请求，直到取完水位线之后的新文章。
+    返回 (文章, 因页数上限没取到的区间 或 None)；任何一页失败时返回 None (该主题的水位线不更新)。
+    """
+    db_keyword = topic.get('keyword', '')
+    params = build_search_params(topic, api_key, window)
+    watermark = topic_watermark(topic) if window is None and INCREMENTAL_CRAWL else None
+
+    articles, unfetched = [], None
+    for page in range(1, CRAWL_MAX_PAGES + 1):
+        api_data = await fetch_page_async(client, page_params(params, page), limiter)
+        if api_data is None:
+            return None
+        page_articles = api_data.get("articles", [])
+        articles.extend(page_articles)
+        if not has_next_page(params, api_data, page_articles, page, watermark):
+            break
+    else:
+        unfetched = unfetched_window(params, articles)
+    tqdm.write(f"  > API 返回: 主题 '{db_keyword}' 找到 {len(articles)} 篇文章" + (f" ({page} 页)。" if page > 1 else "。"))
+    return drop_seen_articles(articles, watermark), unfetched
+
+async def fetch_topic_articles_async(
+    client: httpx.AsyncClient,
+    topic: Dict[str, Any],
+    api_key: str,
+    limiter: TokenBucket,
+    window: SearchWindow | None = None
+) -> Tuple[List[Dict[str, Any]], SearchWindow | None] | None:
+    """异步版 fetch_topic_articles：新文章之后补爬上次没爬完的区间"""
+    fresh = await fetch_articles_async(client, topic, api_key, limiter, window)
+    backfill = topic_backfill(topic) if window is None else None
+    if fresh is None or backfill is None:
+        return fresh
+    older = await fetch_articles_async(client, topic, api_key, limiter, backfill)
+    if older is None:
+        return None
+    return fresh[0] + older[0], merge_windows(fresh[1], older[1])
+
+async def crawl_topics_async(
+    topics: List[Dict[str, Any]],
+    api_key: str,
+    save_fn: Callable[[List[Dict[str, Any]], int], int] = save_articles_to_db,
+    concurrency: int = CRAWLER_CONCURRENCY,
+    limiter: TokenBucket | None = None,
+    window: SearchWindow | None = None,
+    on_topic_done: Callable[[Dict[str, Any], List[Dict[str, Any]], int, SearchWindow | None], None] | None = None
+) -> int:
+    """
+    并发抓取所有主题并返回新增文章总数。
+    - 最多 `concurrency` 个请求同时在途，全部共享一个 keep-alive 的连接池；
+    - 抓取结果放入队列，由单个写入任务在后台线程中调用 `save_fn`，
+      这样上一个主题的入库与下一个主题的抓取是重叠进行的；
+    - 每个主题抓取并入库成功后调用 on_topic_done(topic, articles, new_count, unfetched)
+      (unfetched 是因页数上限没取到的区间；请求或入库失败的主题不调用)。
+    """
+    if limiter is None:
+        limiter = TokenBucket(GNEWS_REQUESTS_PER_SECOND, GNEWS_BURST)
+
+    topic_queue: asyncio.Queue = asyncio.Queue()
+    for topic in topics:
+        topic_queue.put_nowait(topic)
+    # 有界队列：写入跟不上时，抓取会自动放慢，避免结果在内存中堆积
+    save_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency) * 2)
+    total_new_articles = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=10.0, limits=limits,
+                                 event_hooks=httpx_event_hooks("gnews", is_async=True)) as client:
+        with tqdm(total=len(topics), desc="处理主题") as pbar:
+
+            async def fetch_worker():
+                while True:
+                    try:
+                        topic = topic_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    result = await fetch_topic_articles_async(client, topic, api_key, limiter, window)
+                    if result and result[0]:
+                        await save_queue.put((topic, *result))
+                    else:
+                        if result is not None and on_topic_done:
+                            on_topic_done(topic, [], 0, result[1])
+                        pbar.update(1)
+
+            async def save_worker():
+                nonlocal total_new_articles
+                while True:
+                    item = await save_queue.get()
+                    if item is None:
+                        return
+                    topic, articles, unfetched = item
+                    try:
+                        new_count = await asyncio.to_thread(save_fn, articles, topic['topic_id'])
+                    except Exception as e:
+                        tqdm.write(f"🔴 错误: 主题 '{topic['keyword']}' 的文章入库失败，下次运行重新爬取: {e}")
+                        pbar.update(1)
+                        continue
+                    total_new_articles += new_count
+                    if on_topic_done:
+                        on_topic_done(topic, articles, new_count, unfetched)
+                    tqdm.write(f"  > 存储: 主题 '{topic['keyword']}' 新增 {new_count} 篇文章到数据库。")
+                    pbar.update(1)
+
+            saver = asyncio.create_task(save_worker())
+            await asyncio.gather(*(fetch_worker() for _ in range(max(1, concurrency))))
+            await save_queue.put(None)
+            await saver
+
+    return total_new_articles
+
+def crawl_topics_sequential(
+    topics: List[Dict[str, Any]],
+    api_key: str,
+    save_fn: Callable[[List[Dict[str, Any]], int], int] = save_articles_to_db,
+    window: SearchWindow | None = None,
+    on_topic_done: Callable[[Dict[str, Any], List[Dict[str, Any]], int, SearchWindow | None], None] | None = None
+) -> int:
+    """
+    旧的逐个主题抓取模式 (每个主题一个新的 httpx.Client)，保留用于对比和回退。
+    """
     total_new_articles = 0
-    
-    # 2. 遍历每个主题并爬取
-    print("  (Crawler Step 2/3) 正在从 NewsAPI 获取文章...")
     with tqdm(total=len(topics), desc="处理主题") as pbar:
         for topic in topics:
             pbar.set_description(f"处理中: {topic['keyword']}")
             
             # 3. 从 API 获取文章
-            articles = fetch_articles_from_api(topic, news_api_key)
+            result = fetch_topic_articles(topic, api_key, window)
+            articles, unfetched = result or (None, None)
             
             if articles:
                 # 4. 保存到数据库 (此步骤会自动去重)
-                new_count = save_articles_to_db(articles, topic['topic_id'])
-                total_new_articles += new_count
-                tqdm.write(f"  > 存储: 主题 '{topic['keyword']}' 新增 {new_count} 篇文章到数据库。")
+                try:
+                    new_count = save_fn(articles, topic['topic_id'])
+                except Exception as e:
+                    tqdm.write(f"🔴 错误: 主题 '{topic['keyword']}' 的文章入库失败，下次运行重新爬取: {e}")
+                else:
+                    total_new_articles += new_count
+                    if on_topic_done:
+                        on_topic_done(topic, articles, new_count, unfetched)
+                    tqdm.write(f"  > 存储: 主题 '{topic['keyword']}' 新增 {new_count} 篇文章到数据库。")
+            elif result is not None and on_topic_done:
+                on_topic_done(topic, [], 0, unfetched)
             
             pbar.update(1)
+    return total_new_articles
+
+# -----------------------------------------------------------------
+# 文章来源 (Article Sources)
+# -----------------------------------------------------------------
+
+class ArticleSource(ABC):
+    """
+    一个文章来源: 为主题抓取文章 (GNews 响应格式的 dict: title / description / url / publishedAt / source)，
+    并通过 save_fn(articles, topic_id) 入库。新的来源实现这个接口并在 build_sources() 中注册即可。
+    """
+    name = "source"
+
+    @abstractmethod
+    def describe(self, topics: List[Dict[str, Any]]) -> List[str]:
+        """预演: 返回本次将发出的请求 (不请求、不写库)"""
+
+    @abstractmethod
+    def crawl(self, topics: List[Dict[str, Any]], save_fn: Callable[[List[Dict[str, Any]], int], int]) -> int:
+        """抓取并入库所有主题的文章，返回新增文章数"""
+
+class GNewsSource(ArticleSource):
+    """
+    GNews 搜索 API: 每个主题一个查询。
+    增量模式下从主题的水位线开始翻页，近期没有新文章的主题降低轮询频率 (补爬时间窗口时不使用水位线)。
+    """
+    name = "gnews"
+
+    def __init__(self, api_key: str | None, window: SearchWindow | None = None):
+        self.api_key = api_key
+        self.window = window
+
+    def select_topics(self, topics: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], CrawlStateTracker | None]:
+        """增量模式: 只保留到了轮询时间的主题，并创建记录水位线的 tracker"""
+        if not INCREMENTAL_CRAWL or self.window is not None:
+            return topics, None
+        tracker = CrawlStateTracker(utc_now())
+        due_topics = [topic for topic in topics if is_topic_due(topic, tracker.now)]
+        skipped = len(topics) - len(due_topics)
+        inc("crawler_topics_total", len(due_topics), status="due")
+        inc("crawler_topics_total", skipped, status="idle_skipped")
+        if skipped:
+            tqdm.write(f"  > {skipped} 个近期没有新文章的主题未到轮询时间，本次跳过。")
+        return due_topics, tracker
+
+    def describe(self, topics: List[Dict[str, Any]]) -> List[str]:
+        lines = []
+        for topic in self.select_topics(topics)[0]:
+            backfill = topic_backfill(topic) if self.window is None else None
+            for window in [self.window] + ([backfill] if backfill else []):
+                params = {k: v for k, v in build_search_params(topic, self.api_key, window).items() if k != "apikey"}
+                lines.append(f"[预演] {NEWS_API_BASE_URL} {params}")
+        return lines
+
+    def crawl(self, topics: List[Dict[str, Any]], save_fn: Callable[[List[Dict[str, Any]], int], int]) -> int:
+        topics, tracker = self.select_topics(topics)
+        if not topics:
+            print("⏹️ 没有到轮询时间的主题，跳过 GNews。")
+            return 0
+
+        on_topic_done = tracker.record if tracker else None
+        if CRAWLER_MODE == "sequential":
+            print("  > 正在从 NewsAPI 逐个获取文章 (sequential 模式)...")
+            total_new_articles = crawl_topics_sequential(
+                topics, self.api_key, save_fn=save_fn, window=self.window, on_topic_done=on_topic_done
+            )
+        else:
+            print(f"  > 正在从 NewsAPI 并发获取文章 (async 模式, 并发上限 {CRAWLER_CONCURRENCY})...")
+            total_new_articles = asyncio.run(crawl_topics_async(
+                topics, self.api_key, save_fn=save_fn, window=self.window, on_topic_done=on_topic_done
+            ))
+
+        if tracker is not None:
+            try:
+                updated = tracker.save()
+                print(f"  > 已更新 {updated} 个主题的水位线 (其中 {tracker.idle_topics} 个本次没有新文章，将降低轮询频率；"
+                      f"{tracker.backfill_topics} 个还有没取到的文章，下次运行补爬)。")
+            except Exception as e:
+                tqdm.write(f"🟡 警告: 无法保存主题的水位线，下次运行将重新爬取这些文章: {e}")
+        return total_new_articles
+
+def build_sources(window: SearchWindow | None = None, dry_run: bool = False) -> List[ArticleSource]:
+    """按 CRAWLER_SOURCES 的顺序创建已配置的来源"""
+    sources = []
+    for name in CRAWLER_SOURCES:
+        if name == "gnews":
+            news_api_key = os.environ.get("NEWS_API_KEY")
+            if news_api_key or dry_run:
+                sources.append(GNewsSource(news_api_key, window))
+            else:
+                print("🟡 警告: NEWS_API_KEY 环境变量未设置！跳过 GNews 来源。")
+        elif name == "rss":
+            # 按需导入 (rss_source 依赖本模块的 ArticleSource)
+            from .rss_source import RssSource, RSS_FEEDS
+            if RSS_FEEDS:
+                sources.append(RssSource(RSS_FEEDS, window))
+        else:
+            print(f"🟡 警告: 未知的文章来源 '{name}' (可选: gnews, rss)，已忽略。")
+    return sources
+
+def main(since: datetime | None = None, until: datetime | None = None, dry_run: bool = False):
+    """
+    爬虫主函数。
+    since/until: 只爬取该窗口内发布的文章 (GNews 'from' / 'to'，RSS 按条目的发布时间过滤)；
+    dry_run: 只打印每个来源将发出的请求，不请求 API、不写库。
+    """
+    print("--- 爬虫脚本 (crawler.py) 启动 ---")
+    window = (since, until) if since or until else None
+
+    sources = build_sources(window, dry_run)
+    if not sources:
+        print("🔴 错误: 没有可用的文章来源 (NEWS_API_KEY 未设置，RSS_FEEDS 为空)！爬虫无法运行。")
+        return
+
+    # 1. 获取要追踪的主题
+    topics = fetch_topics_from_db()
+    if not topics:
+        print("⏹️ 数据库中没有激活的主题。爬虫退出。")
+        return
+
+    if dry_run:
+        for source in sources:
+            for line in source.describe(topics):
+                print(f"  > {line}")
+        print(f"--- 爬虫脚本 (crawler.py) 结束 (预演，{len(topics)} 个主题，未请求 API、未写入数据库) ---")
+        return
+        
+    # 1.5 加载近似重复索引和已知 URL 过滤器 (失败时跳过对应的去重，爬虫照常运行)
+    dedupe_index = None
+    if DEDUPE_ENABLED:
+        try:
+            dedupe_index = load_near_duplicate_index()
+            tqdm.write(f"  > 近似重复索引已加载: 最近 {DEDUPE_WINDOW_DAYS} 天的 {len(dedupe_index)} 篇文章。")
+        except Exception as e:
+            tqdm.write(f"🟡 警告: 无法加载近似重复索引，本次不做近似去重: {e}")
+    url_filter = None
+    if URL_FILTER_ENABLED:
+        try:
+            with span("url_filter_load"):
+                url_filter = load_known_url_filter(get_storage())
+            tqdm.write(f"  > 已知 URL 过滤器已加载: {len(url_filter)} 个 URL "
+                       f"({url_filter.bloom.size_bytes / 1024:.0f} KB)。")
+        except Exception as e:
+            tqdm.write(f"🟡 警告: 无法加载已知 URL 过滤器，本次所有文章都交给数据库去重: {e}")
+    save_fn = functools.partial(save_articles_to_db, dedupe_index=dedupe_index, url_filter=url_filter)
+
+    # 2. 依次运行每个来源 (一个来源失败不影响其他来源)
+    total_new_articles, failed_sources = 0, []
+    for source in sources:
+        print(f"  (Crawler Step 2/3) 正在从来源 '{source.name}' 获取文章...")
+        try:
+            with span("crawl_source", source=source.name):
+                total_new_articles += source.crawl(topics, save_fn)
+        except Exception as e:
+            tqdm.write(f"🔴 错误: 来源 '{source.name}' 爬取失败: {e}")
+            failed_sources.append(source.name)
 
     print("  (Crawler Step 3/3) 爬取完成。")
+    if url_filter is not None:
+        try:
+            url_filter.save()
+        except OSError as e:
+            tqdm.write(f"🟡 警告: 无法保存已知 URL 过滤器，下次运行将重新构建: {e}")
+        print(f"  > {url_filter.format_stats()}。")
+    if dedupe_index is not None:
+        print(f"  > 其中 {dedupe_index.duplicates_found} 篇是已有报道的近似重复 (转载)，将直接复用簇代表的 L1 分析。")
     print(f"--- 爬虫脚本 (crawler.py) 结束 ---")
     print(f"🟢 总结：总共发现 {total_new_articles} 篇新文章并存入数据库。")
-
+    if failed_sources:
+        # 已入库的文章和过滤器照常保存，再让本阶段记为失败 (可用 --resume 重跑)
+        raise RuntimeError(f"文章来源爬取失败: {', '.join(failed_sources)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("stage", trace=True, stage="crawl"):
+        main()
+    write_run_report()
@@ -1,7 +1,14 @@
 import os
-from supabase import create_client, Client
+import threading
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
+try:
+    from .metrics import httpx_event_hooks, METRICS_ENABLED
+except ImportError:
+    from metrics import httpx_event_hooks, METRICS_ENABLED
+
 # -----------------------------------------------------------------
 # 本地测试设置 (Local Testing Setup)
 # -----------------------------------------------------------------
@@ -27,32 +34,50 @@ supabase_url: str = os.environ.get("SUPABASE_URL")
 supabase_key: str = os.environ.get("SUPABASE_SERVICE_KEY")
 
 # 2. 初始化一个全局客户端变量
+# 客户端在第一次调用 get_db_client() 时才创建：
+# 使用本地存储后端 (STORAGE_BACKEND=sqlite，见 storage/) 时完全不需要 Supabase。
 db_client: Client | None = None
+_db_client_lock = threading.Lock()
 
-# 3. 检查变量是否存在并尝试连接
-if not supabase_url or not supabase_key:
-    # 这是一个严重错误，脚本无法在没有数据库的情况下运行。
-    print("🔴 错误：SUPABASE_URL 或 SUPABASE_SERVICE_KEY 环境变量未设置。")
-    print("   请在 GitHub Secrets (用于生产) 和 .env 文件 (用于本地) 中设置它们。")
-else:
+def _create_client() -> Client | None:
+    # 3. 检查变量是否存在并尝试连接
+    if not supabase_url or not supabase_key:
+        # 这是一个严重错误，脚本无法在没有数据库的情况下运行。
+        print("🔴 错误：SUPABASE_URL 或 SUPABASE_SERVICE_KEY 环境变量未设置。")
+        print("   请在 GitHub Secrets (用于生产) 和 .env 文件 (用于本地) 中设置它们。")
+        return None
     try:
         # 4. 创建唯一的、可复用的 Supabase 客户端实例
         # 这个客户端使用 'service_role' 密钥，拥有完全的管理员权限。
         # 它会绕过我们为 'public_api_role' 设置的 RLS 策略，
         # 这对于我们的后端自动化脚本 (A) 来说是必需的。
-        db_client = create_client(supabase_url, supabase_key)
+        # 开启指标时传入带埋点的 httpx 客户端 (统计每次 PostgREST / RPC 往返的耗时、状态码和字节数)，
+        # 超时和 HTTP/2 与 postgrest 默认客户端一致
+        options = None
+        if METRICS_ENABLED:
+            options = ClientOptions(httpx_client=httpx.Client(
+                timeout=120, follow_redirects=True, http2=True,
+                event_hooks=httpx_event_hooks("supabase")
+            ))
+        client = create_client(supabase_url, supabase_key, options=options)
         print("🟢 数据库客户端初始化成功。")
+        return client
     except Exception as e:
         print(f"🔴 数据库连接失败: {e}")
         print("   请检查你的 SUPABASE_URL 和 SUPABASE_SERVICE_KEY 是否正确。")
+        return None
 
 # --- 供其他脚本导入的函数 ---
 
 def get_db_client() -> Client:
     """
-    一个辅助函数，用于获取已初始化的数据库客户端。
+    一个辅助函数，用于获取已初始化的数据库客户端 (首次调用时创建)。
     如果客户端未初始化 (e.g., 缺少密钥)，将引发异常。
     """
+    global db_client
+    with _db_client_lock:
+        if db_client is None:
+            db_client = _create_client()
     if db_client is None:
         raise ConnectionError("数据库客户端未初始化。请检查环境变量。")
-    return db_client
\ No newline at end of file
+    return db_client
@@ -0,0 +1,122 @@
+import os
+import re
+import zlib
+import random
+from collections import defaultdict
+from typing import List, Dict, Tuple
+
+# -----------------------------------------------------------------
+# 近似重复文章检测 (Near-Duplicate Detection)
+# -----------------------------------------------------------------
+#
+# GNews 会以不同 URL 返回同一篇通稿的多个转载版本，
+# 'raw_articles' 只按 url 精确去重，拦不住它们。
+# 这里对规范化后的 "标题 + 摘要" 计算 MinHash 签名 (估算 shingle 集合的 Jaccard 相似度)，
+# 再用 LSH 分段索引只比较可能相似的候选，把近似重复归入同一个簇 (以最早入库的文章为代表)。
+# 分析阶段只对簇代表调用 AI，再把 L1 结果复制给其他成员。
+#
+# 常量定义 (Constants)
+# 估算的 Jaccard 相似度不低于该值即视为近似重复
+DEDUPE_MIN_SIMILARITY = float(os.environ.get("DEDUPE_MIN_SIMILARITY", "0.7"))
+# MinHash 签名长度 = LSH 段数 x 每段行数
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+# 组成一个 shingle 的词元数 (标题 + 摘要很短，用 2 个词元对小改动更宽容)
+SHINGLE_SIZE = 2
+
+# 固定种子，保证签名在不同进程、不同运行之间一致 (签名会存入数据库)
+_PERMUTATION_MASKS = [random.Random(20240601 + i).getrandbits(32) for i in range(MINHASH_PERMUTATIONS)]
+# 英文按单词切分，中日韩文字按单字切分
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """规范化文本 (小写、去标点) 并切分为词元"""
+    return _TOKEN_PATTERN.findall((text or "").lower())
+
+def shingle_hashes(text: str) -> List[int]:
+    """把文本切成 SHINGLE_SIZE 个词元一组的 shingle，并计算稳定的 32 位哈希 (CRC32)"""
+    tokens = normalize_tokens(text)
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return list({zlib.crc32(s.encode('utf-8')) for s in shingles})
+
+def minhash_signature(text: str) -> List[int] | None:
+    """
+    计算 MinHash 签名 (MINHASH_PERMUTATIONS 个 32 位整数)。
+    每个 "排列" 用一个固定的随机掩码与 shingle 哈希异或实现，比逐个重新哈希快得多。
+    文本为空时返回 None。
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    return [min(map(mask.__xor__, hashes)) for mask in _PERMUTATION_MASKS]
+
+def article_signature(title: str | None, snippet: str | None) -> List[int] | None:
+    """文章指纹：基于规范化后的 标题 + 摘要"""
+    return minhash_signature(f"{title or ''} {snippet or ''}")
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """两个签名中相同位置取值相等的比例 = Jaccard 相似度的估计"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """
+    内存中的 MinHash LSH 索引。
+    签名被切成 LSH_BANDS 段，每段 LSH_ROWS 个值；至少有一段完全相同的文章才会被精确比较。
+    (16 x 4 的配置下，相似度 0.7 的一对文章成为候选的概率约 99%，0.3 的约 12%)
+    """
+    def __init__(self, min_similarity: float = DEDUPE_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        self._signatures: Dict[int, List[int]] = {}
+        # article_id -> 所属簇的代表文章 (canonical) ID
+        self._canonical: Dict[int, int] = {}
+        # 本次运行中通过 assign() 发现的近似重复数量
+        self.duplicates_found = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature: List[int]):
+        for band in range(LSH_BANDS):
+            yield band, tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+
+    def find_canonical(self, signature: List[int]) -> int | None:
+        """返回最相似的近似重复所属簇的代表 ID；没有则返回 None"""
+        best_id, best_similarity = None, self.min_similarity
+        seen = set()
+        for key in self._bands(signature):
+            for article_id in self._buckets.get(key, ()):
+                if article_id in seen:
+                    continue
+                seen.add(article_id)
+                similarity = estimate_similarity(signature, self._signatures[article_id])
+                if similarity >= best_similarity:
+                    best_id, best_similarity = article_id, similarity
+        if best_id is None:
+            return None
+        return self._canonical[best_id]
+
+    def add(self, article_id: int, signature: List[int], canonical_id: int | None = None):
+        """把文章加入索引；canonical_id 为 None 表示它自己就是簇代表"""
+        self._signatures[article_id] = signature
+        self._canonical[article_id] = canonical_id or article_id
+        for key in self._bands(signature):
+            self._buckets[key].append(article_id)
+
+    def assign(self, article_id: int, signature: List[int]) -> int | None:
+        """
+        为新文章查找簇并加入索引。
+        返回簇代表 ID (近似重复时)，或 None (它成为新簇的代表)。
+        """
+        canonical_id = self.find_canonical(signature)
+        self.add(article_id, signature, canonical_id)
+        if canonical_id is not None:
+            self.duplicates_found += 1
+        return canonical_id
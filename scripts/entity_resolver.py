@@ -0,0 +1,401 @@
+import os
+import re
+import sys
+import argparse
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import List, Dict, Any, Iterable, Set, Tuple
+
+# 导入我们自己的存储后端
+try:
+    from .storage import get_storage
+    from .metrics import inc
+except ImportError:
+    from storage import get_storage
+    from metrics import inc
+
+# -----------------------------------------------------------------
+# 实体解析 (Entity Resolution)
+# -----------------------------------------------------------------
+#
+# AI 对同一实体会写出不同的名字 ("NVIDIA" / "Nvidia Corp" / "英伟达")，按原样入库会拆散热门实体的计数。
+# 每次运行开始时把实体表和别名表 (entity_aliases) 一次性读入内存，在本地按以下顺序解析:
+#   1. 规范化键 (NFKC、小写、去标点和空白、去掉 Inc / Corp / 有限公司 等后缀) 完全相同；
+#   2. 别名表中的规范化键 (跨语言别名由合并命令写入)；
+#   3. 字符 n-gram (三元组) 的 Dice 相似度不低于阈值、类型相同、数字一致 (避免 "GPT-4" 并入 "GPT-5")。
+# 解析到的实体直接以 entity_id 写入，只有真正的新实体才随分块的 'save_l1_batch' 一次性创建；
+# 模糊匹配到的新写法作为别名保存，下次运行直接命中。
+#
+# 合并已有的重复实体:
+#   python -m scripts.entity_resolver merge                        # 预览按规范化键 / 模糊匹配找到的重复
+#   python -m scripts.entity_resolver merge --apply                # 执行合并
+#   python -m scripts.entity_resolver merge "英伟达" "Nvidia Corp" --into NVIDIA   # 手动合并并记录别名
+#
+# 常量定义 (Constants)
+# 模糊匹配的最低 Dice 相似度 (三元组)
+ENTITY_FUZZY_MIN_SIMILARITY = float(os.environ.get("ENTITY_FUZZY_MIN_SIMILARITY", "0.8"))
+# 规范化键短于该长度时只做精确匹配 (短名字的 n-gram 太少，模糊匹配不可靠)
+ENTITY_FUZZY_MIN_LENGTH = int(os.environ.get("ENTITY_FUZZY_MIN_LENGTH", "5"))
+# 分页读取实体表 / 别名表时每页的行数
+ENTITY_PAGE_SIZE = 1000
+NGRAM_SIZE = 3
+
+# 规范化时从名字末尾去掉的公司后缀
+_COMPANY_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "llc", "plc", "ag", "sa", "gmbh", "group", "holdings", "holding",
+}
+_CJK_COMPANY_SUFFIXES = ("股份有限公司", "有限责任公司", "有限公司", "集团", "公司")
+_WORD_PATTERN = re.compile(r"[^\W_]+")
+_DIGITS_PATTERN = re.compile(r"\d+")
+
+
+def normalize_entity_key(name: str) -> str:
+    """
+    实体名的规范化键: NFKC + 小写，去掉所有格、标点、空白和公司后缀。
+    "NVIDIA" / "Nvidia Corp." / "NVIDIA Corporation" -> "nvidia"；"Open AI" -> "openai"。
+    """
+    text = unicodedata.normalize("NFKC", name or "").casefold()
+    text = re.sub(r"['’]s\b", "", text)
+    words = _WORD_PATTERN.findall(text)
+    while len(words) > 1 and words[-1] in _COMPANY_SUFFIXES:
+        words.pop()
+    if len(words) > 1 and words[0] == "the":
+        words.pop(0)
+    key = "".join(words)
+    for suffix in _CJK_COMPANY_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            key = key[:-len(suffix)]
+            break
+    # 只有标点的名字 (罕见) 退回到去掉空白的原文
+    return key or "".join(text.split())
+
+def key_ngrams(key: str, n: int = NGRAM_SIZE) -> Set[str]:
+    """带首尾边界符的字符 n-gram 集合"""
+    padded = f"^{key}$"
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+def ngram_similarity(a: str, b: str) -> float:
+    """两个规范化键的 n-gram Dice 相似度"""
+    grams_a, grams_b = key_ngrams(a), key_ngrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+class EntityResolver:
+    """
+    内存中的实体索引: 规范化键 -> entity_id，加上 n-gram 倒排索引用于模糊匹配。
+    尚未入库的新实体以规范化键暂存 (pending)，写入成功后由 confirm() 登记返回的 ID。
+    线程安全 (流式写入线程和逐篇写入都会调用)。
+    """
+    def __init__(self, min_similarity: float = ENTITY_FUZZY_MIN_SIMILARITY, min_length: int = ENTITY_FUZZY_MIN_LENGTH):
+        self.min_similarity = min_similarity
+        self.min_length = min_length
+        # 规范化键 -> entity_id (实体名自身的键和别名键)
+        self._ids: Dict[str, int] = {}
+        # entity_id -> (entity_name, entity_type)
+        self._entities: Dict[int, Tuple[str, str]] = {}
+        # 尚未入库的新实体: 规范化键 -> {"entity_name", "entity_type"}
+        self._pending: Dict[str, Dict[str, str]] = {}
+        # 模糊匹配到 "新实体" 的写法: 规范化键 -> 新实体的规范化键
+        self._redirects: Dict[str, str] = {}
+        # 待写入的别名: 规范化键 -> entity_id
+        self._new_aliases: Dict[str, int] = {}
+        # 模糊匹配的候选: n-gram -> 规范化键 (已入库实体的名字键 + 待创建实体的键)
+        self._ngram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._key_types: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact": 0, "alias": 0, "fuzzy": 0, "new": 0, "created": 0}
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    # --- 加载 ---
+
+    def add_entity(self, entity_id: int, name: str, entity_type: str):
+        """登记一个已入库的实体 (调用方需持有锁，或在加载阶段单线程调用)"""
+        key = normalize_entity_key(name)
+        self._entities[entity_id] = (name, entity_type)
+        # 同一个键已有实体时保留 ID 较小 (较早创建) 的那个，重复由合并命令处理
+        if key not in self._ids or self._ids[key] > entity_id:
+            self._ids[key] = entity_id
+        if key not in self._key_types:
+            self._key_types[key] = entity_type
+            if len(key) >= self.min_length:
+                for gram in key_ngrams(key):
+                    self._ngram_index[gram].add(key)
+
+    def add_alias(self, alias_key: str, entity_id: int):
+        """登记一个别名 (别名优先于同键的实体名，合并后的名字都指向合并目标)"""
+        self._ids[alias_key] = entity_id
+
+    def load(self, storage=None, page_size: int = ENTITY_PAGE_SIZE) -> "EntityResolver":
+        """分页读取整个实体表和别名表"""
+        storage = storage or get_storage()
+        after_id = 0
+        while True:
+            page = storage.fetch_entity_page(after_id, page_size)
+            for row in page:
+                self.add_entity(row['entity_id'], row['entity_name'], row['entity_type'])
+            if len(page) < page_size:
+                break
+            after_id = page[-1]['entity_id']
+        after_key = ""
+        while True:
+            page = storage.fetch_entity_alias_page(after_key, page_size)
+            for row in page:
+                self.add_alias(row['alias_key'], row['entity_id'])
+            if len(page) < page_size:
+                break
+            after_key = page[-1]['alias_key']
+        return self
+
+    # --- 解析 ---
+
+    def _fuzzy_candidates(self, key: str, entity_type: str | None) -> List[Tuple[float, str]]:
+        """n-gram 索引中与 key 相似度达到阈值、类型相同、数字一致的其他键 [(相似度, 键)] (调用方需持有锁)"""
+        if len(key) < self.min_length:
+            return []
+        grams = key_ngrams(key)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._ngram_index.get(gram, ()):
+                if candidate != key:
+                    shared[candidate] += 1
+        digits = _DIGITS_PATTERN.findall(key)
+        matches = []
+        for candidate, count in shared.items():
+            score = 2 * count / (len(grams) + len(key_ngrams(candidate)))
+            if (score >= self.min_similarity and self._key_types.get(candidate) == entity_type
+                    and _DIGITS_PATTERN.findall(candidate) == digits):
+                matches.append((score, candidate))
+        return matches
+
+    def _fuzzy_match(self, key: str, entity_type: str) -> str | None:
+        """相似度最高的候选键 (调用方需持有锁)"""
+        matches = self._fuzzy_candidates(key, entity_type)
+        return max(matches)[1] if matches else None
+
+    def resolve(self, name: str, entity_type: str) -> Tuple[int | None, str]:
+        """
+        把实体名解析为 (entity_id, 规范化键)。
+        entity_id 为 None 表示这是尚未入库的新实体，用 pending_name(键) 作为它的入库名称。
+        """
+        key = normalize_entity_key(name)
+        with self._lock:
+            key = self._redirects.get(key, key)
+            if key in self._ids:
+                is_alias = key not in self._key_types
+                self.stats["alias" if is_alias else "exact"] += 1
+                inc("entity_resolutions_total", result="alias" if is_alias else "exact")
+                return self._ids[key], key
+            if key in self._pending:
+                self.stats["new"] += 1
+                inc("entity_resolutions_total", result="new")
+                return None, key
+
+            match = self._fuzzy_match(key, entity_type)
+            if match is not None:
+                self.stats["fuzzy"] += 1
+                inc("entity_resolutions_total", result="fuzzy")
+                if match in self._ids:
+                    self._ids[key] = self._ids[match]
+                    self._new_aliases[key] = self._ids[match]
+                    return self._ids[match], key
+                self._redirects[key] = match
+                return None, match
+
+            self._pending[key] = {"entity_name": " ".join(name.split()), "entity_type": entity_type}
+            self._key_types[key] = entity_type
+            if len(key) >= self.min_length:
+                for gram in key_ngrams(key):
+                    self._ngram_index[gram].add(key)
+            self.stats["new"] += 1
+            inc("entity_resolutions_total", result="new")
+            return None, key
+
+    def pending_name(self, key: str) -> str:
+        """新实体的入库名称 (本次运行中第一次出现时的写法)"""
+        with self._lock:
+            return self._pending[key]["entity_name"]
+
+    def build_entity_payload(self, pending_keys: Iterable[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        一个分块需要创建的新实体和需要写入的别名 (新实体的其他写法 + 模糊匹配到已有实体的写法)。
+        别名在 confirm() 之前不会被清除，写入失败时会随下一个分块重发。
+        """
+        with self._lock:
+            pending_keys = {key for key in pending_keys if key in self._pending}
+            entities = [self._pending[key] for key in sorted(pending_keys)]
+            aliases = [{"alias_key": alias, "entity_id": entity_id} for alias, entity_id in self._new_aliases.items()]
+            aliases += [
+                {"alias_key": alias, "entity_name": self._pending[target]["entity_name"]}
+                for alias, target in self._redirects.items() if target in pending_keys
+            ]
+            return entities, aliases
+
+    def confirm(self, payload: Dict[str, Any], created: List[Dict[str, Any]]):
+        """分块写入成功后: 登记新实体的 ID，清除已写入的别名"""
+        with self._lock:
+            for row in created:
+                key = normalize_entity_key(row['entity_name'])
+                entity_type = self._pending.pop(key, {}).get("entity_type") or self._key_types.get(key, "OTHER")
+                self._entities[row['entity_id']] = (row['entity_name'], entity_type)
+                self._ids.setdefault(key, row['entity_id'])
+                self.stats["created"] += 1
+            for alias in payload.get("aliases", []):
+                if "entity_id" in alias:
+                    self._new_aliases.pop(alias["alias_key"], None)
+                elif alias["alias_key"] in self._redirects:
+                    target = self._redirects.pop(alias["alias_key"])
+                    if target in self._ids:
+                        self._ids[alias["alias_key"]] = self._ids[target]
+
+    def format_stats(self) -> str:
+        s = self.stats
+        return (
+            f"实体解析: 精确 {s['exact']}，别名 {s['alias']}，模糊 {s['fuzzy']}，"
+            f"新实体 {s['created']} 个 (索引共 {len(self._entities)} 个实体)"
+        )
+
+    # --- 合并 ---
+
+    def find_duplicate_groups(self) -> List[List[int]]:
+        """
+        在已入库实体中找重复，返回若干组 entity_id，每组第一个 (ID 最小) 是合并目标:
+          * 规范化键相同，或名字是另一个实体的别名: 完全等价，可以传递；
+          * 模糊相似 (类型相同、数字一致): 不传递，只有名字与目标本身相似的实体才并入该组
+            (A≈B、B≈C 时，与 A 不相似的 C 不会被并入 A)。
+        """
+        parent: Dict[int, int] = {}
+
+        def find(x: int) -> int:
+            while parent.get(x, x) != x:
+                x = parent[x]
+            return x
+
+        def union(a: int, b: int):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        groups = []
+        with self._lock:
+            by_key: Dict[str, List[int]] = defaultdict(list)
+            for entity_id, (name, _) in self._entities.items():
+                by_key[normalize_entity_key(name)].append(entity_id)
+            for key, ids in by_key.items():
+                for entity_id in ids[1:]:
+                    union(ids[0], entity_id)
+                # 别名指向的实体与同键的实体也是重复
+                if key in self._ids and self._ids[key] in self._entities:
+                    union(ids[0], self._ids[key])
+
+            # 完全等价的实体先归为一组，组内 ID 最小的是目标
+            units: Dict[int, List[int]] = defaultdict(list)
+            for entity_id in self._entities:
+                units[find(entity_id)].append(entity_id)
+            unit_keys = {root: {normalize_entity_key(self._entities[i][0]) for i in ids} for root, ids in units.items()}
+
+            # 再按目标从早到晚，并入所有名字都与目标相似的其他组
+            absorbed: Set[int] = set()
+            for root in sorted(units):
+                if root in absorbed:
+                    continue
+                target_key = normalize_entity_key(self._entities[root][0])
+                similar = {target_key} | {
+                    candidate for _, candidate in self._fuzzy_candidates(target_key, self._key_types.get(target_key))
+                }
+                group = list(units[root])
+                for other in sorted({find(i) for key in similar - {target_key} for i in by_key.get(key, ())}):
+                    if other > root and other not in absorbed and unit_keys[other] <= similar:
+                        group += units[other]
+                        absorbed.add(other)
+                if len(group) > 1:
+                    groups.append(sorted(group))
+        return groups
+
+    def entity_name(self, entity_id: int) -> str:
+        return self._entities[entity_id][0]
+
+    def lookup_name(self, name: str) -> int | None:
+        """按名字 (规范化键或别名) 查找已入库实体的 ID"""
+        with self._lock:
+            return self._ids.get(normalize_entity_key(name))
+
+
+# --- 全局解析器 (每次运行加载一次) ---
+_entity_resolver: EntityResolver | None = None
+_entity_resolver_lock = threading.Lock()
+
+def get_entity_resolver() -> EntityResolver:
+    """获取全局实体解析器 (首次调用时从数据库加载实体表和别名表)"""
+    global _entity_resolver
+    with _entity_resolver_lock:
+        if _entity_resolver is None:
+            _entity_resolver = EntityResolver().load()
+        return _entity_resolver
+
+
+def merge_entity_group(storage, resolver: EntityResolver, target_id: int, source_ids: List[int], extra_names: List[str] = ()) -> int:
+    """把 source_ids 并入 target_id，并把它们的名字 (和 extra_names) 记录为 target 的别名"""
+    target_key = normalize_entity_key(resolver.entity_name(target_id))
+    alias_keys = {normalize_entity_key(resolver.entity_name(i)) for i in source_ids} | {normalize_entity_key(n) for n in extra_names}
+    alias_keys.discard(target_key)
+    return storage.merge_entities(target_id, list(source_ids), sorted(alias_keys))
+
+def main():
+    """
+    实体合并命令的主函数
+    """
+    parser = argparse.ArgumentParser(description="合并 l1_analysis_entities 中的重复实体")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="合并重复实体并记录别名")
+    merge.add_argument("names", nargs="*", help="要并入 --into 的实体名 (不在库中的名字只记录为别名)；省略时自动查找重复")
+    merge.add_argument("--into", help="合并目标的实体名 (手动合并时必填)")
+    merge.add_argument("--apply", action="store_true", help="自动查找时真正执行合并 (默认只预览)")
+    merge.add_argument("--threshold", type=float, default=ENTITY_FUZZY_MIN_SIMILARITY, help="模糊匹配的最低相似度")
+    args = parser.parse_args()
+
+    print("--- 实体合并脚本 (entity_resolver.py) 启动 ---")
+    storage = get_storage()
+    try:
+        resolver = EntityResolver(min_similarity=args.threshold).load(storage)
+    except Exception as e:
+        print(f"🔴 错误: 无法读取实体表: {e}")
+        sys.exit(1)
+    print(f"  > 已加载 {len(resolver)} 个实体。")
+
+    try:
+        if args.names:
+            if not args.into:
+                parser.error("手动合并需要 --into")
+            target_id = resolver.lookup_name(args.into)
+            if target_id is None:
+                print(f"🔴 错误: 找不到合并目标 '{args.into}'")
+                sys.exit(1)
+            source_ids = sorted({i for i in map(resolver.lookup_name, args.names) if i is not None and i != target_id})
+            moved = merge_entity_group(storage, resolver, target_id, source_ids, args.names)
+            print(f"🟢 已把 {len(source_ids)} 个实体并入 '{resolver.entity_name(target_id)}' "
+                  f"(并入 {moved} 条文章关系)，并记录 {len(args.names)} 个别名。")
+        else:
+            groups = resolver.find_duplicate_groups()
+            moved_total = 0
+            for ids in groups:
+                names = " / ".join(resolver.entity_name(i) for i in ids[1:])
+                print(f"  - {resolver.entity_name(ids[0])} <- {names}")
+                if args.apply:
+                    moved_total += merge_entity_group(storage, resolver, ids[0], ids[1:])
+            if not groups:
+                print("🟢 没有找到重复实体。")
+            elif args.apply:
+                print(f"🟢 已合并 {len(groups)} 组重复实体 (并入 {moved_total} 条文章关系)。")
+            else:
+                print(f"🟡 找到 {len(groups)} 组重复实体 (预览)，加 --apply 执行合并。")
+    except Exception as e:
+        print(f"🔴 错误: 合并实体失败: {e}")
+        sys.exit(1)
+    print("--- 实体合并脚本 (entity_resolver.py) 结束 ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+import argparse
+
+# 导入我们自己的存储后端
+try:
+    from .storage import get_storage
+    from .archive import first_live_stat_date
+except ImportError:
+    from storage import get_storage
+    from archive import first_live_stat_date
+
+# -----------------------------------------------------------------
+# 实体每日统计 (entity_daily_stats) 维护脚本
+# -----------------------------------------------------------------
+#
+# 平时统计由数据库触发器在 L1 结果写入时增量维护，无需运行本脚本。
+# 在以下情况下需要全量重算:
+#   * 首次部署 entity_daily_stats (为历史数据补统计)；
+#   * 手动修改 / 删除了明细数据，希望统计与明细表完全一致。
+# 明细已被归档 (scripts/archive.py) 或删除的日期不会被重算，它们的统计保持不变:
+# 起点自动推迟到归档清单记录的最晚分析日期之后，数据库端也不会早于库中最早的文章。
+#
+# 用法:
+#   python -m scripts.entity_stats                       # 重算全部日期
+#   python -m scripts.entity_stats --start 2025-01-01 --end 2025-01-31
+
+def rebuild_entity_daily_stats(start_date: str | None = None, end_date: str | None = None) -> int:
+    """调用 'rebuild_entity_daily_stats' (RPC 或本地实现) 重算统计，返回写入的统计行数"""
+    live_since = first_live_stat_date()
+    if live_since and (start_date is None or start_date < str(live_since)):
+        print(f"  > {live_since} 之前的明细已归档，只重算 {live_since} 及之后的统计。")
+        start_date = str(live_since)
+    return get_storage().rebuild_entity_daily_stats(start_date, end_date)
+
+def main():
+    """
+    重算脚本的主函数
+    """
+    parser = argparse.ArgumentParser(description="从明细表重算 entity_daily_stats")
+    parser.add_argument("--start", help="起始日期 (YYYY-MM-DD)，默认不限")
+    parser.add_argument("--end", help="结束日期 (YYYY-MM-DD)，默认不限")
+    args = parser.parse_args()
+
+    print("--- 实体每日统计重算脚本 (entity_stats.py) 启动 ---")
+    try:
+        rebuilt = rebuild_entity_daily_stats(args.start, args.end)
+        print(f"🟢 重算完成，共写入 {rebuilt} 行统计。")
+    except Exception as e:
+        print(f"🔴 错误: 重算 entity_daily_stats 失败: {e}")
+        sys.exit(1)
+    print("--- 实体每日统计重算脚本 (entity_stats.py) 结束 ---")
+
+if __name__ == "__main__":
+    main()
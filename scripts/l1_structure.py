@@ -15,4 +15,17 @@ class L1AnalysisStructure(BaseModel):
     ai_summary: str = Field(description="A concise, neutral summary of the article in the requested language (under 50 words).")
     sentiment_label: Literal['Positive', 'Negative', 'Neutral'] = Field(description="The single, most accurate sentiment label.")
     sentiment_score: float = Field(description="The sentiment score from -1.0 to 1.0.")
-    entities: List[ExtractedEntity] = Field(description="A list of key entities extracted from the text.")
\ No newline at end of file
+    entities: List[ExtractedEntity] = Field(description="A list of key entities extracted from the text.")
+
+# 定义“批量 L1 分析”的输出结构：一次 AI 调用分析多篇文章
+class L1BatchItem(L1AnalysisStructure):
+    """
+    The analysis of one article inside a batch, keyed by its article_id.
+    """
+    article_id: int = Field(description="The 'article_id' of the analyzed article, copied exactly from the input.")
+
+class L1BatchAnalysisStructure(BaseModel):
+    """
+    Structured analyses of a batch of news articles, one entry per input article.
+    """
+    results: List[L1BatchItem] = Field(description="One analysis per input article, each tagged with its 'article_id'.")
@@ -12,4 +12,11 @@ class L2ReportStructure(BaseModel):
     """
     report_summary: str = Field(description="The 150-word executive summary in the requested language, explaining the 'why'.")
     overall_sentiment_score: float = Field(description="The calculated average sentiment score for the entire day/category.")
-    trending_topics: List[TrendingTopic] = Field(description="A list of the Top 3-5 trending topics for the day.")
\ No newline at end of file
+    trending_topics: List[TrendingTopic] = Field(description="A list of the Top 3-5 trending topics for the day.")
+
+class L2PartialSummary(BaseModel):
+    """
+    The map-step summary of one chunk of a category's articles.
+    """
+    partial_summary: str = Field(description="A factual summary (max 80 words) of the articles in this chunk, in the requested language.")
+    key_developments: List[str] = Field(description="Up to 5 of the most important developments in this chunk, one short sentence each.")
@@ -0,0 +1,227 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from time import time
+from typing import Any, Dict
+from tqdm import tqdm
+
+try:
+    from .metrics import inc
+except ImportError:
+    from metrics import inc
+
+# -----------------------------------------------------------------
+# LLM 响应缓存 (LLM Response Cache)
+# -----------------------------------------------------------------
+#
+# 以 "模型名 + 提示词模板 + 格式化指令 + 输出模式与 schema + 输入变量" 的哈希作为键，
+# 把解析后的结构化输出存入本地 SQLite 文件。
+# 同样的输入 (崩溃后重跑、重新分析、L2 报告重新生成) 会直接命中缓存，
+# 完全跳过网络调用。L1 (analysis.py) 和 L2 (report.py) 共用同一个缓存文件。
+#
+# 常量定义 (Constants)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '.cache', 'llm_cache.sqlite3')
+)
+# 缓存文件的大小上限 (MB)，超出后按 LRU (最近最少使用) 淘汰
+LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "200"))
+# 可选的过期时间 (小时)，0 表示永不过期
+LLM_CACHE_TTL_HOURS = float(os.environ.get("LLM_CACHE_TTL_HOURS", "0"))
+
+
+def make_cache_key(
+    model_name: str, template_text: str, format_instructions: str, output_signature: str, inputs: Dict[str, Any]
+) -> str:
+    """计算内容寻址的缓存键 (SHA-256)"""
+    payload = json.dumps(
+        [model_name, template_text, format_instructions, output_signature, inputs],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    线程安全的 SQLite 缓存，带大小上限的 LRU 淘汰和可选 TTL。
+    """
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at, size FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at, size = row
+            now = time()
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                self._conn.commit()
+                self.total_bytes -= size
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def put(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        now = time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE cache_key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的条目，直到缓存回到上限的 90% 以下 (调用方需持有锁)"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT cache_key, size FROM llm_cache ORDER BY last_access ASC").fetchall()
+        for cache_key, size in rows:
+            if self.total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+            self.total_bytes -= size
+
+    def record_hit(self, bytes_saved: int):
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += bytes_saved
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bytes_saved": self.bytes_saved}
+
+
+class CachedChain:
+    """
+    包装 'prompt | llm | parser' chain：先查缓存，未命中才调用 AI，并把结果写回缓存。
+    对调用方来说，它和原来的 chain 一样提供 .invoke()。
+    output_signature: 输出模式和 schema (见 llm_output.output_signature)，schema 不在提示词里时靠它区分缓存。
+    """
+    def __init__(self, chain, prompt, model_name: str, output_model, cache: LLMCache, output_signature: str = ""):
+        self.chain = chain
+        self.prompt = prompt
+        self.model_name = model_name
+        self.output_model = output_model
+        self.cache = cache
+        self.output_signature = output_signature
+        self.template_text = "\n".join(
+            getattr(getattr(message, 'prompt', None), 'template', '') for message in prompt.messages
+        )
+        self.format_instructions = str(prompt.partial_variables.get("format_instructions", ""))
+
+    def _key(self, inputs: Dict[str, Any]) -> str:
+        return make_cache_key(self.model_name, self.template_text, self.format_instructions, self.output_signature, inputs)
+
+    def _lookup(self, inputs: Dict[str, Any]):
+        key = self._key(inputs)
+        try:
+            cached = self.cache.get(key)
+            if cached is not None:
+                result = self.output_model.model_validate_json(cached)
+                # 命中时节省的字节 = 未发送的提示词 + 未接收的响应
+                prompt_bytes = len(self.prompt.format(**inputs).encode('utf-8'))
+                self.cache.record_hit(prompt_bytes + len(cached.encode('utf-8')))
+                inc("llm_cache_requests_total", result="hit")
+                return key, result
+        except Exception as e:
+            tqdm.write(f"🟡 LLM 缓存读取失败，改为调用 AI: {e}")
+        self.cache.record_miss()
+        inc("llm_cache_requests_total", result="miss")
+        return key, None
+
+    def _store(self, key: str, result):
+        try:
+            self.cache.put(key, result.model_dump_json())
+        except Exception as e:
+            tqdm.write(f"🟡 LLM 缓存写入失败: {e}")
+
+    def invoke(self, inputs: Dict[str, Any]):
+        key, result = self._lookup(inputs)
+        if result is not None:
+            return result
+        result = self.chain.invoke(inputs)
+        self._store(key, result)
+        return result
+
+
+# --- 全局缓存实例 (L1 和 L2 共用) ---
+_llm_cache: LLMCache | None = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMCache | None:
+    """
+    获取全局缓存实例 (首次调用时创建)。缓存被禁用或无法打开时返回 None。
+    """
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            try:
+                _llm_cache = LLMCache(
+                    LLM_CACHE_PATH,
+                    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+                    ttl_seconds=LLM_CACHE_TTL_HOURS * 3600
+                )
+            except Exception as e:
+                print(f"🟡 警告: 无法打开 LLM 缓存 ({LLM_CACHE_PATH})，本次运行不使用缓存: {e}")
+                return None
+        return _llm_cache
+
+def with_llm_cache(chain, prompt, model_name: str, output_model, output_signature: str = ""):
+    """如果缓存可用，用 CachedChain 包装 chain；否则原样返回"""
+    cache = get_llm_cache()
+    if cache is None:
+        return chain
+    return CachedChain(chain, prompt, model_name, output_model, cache, output_signature)
+
+def get_cache_stats() -> Dict[str, int]:
+    """返回当前累计的命中/未命中/节省字节数 (缓存未启用时全为 0)"""
+    if _llm_cache is None:
+        return {"hits": 0, "misses": 0, "bytes_saved": 0}
+    return _llm_cache.get_stats()
+
+def format_cache_stats(before: Dict[str, int] | None = None) -> str:
+    """格式化缓存统计；传入 before 时只统计此后的增量 (用于单个阶段)"""
+    stats = get_cache_stats()
+    if before:
+        stats = {k: stats[k] - before.get(k, 0) for k in stats}
+    return f"LLM 缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，节省 {stats['bytes_saved'] / 1024:.1f} KB"
@@ -0,0 +1,234 @@
+import os
+import random
+import threading
+from time import sleep, perf_counter
+from typing import Any, Callable, Dict
+
+import openai
+from tqdm import tqdm
+
+try:
+    from .metrics import inc, gauge
+except ImportError:
+    from metrics import inc, gauge
+
+# -----------------------------------------------------------------
+# LLM 自适应并发控制 (AIMD Adaptive Concurrency)
+# -----------------------------------------------------------------
+#
+# 代替固定的线程数: 所有 LLM 调用 (L1 和 L2 共用一个控制器) 先拿到一个并发槽位。
+#   * 加性增 (Additive Increase): 槽位用满且调用健康时，每完成约 "上限" 次调用，上限 +1；
+#   * 乘性减 (Multiplicative Decrease): 遇到 429 / 5xx / 网络错误，或延迟明显高于基线时，上限减半。
+#     同一轮 (上次下调之前就已发出的) 调用带回的信号只下调一次，避免一次拥塞把上限打到底。
+# 被限流或失败的调用带抖动退避后重试 (优先遵循 Retry-After)，而不是直接记为失败的文章。
+#
+# 常量定义 (Constants)
+LLM_INITIAL_CONCURRENCY = int(os.environ.get("LLM_INITIAL_CONCURRENCY", "2"))
+LLM_MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", "1"))
+# 并发上限的上界，也是 L1/L2 线程池的大小 (多出来的线程在槽位上等待)
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+# 下调时乘以的系数
+LLM_BACKOFF_RATIO = float(os.environ.get("LLM_BACKOFF_RATIO", "0.5"))
+# 近期延迟超过基线的多少倍视为 "延迟上升"
+LLM_LATENCY_TOLERANCE = float(os.environ.get("LLM_LATENCY_TOLERANCE", "2.0"))
+# 单次调用的最大重试次数，以及指数退避的基数 / 上限 (秒)
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE = float(os.environ.get("LLM_RETRY_BASE", "1.0"))
+LLM_RETRY_MAX = float(os.environ.get("LLM_RETRY_MAX", "60"))
+
+# 延迟基线: 长期 EWMA (慢) 与近期 EWMA (快)，每个提示词分别统计 (L1 批量和 L2 报告的耗时量级不同)
+_LONG_ALPHA = 0.05
+_SHORT_ALPHA = 0.3
+# 至少观察到这么多次调用后才判断延迟是否上升
+_LATENCY_WARMUP = 5
+
+
+def classify_error(error: Exception) -> str:
+    """
+    把 LLM 调用的异常归类:
+    'throttled' (429)、'error' (5xx / 网络 / 超时，均可重试)，其余 (4xx、解析失败等) 为 'other'，不重试。
+    """
+    if isinstance(error, openai.APIConnectionError):  # 包括 APITimeoutError
+        return "error"
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "throttled"
+    if status is not None and status >= 500:
+        return "error"
+    return "other"
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """从 429/503 响应中读取 Retry-After (秒)"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """带抖动的退避: 有 Retry-After 时在其基础上加最多 20% 抖动，否则用 "full jitter" 指数退避"""
+    if retry_after is not None:
+        return min(LLM_RETRY_MAX, retry_after * (1 + 0.2 * random.random()))
+    return random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * (2 ** attempt)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    线程安全的 AIMD 并发控制器。call(fn, key) 在槽位内执行 fn 并按结果调整上限，
+    可重试的失败会在释放槽位后退避重试。
+    """
+    def __init__(
+        self,
+        initial: int = LLM_INITIAL_CONCURRENCY,
+        min_limit: int = LLM_MIN_CONCURRENCY,
+        max_limit: int = LLM_MAX_CONCURRENCY,
+        backoff_ratio: float = LLM_BACKOFF_RATIO,
+        latency_tolerance: float = LLM_LATENCY_TOLERANCE,
+        max_retries: int = LLM_MAX_RETRIES
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.stats = {
+            "calls": 0, "throttled": 0, "errors": 0, "retries": 0, "gave_up": 0,
+            "increases": 0, "decreases": 0, "peak_in_flight": 0, "peak_limit": self.limit,
+        }
+        self._latency: Dict[str, Dict[str, float]] = {}
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+        gauge("llm_concurrency_limit", self.limit)
+
+    def acquire(self) -> float:
+        """等待一个空闲槽位，返回开始时间"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+            gauge("llm_in_flight", self.in_flight)
+            return perf_counter()
+
+    def release(self, started: float, outcome: str, key: str = "default"):
+        """释放槽位，并根据这次调用的结果 ('ok' / 'throttled' / 'error' / 'other') 调整上限"""
+        with self._cond:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.stats["calls"] += 1
+            if outcome == "ok":
+                if self._latency_rising(key, perf_counter() - started):
+                    self._decrease(started, "latency")
+                elif saturated and self.limit < self.max_limit:
+                    # 每个 "上限" 次成功调用约 +1 (只在槽位用满时增加，需求不足时上限不会虚涨)
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    self.stats["increases"] += 1
+                    self.stats["peak_limit"] = max(self.stats["peak_limit"], self.limit)
+            elif outcome in ("throttled", "error"):
+                self.stats["throttled" if outcome == "throttled" else "errors"] += 1
+                self._decrease(started, outcome)
+            gauge("llm_concurrency_limit", self.limit)
+            gauge("llm_in_flight", self.in_flight)
+            self._cond.notify_all()
+
+    def _latency_rising(self, key: str, latency: float) -> bool:
+        """更新该提示词的延迟基线，近期延迟超过长期基线 latency_tolerance 倍时返回 True (调用方需持有锁)"""
+        state = self._latency.get(key)
+        if state is None:
+            self._latency[key] = {"long": latency, "short": latency, "samples": 1}
+            return False
+        state["samples"] += 1
+        state["short"] += _SHORT_ALPHA * (latency - state["short"])
+        rising = state["samples"] > _LATENCY_WARMUP and state["short"] > state["long"] * self.latency_tolerance
+        if rising:
+            # 下调后重新积累证据，而不是对同一段高延迟反复下调
+            state["short"] = state["long"]
+        state["long"] += _LONG_ALPHA * (latency - state["long"])
+        return rising
+
+    def _decrease(self, started: float, reason: str):
+        """乘性减；上次下调之前发出的调用不再触发下调 (调用方需持有锁)"""
+        if started < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self._last_decrease = perf_counter()
+        self.stats["decreases"] += 1
+        inc("llm_concurrency_decreases_total", reason=reason)
+
+    def call(self, fn: Callable[[], Any], key: str = "default") -> Any:
+        """
+        在并发槽位内执行 fn。429 / 5xx / 网络错误在释放槽位后带抖动退避重试，
+        超过 max_retries 次或不可重试的异常原样抛出。
+        """
+        for attempt in range(self.max_retries + 1):
+            started = self.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                outcome = classify_error(e)
+                self.release(started, outcome, key)
+                if outcome == "other":
+                    raise
+                if attempt == self.max_retries:
+                    with self._cond:
+                        self.stats["gave_up"] += 1
+                    raise
+                delay = backoff_delay(attempt, retry_after_seconds(e))
+                with self._cond:
+                    self.stats["retries"] += 1
+                inc("llm_retries_total", reason=outcome, prompt=key)
+                tqdm.write(
+                    f"🟡 LLM 调用{'被限流 (429)' if outcome == 'throttled' else '失败'} ({key})，"
+                    f"并发上限降为 {int(self.limit)}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})..."
+                )
+                sleep(delay)
+                continue
+            self.release(started, "ok", key)
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, "limit": round(self.limit, 2), "peak_limit": round(self.stats["peak_limit"], 2),
+                    "in_flight": self.in_flight}
+
+    def format_stats(self) -> str:
+        s = self.get_stats()
+        return (
+            f"LLM 并发: 当前上限 {int(s['limit'])} (峰值 {int(s['peak_limit'])}，同时在途最多 {s['peak_in_flight']})，"
+            f"限流 {s['throttled']} 次，其他错误 {s['errors']} 次，重试 {s['retries']} 次，"
+            f"放弃 {s['gave_up']} 次，下调 {s['decreases']} 次"
+        )
+
+
+class AdaptiveChain:
+    """
+    包装 'prompt | llm | parser' chain：每次 .invoke() 都经过共享的并发控制器。
+    放在 LLM 缓存之内 (缓存命中不占用槽位)。
+    """
+    def __init__(self, chain, limiter: AdaptiveConcurrencyLimiter, key: str):
+        self.chain = chain
+        self.limiter = limiter
+        self.key = key
+
+    def invoke(self, inputs: Dict[str, Any]):
+        return self.limiter.call(lambda: self.chain.invoke(inputs), self.key)
+
+
+# --- 全局控制器 (L1 和 L2 共用) ---
+_llm_limiter: AdaptiveConcurrencyLimiter | None = None
+_llm_limiter_lock = threading.Lock()
+
+def get_llm_limiter() -> AdaptiveConcurrencyLimiter:
+    """获取全局并发控制器 (首次调用时创建)"""
+    global _llm_limiter
+    with _llm_limiter_lock:
+        if _llm_limiter is None:
+            _llm_limiter = AdaptiveConcurrencyLimiter()
+        return _llm_limiter
+
+def with_adaptive_concurrency(chain, key: str) -> AdaptiveChain:
+    """让 chain 的调用经过全局并发控制器 (key 用于区分不同提示词的延迟基线)"""
+    return AdaptiveChain(chain, get_llm_limiter(), key)
@@ -0,0 +1,117 @@
+import os
+import json
+from typing import Any, Dict, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import RunnableLambda
+
+# -----------------------------------------------------------------
+# LLM 输出模式与提示词布局 (Structured Output & Prompt Layout)
+# -----------------------------------------------------------------
+#
+# 输出模式 (LLM_OUTPUT_MODE):
+#   * 'parser'           : 原来的做法，把 PydanticOutputParser 的完整格式化指令 (冗长的 JSON schema) 附加到提示词，再解析自由文本；
+#   * 'json_mode'        : response_format={"type": "json_object"}，提示词中只附加一行紧凑 schema；
+#   * 'json_schema'      : 供应商原生的 Structured Outputs，紧凑 schema 通过 API 参数发送；
+#   * 'function_calling' : 强制调用一个以紧凑 schema 为参数的工具 (DeepSeek / 大多数 OpenAI 兼容服务都支持)。
+# 紧凑 schema 去掉了字段说明、标题和默认值 (这些要求已经写在提示词的指令里)，结果仍由 Pydantic 模型校验。
+#
+# 提示词布局: 提示词文件以 PROMPT_INPUT_MARKER 一行分成两部分，
+# 之前的静态指令 (加上格式化指令) 作为 system 消息，之后的每次调用都不同的数据作为 user 消息。
+# 这样所有调用共享同一段前缀，能命中供应商的前缀缓存 (prompt caching)。
+#
+# 常量定义 (Constants)
+LLM_OUTPUT_MODES = ("parser", "json_mode", "json_schema", "function_calling")
+LLM_OUTPUT_MODE = os.environ.get("LLM_OUTPUT_MODE", "parser").lower()
+if LLM_OUTPUT_MODE not in LLM_OUTPUT_MODES:
+    print(f"🟡 警告: 未知的 LLM_OUTPUT_MODE '{LLM_OUTPUT_MODE}'，改用 'parser'。可选: {', '.join(LLM_OUTPUT_MODES)}")
+    LLM_OUTPUT_MODE = "parser"
+
+PROMPT_INPUT_MARKER = "<<<INPUT>>>"
+
+# 紧凑 schema 中要去掉的 JSON Schema 关键字
+_VERBOSE_KEYS = ("title", "description", "default", "examples")
+
+
+def compact_schema(pydantic_object) -> Dict[str, Any]:
+    """
+    生成 Pydantic 模型的紧凑 JSON schema: 内联 $defs，去掉字段的说明/标题/默认值。
+    只保留顶层的标题 (作为工具名) 和一句话说明。
+    """
+    schema = pydantic_object.model_json_schema()
+    defs = schema.get("$defs", {})
+
+    def strip(node):
+        if isinstance(node, list):
+            return [strip(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return strip(defs[node["$ref"].rsplit("/", 1)[-1]])
+        compact = {}
+        for key, value in node.items():
+            if key in _VERBOSE_KEYS or key == "$defs":
+                continue
+            if key == "properties":
+                # 属性名本身可能叫 'title' / 'description'，不能按关键字过滤
+                compact[key] = {name: strip(prop) for name, prop in value.items()}
+            else:
+                compact[key] = strip(value)
+        return compact
+
+    description = " ".join((pydantic_object.__doc__ or "").split())
+    return {"title": schema["title"], **({"description": description} if description else {}), **strip(schema)}
+
+def output_signature(pydantic_object, mode: str = LLM_OUTPUT_MODE) -> str:
+    """
+    输出模式 + 紧凑 schema 的序列化，用作 LLM 缓存键的一部分:
+    非 'parser' 模式下 schema 通过 API 参数发送，不在格式化指令里，模型字段变化时也要让缓存失效。
+    """
+    return json.dumps([mode, compact_schema(pydantic_object)], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+def split_prompt(template_str: str) -> Tuple[str, str]:
+    """按 PROMPT_INPUT_MARKER 把提示词分成 (静态指令, 每次调用的输入)；没有标记时输入部分为空"""
+    instructions, marker, inputs = template_str.partition(PROMPT_INPUT_MARKER)
+    if not marker:
+        return template_str.rstrip(), ""
+    return instructions.rstrip(), inputs.strip()
+
+def build_structured_chain(template_str: str, pydantic_object, llm, mode: str = LLM_OUTPUT_MODE):
+    """
+    按输出模式构建 'prompt | llm | parser'，返回 (chain, prompt)。
+    chain 的输出始终是 pydantic_object 的实例 (解析/校验失败时抛出 OutputParserException / ValidationError)。
+    """
+    instructions, inputs = split_prompt(template_str)
+    schema = compact_schema(pydantic_object)
+
+    if mode == "parser":
+        parser = PydanticOutputParser(pydantic_object=pydantic_object)
+        format_instructions = parser.get_format_instructions()
+        model = llm
+    else:
+        if mode == "json_mode":
+            # JSON mode 不发送 schema，只在提示词中附加一行紧凑 schema
+            format_instructions = (
+                "Respond with a single JSON object that matches this JSON schema:\n"
+                + json.dumps({k: v for k, v in schema.items() if k not in ("title", "description")},
+                             ensure_ascii=False, separators=(',', ':'))
+            )
+        elif mode == "function_calling":
+            format_instructions = f"Return your answer by calling the '{schema['title']}' function."
+        else:
+            format_instructions = f"Return your answer as JSON matching the '{schema['title']}' schema."
+        model = llm.with_structured_output(schema, method=mode)
+        parser = RunnableLambda(pydantic_object.model_validate)
+
+    # 格式化指令作为 partial 变量传入 (其中的大括号不会被当作模板变量)
+    if inputs:
+        prompt = ChatPromptTemplate.from_messages(
+            [("system", instructions + "\n\n{format_instructions}"), ("human", inputs)],
+        ).partial(format_instructions=format_instructions)
+    else:
+        prompt = ChatPromptTemplate.from_template(
+            instructions + "\n\n{format_instructions}\n",
+            partial_variables={"format_instructions": format_instructions}
+        )
+    return prompt | model | parser, prompt
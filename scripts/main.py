@@ -1,60 +1,239 @@
 import sys
 import os
+import json
+import uuid
+import argparse
+import importlib
 from time import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
 
 # 确保 Python 可以找到我们的同级模块
 sys.path.append(os.path.dirname(__file__))
 
 try:
-    # 导入我们将要编排的四个模块
-    from . import sync_topics  # ⬅️ 【新增】导入同步脚本
-    from . import crawler
-    from . import analysis
-    from . import report
+    # 只导入轻量的基础模块；各阶段的模块 (LangChain、Supabase 客户端等) 在该阶段运行时才导入
+    from .llm_cache import get_cache_stats, format_cache_stats
+    from .metrics import span, write_run_report
 except ImportError:
     print("🔴 错误：无法作为模块导入。请确保你在项目根目录使用 `python -m scripts.main` 来运行。")
-    import sync_topics, crawler, analysis, report
+    from llm_cache import get_cache_stats, format_cache_stats
+    from metrics import span, write_run_report
 
-def main_workflow():
+# -----------------------------------------------------------------
+# 流水线阶段 (Pipeline Stages)
+# -----------------------------------------------------------------
+#
+# 每个阶段: (模块名, 说明, 指标中的阶段名, 是否接受 --since/--until, 是否调用 LLM)。
+# L1 分析总是处理全部未分析的积压，不受时间窗口限制。
+#
+# 常量定义 (Constants)
+STAGES = {
+    "sync": ("sync_topics", "关键词同步", "sync", False, False),
+    "crawl": ("crawler", "L0 爬取", "crawl", True, False),
+    "analyze": ("analysis", "L1 分析", "analysis", False, True),
+    "report": ("report", "L2 报告", "report", True, True),
+}
+# 运行清单 (每次运行一个 JSON 文件)，记录各阶段的状态和耗时，供 --resume 从失败的阶段继续
+RUN_MANIFEST_DIR = os.environ.get(
+    "RUN_MANIFEST_DIR",
+    os.path.join(os.path.dirname(__file__), '..', '.cache', 'runs')
+)
+
+
+def import_stage(module_name: str):
+    """按需导入阶段模块 (python -m scripts.main 时为包内导入)"""
+    if __package__:
+        return importlib.import_module(f"{__package__}.{module_name}")
+    return importlib.import_module(module_name)
+
+def parse_time(value: str, end_of_day: bool = False) -> datetime:
     """
-    按顺序执行整个 AI 趋势分析流水线。
+    解析 --since/--until: 'YYYY-MM-DD' 或 ISO 8601 时间。
+    只给日期的 --until 包含当天整天 (即次日 00:00 之前)。
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法解析的时间: '{value}' (格式: YYYY-MM-DD 或 YYYY-MM-DDTHH:MM)")
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def parse_stages(value: str) -> List[str]:
+    """解析 --stages 'crawl,analyze' (按流水线顺序执行，与书写顺序无关)"""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"未知的阶段: {', '.join(unknown) or '(空)'} (可选: {', '.join(STAGES)})")
+    return [name for name in STAGES if name in names]
+
+# --- 运行清单 (Run Manifest) ---
+
+def manifest_path(run_id: str, manifest_dir: str = RUN_MANIFEST_DIR) -> str:
+    return os.path.join(manifest_dir, f"{run_id}.json")
+
+def write_manifest(manifest: Dict[str, Any], manifest_dir: str = RUN_MANIFEST_DIR):
+    """先写临时文件再原子替换，进程中途被杀时也不会留下半个清单"""
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = manifest_path(manifest["run_id"], manifest_dir)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def load_manifest(run_id: str | None = None, manifest_dir: str = RUN_MANIFEST_DIR) -> Dict[str, Any] | None:
+    """读取指定的运行清单；不指定时读取最近一次非预演运行的清单"""
+    if run_id:
+        with open(manifest_path(run_id, manifest_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if not os.path.isdir(manifest_dir):
+        return None
+    # run_id 以启动时间开头，按文件名倒序即按时间倒序
+    for filename in sorted(os.listdir(manifest_dir), reverse=True):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(manifest_dir, filename), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not manifest.get("dry_run"):
+            return manifest
+    return None
+
+def resume_plan(previous: Dict[str, Any]) -> List[str]:
+    """上次运行中第一个未成功的阶段及其后的阶段 (全部成功时为空)"""
+    stages = [stage["name"] for stage in previous["stages"]]
+    for i, stage in enumerate(previous["stages"]):
+        if stage["status"] != "ok":
+            return stages[i:]
+    return []
+
+def new_manifest(stages: List[str], args: argparse.Namespace, resumed_from: str | None) -> Dict[str, Any]:
+    started = datetime.now()
+    return {
+        "run_id": f"{started.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}",
+        "status": "running",
+        "started_at": started.isoformat(timespec='seconds'),
+        "finished_at": None,
+        "seconds": None,
+        "since": args.since.isoformat() if args.since else None,
+        "until": args.until.isoformat() if args.until else None,
+        "dry_run": args.dry_run,
+        "resumed_from": resumed_from,
+        "stages": [
+            {"name": name, "status": "pending", "started_at": None, "import_seconds": None, "seconds": None, "error": None}
+            for name in stages
+        ],
+    }
+
+# --- 执行 (Execution) ---
+
+def run_stage(index: int, total: int, stage: Dict[str, Any], args: argparse.Namespace):
+    """导入并运行一个阶段 (异常由调用方记录)"""
+    module_name, label, span_name, takes_window, uses_llm = STAGES[stage["name"]]
+    print(f"\n[阶段 {index}/{total}] 正在启动{label} ({module_name}.py)...")
+    stage_start = time()
+    module = import_stage(module_name)
+    stage["import_seconds"] = round(time() - stage_start, 3)
+
+    kwargs = {"dry_run": args.dry_run}
+    if takes_window:
+        kwargs.update(since=args.since, until=args.until)
+    elif args.since or args.until:
+        print(f"  > {label}不受 --since/--until 限制。")
+
+    cache_before = get_cache_stats() if uses_llm else None
+    with span("stage", trace=True, stage=span_name):
+        module.main(**kwargs)
+    cache_note = f", {format_cache_stats(cache_before)}" if uses_llm else ""
+    print(f"[阶段 {index}/{total}] {label}执行完毕。 (耗时: {time() - stage_start:.2f} 秒, 导入 {stage['import_seconds']:.2f} 秒{cache_note})")
+
+def main_workflow(argv: List[str] | None = None) -> int:
+    """
+    按顺序执行选定的流水线阶段，返回退出码。
     这是我们 GitHub Action 的唯一入口点。
     """
-    print("--- 自动化工作流 (main.py) 启动 ---")
+    parser = argparse.ArgumentParser(description="AI 趋势分析流水线: 关键词同步 → L0 爬取 → L1 分析 → L2 报告")
+    parser.add_argument("--stages", type=parse_stages, default=list(STAGES),
+                        help=f"要运行的阶段，逗号分隔 (默认全部: {','.join(STAGES)})")
+    parser.add_argument("--since", type=parse_time, help="时间窗口起点 (含)，作用于爬取和 L2 报告")
+    parser.add_argument("--until", type=lambda v: parse_time(v, end_of_day=True),
+                        help="时间窗口终点 (不含；只给日期时包含当天)")
+    parser.add_argument("--dry-run", action="store_true", help="预演: 只读取和统计，不调用外部 API / LLM，不写数据库")
+    parser.add_argument("--resume", nargs="?", const="", metavar="RUN_ID",
+                        help="从上次 (或指定) 运行失败的阶段继续，沿用其阶段和时间窗口")
+    parser.add_argument("--keep-going", action="store_true", help="某个阶段失败后继续运行后面的阶段")
+    args = parser.parse_args(argv)
+
+    stages, resumed_from = args.stages, None
+    if args.resume is not None:
+        try:
+            previous = load_manifest(args.resume or None)
+        except (OSError, ValueError) as e:
+            print(f"🔴 错误: 无法读取运行清单 '{args.resume}': {e}")
+            return 1
+        if previous is None:
+            print(f"🔴 错误: {os.path.abspath(RUN_MANIFEST_DIR)} 中没有可以继续的运行清单。")
+            return 1
+        stages = resume_plan(previous)
+        if not stages:
+            print(f"🟢 运行 {previous['run_id']} 已全部成功完成，无需继续。")
+            return 0
+        resumed_from = previous["run_id"]
+        # 沿用上次的时间窗口 (命令行另行指定时以命令行为准)
+        args.since = args.since or (datetime.fromisoformat(previous["since"]) if previous.get("since") else None)
+        args.until = args.until or (datetime.fromisoformat(previous["until"]) if previous.get("until") else None)
+        print(f"  > 继续运行 {resumed_from}: 从阶段 '{stages[0]}' 开始 ({', '.join(stages)})。")
+
+    if args.since and args.until and args.since >= args.until:
+        print(f"🔴 错误: --since ({args.since}) 必须早于 --until ({args.until})。")
+        return 1
+
+    manifest = new_manifest(stages, args, resumed_from)
+    print(f"--- 自动化工作流 (main.py) 启动 --- (运行 {manifest['run_id']}: {', '.join(stages)}"
+          f"{'，预演' if args.dry_run else ''})")
     start_time = time()
-    
+    failed = []
+
     try:
-        # --- 阶段 0: 关键词同步 ---
-        print("\n[阶段 0/4] 正在启动关键词同步 (sync_topics.py)...")
-        sync_start = time()
-        sync_topics.main()  # ⬅️ 【新增】首先运行同步
-        print(f"[阶段 0/4] 关键词同步完毕。 (耗时: {time() - sync_start:.2f} 秒)")
-        
-        # --- 阶段 1: L0 爬取 ---
-        print("\n[阶段 1/4] 正在启动爬虫 (crawler.py)...")
-        crawler_start = time()
-        crawler.main()
-        print(f"[阶段 1/4] 爬虫执行完毕。 (耗时: {time() - crawler_start:.2f} 秒)")
-        
-        # --- 阶段 2: L1 分析 ---
-        print("\n[阶段 2/4] 正在启动 L1 分析 (analysis.py)...")
-        analysis_start = time()
-        analysis.main()
-        print(f"[阶段 2/4] L1 分析执行完毕。 (耗时: {time() - analysis_start:.2f} 秒)")
-        
-        # --- 阶段 3: L2 报告 ---
-        print("\n[阶段 3/4] 正在启动 L2 报告 (report.py)...")
-        report_start = time()
-        report.main()
-        print(f"[阶段 3/4] L2 报告执行完毕。 (耗时: {time() - report_start:.2f} 秒)")
-        
-        print("\n--- 自动化工作流 (main.py) 成功完成 ---")
-        
-    except Exception as e:
-        print(f"🔴 致命错误：工作流在执行中失败: {e}")
-        sys.exit(1)
+        write_manifest(manifest)
+        for index, stage in enumerate(manifest["stages"], start=1):
+            if failed and not args.keep_going:
+                stage["status"] = "skipped"
+                continue
+            stage["status"] = "running"
+            stage["started_at"] = datetime.now().isoformat(timespec='seconds')
+            write_manifest(manifest)
+            stage_start = time()
+            try:
+                run_stage(index, len(stages), stage, args)
+                stage["status"] = "ok"
+            except (Exception, SystemExit) as e:
+                # 记录失败并停止 (或 --keep-going 时继续)，之后可用 --resume 从这里继续
+                stage["status"] = "failed"
+                stage["error"] = f"{type(e).__name__}: {e}"
+                failed.append(stage["name"])
+                print(f"🔴 致命错误：阶段 '{stage['name']}' 执行失败: {stage['error']}")
+            stage["seconds"] = round(time() - stage_start, 3)
+            write_manifest(manifest)
+
+        if failed:
+            print(f"\n--- 自动化工作流 (main.py) 失败 (阶段: {', '.join(failed)}) ---")
+            print(f"   修复后可运行 `python -m scripts.main --resume {manifest['run_id']}` 从失败的阶段继续。")
+        else:
+            print("\n--- 自动化工作流 (main.py) 成功完成 ---")
     finally:
-        print(f"总耗时: {time() - start_time:.2f} 秒。")
+        # 被中断 (Ctrl-C / 进程被杀前的异常) 的阶段同样记为未完成
+        for stage in manifest["stages"]:
+            if stage["status"] == "running":
+                stage["status"] = "interrupted"
+        manifest["status"] = "ok" if all(stage["status"] == "ok" for stage in manifest["stages"]) else "failed"
+        manifest["finished_at"] = datetime.now().isoformat(timespec='seconds')
+        manifest["seconds"] = round(time() - start_time, 3)
+        write_manifest(manifest)
+        print(f"总耗时: {time() - start_time:.2f} 秒。 ({format_cache_stats()})")
+        print(f"运行清单: {os.path.abspath(manifest_path(manifest['run_id']))}")
+        # 运行报告 (JSON) 和 Prometheus textfile，失败的运行同样会写出
+        write_run_report()
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    main_workflow()
\ No newline at end of file
+    sys.exit(main_workflow())
@@ -0,0 +1,373 @@
+import os
+import json
+import uuid
+import bisect
+import threading
+from time import time, perf_counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+# -----------------------------------------------------------------
+# 运行指标与追踪 (Metrics & Tracing)
+# -----------------------------------------------------------------
+#
+# 进程内的轻量指标注册表，crawler / analysis / report / db 共用：
+#   * counter:   累加值 (请求数、token 数、重试次数、字节数...)
+#   * gauge:     最新值 (当前并发上限、在途请求数...)
+#   * histogram: 固定分桶的耗时分布 (每次 LLM 调用、HTTP 请求、数据库操作...)
+#   * span:      计时上下文，结果计入 '<name>_seconds' 直方图；
+#                trace=True 的 span (阶段、报告等粗粒度操作) 还会保留在追踪列表中。
+# 每次记录只是一次加锁的字典更新 (微秒级)，默认开启；
+# 运行结束时写出 JSON 运行报告和 Prometheus textfile (node_exporter textfile collector 格式)。
+#
+# 常量定义 (Constants)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR",
+    os.path.join(os.path.dirname(__file__), '..', '.cache', 'metrics')
+)
+RUN_REPORT_PATH = os.path.join(METRICS_DIR, 'run_report.json')
+PROMETHEUS_PATH = os.path.join(METRICS_DIR, 'dailynews.prom')
+# Prometheus 指标名前缀
+METRIC_PREFIX = "dailynews_"
+# 直方图分桶上界 (秒)，覆盖数据库的毫秒级往返到 LLM 的分钟级长文本调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# 追踪列表最多保留的 span 数 (超出后只计入直方图)
+MAX_TRACE_SPANS = 2000
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """固定分桶的直方图 (非累积计数，导出时再累加)"""
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        """由分桶线性插值估算分位数 (不保存原始样本，内存与调用次数无关)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(self.min, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": round(self.quantile(0.50), 6) if self.count else None,
+            "p95": round(self.quantile(0.95), 6) if self.count else None,
+        }
+
+
+class MetricsRegistry:
+    """
+    线程安全的指标注册表。所有方法在 METRICS_ENABLED=false 时直接返回。
+    """
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time()
+        self._start = perf_counter()
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._trace: List[Dict[str, Any]] = []
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, trace: bool = False, **labels):
+        """
+        计时一个操作: 耗时计入 '<name>_seconds'，抛出异常时计入 '<name>_errors_total'。
+        trace=True 时记录到追踪列表 (同一线程内嵌套的 span 记录父 span)。
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        record = None
+        if trace:
+            record = {
+                "name": name,
+                "labels": dict(labels),
+                "parent": stack[-1]["name"] if stack else None,
+                "start_offset": round(perf_counter() - self._start, 6),
+            }
+            stack.append(record)
+        start = perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            self.observe(f"{name}_seconds", elapsed, **labels)
+            if record is not None:
+                stack.pop()
+                record["seconds"] = round(elapsed, 6)
+                record["status"] = status
+                with self._lock:
+                    if len(self._trace) < MAX_TRACE_SPANS:
+                        self._trace.append(record)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前所有指标的 JSON 可序列化快照"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            trace = sorted(self._trace, key=lambda s: s["start_offset"])
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "duration_seconds": round(perf_counter() - self._start, 3),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+            "spans": trace,
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式 (counter / gauge / histogram，外加本次运行的时间戳和时长)"""
+        def fmt_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                f'{k}="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                for k, v in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{fmt_labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} gauge")
+                    typed.add(metric)
+                lines.append(f"{metric}{fmt_labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, bucket_count in zip(list(histogram.buckets) + [float('inf')], histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                    lines.append(f"{metric}_bucket{fmt_labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{metric}_sum{fmt_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{fmt_labels(labels)} {histogram.count}")
+        lines.append(f"# TYPE {METRIC_PREFIX}run_timestamp_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}run_timestamp_seconds {self.started_at:.3f}")
+        lines.append(f"# TYPE {METRIC_PREFIX}run_duration_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}run_duration_seconds {perf_counter() - self._start:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+# --- 全局注册表 (所有脚本共用) ---
+registry = MetricsRegistry()
+
+def inc(name: str, value: float = 1, **labels):
+    registry.inc(name, value, **labels)
+
+def gauge(name: str, value: float, **labels):
+    registry.set_gauge(name, value, **labels)
+
+def observe(name: str, value: float, **labels):
+    registry.observe(name, value, **labels)
+
+def span(name: str, trace: bool = False, **labels):
+    return registry.span(name, trace, **labels)
+
+def _atomic_write(path: str, content: str):
+    """先写临时文件再改名 (textfile collector 不会读到写了一半的文件)"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def format_summary(limit: int = 8) -> str:
+    """按累计耗时列出最重的几类操作，一眼看出慢在 LLM、数据库还是 GNews"""
+    histograms = sorted(registry.snapshot()["histograms"], key=lambda h: h["sum"], reverse=True)
+    lines = []
+    for h in histograms[:limit]:
+        labels = ",".join(f"{k}={v}" for k, v in h["labels"].items())
+        lines.append(
+            f"    {h['name']}{'{' + labels + '}' if labels else ''}: {h['count']} 次, 共 {h['sum']:.2f} 秒, "
+            f"p50 {h['p50'] * 1000:.0f} ms, p95 {h['p95'] * 1000:.0f} ms"
+        )
+    return "\n".join(lines)
+
+def write_run_report(report_path: str = RUN_REPORT_PATH, prometheus_path: str = PROMETHEUS_PATH):
+    """写出 JSON 运行报告和 Prometheus textfile (失败只打印警告，不影响流水线结果)"""
+    if not registry.enabled:
+        return
+    try:
+        _atomic_write(report_path, json.dumps(registry.snapshot(), ensure_ascii=False, indent=2))
+        _atomic_write(prometheus_path, registry.to_prometheus())
+        print(f"🟢 运行指标已写入 {os.path.abspath(report_path)} 和 {os.path.abspath(prometheus_path)}")
+        summary = format_summary()
+        if summary:
+            print("  > 累计耗时最多的操作:\n" + summary)
+    except Exception as e:
+        print(f"🟡 警告: 写入运行指标失败: {e}")
+
+# -----------------------------------------------------------------
+# HTTP 与 LLM 的自动埋点
+# -----------------------------------------------------------------
+
+def _on_request(service: str, request):
+    request.extensions["metrics_start"] = perf_counter()
+    # openai 客户端会在重试的请求上带 'x-stainless-retry-count'
+    if request.headers.get("x-stainless-retry-count", "0") != "0":
+        inc("http_retries_total", service=service)
+    try:
+        inc("http_request_bytes_total", len(request.content), service=service)
+    except Exception:
+        pass  # 流式请求体，长度未知
+
+def _on_response(service: str, response):
+    start = response.request.extensions.get("metrics_start")
+    if start is not None:
+        observe("http_request_seconds", perf_counter() - start, service=service)
+    inc("http_requests_total", service=service, status=str(response.status_code))
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        inc("http_response_bytes_total", int(content_length), service=service)
+
+def httpx_event_hooks(service: str, is_async: bool = False) -> Dict[str, list]:
+    """
+    httpx 客户端的 event_hooks：按服务 (gnews / llm / supabase) 统计请求数、状态码、
+    耗时 (到收到响应头为止)、收发字节数和重试次数。AsyncClient 需要 is_async=True。
+    """
+    if not registry.enabled:
+        return {}
+    if is_async:
+        async def on_request(request):
+            _on_request(service, request)
+
+        async def on_response(response):
+            _on_response(service, response)
+    else:
+        def on_request(request):
+            _on_request(service, request)
+
+        def on_response(response):
+            _on_response(service, response)
+    return {"request": [on_request], "response": [on_response]}
+
+def llm_instrumentation(prompt_name: str) -> Dict[str, Any]:
+    """
+    ChatOpenAI 的额外构造参数: 记录每次 LLM 调用耗时、token 用量和错误的回调，
+    以及带 HTTP 埋点的客户端 (可看到 429/5xx 和 SDK 内部的重试)。
+    """
+    if not registry.enabled:
+        return {}
+    from openai import DefaultHttpxClient
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetricsHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._starts: Dict[Any, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = perf_counter()
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._starts[run_id] = perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._starts.pop(run_id, None)
+            if start is not None:
+                observe("llm_call_seconds", perf_counter() - start, prompt=prompt_name)
+            inc("llm_calls_total", prompt=prompt_name, status="ok")
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            inc("llm_tokens_total", usage.get("prompt_tokens") or 0, prompt=prompt_name, kind="prompt")
+            inc("llm_tokens_total", usage.get("completion_tokens") or 0, prompt=prompt_name, kind="completion")
+            # 命中供应商前缀缓存的提示词 token (OpenAI: prompt_tokens_details.cached_tokens；DeepSeek: prompt_cache_hit_tokens)
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or usage.get("prompt_cache_hit_tokens")
+            inc("llm_tokens_total", cached or 0, prompt=prompt_name, kind="cached")
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._starts.pop(run_id, None)
+            inc("llm_calls_total", prompt=prompt_name, status="error")
+            inc("llm_errors_total", prompt=prompt_name, error=type(error).__name__)
+
+    return {
+        "callbacks": [LLMMetricsHandler()],
+        "http_client": DefaultHttpxClient(event_hooks=httpx_event_hooks("llm")),
+    }
@@ -1,17 +1,26 @@
 import os
 import sys
 import json
-from datetime import datetime, timedelta
+import functools
+from time import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import ValidationError
 from collections import defaultdict
-from typing import List, Dict, Any # ⬅️ 导入 Any
+from typing import List, Dict, Any, Callable, Tuple # ⬅️ 导入 Any
 
 # 导入我们自己的模块
-from .db import get_db_client
-from .l2_structure import L2ReportStructure
+from .storage import get_storage
+from .l2_structure import L2ReportStructure, L2PartialSummary
+from .llm_cache import with_llm_cache
+from .llm_output import build_structured_chain, output_signature, LLM_OUTPUT_MODE
+from .metrics import span, inc, llm_instrumentation, write_run_report
+from .llm_concurrency import with_adaptive_concurrency, get_llm_limiter, LLM_MAX_CONCURRENCY
+from .analysis import estimate_tokens, estimate_prompt_tokens
+from .bundles import publish_bundle, BUNDLES_ENABLED, BUNDLE_DIR
 
 # -----------------------------------------------------------------
 # 常量定义 (Constants)
@@ -20,46 +29,70 @@ MODEL_NAME = os.environ.get("MODEL_NAME", "deepseek-chat")
 LANGUAGE = os.environ.get("LANGUAGE", "Chinese")
 # 【新】定义 L2 报告要显示的热门实体数量
 TOP_N_ENTITIES = 5 
+# 同时生成 L2 报告的分类数上限 (每个分类一次长文本 AI 调用，彼此独立)；
+# 实际同时进行的 AI 调用数由与 L1 共享的自适应并发控制器决定
+L2_MAX_WORKERS = int(os.environ.get("L2_MAX_WORKERS", str(LLM_MAX_CONCURRENCY)))
 
-def load_prompt() -> str:
-    """从文件加载 L2 提示词"""
-    prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', 'l2_report.txt')
+# --- L2 输入压缩与 Map-Reduce ---
+# 文章以 "标题 | 摘要 | 情感分" 的表格行发送 (不再是缩进 JSON)，摘要截断到该字符数
+L2_SUMMARY_MAX_CHARS = int(os.environ.get("L2_SUMMARY_MAX_CHARS", "200"))
+# 单次 L2 调用中文章数据的估算 token 预算；超出时按预算分块 (map)，再合并分块摘要 (reduce)
+L2_CHUNK_TOKEN_BUDGET = int(os.environ.get("L2_CHUNK_TOKEN_BUDGET", "6000"))
+L2_MAP_REDUCE = os.environ.get("L2_MAP_REDUCE", "true").lower() == "true"
+
+def load_prompt(filename: str = 'l2_report.txt') -> str:
+    """从 'prompts' 目录加载 L2 提示词"""
+    prompt_path = os.path.join(os.path.dirname(__file__), 'prompts', filename)
     with open(prompt_path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def get_l1_data_for_report() -> Dict[str, List[Dict]]:
+def build_chain(prompt_filename: str, pydantic_object):
     """
-    【修改】获取过去24h的 L1 摘要数据 (与之前相同)
+    构建 'prompt | llm | parser' chain 并套上 LLM 响应缓存，返回 (chain, prompt)。
     """
-    print("  (Report Step 1/4) 正在从数据库获取过去 24h 的 L1 摘要数据...")
-    db = get_db_client()
+    # 1. 加载原始提示词字符串 (静态指令在前，每次调用的数据在 PROMPT_INPUT_MARKER 之后)
+    prompt_template_str = load_prompt(prompt_filename)
+    
+    # 2. 初始化 LLM
+    #    (附带指标埋点: 每次调用的耗时、token 用量、429/5xx 和重试，见 metrics.py)
+    #    (关闭 SDK 自带的重试: 429/5xx 由共享的并发控制器退避重试，并据此调整并发)
+    prompt_name = prompt_filename.rsplit('.', 1)[0]
+    llm = ChatOpenAI(model=MODEL_NAME, max_retries=0, **llm_instrumentation(prompt_name))
+    
+    # 3. 按输出模式 (LLM_OUTPUT_MODE，见 llm_output.py) 创建 'prompt | llm | parser' chain：
+    #    'parser' 附加完整格式化指令并解析文本；其他模式使用模型原生的 JSON / 工具调用和紧凑 schema
+    chain, prompt = build_structured_chain(prompt_template_str, pydantic_object, llm)
+    
+    # 4. 每次调用都经过与 L1 共享的自适应并发控制器
+    chain = with_adaptive_concurrency(chain, prompt_name)
     
-    time_threshold = (datetime.now() - timedelta(days=1)).isoformat()
+    # 5. 套上本地 LLM 响应缓存 (与 L1 共用)，报告重新生成时可直接命中
+    return with_llm_cache(chain, prompt, MODEL_NAME, pydantic_object, output_signature(pydantic_object)), prompt
+
+def utc_today() -> str:
+    """默认的报告日期: 今天 (UTC)，与 entity_daily_stats 的统计日期和 daily_trending_entities 视图一致"""
+    return str(datetime.now(timezone.utc).date())
+
+def get_l1_data_for_report(since: datetime | None = None, until: datetime | None = None) -> Dict[str, List[Dict]]:
+    """
+    【修改】获取 [since, until) 窗口内的 L1 摘要数据 (默认为过去 24h)
+    """
+    if since is None and until is None:
+        print("  (Report Step 1/4) 正在从数据库获取过去 24h 的 L1 摘要数据...")
+    else:
+        print(f"  (Report Step 1/4) 正在从数据库获取 {since or '-'} ~ {until or '-'} 的 L1 摘要数据...")
+    time_threshold = (since or (until or datetime.now(timezone.utc)) - timedelta(days=1)).isoformat()
     
     try:
-        # 此查询保持不变
-        response = db.table("l1_analysis_sentiment").select(
-            """
-            analyzed_at,
-            raw_articles (
-                title,
-                tracked_topics ( category )
-            ),
-            ai_summary,
-            sentiment_score
-            """
-        ).gte("analyzed_at", time_threshold).execute()
-
-        data = response.data
+        data = get_storage().fetch_l1_window(time_threshold, until.isoformat() if until else None)
         
         grouped_data = defaultdict(list)
         for item in data:
-            if not item.get('raw_articles') or not item['raw_articles'].get('tracked_topics'):
+            if not item.get('category'):
                 continue
                 
-            category = item['raw_articles']['tracked_topics']['category']
-            grouped_data[category].append({
-                "title": item['raw_articles']['title'],
+            grouped_data[item['category']].append({
+                "title": item['title'],
                 "summary": item['ai_summary'],
                 "sentiment_score": item['sentiment_score']
             })
@@ -68,60 +101,150 @@ def get_l1_data_for_report() -> Dict[str, List[Dict]]:
         return grouped_data
 
     except Exception as e:
+        # 读库失败不能当成"窗口内没有数据"，让本阶段记为失败
         tqdm.write(f"🔴 错误: 无法获取 L1 摘要数据: {e}")
-        return {}
+        raise
 
-def get_grouped_trending_entities() -> Dict[str, List[Dict]]:
+def get_grouped_trending_entities(start_date: str | None = None, end_date: str | None = None) -> Dict[str, List[Dict]]:
     """
-    【新增】从 'daily_trending_entities' 视图中获取已聚合的热门实体数据。
+    【新增】从 'entity_daily_stats' 预聚合表 (通过 'get_trending_entities' RPC) 获取日期范围内 (默认今天) 的热门实体。
+    这是一次主键范围扫描，不再需要五表连接。
     """
-    print("  (Report Step 2/4) 正在从数据库视图获取热门实体数据...")
-    db = get_db_client()
+    print("  (Report Step 2/4) 正在从实体每日统计获取热门实体数据...")
+    today = utc_today()
     try:
-        # 直接查询我们创建的视图
-        response = db.table("daily_trending_entities").select("*").execute()
+        trending = get_storage().get_trending_entities(start_date or today, end_date or today, TOP_N_ENTITIES)
         
         grouped_entities = defaultdict(list)
-        for entity in response.data:
-            # 视图返回的数据字段已完美匹配 l2_structure.py 中的 TrendingTopic 模型
+        for entity in trending:
+            # 返回的数据字段已完美匹配 l2_structure.py 中的 TrendingTopic 模型
             #
             grouped_entities[entity['category']].append(entity)
             
-        tqdm.write(f"  > 成功获取 {len(response.data)} 条热门实体数据。")
+        tqdm.write(f"  > 成功获取 {len(trending)} 条热门实体数据。")
         return grouped_entities
         
     except Exception as e:
-        # 如果视图不存在 (e.g., SQL 未运行)，这里会报错
-        tqdm.write(f"🔴 错误: 无法从 'daily_trending_entities' 视图获取数据: {e}")
-        tqdm.write("   请确保你已在数据库中运行了 schema.sql 中的 CREATE VIEW 语句。")
+        # 如果函数不存在 (e.g., SQL 未运行)，这里会报错
+        tqdm.write(f"🔴 错误: 无法从 'get_trending_entities' 获取数据: {e}")
+        tqdm.write("   请确保你已在数据库中运行了 schema.sql 中的 entity_daily_stats 相关语句。")
         return {}
 
+def clean_field(value: Any) -> str:
+    """把字段压成单行，并去掉会与列分隔符混淆的 '|'"""
+    return " ".join(str(value or "").replace("|", "/").split())
+
+def encode_article_row(article: Dict) -> str:
+    """把一篇文章编码为紧凑的表格行: 标题 | 摘要 (截断) | 情感分"""
+    summary = clean_field(article.get('summary'))
+    if len(summary) > L2_SUMMARY_MAX_CHARS:
+        summary = summary[:L2_SUMMARY_MAX_CHARS - 1] + "…"
+    score = article.get('sentiment_score')
+    score_text = f"{score:.2f}" if isinstance(score, (int, float)) else "?"
+    return f"{clean_field(article.get('title'))} | {summary} | {score_text}"
+
+def chunk_rows(rows: List[str], token_budget: int = L2_CHUNK_TOKEN_BUDGET) -> List[List[str]]:
+    """按估算的 token 预算把表格行切成若干块 (单行超预算时自成一块)"""
+    chunks, current, current_tokens = [], [], 0
+    for row in rows:
+        row_tokens = estimate_tokens(row) + 1
+        if current and current_tokens + row_tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(row)
+        current_tokens += row_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def average_sentiment(l1_article_data: List[Dict]) -> float:
+    """在本地计算分类的平均情感分 (忽略缺失值)"""
+    scores = [a['sentiment_score'] for a in l1_article_data if isinstance(a.get('sentiment_score'), (int, float))]
+    return sum(scores) / len(scores) if scores else 0.0
+
+def map_reduce_l2_report(
+    category: str,
+    chunks: List[List[str]],
+    l1_article_data: List[Dict],
+    entity_data_json: str,
+    chains: Dict[str, Tuple[Any, ChatPromptTemplate]]
+) -> Tuple[L2ReportStructure, int]:
+    """
+    Map: 每个分块生成一份中间摘要；Reduce: 把中间摘要合并成最终的 L2ReportStructure。
+    整体情感分无法由单次调用看到全部文章，因此在本地计算后注入 reduce 提示词，并以它为准。
+    返回 (报告, 所有调用的估算提示词 token 总数)。
+    """
+    map_chain, map_prompt = chains["map"]
+    reduce_chain, reduce_prompt = chains["reduce"]
+    prompt_tokens = 0
+
+    notes = []
+    for index, chunk in enumerate(chunks, start=1):
+        map_input = {
+            "language": LANGUAGE,
+            "category": category,
+            "l1_data_rows": "\n".join(chunk)
+        }
+        prompt_tokens += estimate_prompt_tokens(map_prompt, map_input)
+        partial: L2PartialSummary = map_chain.invoke(map_input)
+        developments = "".join(f"\n  - {d}" for d in partial.key_developments)
+        notes.append(f"[{index}] ({len(chunk)} articles) {partial.partial_summary}{developments}")
+
+    overall_sentiment = round(average_sentiment(l1_article_data), 4)
+    reduce_input = {
+        "language": LANGUAGE,
+        "category": category,
+        "article_count": len(l1_article_data),
+        "average_sentiment": overall_sentiment,
+        "partial_summaries": "\n".join(notes),
+        "entity_data_json": entity_data_json
+    }
+    prompt_tokens += estimate_prompt_tokens(reduce_prompt, reduce_input)
+    response: L2ReportStructure = reduce_chain.invoke(reduce_input)
+    return response.model_copy(update={"overall_sentiment_score": overall_sentiment}), prompt_tokens
+
 def generate_l2_report(
     category: str, 
     l1_article_data: List[Dict], 
     l1_entity_data: List[Dict], 
-    chain
+    chains: Dict[str, Tuple[Any, ChatPromptTemplate]]
 ) -> L2ReportStructure | None:
     """
-    【修改】为单个分类调用 AI，同时注入“摘要”和“实体”
+    【修改】为单个分类调用 AI，同时注入“摘要”和“实体”。
+    文章数据以紧凑表格行发送；超出 L2_CHUNK_TOKEN_BUDGET 时走 map-reduce。
     """
     try:
-        # 1. 准备 L1 摘要 JSON
-        l1_data_json = json.dumps(l1_article_data, ensure_ascii=False, indent=2)
+        # 1. 准备 L1 摘要 (紧凑表格行)
+        rows = [encode_article_row(article) for article in l1_article_data]
+        chunks = chunk_rows(rows)
         
         # 2. 【新】准备 L1 实体 JSON (只取 Top N)
         top_entities = l1_entity_data[:TOP_N_ENTITIES]
-        entity_data_json = json.dumps(top_entities, ensure_ascii=False, indent=2)
+        entity_data_json = json.dumps(top_entities, ensure_ascii=False, separators=(',', ':'))
 
-        # 3. 准备 AI 输入
-        ai_input = {
-            "language": LANGUAGE,
-            "category": category,
-            "l1_data_json": l1_data_json,
-            "entity_data_json": entity_data_json # ⬅️ 【新】注入实体数据
-        }
-        
-        response: L2ReportStructure = chain.invoke(ai_input)
+        report_chain, report_prompt = chains["report"]
+        if L2_MAP_REDUCE and len(chunks) > 1:
+            response, prompt_tokens = map_reduce_l2_report(
+                category, chunks, l1_article_data, entity_data_json, chains
+            )
+            calls = len(chunks) + 1
+            inc("l2_map_chunks_total", len(chunks))
+        else:
+            # 3. 准备 AI 输入 (单次调用)
+            ai_input = {
+                "language": LANGUAGE,
+                "category": category,
+                "l1_data_rows": "\n".join(rows),
+                "entity_data_json": entity_data_json # ⬅️ 【新】注入实体数据
+            }
+            prompt_tokens = estimate_prompt_tokens(report_prompt, ai_input)
+            response: L2ReportStructure = report_chain.invoke(ai_input)
+            calls = 1
+
+        inc("l2_prompt_tokens_estimated_total", prompt_tokens, format="compact")
+        tqdm.write(
+            f"  > {category}: {len(l1_article_data)} 篇文章, {calls} 次 AI 调用, 提示词约 {prompt_tokens} tokens"
+        )
         
         # 4. 【新】将我们预先计算的实体数据“覆盖”回 AI 响应
         #    我们信任自己的聚合数据，AI 的职责是基于这些数据写摘要。
@@ -146,17 +269,14 @@ def generate_l2_report(
     
     return None
 
-def save_l2_report_to_db(category: str, report: L2ReportStructure):
+def save_l2_report_to_db(category: str, report: L2ReportStructure, report_date: str | None = None):
     """
-    将 L2 报告存入数据库 'daily_reports' (表 6)。
+    将 L2 报告存入数据库 'daily_reports' (表 6)，report_date 默认为今天 (UTC)。
     (此函数无需修改，但请注意我们修复了 schema.sql 中的字段名)
     """
-    db = get_db_client()
-    today = datetime.now().date()
-    
     try:
         report_data = {
-            "report_date": str(today),
+            "report_date": report_date or utc_today(),
             "category": category,
             "report_summary": report.report_summary,
             "overall_sentiment_score": report.overall_sentiment_score,
@@ -165,89 +285,162 @@ def save_l2_report_to_db(category: str, report: L2ReportStructure):
         }
         
         # 'upsert' 会在 (report_date, category) 冲突时“更新”报告
-        db.table("daily_reports").upsert(
-            report_data, 
-            on_conflict="report_date, category"
-        ).execute()
+        get_storage().upsert_report(report_data)
         return True
         
     except Exception as e:
         tqdm.write(f"🔴 数据库写入 L2 报告失败 (分类: {category}): {e}")
         return False
 
-def main():
+def timed_generate_l2_report(
+    category: str,
+    l1_article_data: List[Dict],
+    l1_entity_data: List[Dict],
+    chains: Dict[str, Tuple[Any, ChatPromptTemplate]]
+):
+    """在工作线程中生成报告，并返回 (报告, 生成耗时)"""
+    start = time()
+    with span("l2_report", trace=True, category=category):
+        report = generate_l2_report(category, l1_article_data, l1_entity_data, chains)
+    return report, time() - start
+
+def generate_reports_concurrently(
+    grouped_l1_data: Dict[str, List[Dict]],
+    grouped_entity_data: Dict[str, List[Dict]],
+    chains: Dict[str, Tuple[Any, ChatPromptTemplate]],
+    max_workers: int = L2_MAX_WORKERS,
+    save_fn: Callable[[str, L2ReportStructure], bool] = save_l2_report_to_db
+) -> Dict[str, Any]:
     """
-    L2 报告脚本主函数
+    为每个分类并行生成 L2 报告 (最多 max_workers 个 AI 调用同时进行)。
+    主线程按完成顺序逐个入库，入库与其余分类的生成同时进行；
+    某个分类失败 (AI 调用、解析或入库) 只记录下来，不影响其他分类。
+    总耗时约等于最慢的那份报告，而不是所有报告之和。
     """
-    print("--- L2 报告脚本 (report.py) 启动 ---")
-    
-    # 1. 初始化 AI (不变)
-    try:
-        # 【新】导入 Pydantic 解析器
-        from langchain_core.output_parsers import PydanticOutputParser
-        
-        # 1. 加载原始提示词字符串
-        l2_prompt_template_str = load_prompt()
-        
-        # 2. 设置我们的解析器
-        parser = PydanticOutputParser(pydantic_object=L2ReportStructure)
-        
-        # 3. 从解析器获取 JSON 格式化指令
-        format_instructions = parser.get_format_instructions()
-        
-        # 4. 【关键】将格式化指令附加到原始提示词的末尾
-        l2_prompt_template_str += "\n\n{format_instructions}\n"
-        
-        # 5. 创建新的、包含格式化指令的 PromptTemplate
-        prompt = ChatPromptTemplate.from_template(
-            l2_prompt_template_str,
-            partial_variables={"format_instructions": format_instructions}
+    stats = {"saved": 0, "failed": [], "slowest_seconds": 0.0, "sequential_seconds": 0.0}
+    start = time()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor, \
+            tqdm(total=len(grouped_l1_data), desc="生成 L2 报告") as pbar:
+        futures = {
+            executor.submit(
+                timed_generate_l2_report,
+                category, l1_data, grouped_entity_data.get(category, []), chains
+            ): category
+            for category, l1_data in grouped_l1_data.items()
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            pbar.set_description(f"L2 报告: {category}")
+            try:
+                report, elapsed = future.result()
+                stats["slowest_seconds"] = max(stats["slowest_seconds"], elapsed)
+                stats["sequential_seconds"] += elapsed
+                if report and save_fn(category, report):
+                    stats["saved"] += 1
+                    inc("l2_reports_total", status="ok")
+                else:
+                    stats["failed"].append(category)
+                    inc("l2_reports_total", status="failed")
+            except Exception as e:
+                tqdm.write(f"🔴 L2 报告处理失败 (分类: {category}): {e}")
+                stats["failed"].append(category)
+                inc("l2_reports_total", status="failed")
+            pbar.update(1)
+
+    stats["wall_seconds"] = time() - start
+    return stats
+
+def describe_report_plan(grouped_l1_data: Dict[str, List[Dict]], grouped_entity_data: Dict[str, List[Dict]]):
+    """
+    预演模式: 打印每个分类将发送的文章数、估算 token 和调用次数，不调用 AI、不写库。
+    同时给出旧格式 (缩进 JSON) 的文章数据 token 数作对比 (正式运行时不计算)。
+    """
+    for category, l1_data in sorted(grouped_l1_data.items()):
+        rows = [encode_article_row(article) for article in l1_data]
+        chunks = chunk_rows(rows)
+        calls = len(chunks) + 1 if L2_MAP_REDUCE and len(chunks) > 1 else 1
+        compact_tokens = sum(estimate_tokens(row) + 1 for row in rows)
+        baseline_tokens = estimate_tokens(json.dumps(l1_data, ensure_ascii=False, indent=2))
+        print(
+            f"  > [预演] {category}: {len(l1_data)} 篇文章，{len(grouped_entity_data.get(category, []))} 个热门实体，"
+            f"文章数据约 {compact_tokens} token (缩进 JSON 格式约 {baseline_tokens} token)，{calls} 次 AI 调用"
         )
-        
-        # 6. 【修复】初始化 LLM，但*不*使用 .with_structured_output()
-        llm = ChatOpenAI(model=MODEL_NAME)
-        
-        # 7. 创建新的 chain
-        chain = prompt | llm | parser
 
-        print(f"  > L2 AI 模型 ({MODEL_NAME}) 和提示词已加载 (使用 PydanticParser)。")
-    except Exception as e:
-        print(f"🔴 致命错误: 无法初始化 L2 AI: {e}")
-        return
+def main(since: datetime | None = None, until: datetime | None = None, dry_run: bool = False):
+    """
+    L2 报告脚本主函数。
+    since/until: 只汇总该窗口 [since, until) 内的 L1 分析 (默认过去 24h)，报告日期为窗口的最后一天；
+    dry_run: 只统计将要生成的报告，不调用 AI、不写库。
+    """
+    print("--- L2 报告脚本 (report.py) 启动 ---")
+    
+    # 1. 初始化 AI (单次报告 + map-reduce 两步所用的 chain)
+    if not dry_run:
+        try:
+            chains = {
+                "report": build_chain('l2_report.txt', L2ReportStructure),
+                "map": build_chain('l2_map.txt', L2PartialSummary),
+                "reduce": build_chain('l2_reduce.txt', L2ReportStructure),
+            }
+            print(f"  > L2 AI 模型 ({MODEL_NAME}) 和提示词已加载 (输出模式: {LLM_OUTPUT_MODE})。")
+        except Exception as e:
+            print(f"🔴 致命错误: 无法初始化 L2 AI: {e}")
+            raise
 
-    # 2. 【修改】获取 L1 摘要 和 L1 实体
-    grouped_l1_data = get_l1_data_for_report()
-    grouped_entity_data = get_grouped_trending_entities() # ⬅️ 【新】
+    # 2. 【修改】获取 L1 摘要 和 L1 实体 (热门实体的日期范围与报告窗口一致)
+    end_date = str((until - timedelta(microseconds=1)).date()) if until else None
+    start_date = str(since.date()) if since else end_date
+    grouped_l1_data = get_l1_data_for_report(since, until)
+    grouped_entity_data = get_grouped_trending_entities(start_date, end_date) # ⬅️ 【新】
     
     if not grouped_l1_data:
-        print("⏹️ 过去 24 小时没有新的 L1 分析数据。脚本退出。")
+        print("⏹️ 报告窗口内没有新的 L1 分析数据。脚本退出。")
+        return
+
+    if dry_run:
+        print(f"  (Report Step 3/4) [预演] 将为 {len(grouped_l1_data)} 个分类生成 L2 报告 (报告日期 {end_date or utc_today()}):")
+        describe_report_plan(grouped_l1_data, grouped_entity_data)
+        if BUNDLES_ENABLED:
+            print(f"  > [预演] 报告入库后将生成前端数据包: {os.path.abspath(BUNDLE_DIR)}")
+        print("--- L2 报告脚本 (report.py) 结束 (预演，未调用 AI、未写入数据库) ---")
         return
         
-    print(f"  (Report Step 3/4) 开始为 {len(grouped_l1_data)} 个分类生成 L2 报告...")
-    
-    successful_reports = 0
+    print(f"  (Report Step 3/4) 开始为 {len(grouped_l1_data)} 个分类并行生成 L2 报告 (最多 {L2_MAX_WORKERS} 个同时进行)...")
     
-    # 3. 遍历每个分类
-    with tqdm(total=len(grouped_l1_data), desc="生成 L2 报告") as pbar:
-        for category, l1_data in grouped_l1_data.items():
-            pbar.set_description(f"L2 报告: {category}")
-            
-            # 【新】获取该分类对应的实体数据
-            entities_for_category = grouped_entity_data.get(category, [])
-            
-            # 4. 调用 AI 生成报告 (传入两种数据)
-            report = generate_l2_report(category, l1_data, entities_for_category, chain)
-            
-            # 5. 存入数据库
-            if report:
-                if save_l2_report_to_db(category, report):
-                    successful_reports += 1
-            
-            pbar.update(1)
+    # 3. 并行生成，每个分类的报告一返回就立即入库
+    stats = generate_reports_concurrently(
+        grouped_l1_data, grouped_entity_data, chains,
+        save_fn=functools.partial(save_l2_report_to_db, report_date=end_date)
+    )
+    successful_reports = stats["saved"]
+    if stats["failed"]:
+        print(f"🟡 以下分类的 L2 报告未能生成或入库: {', '.join(stats['failed'])}")
+    print(
+        f"  > 总耗时 {stats['wall_seconds']:.1f} 秒 "
+        f"(最慢的单个报告 {stats['slowest_seconds']:.1f} 秒，逐个生成约需 {stats['sequential_seconds']:.1f} 秒)"
+    )
+
+    print(f"  > {get_llm_limiter().format_stats()}")
 
+    # 4. 为前端生成当天的静态数据包 (失败时前端照常实时查询)
+    if BUNDLES_ENABLED and successful_reports:
+        report_date = end_date or utc_today()
+        try:
+            with span("bundle"):
+                entry = publish_bundle(report_date, start_date)
+            if entry:
+                print(f"  > 前端数据包已生成: {entry['path']} ({entry['bytes'] / 1024:.1f} KB，压缩前 {entry['raw_bytes'] / 1024:.1f} KB)")
+        except Exception as e:
+            tqdm.write(f"🟡 警告: 生成前端数据包失败，前端将实时查询 {report_date} 的数据: {e}")
     print(f"  (Report Step 4/4) L2 报告处理完成。")
     print("--- L2 报告脚本 (report.py) 结束 ---")
     print(f"🟢 总结：总共 {successful_reports} 份 L2 每日报告已成功存入数据库。")
+    if stats["failed"] and not successful_reports:
+        # 一份报告都没入库，让本阶段记为失败 (可用 --resume 重跑)
+        raise RuntimeError(f"所有分类的 L2 报告都未能生成: {', '.join(stats['failed'])}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("stage", trace=True, stage="report"):
+        main()
+    write_run_report()
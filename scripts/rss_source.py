@@ -0,0 +1,363 @@
+import os
+import re
+import json
+import html
+import asyncio
+import httpx
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from tqdm import tqdm
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .crawler import ArticleSource, SearchWindow, parse_timestamp, utc_now
+from .metrics import inc, httpx_event_hooks
+
+# -----------------------------------------------------------------
+# RSS / Atom 文章来源 (RSS / Atom Source)
+# -----------------------------------------------------------------
+#
+# GNews 每次请求最多返回 'max' 篇文章，还受每日配额限制。RSS_FEEDS 中的订阅源作为第二个来源:
+#   * 条件请求: 带上次响应的 ETag / Last-Modified (If-None-Match / If-Modified-Since)，
+#     没有变化的订阅源只花一个 304，不传输、不解析；
+#   * 流式解析: XMLPullParser 边下载边解析，每个 <item> / <entry> 解析完就从树上移除，
+#     内存占用与单个条目的大小有关，而不是整个文档；
+#   * 主题映射: 条目的 "标题 + 摘要" 中出现主题关键词 (整词、不区分大小写) 即归入该主题，
+#     匹配多个主题时取关键词最长 (最具体) 的那个，没有匹配的条目被丢弃。
+# 每个订阅源的 ETag / Last-Modified 和已入库的最新条目时间保存在本地 JSON 文件中 (缺失时只是多拉一次全文)。
+#
+# 常量定义 (Constants)
+# 订阅源 URL，逗号或换行分隔
+RSS_FEEDS = [url.strip() for url in re.split(r"[,\n]", os.environ.get("RSS_FEEDS", "")) if url.strip()]
+RSS_STATE_PATH = os.environ.get(
+    "RSS_STATE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '.cache', 'rss_feeds.json')
+)
+# 同时在途的订阅源请求数 (订阅源分布在不同的站点，不共用 GNews 的令牌桶)
+RSS_CONCURRENCY = int(os.environ.get("RSS_CONCURRENCY", "8"))
+RSS_TIMEOUT = float(os.environ.get("RSS_TIMEOUT", "15"))
+# 摘要的最大字符数 (有的订阅源在 <content:encoded> 中放整篇文章)
+RSS_SNIPPET_CHARS = int(os.environ.get("RSS_SNIPPET_CHARS", "500"))
+RSS_USER_AGENT = "DailyNews-AIEnhance/1.0 (+rss)"
+
+ITEM_TAGS = {"item", "entry"}
+FEED_TAGS = {"channel", "feed"}
+SUMMARY_TAGS = ("description", "summary", "encoded", "content")  # 按优先级
+DATE_TAGS = ("pubDate", "published", "date", "issued", "updated")
+_HTML_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def _local_name(tag: str) -> str:
+    """去掉命名空间: '{http://www.w3.org/2005/Atom}entry' -> 'entry'"""
+    return tag.rsplit('}', 1)[-1]
+
+def _plain_text(value: str, limit: int = RSS_SNIPPET_CHARS) -> str:
+    """去掉 HTML 标签和实体，合并空白，截断到 limit 个字符"""
+    text = _WHITESPACE.sub(" ", html.unescape(_HTML_TAG.sub(" ", value))).strip()
+    return text[:limit]
+
+def parse_feed_date(value: str | None) -> datetime | None:
+    """RSS 的 RFC 822 日期 ('Tue, 10 Jun 2025 04:00:00 GMT') 或 Atom 的 ISO 8601 日期，统一为 UTC"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value.strip())
+    except (TypeError, ValueError):
+        return parse_timestamp(value.strip())
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class FeedParser:
+    """
+    RSS 2.0 / RSS 1.0 (RDF) / Atom 的增量解析器: feed(chunk) 返回这一块数据中解析完成的条目。
+    条目为 GNews 响应格式的 dict (title / description / content / url / publishedAt / source)。
+    """
+    def __init__(self, feed_url: str = ""):
+        self.feed_url = feed_url
+        self.feed_title = ""
+        self.feed_link = ""
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: List[ET.Element] = []
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        self._parser.feed(chunk)
+        return self._read_events()
+
+    def close(self) -> List[Dict[str, Any]]:
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self) -> List[Dict[str, Any]]:
+        items = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            name = _local_name(elem.tag)
+            parent = self._stack[-1] if self._stack else None
+            if name in ITEM_TAGS:
+                item = self._make_item(elem)
+                if item:
+                    items.append(item)
+                # 解析完的条目从树上移除，文档再大也只保留当前条目
+                if parent is not None:
+                    parent.remove(elem)
+            elif parent is not None and _local_name(parent.tag) in FEED_TAGS:
+                if name == "title" and not self.feed_title:
+                    self.feed_title = _plain_text("".join(elem.itertext()), 200)
+                elif name == "link" and not self.feed_link:
+                    self.feed_link = elem.get("href") or (elem.text or "").strip()
+        return items
+
+    def _make_item(self, elem: ET.Element) -> Dict[str, Any] | None:
+        fields: Dict[str, str] = {}
+        for child in elem:
+            name = _local_name(child.tag)
+            if name == "link":
+                # Atom: <link rel="alternate" href="..."/>；RSS: <link>...</link>
+                href = child.get("href")
+                if href is None:
+                    fields.setdefault("link", (child.text or "").strip())
+                elif child.get("rel", "alternate") == "alternate":
+                    fields.setdefault("link", href.strip())
+            elif name in ("guid", "id"):
+                fields.setdefault("guid", (child.text or "").strip())
+            elif name == "title" or name in SUMMARY_TAGS or name in DATE_TAGS:
+                fields.setdefault(name, "".join(child.itertext()))
+
+        url = fields.get("link") or fields.get("guid", "")
+        if not url.startswith(("http://", "https://")):
+            return None
+        summary = next((fields[tag] for tag in SUMMARY_TAGS if fields.get(tag)), "")
+        published = next((parse_feed_date(fields[tag]) for tag in DATE_TAGS if fields.get(tag)), None)
+        description = _plain_text(summary)
+        return {
+            "title": _plain_text(fields.get("title", ""), 300),
+            "description": description,
+            "content": description,
+            "url": url,
+            "publishedAt": published.strftime("%Y-%m-%dT%H:%M:%SZ") if published else None,
+            "source": {"name": self.feed_title or None, "url": self.feed_link or self.feed_url},
+        }
+
+def parse_feed(chunks: Iterable[bytes], feed_url: str = "") -> List[Dict[str, Any]]:
+    """解析一个完整的订阅源 (按块输入)"""
+    parser = FeedParser(feed_url)
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+    return items
+
+
+class TopicMatcher:
+    """
+    把条目的文本映射到主题: 主题关键词按首个词建索引，文本中每个词只检查以它开头的关键词。
+    """
+    def __init__(self, topics: List[Dict[str, Any]]):
+        self._by_first_word: Dict[str, List[Tuple[Tuple[str, ...], Dict[str, Any]]]] = defaultdict(list)
+        for topic in topics:
+            words = tuple(_WORD.findall((topic.get('keyword') or "").lower()))
+            if words:
+                self._by_first_word[words[0]].append((words, topic))
+        for candidates in self._by_first_word.values():
+            candidates.sort(key=lambda candidate: -len(candidate[0]))
+
+    def match(self, text: str) -> Dict[str, Any] | None:
+        """返回文本中出现的最长关键词对应的主题 (没有时返回 None)"""
+        words = _WORD.findall(text.lower())
+        best_words, best_topic = (), None
+        for i, word in enumerate(words):
+            for keyword, topic in self._by_first_word.get(word, ()):
+                if len(keyword) <= len(best_words):
+                    break
+                if tuple(words[i:i + len(keyword)]) == keyword:
+                    best_words, best_topic = keyword, topic
+                    break
+        return best_topic
+
+
+def load_feed_state(path: str | None = None) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path or RSS_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_feed_state(state: Dict[str, Dict[str, Any]], path: str | None = None):
+    """先写临时文件再原子替换"""
+    path = path or RSS_STATE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def conditional_headers(feed_state: Dict[str, Any]) -> Dict[str, str]:
+    headers = {"User-Agent": RSS_USER_AGENT}
+    if feed_state.get("etag"):
+        headers["If-None-Match"] = feed_state["etag"]
+    if feed_state.get("last_modified"):
+        headers["If-Modified-Since"] = feed_state["last_modified"]
+    return headers
+
+
+class RssSource(ArticleSource):
+    """
+    RSS / Atom 订阅源: 条件请求 + 流式解析，条目按关键词归入主题。
+    新的 ETag / 水位线只在该订阅源的条目全部入库成功后才保存 (否则下次会收到 304，漏掉这些条目)。
+    """
+    name = "rss"
+
+    def __init__(self, feeds: List[str], window: SearchWindow | None = None,
+                 state_path: str | None = None, concurrency: int = RSS_CONCURRENCY):
+        self.feeds = feeds
+        self.window = window
+        self.state_path = state_path
+        self.concurrency = concurrency
+
+    def describe(self, topics: List[Dict[str, Any]]) -> List[str]:
+        state = load_feed_state(self.state_path)
+        return [
+            f"[预演] RSS {url}" + (" (条件请求)" if state.get(url, {}).get("etag") or state.get(url, {}).get("last_modified") else "")
+            for url in self.feeds
+        ]
+
+    def keep_item(self, item: Dict[str, Any], watermark: datetime | None) -> bool:
+        """时间过滤: 补爬时只保留窗口内的条目，否则去掉不晚于水位线的条目"""
+        published = parse_timestamp(item.get("publishedAt"))
+        if self.window is not None:
+            since, until = self.window
+            if published is None:
+                return False
+            return (since is None or published >= since.astimezone(timezone.utc)) and \
+                (until is None or published < until.astimezone(timezone.utc))
+        return watermark is None or published is None or published > watermark
+
+    async def fetch_feed(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        feed_state: Dict[str, Any],
+        matcher: TopicMatcher,
+        now: datetime
+    ) -> Tuple[str, Dict[str, Any], Dict[int, List[Dict[str, Any]]]] | None:
+        """
+        请求并流式解析一个订阅源，返回 ('ok' 或 'not_modified', 新的订阅源状态, {topic_id: 条目})。
+        请求或解析失败时返回 None。
+        """
+        # 补爬时间窗口时总是拉取全文 (且不更新状态)
+        headers = conditional_headers(feed_state) if self.window is None else {"User-Agent": RSS_USER_AGENT}
+        watermark = parse_timestamp(feed_state.get("last_item_at")) if self.window is None else None
+        by_topic: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    inc("rss_feeds_total", status="not_modified")
+                    return "not_modified", {**feed_state, "checked_at": now.isoformat()}, by_topic
+                response.raise_for_status()
+
+                parser = FeedParser(url)
+                newest = parse_timestamp(feed_state.get("last_item_at"))
+                counts = defaultdict(int)
+                async for chunk in response.aiter_bytes():
+                    inc("rss_bytes_total", len(chunk))
+                    for item in parser.feed(chunk):
+                        published = parse_timestamp(item.get("publishedAt"))
+                        if published and published <= now:
+                            newest = max(newest, published) if newest else published
+                        if not self.keep_item(item, watermark):
+                            counts["seen"] += 1
+                            continue
+                        topic = matcher.match(f"{item['title']} {item['description']}")
+                        if topic is None:
+                            counts["unmatched"] += 1
+                            continue
+                        counts["matched"] += 1
+                        by_topic[topic['topic_id']].append(item)
+                # 流式读取到的数据在 close() 之前都已送入解析器
+                parser.close()
+        except httpx.HTTPStatusError as e:
+            tqdm.write(f"🔴 错误: 订阅源请求失败 (HTTP {e.response.status_code}): {url}")
+            inc("rss_feeds_total", status="error")
+            return None
+        except httpx.RequestError as e:
+            tqdm.write(f"🔴 错误: 订阅源网络请求失败: {url}: {e}")
+            inc("rss_feeds_total", status="error")
+            return None
+        except ET.ParseError as e:
+            tqdm.write(f"🔴 错误: 订阅源解析失败: {url}: {e}")
+            inc("rss_feeds_total", status="error")
+            return None
+
+        inc("rss_feeds_total", status="ok")
+        for status, count in counts.items():
+            inc("rss_items_total", count, status=status)
+        tqdm.write(f"  > RSS: {url} 共 {sum(counts.values())} 条，匹配主题 {counts['matched']} 条 "
+                   f"(已见过 {counts['seen']}，无匹配 {counts['unmatched']})。")
+        new_state = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "last_item_at": newest.isoformat() if newest else None,
+            "checked_at": now.isoformat(),
+        }
+        return "ok", new_state, by_topic
+
+    async def fetch_all(self, matcher: TopicMatcher, state: Dict[str, Dict[str, Any]], now: datetime):
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=RSS_TIMEOUT, limits=limits, follow_redirects=True,
+                                     event_hooks=httpx_event_hooks("rss", is_async=True)) as client:
+
+            async def fetch_one(url: str):
+                async with semaphore:
+                    return await self.fetch_feed(client, url, state.get(url, {}), matcher, now)
+
+            return await asyncio.gather(*(fetch_one(url) for url in self.feeds))
+
+    def crawl(self, topics: List[Dict[str, Any]], save_fn: Callable[[List[Dict[str, Any]], int], int]) -> int:
+        matcher = TopicMatcher(topics)
+        state = load_feed_state(self.state_path)
+        now = utc_now()
+        print(f"  > 正在请求 {len(self.feeds)} 个 RSS / Atom 订阅源 (并发上限 {self.concurrency})...")
+        results = asyncio.run(self.fetch_all(matcher, state, now))
+
+        # 所有订阅源的条目按主题合并，每个主题一次写入
+        articles_by_topic: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        feeds_by_topic: Dict[int, List[str]] = defaultdict(list)
+        for url, result in zip(self.feeds, results):
+            if result is None:
+                continue
+            for topic_id, items in result[2].items():
+                articles_by_topic[topic_id].extend(items)
+                feeds_by_topic[topic_id].append(url)
+
+        keywords = {topic['topic_id']: topic['keyword'] for topic in topics}
+        total_new_articles, failed_feeds = 0, set()
+        for topic_id, articles in tqdm(articles_by_topic.items(), desc="RSS 入库"):
+            try:
+                new_count = save_fn(articles, topic_id)
+            except Exception as e:
+                tqdm.write(f"🔴 错误: 主题 '{keywords[topic_id]}' 的 RSS 文章入库失败，下次运行重新拉取: {e}")
+                failed_feeds.update(feeds_by_topic[topic_id])
+                continue
+            total_new_articles += new_count
+            tqdm.write(f"  > 存储: 主题 '{keywords[topic_id]}' 从 RSS 新增 {new_count} 篇文章到数据库。")
+
+        if self.window is None:
+            for url, result in zip(self.feeds, results):
+                if result is not None and url not in failed_feeds:
+                    state[url] = result[1]
+            try:
+                save_feed_state(state, self.state_path)
+            except OSError as e:
+                tqdm.write(f"🟡 警告: 无法保存订阅源状态，下次运行将重新拉取全部订阅源: {e}")
+
+        not_modified = sum(1 for result in results if result is not None and result[0] == "not_modified")
+        errors = sum(1 for result in results if result is None)
+        print(f"  > RSS 完成: {len(self.feeds)} 个订阅源 ({not_modified} 个未变化 (304)，{errors} 个失败)，"
+              f"新增 {total_new_articles} 篇文章。")
+        return total_new_articles
@@ -0,0 +1,49 @@
+import os
+import threading
+
+from .base import StorageBackend
+from .instrumented import InstrumentedStorage
+
+# -----------------------------------------------------------------
+# 存储后端选择 (Storage Backend)
+# -----------------------------------------------------------------
+#
+# STORAGE_BACKEND=supabase (默认): 生产环境，经由 PostgREST / RPC 读写 Supabase。
+# STORAGE_BACKEND=sqlite: 本地嵌入式数据库 (LOCAL_DB_PATH)，不需要 Supabase 项目，
+#   大批量离线回填和基准测试以本地磁盘速度运行。
+#
+# 常量定义 (Constants)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase").lower()
+LOCAL_DB_PATH = os.environ.get(
+    "LOCAL_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'dailynews.sqlite3')
+)
+
+_storage: StorageBackend | None = None
+_storage_lock = threading.Lock()
+
+def create_storage(backend: str = STORAGE_BACKEND, path: str = LOCAL_DB_PATH) -> StorageBackend:
+    """按名称创建存储后端 ('supabase' 或 'sqlite')"""
+    if backend == "supabase":
+        from .supabase_backend import SupabaseStorage
+        return SupabaseStorage()
+    if backend == "sqlite":
+        from .sqlite_backend import SQLiteStorage
+        return SQLiteStorage(path)
+    raise ValueError(f"未知的 STORAGE_BACKEND: '{backend}' (可选: supabase, sqlite)")
+
+def get_storage() -> StorageBackend:
+    """获取全局存储后端 (首次调用时按配置创建并套上指标埋点，所有脚本共用)"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = InstrumentedStorage(create_storage(), STORAGE_BACKEND)
+            if STORAGE_BACKEND != "supabase":
+                print(f"🟢 使用本地存储后端 ({STORAGE_BACKEND}): {os.path.abspath(LOCAL_DB_PATH)}")
+        return _storage
+
+def set_storage(storage: StorageBackend | None):
+    """替换全局存储后端 (基准测试或离线回填时指定自己的实例)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
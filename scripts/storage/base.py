@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any
+
+# -----------------------------------------------------------------
+# 存储接口 (Storage Backend Interface)
+# -----------------------------------------------------------------
+#
+# 只包含流水线脚本真正用到的操作。每个后端 (Supabase / 本地 SQLite)
+# 都必须实现同样的语义，对应 db_schema/schema.sql 中的表、视图和 RPC 函数。
+# 时间参数都是 ISO 格式字符串；不带时区时按 UTC 处理 (与 Supabase 的会话时区一致)。
+
+class StorageBackend(ABC):
+
+    # --- 主题 (表 1) ---
+
+    @abstractmethod
+    def fetch_active_topics(self) -> List[Dict[str, Any]]:
+        """返回所有 is_active 的主题 (topic_id, keyword, category, is_active)"""
+
+    @abstractmethod
+    def upsert_topics(self, topics: List[Dict[str, Any]]) -> int:
+        """按 keyword 插入或更新主题 (category, keyword, is_active)，返回处理的行数"""
+
+    @abstractmethod
+    def save_crawl_state(self, states: List[Dict[str, Any]]) -> int:
+        """
+        批量更新主题的增量爬取状态
+        [{topic_id, last_published_at, last_crawled_at, next_crawl_at, idle_runs, backfill_since, backfill_until}]，
+        水位线 last_published_at 只前进不后退；未爬区间 backfill_since / backfill_until 直接覆盖 (None 表示已补完)。
+        返回更新的主题数。
+        """
+
+    # --- 原始文章 (表 2) ---
+
+    @abstractmethod
+    def insert_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        插入文章，url 已存在的行被忽略。
+        返回真正新插入的行 (至少包含 article_id 和 minhash_signature)。
+        """
+
+    @abstractmethod
+    def fetch_signature_page(self, since: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        keyset 分页读取 crawl_date >= since 且带签名的文章
+        (article_id, minhash_signature, canonical_article_id)，按 article_id 升序。
+        """
+
+    @abstractmethod
+    def fetch_url_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """keyset 分页读取 article_id > after_id 的文章 (article_id, url)，按 article_id 升序 (用于已知 URL 过滤器)"""
+
+    @abstractmethod
+    def set_canonical_articles(self, links: List[Dict[str, int]]) -> int:
+        """记录近似重复关系 [{"article_id", "canonical_article_id"}]，返回更新的行数"""
+
+    # --- L1 分析 (表 3, 4, 5) ---
+
+    @abstractmethod
+    def fetch_unanalyzed_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """keyset 分页读取待分析文章 (article_id, title, snippet, keyword)，即 'unanalyzed_articles' 视图"""
+
+    @abstractmethod
+    def save_l1_batch(self, payload: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        原子写入一个分块的 L1 结果 (payload 格式见 schema.sql 的 save_l1_batch)，
+        并把结果复制给这些文章的近似重复。
+        返回 {"saved": 写入的文章数, "entities": [{"entity_id", "entity_name"}] (payload 中新实体的 ID)}。
+        """
+
+    @abstractmethod
+    def claim_l1_batch(self, worker_id: str, batch_size: int, lease_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+        """
+        原子领取最多 batch_size 篇待分析文章，租约 lease_seconds 秒 (见 schema.sql 的 claim_l1_batch)。
+        并发的领取者拿到的文章互不重叠；租约过期且已领取 max_attempts 次的文章进入死信。
+        返回 fetch_unanalyzed_page 的各列以及本次是第几次领取 (attempts)。
+        """
+
+    @abstractmethod
+    def release_l1_claims(self, worker_id: str, article_ids: List[int], error: str | None, max_attempts: int) -> Dict[str, int]:
+        """
+        归还 worker_id 分析失败的文章 (租约立即过期；已领取 max_attempts 次的进入死信)，
+        返回 {"released": 归还数, "dead_lettered": 其中进入死信的数量}。
+        """
+
+    # --- 实体解析 (表 4, 4b) ---
+
+    @abstractmethod
+    def fetch_entity_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """keyset 分页读取实体 (entity_id, entity_name, entity_type)，按 entity_id 升序"""
+
+    @abstractmethod
+    def fetch_entity_alias_page(self, after_key: str, limit: int) -> List[Dict[str, Any]]:
+        """keyset 分页读取实体别名 (alias_key, entity_id)，按 alias_key 升序"""
+
+    @abstractmethod
+    def merge_entities(self, target_id: int, source_ids: List[int], alias_keys: List[str]) -> int:
+        """
+        把 source_ids 并入 target_id 并记录别名，source 的每日统计一并累加到 target
+        (见 schema.sql 的 merge_entities)，返回并入的文章关系数。
+        """
+
+    @abstractmethod
+    def copy_l1_to_duplicates(self) -> int:
+        """把已分析的簇代表的 L1 结果复制给尚无结果的近似重复，返回复制的文章数"""
+
+    # --- L2 报告 (表 6, 7) ---
+
+    @abstractmethod
+    def fetch_l1_window(self, since: str, until: str | None = None) -> List[Dict[str, Any]]:
+        """
+        读取 since <= analyzed_at < until (until 为 None 时不设上限) 的 L1 结果，每行为
+        {analyzed_at, title, category, ai_summary, sentiment_score} (无主题的文章 category 为 None)。
+        """
+
+    @abstractmethod
+    def get_trending_entities(self, start_date: str, end_date: str, per_category_limit: int | None = None) -> List[Dict[str, Any]]:
+        """日期范围内各分类的热门实体 (category, topic, count, average_sentiment)，按分类、热度排序"""
+
+    @abstractmethod
+    def rebuild_entity_daily_stats(self, start_date: str | None = None, end_date: str | None = None) -> int:
+        """
+        从明细表重算 entity_daily_stats (可选日期范围)，返回写入的统计行数。
+        起点不早于库中最早的文章的日期 (更早的明细已被删除或归档，保留它们的统计)。
+        """
+
+    @abstractmethod
+    def upsert_report(self, report: Dict[str, Any]):
+        """按 (report_date, category) 插入或更新一份 L2 报告"""
+
+    # --- 静态数据包 (scripts/bundles.py) ---
+
+    @abstractmethod
+    def fetch_reports(self, report_date: str) -> List[Dict[str, Any]]:
+        """某天的全部 L2 报告 (report_date, category, report_summary, overall_sentiment_score, trending_topics)，按分类排序"""
+
+    @abstractmethod
+    def fetch_entity_articles(
+        self,
+        entity_names: List[str],
+        since: str,
+        until: str | None = None,
+        per_entity_limit: int | None = None
+    ) -> List[Dict[str, Any]]:
+        """
+        在 [since, until) 内完成 L1 分析、且提到这些实体的文章及其 L1 结果
+        (entity_name, article_id, title, url, source_name, publication_date, ai_summary, sentiment_label, sentiment_score)，
+        每个实体按 article_id 倒序 (与前端下钻的翻页顺序一致) 最多 per_entity_limit 篇。
+        """
+
+    # --- 冷数据归档 (scripts/archive.py) ---
+
+    @abstractmethod
+    def fetch_archive_page(self, until: str, after_id: int, limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        keyset 分页读取 crawl_date < until 的原始文章 (按 article_id 升序) 及其 L1 结果:
+        {"articles": raw_articles 全部列 + 主题的 keyword / category,
+         "sentiments": 这些文章的 l1_analysis_sentiment 行,
+         "maps": 这些文章的 article_entity_map 行 + entity_name / entity_type}
+        """
+
+    @abstractmethod
+    def prune_archived_articles(self, since: str, until: str, max_article_id: int, limit: int) -> int:
+        """
+        删除最多 limit 篇 since <= crawl_date < until 且 article_id <= max_article_id 的原始文章
+        (L1 情感、实体关系和工作租约级联删除；entity_daily_stats 不回减)，返回删除的文章数。
+        """
@@ -0,0 +1,32 @@
+import functools
+from typing import Any
+
+try:
+    from ..metrics import span, inc
+except ImportError:
+    from metrics import span, inc
+
+# -----------------------------------------------------------------
+# 带埋点的存储后端代理: 每次调用计入 'db_operation_seconds{backend, op}'，
+# 返回列表的操作还会累加 'db_rows_total' (读到或写入的行数)。
+# Supabase 后端的 HTTP 往返和字节数另由 db.py 的 httpx 埋点统计。
+# -----------------------------------------------------------------
+
+class InstrumentedStorage:
+    def __init__(self, backend, backend_name: str):
+        self._backend = backend
+        self._backend_name = backend_name
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._backend, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            with span("db_operation", backend=self._backend_name, op=name):
+                result = attr(*args, **kwargs)
+            if isinstance(result, list):
+                inc("db_rows_total", len(result), backend=self._backend_name, op=name)
+            return result
+        return wrapper
@@ -0,0 +1,603 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any
+
+from .base import StorageBackend
+
+# -----------------------------------------------------------------
+# 本地 SQLite 后端: 表结构见 sqlite_schema.sql (与 db_schema/schema.sql 对应)，
+# schema.sql 中的 RPC 函数在这里用同一个事务内的 SQL 实现。
+# 适合离线回填、基准测试和没有 Supabase 项目时的本地运行。
+# -----------------------------------------------------------------
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'sqlite_schema.sql')
+
+# 参数中的时间统一转换成与列默认值相同的 UTC 文本格式再比较
+_TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', ?)"
+
+# 建表之后新增的列: 已有的本地数据库文件在启动时补上 (对应 schema.sql 中的 ADD COLUMN IF NOT EXISTS)
+_ADDED_COLUMNS = [
+    ("tracked_topics", "last_published_at", "TEXT"),
+    ("tracked_topics", "last_crawled_at", "TEXT"),
+    ("tracked_topics", "next_crawl_at", "TEXT"),
+    ("tracked_topics", "idle_runs", "INTEGER NOT NULL DEFAULT 0"),
+    ("tracked_topics", "backfill_since", "TEXT"),
+    ("tracked_topics", "backfill_until", "TEXT"),
+]
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    单个 SQLite 文件上的存储后端。
+    连接在线程间共享 (分析阶段有预取线程和写入线程)，所有操作串行执行。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+            self._conn.executescript(f.read())
+        for table, column, declaration in _ADDED_COLUMNS:
+            existing = {row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    @contextmanager
+    def _transaction(self):
+        """持有锁并在一个事务中执行；出错时整体回滚 (对应 RPC 函数的原子性)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    # --- 主题 ---
+
+    def fetch_active_topics(self) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM tracked_topics WHERE is_active = 1")
+        for row in rows:
+            row['is_active'] = bool(row['is_active'])
+        return rows
+
+    def upsert_topics(self, topics: List[Dict[str, Any]]) -> int:
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO tracked_topics (keyword, category, is_active) VALUES (?, ?, ?)
+                ON CONFLICT (keyword) DO UPDATE SET
+                  category = excluded.category,
+                  is_active = excluded.is_active
+                """,
+                [(t['keyword'], t['category'], int(t.get('is_active', True))) for t in topics]
+            )
+        return len(topics)
+
+    def save_crawl_state(self, states: List[Dict[str, Any]]) -> int:
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                f"""
+                UPDATE tracked_topics SET
+                  last_published_at = coalesce(max(last_published_at, {_TIMESTAMP_SQL}), last_published_at, {_TIMESTAMP_SQL}),
+                  last_crawled_at = {_TIMESTAMP_SQL},
+                  next_crawl_at = {_TIMESTAMP_SQL},
+                  idle_runs = ?,
+                  backfill_since = {_TIMESTAMP_SQL},
+                  backfill_until = {_TIMESTAMP_SQL}
+                WHERE topic_id = ?
+                """,
+                [
+                    (s['last_published_at'], s['last_published_at'], s['last_crawled_at'], s['next_crawl_at'],
+                     s['idle_runs'], s.get('backfill_since'), s.get('backfill_until'), s['topic_id'])
+                    for s in states
+                ]
+            )
+            return cursor.rowcount
+
+    # --- 原始文章 ---
+
+    def insert_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        inserted = []
+        with self._transaction() as conn:
+            for article in articles:
+                signature = article.get('minhash_signature')
+                row = conn.execute(
+                    """
+                    INSERT INTO raw_articles
+                      (topic_id, url, title, snippet, source_name, publication_date, minhash_signature)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (url) DO NOTHING
+                    RETURNING article_id, topic_id, url, title, snippet, crawl_date
+                    """,
+                    (
+                        article.get('topic_id'), article.get('url'), article.get('title'),
+                        article.get('snippet'), article.get('source_name'), article.get('publication_date'),
+                        json.dumps(signature) if signature is not None else None
+                    )
+                ).fetchone()
+                if row is not None:
+                    inserted.append({**dict(row), "minhash_signature": signature})
+        return inserted
+
+    def fetch_signature_page(self, since: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        rows = self._query(
+            f"""
+            SELECT article_id, minhash_signature, canonical_article_id FROM raw_articles
+            WHERE crawl_date >= {_TIMESTAMP_SQL} AND article_id > ? AND minhash_signature IS NOT NULL
+            ORDER BY article_id LIMIT ?
+            """,
+            (since, after_id, limit)
+        )
+        for row in rows:
+            row['minhash_signature'] = json.loads(row['minhash_signature'])
+        return rows
+
+    def fetch_url_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT article_id, url FROM raw_articles WHERE article_id > ? ORDER BY article_id LIMIT ?",
+            (after_id, limit)
+        )
+
+    def set_canonical_articles(self, links: List[Dict[str, int]]) -> int:
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                "UPDATE raw_articles SET canonical_article_id = ? WHERE article_id = ?",
+                [(l['canonical_article_id'], l['article_id']) for l in links]
+            )
+            return cursor.rowcount
+
+    # --- L1 分析 ---
+
+    def fetch_unanalyzed_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self._query(
+            """
+            SELECT article_id, title, snippet, keyword FROM unanalyzed_articles
+            WHERE article_id > ? ORDER BY article_id LIMIT ?
+            """,
+            (after_id, limit)
+        )
+
+    def _copy_l1_to_duplicates(self, conn: sqlite3.Connection, canonical_ids: List[int] | None) -> int:
+        """对应 schema.sql 的 copy_l1_to_duplicates (调用方需在事务中)"""
+        copied = [row[0] for row in conn.execute(
+            """
+            INSERT INTO l1_analysis_sentiment (article_id, ai_summary, sentiment_score, sentiment_label)
+            SELECT a.article_id, s.ai_summary, s.sentiment_score, s.sentiment_label
+            FROM raw_articles a
+              JOIN l1_analysis_sentiment s ON s.article_id = a.canonical_article_id
+            WHERE a.canonical_article_id IS NOT NULL
+              AND (?1 IS NULL OR a.canonical_article_id IN (SELECT value FROM json_each(?1)))
+              AND NOT EXISTS (SELECT 1 FROM l1_analysis_sentiment x WHERE x.article_id = a.article_id)
+            ON CONFLICT (article_id) DO NOTHING
+            RETURNING article_id
+            """,
+            (json.dumps(canonical_ids) if canonical_ids is not None else None,)
+        ).fetchall()]
+        conn.executemany(
+            """
+            INSERT INTO article_entity_map (article_id, entity_id)
+            SELECT a.article_id, m.entity_id
+            FROM raw_articles a
+              JOIN article_entity_map m ON m.article_id = a.canonical_article_id
+            WHERE a.article_id = ?
+            ON CONFLICT (article_id, entity_id) DO NOTHING
+            """,
+            [(article_id,) for article_id in copied]
+        )
+        return len(copied)
+
+    def save_l1_batch(self, payload: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        sentiments = payload.get('sentiments', [])
+        with self._transaction() as conn:
+            # 1. 情感摘要 (表 3)
+            conn.executemany(
+                """
+                INSERT INTO l1_analysis_sentiment (article_id, ai_summary, sentiment_score, sentiment_label)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (article_id) DO UPDATE SET
+                  ai_summary = excluded.ai_summary,
+                  sentiment_score = excluded.sentiment_score,
+                  sentiment_label = excluded.sentiment_label
+                """,
+                [(s['article_id'], s['ai_summary'], s['sentiment_score'], s['sentiment_label']) for s in sentiments]
+            )
+            # 2. 新实体 (表 4)，同名实体只保留一行；已存在时返回已有的 ID
+            entity_types = {e['entity_name']: e['entity_type'] for e in payload.get('entities', [])}
+            created = [
+                dict(conn.execute(
+                    """
+                    INSERT INTO l1_analysis_entities (entity_name, entity_type) VALUES (?, ?)
+                    ON CONFLICT (entity_name) DO UPDATE SET entity_type = excluded.entity_type
+                    RETURNING entity_id, entity_name
+                    """,
+                    (name, entity_type)
+                ).fetchone())
+                for name, entity_type in entity_types.items()
+            ]
+            # 3. 别名 (表 4b)，按 ID 或 (新实体的) 名称引用
+            conn.executemany(
+                """
+                INSERT INTO entity_aliases (alias_key, entity_id)
+                SELECT ?1, COALESCE(?2, (SELECT entity_id FROM l1_analysis_entities WHERE entity_name = ?3))
+                WHERE COALESCE(?2, (SELECT entity_id FROM l1_analysis_entities WHERE entity_name = ?3)) IS NOT NULL
+                ON CONFLICT (alias_key) DO NOTHING
+                """,
+                [(a['alias_key'], a.get('entity_id'), a.get('entity_name')) for a in payload.get('aliases', [])]
+            )
+            # 4. 文章-实体连接表 (表 5)，已知实体直接用 ID，新实体按名称查回 ID
+            conn.executemany(
+                """
+                INSERT INTO article_entity_map (article_id, entity_id)
+                SELECT ?1, COALESCE(?2, (SELECT entity_id FROM l1_analysis_entities WHERE entity_name = ?3))
+                WHERE COALESCE(?2, (SELECT entity_id FROM l1_analysis_entities WHERE entity_name = ?3)) IS NOT NULL
+                ON CONFLICT (article_id, entity_id) DO NOTHING
+                """,
+                [(m['article_id'], m.get('entity_id'), m.get('entity_name')) for m in payload.get('maps', [])]
+            )
+            # 5. 把结果复制给这些文章的近似重复
+            self._copy_l1_to_duplicates(conn, [s['article_id'] for s in sentiments])
+            # 6. 已写入结果的文章不再需要租约
+            conn.executemany("DELETE FROM l1_work_claims WHERE article_id = ?", [(s['article_id'],) for s in sentiments])
+        return {"saved": len(sentiments), "entities": created}
+
+    def claim_l1_batch(self, worker_id: str, batch_size: int, lease_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+        # BEGIN IMMEDIATE 在多个进程之间串行化领取 (对应 PostgreSQL 的 FOR UPDATE SKIP LOCKED)
+        now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+        with self._transaction() as conn:
+            conn.execute(
+                f"""
+                UPDATE l1_work_claims
+                SET dead_lettered_at = {now}, last_error = coalesce(last_error, 'lease expired')
+                WHERE dead_lettered_at IS NULL AND lease_expires_at <= {now} AND attempts >= ?
+                """,
+                (max_attempts,)
+            )
+            claimed = {row[0]: row[1] for row in conn.execute(
+                f"""
+                INSERT INTO l1_work_claims (article_id, worker_id, lease_expires_at, attempts)
+                SELECT u.article_id, ?1, strftime('%Y-%m-%d %H:%M:%f', 'now', ?2 || ' seconds'), 1
+                FROM unanalyzed_articles u
+                WHERE NOT EXISTS (
+                  SELECT 1 FROM l1_work_claims c
+                  WHERE c.article_id = u.article_id AND (c.lease_expires_at > {now} OR c.dead_lettered_at IS NOT NULL)
+                )
+                ORDER BY u.article_id LIMIT ?3
+                ON CONFLICT (article_id) DO UPDATE SET
+                  worker_id = excluded.worker_id,
+                  lease_expires_at = excluded.lease_expires_at,
+                  attempts = attempts + 1,
+                  last_error = NULL
+                RETURNING article_id, attempts
+                """,
+                (worker_id, lease_seconds, batch_size)
+            )}
+            if not claimed:
+                return []
+            rows = [dict(row) for row in conn.execute(
+                """
+                SELECT article_id, title, snippet, keyword FROM unanalyzed_articles
+                WHERE article_id IN (SELECT value FROM json_each(?)) ORDER BY article_id
+                """,
+                (json.dumps(list(claimed)),)
+            )]
+        for row in rows:
+            row['attempts'] = claimed[row['article_id']]
+        return rows
+
+    def release_l1_claims(self, worker_id: str, article_ids: List[int], error: str | None, max_attempts: int) -> Dict[str, int]:
+        now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+        with self._transaction() as conn:
+            released = conn.execute(
+                f"""
+                UPDATE l1_work_claims
+                SET lease_expires_at = {now},
+                    last_error = ?,
+                    dead_lettered_at = CASE WHEN attempts >= ? THEN {now} END
+                WHERE article_id IN (SELECT value FROM json_each(?)) AND worker_id = ? AND dead_lettered_at IS NULL
+                RETURNING dead_lettered_at
+                """,
+                (error, max_attempts, json.dumps(list(article_ids)), worker_id)
+            ).fetchall()
+        return {"released": len(released), "dead_lettered": sum(1 for row in released if row[0] is not None)}
+
+    def copy_l1_to_duplicates(self) -> int:
+        with self._transaction() as conn:
+            return self._copy_l1_to_duplicates(conn, None)
+
+    # --- 实体解析 ---
+
+    def fetch_entity_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT entity_id, entity_name, entity_type FROM l1_analysis_entities WHERE entity_id > ? ORDER BY entity_id LIMIT ?",
+            (after_id, limit)
+        )
+
+    def fetch_entity_alias_page(self, after_key: str, limit: int) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT alias_key, entity_id FROM entity_aliases WHERE alias_key > ? ORDER BY alias_key LIMIT ?",
+            (after_key, limit)
+        )
+
+    def merge_entities(self, target_id: int, source_ids: List[int], alias_keys: List[str]) -> int:
+        sources = [(source_id,) for source_id in set(source_ids) if source_id != target_id]
+        source_json = json.dumps([source_id for (source_id,) in sources])
+        with self._transaction() as conn:
+            # 1. source 的每日统计 (包括明细已归档的日期) 累加到 target
+            conn.execute(
+                """
+                INSERT INTO entity_daily_stats
+                  (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+                SELECT stat_date, category, ?1, sum(article_count), sum(sentiment_sum), sum(sentiment_sq_sum)
+                FROM entity_daily_stats
+                WHERE entity_id IN (SELECT value FROM json_each(?2))
+                GROUP BY stat_date, category
+                ON CONFLICT (stat_date, category, entity_id) DO UPDATE SET
+                  article_count = article_count + excluded.article_count,
+                  sentiment_sum = sentiment_sum + excluded.sentiment_sum,
+                  sentiment_sq_sum = sentiment_sq_sum + excluded.sentiment_sq_sum
+                """,
+                (target_id, source_json)
+            )
+            # 2. 同时关联了多个被合并实体的在库文章，合并后只算一次
+            conn.execute(
+                """
+                WITH extra AS (
+                  SELECT
+                    date(s.analyzed_at) AS stat_date,
+                    t.category,
+                    sum(l.extra) AS extra_count,
+                    sum(l.extra * s.sentiment_score) AS extra_sum,
+                    sum(l.extra * s.sentiment_score * s.sentiment_score) AS extra_sq_sum
+                  FROM (
+                    SELECT article_id, count(*) - 1 AS extra
+                    FROM article_entity_map
+                    WHERE entity_id = ?1 OR entity_id IN (SELECT value FROM json_each(?2))
+                    GROUP BY article_id
+                    HAVING count(*) > 1
+                  ) l
+                    JOIN l1_analysis_sentiment s ON s.article_id = l.article_id
+                    JOIN raw_articles a ON a.article_id = l.article_id
+                    JOIN tracked_topics t ON t.topic_id = a.topic_id
+                  WHERE a.canonical_article_id IS NULL
+                    AND s.sentiment_score IS NOT NULL
+                  GROUP BY 1, 2
+                )
+                UPDATE entity_daily_stats
+                SET
+                  article_count = article_count - extra.extra_count,
+                  sentiment_sum = sentiment_sum - extra.extra_sum,
+                  sentiment_sq_sum = sentiment_sq_sum - extra.extra_sq_sum
+                FROM extra
+                WHERE entity_daily_stats.stat_date = extra.stat_date
+                  AND entity_daily_stats.category = extra.category
+                  AND entity_daily_stats.entity_id = ?1
+                """,
+                (target_id, source_json)
+            )
+            # 3. 文章关系改指向 target (UPDATE 不经过插入触发器)，其余的 source 关系随实体级联删除
+            moved = conn.execute(
+                """
+                UPDATE article_entity_map
+                SET entity_id = ?1
+                WHERE entity_id IN (SELECT value FROM json_each(?2))
+                  AND entity_id = (
+                    SELECT min(x.entity_id) FROM article_entity_map x
+                    WHERE x.article_id = article_entity_map.article_id
+                      AND x.entity_id IN (SELECT value FROM json_each(?2))
+                  )
+                  AND NOT EXISTS (
+                    SELECT 1 FROM article_entity_map x
+                    WHERE x.article_id = article_entity_map.article_id AND x.entity_id = ?1
+                  )
+                """,
+                (target_id, source_json)
+            ).rowcount
+            # 先改指向再删除 source (否则别名会被级联删除)
+            conn.executemany("UPDATE entity_aliases SET entity_id = ? WHERE entity_id = ?",
+                             [(target_id, source_id) for (source_id,) in sources])
+            conn.executemany(
+                """
+                INSERT INTO entity_aliases (alias_key, entity_id) VALUES (?, ?)
+                ON CONFLICT (alias_key) DO UPDATE SET entity_id = excluded.entity_id
+                """,
+                [(key, target_id) for key in set(alias_keys)]
+            )
+            conn.executemany("DELETE FROM l1_analysis_entities WHERE entity_id = ?", sources)
+        return moved
+
+    # --- L2 报告 ---
+
+    def fetch_l1_window(self, since: str, until: str | None = None) -> List[Dict[str, Any]]:
+        return self._query(
+            f"""
+            SELECT s.analyzed_at, a.title, t.category, s.ai_summary, s.sentiment_score
+            FROM l1_analysis_sentiment s
+              JOIN raw_articles a ON a.article_id = s.article_id
+              LEFT JOIN tracked_topics t ON t.topic_id = a.topic_id
+            WHERE s.analyzed_at >= {_TIMESTAMP_SQL}
+              AND (? IS NULL OR s.analyzed_at < {_TIMESTAMP_SQL})
+            """,
+            (since, until, until)
+        )
+
+    def get_trending_entities(self, start_date: str, end_date: str, per_category_limit: int | None = None) -> List[Dict[str, Any]]:
+        return self._query(
+            """
+            SELECT ranked.category, ranked.topic, ranked.count, ranked.average_sentiment
+            FROM (
+              SELECT
+                st.category,
+                e.entity_name AS topic,
+                sum(st.article_count) AS count,
+                sum(st.sentiment_sum) / NULLIF(sum(st.article_count), 0) AS average_sentiment,
+                row_number() OVER (PARTITION BY st.category ORDER BY sum(st.article_count) DESC, e.entity_name) AS rank
+              FROM entity_daily_stats st
+                JOIN l1_analysis_entities e ON e.entity_id = st.entity_id
+              WHERE st.stat_date BETWEEN ?1 AND ?2
+              GROUP BY st.category, e.entity_name
+            ) ranked
+            WHERE ?3 IS NULL OR ranked.rank <= ?3
+            ORDER BY ranked.category, ranked.count DESC
+            """,
+            (start_date, end_date, per_category_limit)
+        )
+
+    def rebuild_entity_daily_stats(self, start_date: str | None = None, end_date: str | None = None) -> int:
+        with self._transaction() as conn:
+            # 起点不早于库中最早的文章的日期 (更早的明细已被删除或归档，保留它们的统计)
+            live_since = conn.execute("SELECT date(min(crawl_date)) FROM raw_articles").fetchone()[0]
+            if live_since is None:
+                return 0
+            start_date = max(start_date or live_since, live_since)
+            conn.execute(
+                """
+                DELETE FROM entity_daily_stats
+                WHERE (?1 IS NULL OR stat_date >= ?1) AND (?2 IS NULL OR stat_date <= ?2)
+                """,
+                (start_date, end_date)
+            )
+            cursor = conn.execute(
+                """
+                INSERT INTO entity_daily_stats
+                  (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+                SELECT
+                  date(s.analyzed_at),
+                  t.category,
+                  m.entity_id,
+                  count(*),
+                  sum(s.sentiment_score),
+                  sum(s.sentiment_score * s.sentiment_score)
+                FROM article_entity_map m
+                  JOIN l1_analysis_sentiment s ON s.article_id = m.article_id
+                  JOIN raw_articles a ON a.article_id = m.article_id
+                  JOIN tracked_topics t ON t.topic_id = a.topic_id
+                WHERE a.canonical_article_id IS NULL
+                  AND s.sentiment_score IS NOT NULL
+                  AND (?1 IS NULL OR date(s.analyzed_at) >= ?1)
+                  AND (?2 IS NULL OR date(s.analyzed_at) <= ?2)
+                GROUP BY 1, 2, 3
+                """,
+                (start_date, end_date)
+            )
+            return cursor.rowcount
+
+    def upsert_report(self, report: Dict[str, Any]):
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO daily_reports
+                  (report_date, category, report_summary, overall_sentiment_score, trending_topics)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (report_date, category) DO UPDATE SET
+                  report_summary = excluded.report_summary,
+                  overall_sentiment_score = excluded.overall_sentiment_score,
+                  trending_topics = excluded.trending_topics
+                """,
+                (
+                    report['report_date'], report['category'], report.get('report_summary'),
+                    report.get('overall_sentiment_score'),
+                    json.dumps(report.get('trending_topics'), ensure_ascii=False)
+                )
+            )
+
+    def fetch_reports(self, report_date: str) -> List[Dict[str, Any]]:
+        rows = self._query(
+            """
+            SELECT report_date, category, report_summary, overall_sentiment_score, trending_topics
+            FROM daily_reports WHERE report_date = ? ORDER BY category
+            """,
+            (report_date,)
+        )
+        for row in rows:
+            row['trending_topics'] = json.loads(row['trending_topics']) if row['trending_topics'] else []
+        return rows
+
+    def fetch_entity_articles(
+        self,
+        entity_names: List[str],
+        since: str,
+        until: str | None = None,
+        per_entity_limit: int | None = None
+    ) -> List[Dict[str, Any]]:
+        if not entity_names:
+            return []
+        placeholders = ", ".join("?" * len(entity_names))
+        return self._query(
+            f"""
+            SELECT entity_name, article_id, title, url, source_name, publication_date,
+                   ai_summary, sentiment_label, sentiment_score
+            FROM (
+              SELECT e.entity_name, a.article_id, a.title, a.url, a.source_name, a.publication_date,
+                     s.ai_summary, s.sentiment_label, s.sentiment_score,
+                     row_number() OVER (PARTITION BY e.entity_id ORDER BY a.article_id DESC) AS rank
+              FROM l1_analysis_entities e
+                JOIN article_entity_map m ON m.entity_id = e.entity_id
+                JOIN raw_articles a ON a.article_id = m.article_id
+                JOIN l1_analysis_sentiment s ON s.article_id = a.article_id
+              WHERE e.entity_name IN ({placeholders})
+                AND s.analyzed_at >= {_TIMESTAMP_SQL}
+                AND (? IS NULL OR s.analyzed_at < {_TIMESTAMP_SQL})
+            ) ranked
+            WHERE ? IS NULL OR rank <= ?
+            ORDER BY entity_name, rank
+            """,
+            (*entity_names, since, until, until, per_entity_limit, per_entity_limit)
+        )
+
+    # --- 冷数据归档 ---
+
+    def fetch_archive_page(self, until: str, after_id: int, limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        articles = self._query(
+            f"""
+            SELECT a.*, t.keyword, t.category
+            FROM raw_articles a LEFT JOIN tracked_topics t ON t.topic_id = a.topic_id
+            WHERE a.crawl_date < {_TIMESTAMP_SQL} AND a.article_id > ?
+            ORDER BY a.article_id LIMIT ?
+            """,
+            (until, after_id, limit)
+        )
+        for row in articles:
+            if row['minhash_signature'] is not None:
+                row['minhash_signature'] = json.loads(row['minhash_signature'])
+        ids = json.dumps([row['article_id'] for row in articles])
+        sentiments = self._query(
+            "SELECT * FROM l1_analysis_sentiment WHERE article_id IN (SELECT value FROM json_each(?)) ORDER BY article_id",
+            (ids,)
+        )
+        maps = self._query(
+            """
+            SELECT m.article_id, m.entity_id, e.entity_name, e.entity_type
+            FROM article_entity_map m JOIN l1_analysis_entities e ON e.entity_id = m.entity_id
+            WHERE m.article_id IN (SELECT value FROM json_each(?))
+            ORDER BY m.article_id, m.entity_id
+            """,
+            (ids,)
+        )
+        return {"articles": articles, "sentiments": sentiments, "maps": maps}
+
+    def prune_archived_articles(self, since: str, until: str, max_article_id: int, limit: int) -> int:
+        with self._transaction() as conn:
+            return conn.execute(
+                f"""
+                DELETE FROM raw_articles WHERE article_id IN (
+                  SELECT article_id FROM raw_articles
+                  WHERE crawl_date >= {_TIMESTAMP_SQL} AND crawl_date < {_TIMESTAMP_SQL} AND article_id <= ?
+                  ORDER BY article_id LIMIT ?
+                )
+                """,
+                (since, until, max_article_id, limit)
+            ).rowcount
@@ -0,0 +1,154 @@
+-- 本地 SQLite 存储的表结构 (scripts/storage/sqlite_backend.py 启动时自动执行)
+-- 与 db_schema/schema.sql 保持一致: 同样的表、列、约束、索引、视图和统计表。
+-- 差异:
+--   * 时间统一存为 UTC 文本 'YYYY-MM-DD HH:MM:SS.SSS'，便于按字符串比较和走索引；
+--   * 数组 / JSONB 列 (minhash_signature, trending_topics) 存为 JSON 文本；
+--   * PostgreSQL 的语句级触发器在这里是行级触发器，RPC 函数由 sqlite_backend.py 实现。
+
+CREATE TABLE IF NOT EXISTS tracked_topics (
+  topic_id INTEGER PRIMARY KEY,
+  keyword TEXT NOT NULL UNIQUE,
+  category TEXT NOT NULL,
+  is_active INTEGER DEFAULT 1,
+  last_published_at TEXT,
+  last_crawled_at TEXT,
+  next_crawl_at TEXT,
+  idle_runs INTEGER NOT NULL DEFAULT 0,
+  backfill_since TEXT,
+  backfill_until TEXT
+);
+
+CREATE TABLE IF NOT EXISTS raw_articles (
+  article_id INTEGER PRIMARY KEY,
+  topic_id INTEGER REFERENCES tracked_topics(topic_id) ON DELETE SET NULL,
+  url TEXT NOT NULL UNIQUE,
+  title TEXT NOT NULL,
+  snippet TEXT,
+  source_name TEXT NOT NULL,
+  publication_date TEXT,
+  crawl_date TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+  minhash_signature TEXT,
+  canonical_article_id INTEGER REFERENCES raw_articles(article_id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_raw_articles_canonical ON raw_articles (canonical_article_id)
+  WHERE canonical_article_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_raw_articles_topic_id ON raw_articles (topic_id);
+CREATE INDEX IF NOT EXISTS idx_raw_articles_crawl_date ON raw_articles (crawl_date);
+
+CREATE TABLE IF NOT EXISTS l1_analysis_sentiment (
+  analysis_id INTEGER PRIMARY KEY,
+  article_id INTEGER NOT NULL UNIQUE REFERENCES raw_articles(article_id) ON DELETE CASCADE,
+  ai_summary TEXT,
+  sentiment_score REAL,
+  sentiment_label TEXT,
+  analyzed_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_l1_sentiment_analyzed_at ON l1_analysis_sentiment (analyzed_at);
+
+CREATE TABLE IF NOT EXISTS l1_analysis_entities (
+  entity_id INTEGER PRIMARY KEY,
+  entity_name TEXT NOT NULL UNIQUE,
+  entity_type TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS entity_aliases (
+  alias_key TEXT PRIMARY KEY,
+  entity_id INTEGER NOT NULL REFERENCES l1_analysis_entities(entity_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_entity_aliases_entity ON entity_aliases (entity_id);
+
+CREATE TABLE IF NOT EXISTS article_entity_map (
+  article_id INTEGER NOT NULL REFERENCES raw_articles(article_id) ON DELETE CASCADE,
+  entity_id INTEGER NOT NULL REFERENCES l1_analysis_entities(entity_id) ON DELETE CASCADE,
+  PRIMARY KEY (article_id, entity_id)
+);
+CREATE INDEX IF NOT EXISTS idx_article_entity_map_entity ON article_entity_map (entity_id, article_id);
+
+CREATE TABLE IF NOT EXISTS daily_reports (
+  report_id INTEGER PRIMARY KEY,
+  report_date TEXT NOT NULL,
+  category TEXT NOT NULL,
+  report_summary TEXT,
+  overall_sentiment_score REAL,
+  trending_topics TEXT,
+  generated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+  UNIQUE (report_date, category)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_reports_report_date ON daily_reports (report_date);
+
+CREATE VIEW IF NOT EXISTS unanalyzed_articles AS
+SELECT
+  a.article_id,
+  a.title,
+  a.snippet,
+  t.keyword
+FROM raw_articles a
+  LEFT JOIN tracked_topics t ON a.topic_id = t.topic_id
+WHERE
+  a.canonical_article_id IS NULL
+  AND NOT EXISTS (
+    SELECT 1 FROM l1_analysis_sentiment s WHERE s.article_id = a.article_id
+  );
+
+CREATE TABLE IF NOT EXISTS l1_work_claims (
+  article_id INTEGER PRIMARY KEY REFERENCES raw_articles(article_id) ON DELETE CASCADE,
+  worker_id TEXT NOT NULL,
+  lease_expires_at TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 1,
+  last_error TEXT,
+  dead_lettered_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS entity_daily_stats (
+  stat_date TEXT NOT NULL,
+  category TEXT NOT NULL,
+  entity_id INTEGER NOT NULL REFERENCES l1_analysis_entities(entity_id) ON DELETE CASCADE,
+  article_count INTEGER NOT NULL DEFAULT 0,
+  sentiment_sum REAL NOT NULL DEFAULT 0,
+  sentiment_sq_sum REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (stat_date, category, entity_id)
+);
+
+-- 新增 "文章-实体" 关系时，累加到对应的 (日期, 分类, 实体)
+CREATE TRIGGER IF NOT EXISTS trg_entity_daily_stats_map_insert
+AFTER INSERT ON article_entity_map
+BEGIN
+  INSERT INTO entity_daily_stats (stat_date, category, entity_id, article_count, sentiment_sum, sentiment_sq_sum)
+  SELECT
+    date(s.analyzed_at),
+    t.category,
+    NEW.entity_id,
+    1,
+    s.sentiment_score,
+    s.sentiment_score * s.sentiment_score
+  FROM l1_analysis_sentiment s
+    JOIN raw_articles a ON a.article_id = s.article_id
+    JOIN tracked_topics t ON t.topic_id = a.topic_id
+  WHERE s.article_id = NEW.article_id
+    AND a.canonical_article_id IS NULL
+    AND s.sentiment_score IS NOT NULL
+  ON CONFLICT (stat_date, category, entity_id) DO UPDATE SET
+    article_count = article_count + excluded.article_count,
+    sentiment_sum = sentiment_sum + excluded.sentiment_sum,
+    sentiment_sq_sum = sentiment_sq_sum + excluded.sentiment_sq_sum;
+END;
+
+-- 文章被重新分析 (情感分数变化) 时，按差值修正它所关联实体的统计
+CREATE TRIGGER IF NOT EXISTS trg_entity_daily_stats_sentiment_update
+AFTER UPDATE OF sentiment_score ON l1_analysis_sentiment
+WHEN NEW.sentiment_score IS NOT OLD.sentiment_score
+  AND NEW.sentiment_score IS NOT NULL
+  AND OLD.sentiment_score IS NOT NULL
+BEGIN
+  UPDATE entity_daily_stats
+  SET
+    sentiment_sum = sentiment_sum + (NEW.sentiment_score - OLD.sentiment_score),
+    sentiment_sq_sum = sentiment_sq_sum + (NEW.sentiment_score * NEW.sentiment_score - OLD.sentiment_score * OLD.sentiment_score)
+  WHERE stat_date = date(OLD.analyzed_at)
+    AND category = (
+      SELECT t.category
+      FROM raw_articles a JOIN tracked_topics t ON t.topic_id = a.topic_id
+      WHERE a.article_id = OLD.article_id AND a.canonical_article_id IS NULL
+    )
+    AND entity_id IN (SELECT m.entity_id FROM article_entity_map m WHERE m.article_id = OLD.article_id);
+END;
@@ -0,0 +1,183 @@
+from typing import List, Dict, Any
+
+from ..db import get_db_client
+from .base import StorageBackend
+
+# -----------------------------------------------------------------
+# Supabase 后端: 通过 PostgREST 读写表和视图，批量写入走 schema.sql 中的 RPC 函数
+# -----------------------------------------------------------------
+
+class SupabaseStorage(StorageBackend):
+
+    @property
+    def db(self):
+        # 客户端由 db.py 懒加载并全局复用
+        return get_db_client()
+
+    def fetch_active_topics(self) -> List[Dict[str, Any]]:
+        return self.db.table("tracked_topics").select("*").eq("is_active", True).execute().data
+
+    def upsert_topics(self, topics: List[Dict[str, Any]]) -> int:
+        # 'keyword' 已存在时更新 'category' 和 'is_active'，否则插入新行
+        response = self.db.table("tracked_topics").upsert(
+            topics,
+            on_conflict="keyword"
+        ).execute()
+        return len(response.data)
+
+    def save_crawl_state(self, states: List[Dict[str, Any]]) -> int:
+        return self.db.rpc("save_crawl_state", {"states": states}).execute().data
+
+    def insert_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # on_conflict="url" + ignore_duplicates: url 已存在的文章被忽略，
+        # response.data 只包含 "新" 插入的数据条目
+        response = self.db.table("raw_articles").upsert(
+            articles,
+            on_conflict="url",
+            ignore_duplicates=True
+        ).execute()
+        return response.data
+
+    def fetch_signature_page(self, since: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self.db.table("raw_articles").select(
+            "article_id, minhash_signature, canonical_article_id"
+        ).gte("crawl_date", since).gt("article_id", after_id).not_.is_(
+            "minhash_signature", "null"
+        ).order("article_id").limit(limit).execute().data
+
+    def fetch_url_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self.db.table("raw_articles").select(
+            "article_id, url"
+        ).gt("article_id", after_id).order("article_id").limit(limit).execute().data
+
+    def set_canonical_articles(self, links: List[Dict[str, int]]) -> int:
+        return self.db.rpc("set_canonical_articles", {"links": links}).execute().data
+
+    def fetch_unanalyzed_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self.db.table("unanalyzed_articles").select(
+            "article_id, title, snippet, keyword"
+        ).gt("article_id", after_id).order("article_id").limit(limit).execute().data
+
+    def save_l1_batch(self, payload: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        return self.db.rpc("save_l1_batch", {"payload": payload}).execute().data
+
+    def claim_l1_batch(self, worker_id: str, batch_size: int, lease_seconds: int, max_attempts: int) -> List[Dict[str, Any]]:
+        return self.db.rpc("claim_l1_batch", {
+            "worker": worker_id,
+            "batch_size": batch_size,
+            "lease_seconds": lease_seconds,
+            "max_attempts": max_attempts,
+        }).execute().data or []
+
+    def release_l1_claims(self, worker_id: str, article_ids: List[int], error: str | None, max_attempts: int) -> Dict[str, int]:
+        return self.db.rpc("release_l1_claims", {
+            "worker": worker_id,
+            "article_ids": list(article_ids),
+            "error": error,
+            "max_attempts": max_attempts,
+        }).execute().data
+
+    def copy_l1_to_duplicates(self) -> int:
+        return self.db.rpc("copy_l1_to_duplicates", {}).execute().data or 0
+
+    def fetch_entity_page(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        return self.db.table("l1_analysis_entities").select(
+            "entity_id, entity_name, entity_type"
+        ).gt("entity_id", after_id).order("entity_id").limit(limit).execute().data
+
+    def fetch_entity_alias_page(self, after_key: str, limit: int) -> List[Dict[str, Any]]:
+        return self.db.table("entity_aliases").select(
+            "alias_key, entity_id"
+        ).gt("alias_key", after_key).order("alias_key").limit(limit).execute().data
+
+    def merge_entities(self, target_id: int, source_ids: List[int], alias_keys: List[str]) -> int:
+        return self.db.rpc("merge_entities", {
+            "target_id": target_id,
+            "source_ids": source_ids,
+            "alias_keys": alias_keys
+        }).execute().data
+
+    def fetch_l1_window(self, since: str, until: str | None = None) -> List[Dict[str, Any]]:
+        query = self.db.table("l1_analysis_sentiment").select(
+            """
+            analyzed_at,
+            raw_articles (
+                title,
+                tracked_topics ( category )
+            ),
+            ai_summary,
+            sentiment_score
+            """
+        ).gte("analyzed_at", since)
+        if until is not None:
+            query = query.lt("analyzed_at", until)
+        response = query.execute()
+
+        rows = []
+        for item in response.data:
+            article = item.get('raw_articles') or {}
+            topic = article.get('tracked_topics') or {}
+            rows.append({
+                "analyzed_at": item['analyzed_at'],
+                "title": article.get('title'),
+                "category": topic.get('category'),
+                "ai_summary": item['ai_summary'],
+                "sentiment_score": item['sentiment_score']
+            })
+        return rows
+
+    def get_trending_entities(self, start_date: str, end_date: str, per_category_limit: int | None = None) -> List[Dict[str, Any]]:
+        return self.db.rpc("get_trending_entities", {
+            "start_date": start_date,
+            "end_date": end_date,
+            "per_category_limit": per_category_limit
+        }).execute().data
+
+    def rebuild_entity_daily_stats(self, start_date: str | None = None, end_date: str | None = None) -> int:
+        return self.db.rpc("rebuild_entity_daily_stats", {
+            "start_date": start_date,
+            "end_date": end_date
+        }).execute().data
+
+    def upsert_report(self, report: Dict[str, Any]):
+        # 'upsert' 会在 (report_date, category) 冲突时“更新”报告
+        self.db.table("daily_reports").upsert(
+            report,
+            on_conflict="report_date, category"
+        ).execute()
+
+    def fetch_reports(self, report_date: str) -> List[Dict[str, Any]]:
+        return self.db.table("daily_reports").select(
+            "report_date, category, report_summary, overall_sentiment_score, trending_topics"
+        ).eq("report_date", report_date).order("category").execute().data
+
+    def fetch_entity_articles(
+        self,
+        entity_names: List[str],
+        since: str,
+        until: str | None = None,
+        per_entity_limit: int | None = None
+    ) -> List[Dict[str, Any]]:
+        if not entity_names:
+            return []
+        return self.db.rpc("get_entity_articles", {
+            "entity_names": entity_names,
+            "since": since,
+            "until": until,
+            "per_entity_limit": per_entity_limit
+        }).execute().data
+
+    def fetch_archive_page(self, until: str, after_id: int, limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        return self.db.rpc("get_archive_page", {
+            "until": until,
+            "after_id": after_id,
+            "page_size": limit
+        }).execute().data
+
+    def prune_archived_articles(self, since: str, until: str, max_article_id: int, limit: int) -> int:
+        return self.db.rpc("prune_archived_articles", {
+            "since": since,
+            "until": until,
+            "max_article_id": max_article_id,
+            "batch_size": limit
+        }).execute().data or 0
@@ -2,11 +2,13 @@ import os
 import sys
 from typing import List, Dict, Any
 
-# 导入我们自己的数据库客户端
+# 导入我们自己的存储后端
 try:
-    from .db import get_db_client
+    from .storage import get_storage
+    from .metrics import span, write_run_report
 except ImportError:
-    from db import get_db_client
+    from storage import get_storage
+    from metrics import span, write_run_report
 
 def parse_topics_from_env() -> List[Dict[str, str]]:
     """
@@ -43,8 +45,6 @@ def sync_topics_to_db(topics: List[Dict[str, str]]):
         print("  (Sync) ⏹️ 没有要同步到数据库的主题。")
         return
 
-    db = get_db_client()
-    
     # 准备 'upsert' 的数据
     # 我们将 'is_active' 设为 True，
     # 'keyword' 是我们 schema.sql 中的 UNIQUE 键
@@ -63,20 +63,18 @@ def sync_topics_to_db(topics: List[Dict[str, str]]):
         # 'upsert' 是关键：
         # 1. 如果 'keyword' 已存在，它会更新 'category' 和 'is_active' 字段。
         # 2. 如果 'keyword' 不存在，它会插入新行。
-        response = db.table("tracked_topics").upsert(
-            data_to_upsert,
-            on_conflict="keyword" # 冲突时依赖 'keyword' 键
-        ).execute()
+        processed = get_storage().upsert_topics(data_to_upsert) # 冲突时依赖 'keyword' 键
         
-        print(f"  (Sync) 🟢 数据库同步成功。处理了 {len(response.data)} 条记录。")
+        print(f"  (Sync) 🟢 数据库同步成功。处理了 {processed} 条记录。")
 
     except Exception as e:
         print(f"  (Sync) 🔴 错误: 同步 'tracked_topics' 失败: {e}")
         sys.exit(1) # 同步失败是严重错误，终止工作流
 
-def main():
+def main(dry_run: bool = False):
     """
-    同步脚本的主函数
+    同步脚本的主函数。
+    dry_run: 只解析并打印要同步的关键词，不写库。
     """
     print("--- 关键词同步脚本 (sync_topics.py) 启动 ---")
     
@@ -84,9 +82,16 @@ def main():
     topics_to_sync = parse_topics_from_env()
     
     # 2. 同步到数据库
-    sync_topics_to_db(topics_to_sync)
+    if dry_run:
+        for topic in topics_to_sync:
+            print(f"  (Sync) [预演] {topic['keyword']} ({topic['category']})")
+        print(f"  (Sync) [预演] 将同步 {len(topics_to_sync)} 个关键词，未写入数据库。")
+    else:
+        sync_topics_to_db(topics_to_sync)
     
     print("--- 关键词同步脚本 (sync_topics.py) 结束 ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("stage", trace=True, stage="sync"):
+        main()
+    write_run_report()
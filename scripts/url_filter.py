@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import math
+import struct
+import hashlib
+from typing import Any, Dict, Iterable, List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    from .metrics import inc, gauge
+except ImportError:
+    from metrics import inc, gauge
+
+# -----------------------------------------------------------------
+# URL 规范化与已知文章过滤器 (URL Canonicalization & Known-URL Bloom Filter)
+# -----------------------------------------------------------------
+#
+# 同一篇文章经常以不同的 URL 出现: utm_* / fbclid 等跟踪参数、http 与 https、
+# www. / m. / amp. 子域名、AMP 版本 (/amp、.amp.html、?outputType=amp、Google AMP Cache)……
+# 'raw_articles.url' 的唯一键只能拦住完全相同的字符串，这些变体会被当成新文章再分析一次。
+#   * clean_url: 保守的清理 (去掉跟踪参数和 #片段，小写协议和主机名，去掉默认端口)，结果存入 raw_articles.url；
+#   * canonical_url_key: 激进的去重键 (再统一为 https、去掉 www./m./amp. 前缀、折叠 AMP 路径、排序查询参数)，
+#     只用来判断 "是否已知"，不保证能访问。
+# 已入库文章的去重键放进一个 Bloom 过滤器: 从 raw_articles 构建，持久化到本地文件，
+# 之后每次运行只追加新入库的行。爬虫在写库之前就丢掉已知文章，不再把它们放进 upsert 请求。
+# Bloom 过滤器没有漏报 (已知文章一定会被拦下)，误报率为 URL_FILTER_FP_RATE (极少数新文章被误判为已知而跳过)。
+#
+# 常量定义 (Constants)
+URL_FILTER_ENABLED = os.environ.get("URL_FILTER_ENABLED", "true").lower() == "true"
+URL_FILTER_PATH = os.environ.get(
+    "URL_FILTER_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '.cache', 'url_filter.bin')
+)
+# 目标误报率: 1e-4 约为每个 URL 19.2 位 (100 万篇文章约 2.3 MB)
+URL_FILTER_FP_RATE = float(os.environ.get("URL_FILTER_FP_RATE", "0.0001"))
+# 过滤器的最小容量 (URL 数)；实际元素数超过容量时按两倍于当前行数重建
+URL_FILTER_MIN_CAPACITY = int(os.environ.get("URL_FILTER_MIN_CAPACITY", "100000"))
+# 构建 / 追加时每页读取的行数 (不超过 PostgREST 的默认行数上限)
+URL_FILTER_PAGE_SIZE = 1000
+
+# 跟踪参数 (不影响页面内容)
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "ref_src", "cmpid", "ocid", "smid", "ncid", "s_cid", "sr_share", "taid",
+    "guccounter", "guce_referrer", "guce_referrer_sig",
+}
+TRACKING_PREFIXES = ("utm_",)
+# 去重键中去掉的主机名前缀 (移动版 / AMP 子域名)
+HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+# 表示 AMP 版本的查询参数
+AMP_QUERY_PARAMS = {"amp": None, "outputtype": "amp", "output": "amp"}
+
+# https://www-example-com.cdn.ampproject.org/c/s/www.example.com/path -> https://www.example.com/path
+_AMP_CACHE_PATH = re.compile(r"^/[a-z]/(s/)?(?P<host>[^/]+)(?P<path>/.*)?$")
+_AMP_PATH_SEGMENT = re.compile(r"(^/amp(?=/)|/amp/?$)")
+_AMP_SUFFIX = re.compile(r"\.amp(?=\.html?$)|\.amp$")
+
+_FILE_MAGIC = b"DNURLBF1"
+_FILE_HEADER = struct.Struct("<8sQIQQd")  # magic, 位数, 哈希数, 元素数, 最大 article_id, 目标误报率
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def _split_host(netloc: str, scheme: str) -> str:
+    """去掉用户信息、默认端口和末尾的点，小写主机名"""
+    host = netloc.rsplit('@', 1)[-1].lower().rstrip('.')
+    if (scheme == "http" and host.endswith(":80")) or (scheme == "https" and host.endswith(":443")):
+        host = host.rsplit(':', 1)[0]
+    return host
+
+def clean_url(url: str | None) -> str | None:
+    """
+    保守的 URL 清理 (存入数据库的形式): 小写协议和主机名、去掉默认端口和 #片段、去掉跟踪参数，
+    其余查询参数保持原来的顺序。无法解析的 URL 原样返回。
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    # 按原样保留其余参数 (不重新编码)，避免改变 URL 的含义
+    query = '&'.join(
+        param for param in parts.query.split('&') if param and not _is_tracking_param(param.split('=', 1)[0])
+    )
+    return urlunsplit((scheme, _split_host(parts.netloc, scheme), parts.path or "/", query, ""))
+
+def canonical_url_key(url: str | None) -> str | None:
+    """
+    URL 的去重键: 在 clean_url 的基础上统一为 https，去掉 www./m./amp. 等前缀，
+    展开 Google AMP Cache，去掉 AMP 路径和参数，排序查询参数，去掉路径末尾的 '/'。
+    """
+    cleaned = clean_url(url)
+    if not cleaned or "://" not in cleaned:
+        return cleaned
+    parts = urlsplit(cleaned)
+    host, path = parts.netloc, parts.path
+
+    if host.endswith(".cdn.ampproject.org"):
+        match = _AMP_CACHE_PATH.match(path)
+        if match:
+            host, path = match.group("host").lower(), match.group("path") or "/"
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix) and host.count('.') > 1:
+            host = host[len(prefix):]
+            break
+
+    path = _AMP_SUFFIX.sub("", _AMP_PATH_SEGMENT.sub("", path)) or "/"
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not (k.lower() in AMP_QUERY_PARAMS and AMP_QUERY_PARAMS[k.lower()] in (None, v.lower()))
+    )
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+class BloomFilter:
+    """
+    位数组 + k 个哈希位置 (由一次 BLAKE2b 摘要做双重哈希 h1 + i * h2 得到)。
+    按容量 n 和目标误报率 p 确定位数 m = -n ln p / (ln 2)^2 和哈希数 k = m / n * ln 2。
+    """
+    def __init__(self, capacity: int, fp_rate: float = URL_FILTER_FP_RATE,
+                 bits: bytearray | None = None, num_hashes: int | None = None, count: int = 0):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        num_bits = bits and len(bits) * 8 or math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.num_bits = (num_bits + 7) // 8 * 8
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.num_bits // 8)
+        # 加入的不同元素数 (加入时没有改变任何位的元素视为已存在，不计数)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str) -> bool:
+        """加入一个元素，返回它之前是否不在过滤器中"""
+        added = False
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+    def estimated_fp_rate(self) -> float:
+        """按当前元素数估算的误报率 (1 - e^(-kn/m))^k"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class KnownUrlFilter:
+    """
+    已入库文章的 URL 过滤器: Bloom 过滤器 + 已收录的最大 article_id (下次运行从这里往后追加)。
+    drop_known() 在写库之前去掉已知文章，并统计少发送的行数和字节数。
+    """
+    def __init__(self, bloom: BloomFilter, max_article_id: int = 0):
+        self.bloom = bloom
+        self.max_article_id = max_article_id
+        self.stats = {"checked": 0, "skipped": 0, "skipped_bytes": 0, "cleaned": 0}
+
+    def __len__(self) -> int:
+        return len(self.bloom)
+
+    def add_url(self, url: str | None, article_id: int | None = None):
+        key = canonical_url_key(url)
+        if key:
+            self.bloom.add(key)
+        if article_id:
+            self.max_article_id = max(self.max_article_id, article_id)
+
+    def drop_known(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """去掉已入库 (或同一批中重复) 的文章行，返回需要写入的行"""
+        fresh, batch_keys, skipped_bytes = [], set(), 0
+        for row in rows:
+            key = canonical_url_key(row.get("url"))
+            if key and (key in batch_keys or key in self.bloom):
+                skipped_bytes += len(json.dumps(row, ensure_ascii=False).encode('utf-8'))
+                continue
+            batch_keys.add(key)
+            fresh.append(row)
+        self.stats["checked"] += len(rows)
+        self.stats["skipped"] += len(rows) - len(fresh)
+        self.stats["skipped_bytes"] += skipped_bytes
+        inc("url_filter_skipped_total", len(rows) - len(fresh))
+        inc("url_filter_bytes_avoided_total", skipped_bytes)
+        return fresh
+
+    def record_written(self, rows: List[Dict[str, Any]], inserted_rows: List[Dict[str, Any]]):
+        """upsert 成功后: 发送的行 (新插入的和已存在的) 都已在数据库中，全部加入过滤器"""
+        for row in rows:
+            self.add_url(row.get("url"))
+        for row in inserted_rows:
+            self.max_article_id = max(self.max_article_id, row.get("article_id") or 0)
+
+    def format_stats(self) -> str:
+        s = self.stats
+        return (
+            f"URL 过滤: 检查 {s['checked']} 篇，跳过 {s['skipped']} 篇已知文章 "
+            f"(少发送约 {s['skipped_bytes'] / 1024:.1f} KB 的 upsert 数据)，清理了 {s['cleaned']} 个带跟踪参数的 URL；"
+            f"过滤器共 {len(self.bloom)} 个 URL，{self.bloom.size_bytes / 1024:.0f} KB，"
+            f"估算误报率 {self.bloom.estimated_fp_rate():.4%}"
+        )
+
+    # --- 持久化 ---
+
+    def save(self, path: str | None = None):
+        """写入本地文件 (先写临时文件再原子替换)"""
+        path = path or URL_FILTER_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = _FILE_HEADER.pack(_FILE_MAGIC, self.bloom.num_bits, self.bloom.num_hashes,
+                                   self.bloom.count, self.max_article_id, self.bloom.fp_rate)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(header)
+            f.write(self.bloom.bits)
+        os.replace(path + ".tmp", path)
+        gauge("url_filter_fp_rate", self.bloom.estimated_fp_rate())
+
+    @classmethod
+    def read(cls, path: str | None = None) -> "KnownUrlFilter | None":
+        """读取本地文件；文件不存在、损坏或误报率配置已改变时返回 None"""
+        try:
+            with open(path or URL_FILTER_PATH, 'rb') as f:
+                data = f.read()
+            magic, num_bits, num_hashes, count, max_article_id, fp_rate = _FILE_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        bits = bytearray(data[_FILE_HEADER.size:])
+        if magic != _FILE_MAGIC or len(bits) * 8 != num_bits or fp_rate != URL_FILTER_FP_RATE:
+            return None
+        capacity = round(-num_bits * math.log(2) ** 2 / math.log(fp_rate))
+        return cls(BloomFilter(capacity, fp_rate, bits, num_hashes, count), max_article_id)
+
+
+def iter_url_pages(storage, after_id: int, page_size: int = URL_FILTER_PAGE_SIZE) -> Iterable[List[Dict[str, Any]]]:
+    """按 article_id 做 keyset 分页，逐页产出 (article_id, url)"""
+    while True:
+        page = storage.fetch_url_page(after_id, page_size)
+        if page:
+            yield page
+            after_id = page[-1]['article_id']
+        if len(page) < page_size:
+            return
+
+def load_known_url_filter(storage, path: str | None = None) -> KnownUrlFilter:
+    """
+    读取持久化的过滤器并追加上次之后入库的文章；没有可用的文件 (或文件不属于当前数据库) 时从 raw_articles 全量构建。
+    元素数超过容量 (误报率会明显升高) 时按两倍于当前元素数的容量重建。
+    """
+    url_filter = KnownUrlFilter.read(path)
+    if url_filter is not None and url_filter.max_article_id:
+        # 文件中最后收录的文章不在当前数据库中: 文件来自另一个数据库 (或该文章已被删除)，重新构建
+        last = storage.fetch_url_page(url_filter.max_article_id - 1, 1)
+        if not last or last[0]['article_id'] != url_filter.max_article_id:
+            url_filter = None
+    if url_filter is None:
+        url_filter = KnownUrlFilter(BloomFilter(URL_FILTER_MIN_CAPACITY))
+    for page in iter_url_pages(storage, url_filter.max_article_id):
+        for row in page:
+            url_filter.add_url(row['url'], row['article_id'])
+
+    if len(url_filter) > url_filter.bloom.capacity:
+        rebuilt = KnownUrlFilter(BloomFilter(max(URL_FILTER_MIN_CAPACITY, 2 * len(url_filter))))
+        for page in iter_url_pages(storage, 0):
+            for row in page:
+                rebuilt.add_url(row['url'], row['article_id'])
+        url_filter = rebuilt
+    return url_filter